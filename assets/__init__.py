@@ -1,18 +1,32 @@
+from datetime import datetime, timedelta
+
 from dagster import (
     AssetSelection,
     DefaultScheduleStatus,
     Definitions,
+    RunRequest,
     ScheduleDefinition,
+    ScheduleEvaluationContext,
+    SkipReason,
     define_asset_job,
+    schedule,
 )
 
-from .checks import check_posicoes_bronze_silver, check_previsoes_bronze_silver
+from .checks import (
+    check_posicoes_bronze_silver,
+    check_posicoes_checksum,
+    check_previsoes_bronze_silver,
+    check_previsoes_checksum,
+)
 from .coleta import posicoes_sptrans, previsoes_sptrans
 from .processamento import (
+    FUSO_HORARIO,
+    JANELA_DIAS,
     compactar_posicoes,
     compactar_previsoes,
     expurgar_posicoes,
     expurgar_previsoes,
+    particoes_diarias,
 )
 
 # --- Jobs (agrupamentos de assets para schedules) ---
@@ -51,17 +65,38 @@ previsoes_schedule = ScheduleDefinition(
     default_status=DefaultScheduleStatus.RUNNING,
 )
 
-compactacao_schedule = ScheduleDefinition(
+
+def _particao_dias_atras(context: ScheduleEvaluationContext, dias: int):
+    """RunRequest para a partição `dias` antes da execução agendada (ou SkipReason se anterior ao início)."""
+    dia = (context.scheduled_execution_time - timedelta(days=dias)).strftime("%Y-%m-%d")
+    if datetime.strptime(dia, "%Y-%m-%d") < particoes_diarias.start.replace(tzinfo=None):
+        return SkipReason(f"Partição {dia} anterior ao início das partições.")
+    return RunRequest(run_key=dia, partition_key=dia)
+
+
+@schedule(
+    name="compactacao_job_schedule",
     job=compactacao_job,
     cron_schedule="0 2 * * *",  # diariamente às 02:00
+    execution_timezone=FUSO_HORARIO,
     default_status=DefaultScheduleStatus.RUNNING,
 )
+def compactacao_schedule(context: ScheduleEvaluationContext):
+    """Compacta a partição do dia anterior."""
+    return _particao_dias_atras(context, 1)
+
 
-expurgo_schedule = ScheduleDefinition(
+@schedule(
+    name="expurgo_job_schedule",
     job=expurgo_job,
     cron_schedule="0 3 * * *",  # diariamente às 03:00
+    execution_timezone=FUSO_HORARIO,
     default_status=DefaultScheduleStatus.RUNNING,
 )
+def expurgo_schedule(context: ScheduleEvaluationContext):
+    """Expurga o dia que acabou de sair da janela quente."""
+    return _particao_dias_atras(context, JANELA_DIAS + 1)
+
 
 # --- Definitions (ponto de entrada do Dagster) ---
 
@@ -83,5 +118,7 @@ defs = Definitions(
     asset_checks=[
         check_posicoes_bronze_silver,
         check_previsoes_bronze_silver,
+        check_posicoes_checksum,
+        check_previsoes_checksum,
     ],
 )
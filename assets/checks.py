@@ -1,9 +1,11 @@
 """
 Asset checks de qualidade para verificação entre camadas.
 
-Cada check verifica a integridade entre Bronze (SQLite) e Silver (Parquet):
-- Reconciliação de contagem de registros
+Cada check verifica a integridade entre Bronze (SQLite) e Silver (Parquet)
+para a partição (dia) materializada, via src/reconciliacao.py:
+- Reconciliação de contagem de registros do dia (índice no Bronze, manifesto/rodapés no Silver)
 - Tolerância configurável (padrão 5%)
+- Checksum de conteúdo do dia (detecta linhas alteradas/substituídas com contagem igual)
 
 Uso:
     Os checks são registrados em assets/__init__.py via Definitions(asset_checks=[...]).
@@ -13,65 +15,62 @@ import logging
 import os
 
 import duckdb
-from dagster import AssetCheckResult, AssetCheckSeverity, asset_check
+from dagster import AssetCheckExecutionContext, AssetCheckResult, AssetCheckSeverity, asset_check
 
 # O decorator @asset_check em Dagster 1.13 não aceita severity;
 # a severidade é definida em AssetCheckResult no retorno.
-from src import compactar_parquet
+from src import compactar_parquet, reconciliacao
+
+from .processamento import em_janela_quente, particoes_diarias
 
 logger = logging.getLogger(__name__)
 
-TOLERANCIA_PCT = 5  # diferença percentual máxima aceitável
+TOLERANCIA_PCT = reconciliacao.TOLERANCIA_PCT  # diferença percentual máxima aceitável
 
 
-def _contagem_sqlite(tabela: str) -> int:
-    """Contagem de registros no SQLite para uma tabela."""
+def _reconciliar_dia(tabela: str, dia: str) -> dict:
+    """Linha do relatório de reconciliação para o dia (Bronze por índice, Silver por manifesto/rodapé)."""
     path = compactar_parquet.DB_PATH
     if not os.path.exists(path):
-        return 0
+        silver, fontes = reconciliacao.contagens_silver(os.path.join(compactar_parquet.PARQUET_DIR, tabela), [dia])
+        return {**reconciliacao.comparar_dia(dia, 0, silver.get(dia, 0)), "fonte_silver": fontes.get(dia, "-")}
     import sqlite3
 
     conn = sqlite3.connect(path)
     try:
-        row = conn.execute(f"SELECT count(*) FROM {tabela}").fetchone()
-        return row[0] if row else 0
+        return reconciliacao.reconciliar(conn, tabela, [dia], TOLERANCIA_PCT)[0]
     finally:
         conn.close()
 
 
-def _contagem_parquet(tabela: str) -> int:
-    """Contagem de registros no Parquet para uma tabela."""
-    parquet_dir = os.path.join(compactar_parquet.PARQUET_DIR, tabela)
-    if not os.path.exists(parquet_dir):
-        return 0
-    con = duckdb.connect()
-    try:
-        row = con.execute(f"SELECT count(*) FROM read_parquet('{parquet_dir}/**/*.parquet')").fetchone()
-        return row[0] if row else 0
-    finally:
-        con.close()
-
+def reconciliar_particao(tabela: str, dia: str) -> AssetCheckResult:
+    """Reconcilia a contagem de um dia entre Bronze (SQLite) e Silver (Parquet)."""
+    linha = _reconciliar_dia(tabela, dia)
+    bronze, silver, diff_pct = linha["bronze"], linha["silver"], linha["diff_pct"]
+    metadata = {
+        "partition": dia,
+        "bronze_count": bronze,
+        "silver_count": silver,
+        "diff_pct": diff_pct,
+        "silver_source": linha["fonte_silver"],
+    }
 
-@asset_check(
-    asset="compactar_posicoes",
-    description="Verifica se a contagem de posições no Parquet (Silver) é consistente com o SQLite (Bronze).",
-)
-def check_posicoes_bronze_silver() -> AssetCheckResult:
-    """Reconcilia contagem de posições entre Bronze (SQLite) e Silver (Parquet)."""
-    bronze = _contagem_sqlite("posicoes")
-    silver = _contagem_parquet("posicoes")
-
-    if bronze == 0 and silver == 0:
-        return AssetCheckResult(passed=True, description="Nenhum registro encontrado em ambas as camadas.")
+    if linha["status"] == "vazio":
+        return AssetCheckResult(
+            passed=True, description=f"Nenhum registro em dt={dia} em ambas as camadas.", metadata=metadata
+        )
 
-    if bronze > 0:
-        diff_pct = abs(bronze - silver) / bronze * 100
-    else:
-        diff_pct = 100.0 if silver > 0 else 0.0
+    if bronze == 0 and not em_janela_quente(dia):
+        # Dia já expurgado do SQLite: Silver é a única cópia, nada a reconciliar
+        return AssetCheckResult(
+            passed=True, description=f"dt={dia} expurgado do Bronze; Silver ({silver}).", metadata=metadata
+        )
 
     if diff_pct > TOLERANCIA_PCT:
         logger.warning(
-            "CHECK FAIL: posicoes Bronze=%s Silver=%s (dif=%.1f%% > %s%%)",
+            "CHECK FAIL: %s dt=%s Bronze=%s Silver=%s (dif=%.1f%% > %s%%)",
+            tabela,
+            dia,
             bronze,
             silver,
             diff_pct,
@@ -81,78 +80,100 @@ def check_posicoes_bronze_silver() -> AssetCheckResult:
             passed=False,
             severity=AssetCheckSeverity.WARN,
             description=(
-                f"Diferença de {diff_pct:.1f}% entre Bronze ({bronze}) "
+                f"dt={dia}: diferença de {diff_pct:.1f}% entre Bronze ({bronze}) "
                 f"e Silver ({silver}) — tolerância: {TOLERANCIA_PCT}%"
             ),
-            metadata={
-                "bronze_count": bronze,
-                "silver_count": silver,
-                "diff_pct": round(diff_pct, 1),
-            },
+            metadata=metadata,
         )
 
-    logger.info("CHECK OK: posicoes Bronze=%s Silver=%s (dif=%.1f%%)", bronze, silver, diff_pct)
+    logger.info("CHECK OK: %s dt=%s Bronze=%s Silver=%s (dif=%.1f%%)", tabela, dia, bronze, silver, diff_pct)
     return AssetCheckResult(
         passed=True,
         description=(
-            f"Bronze ({bronze}) ↔ Silver ({silver}) — diferença de {diff_pct:.1f}% (tolerância: {TOLERANCIA_PCT}%)"
+            f"dt={dia}: Bronze ({bronze}) ↔ Silver ({silver}) — diferença de {diff_pct:.1f}% "
+            f"(tolerância: {TOLERANCIA_PCT}%)"
         ),
-        metadata={
-            "bronze_count": bronze,
-            "silver_count": silver,
-            "diff_pct": round(diff_pct, 1),
-        },
+        metadata=metadata,
     )
 
 
 @asset_check(
-    asset="compactar_previsoes",
-    description="Verifica se a contagem de previsões no Parquet (Silver) é consistente com o SQLite (Bronze).",
+    asset="compactar_posicoes",
+    partitions_def=particoes_diarias,
+    description="Verifica se a contagem de posições do dia no Parquet (Silver) é consistente com o SQLite (Bronze).",
 )
-def check_previsoes_bronze_silver() -> AssetCheckResult:
-    """Reconcilia contagem de previsões entre Bronze (SQLite) e Silver (Parquet)."""
-    bronze = _contagem_sqlite("previsoes")
-    silver = _contagem_parquet("previsoes")
+def check_posicoes_bronze_silver(context: AssetCheckExecutionContext) -> AssetCheckResult:
+    """Reconcilia contagem de posições da partição entre Bronze (SQLite) e Silver (Parquet)."""
+    return reconciliar_particao("posicoes", context.partition_key)
 
-    if bronze == 0 and silver == 0:
-        return AssetCheckResult(passed=True, description="Nenhum registro encontrado em ambas as camadas.")
 
-    if bronze > 0:
-        diff_pct = abs(bronze - silver) / bronze * 100
-    else:
-        diff_pct = 100.0 if silver > 0 else 0.0
+@asset_check(
+    asset="compactar_previsoes",
+    partitions_def=particoes_diarias,
+    description="Verifica se a contagem de previsões do dia no Parquet (Silver) é consistente com o SQLite (Bronze).",
+)
+def check_previsoes_bronze_silver(context: AssetCheckExecutionContext) -> AssetCheckResult:
+    """Reconcilia contagem de previsões da partição entre Bronze (SQLite) e Silver (Parquet)."""
+    return reconciliar_particao("previsoes", context.partition_key)
 
-    if diff_pct > TOLERANCIA_PCT:
-        logger.warning(
-            "CHECK FAIL: previsoes Bronze=%s Silver=%s (dif=%.1f%% > %s%%)",
-            bronze,
-            silver,
-            diff_pct,
-            TOLERANCIA_PCT,
-        )
-        return AssetCheckResult(
-            passed=False,
-            severity=AssetCheckSeverity.WARN,
-            description=(
-                f"Diferença de {diff_pct:.1f}% entre Bronze ({bronze}) "
-                f"e Silver ({silver}) — tolerância: {TOLERANCIA_PCT}%"
-            ),
-            metadata={
-                "bronze_count": bronze,
-                "silver_count": silver,
-                "diff_pct": round(diff_pct, 1),
-            },
-        )
 
-    logger.info("CHECK OK: previsoes Bronze=%s Silver=%s (dif=%.1f%%)", bronze, silver, diff_pct)
+def verificar_checksum(tabela: str, dia: str) -> AssetCheckResult:
+    """Compara o checksum de conteúdo do dia: Bronze agora, arquivos Silver agora e manifesto (gravado na compactação)."""
+    if not os.path.exists(compactar_parquet.DB_PATH):
+        return AssetCheckResult(passed=True, description="Bronze indisponível; checksum não verificado.")
+
+    destino = os.path.join(compactar_parquet.PARQUET_DIR, tabela)
+    colunas = compactar_parquet.COLUNAS_CHECKSUM[tabela]
+    particao = os.path.join(destino, f"dt={dia}")
+    vazio = f"{0:016x}"
+    manifesto = compactar_parquet.ler_manifesto(destino)["particoes"].get(dia, {}) if os.path.isdir(destino) else {}
+    con = duckdb.connect()
+    try:
+        bronze = compactar_parquet.checksum_sqlite(con, tabela, dia, colunas)
+        arquivos = compactar_parquet.checksum_parquet(con, destino, dia, colunas) if os.path.isdir(particao) else vazio
+    finally:
+        con.close()
+    esperado = manifesto.get("checksum", vazio)
+    metadata = {
+        "partition": dia,
+        "bronze_checksum": bronze,
+        "silver_checksum": arquivos,
+        "manifest_checksum": esperado,
+    }
+
+    if bronze == arquivos == esperado:
+        descricao = f"Nenhum registro em dt={dia}." if bronze == vazio else f"dt={dia}: checksum {bronze} confere."
+        return AssetCheckResult(passed=True, description=descricao, metadata=metadata)
+    if bronze == vazio and not em_janela_quente(dia) and arquivos == esperado:
+        return AssetCheckResult(passed=True, description=f"dt={dia} expurgado do Bronze.", metadata=metadata)
+
+    logger.warning(
+        "CHECK FAIL: %s dt=%s checksum Bronze=%s Silver=%s manifesto=%s", tabela, dia, bronze, arquivos, esperado
+    )
+    origem = "arquivos Silver alterados após a compactação" if arquivos != esperado else "Silver diverge do Bronze"
     return AssetCheckResult(
-        passed=True,
-        description=(
-            f"Bronze ({bronze}) ↔ Silver ({silver}) — diferença de {diff_pct:.1f}% (tolerância: {TOLERANCIA_PCT}%)"
-        ),
-        metadata={
-            "bronze_count": bronze,
-            "silver_count": silver,
-            "diff_pct": round(diff_pct, 1),
-        },
+        passed=False,
+        severity=AssetCheckSeverity.WARN,
+        description=f"dt={dia}: {origem} (Bronze {bronze}, Silver {arquivos}, manifesto {esperado}).",
+        metadata=metadata,
     )
+
+
+@asset_check(
+    asset="compactar_posicoes",
+    partitions_def=particoes_diarias,
+    description="Compara o checksum de conteúdo das posições do dia entre Bronze (SQLite) e o manifesto Silver.",
+)
+def check_posicoes_checksum(context: AssetCheckExecutionContext) -> AssetCheckResult:
+    """Detecta posições alteradas ou substituídas no Silver mesmo com contagens iguais."""
+    return verificar_checksum("posicoes", context.partition_key)
+
+
+@asset_check(
+    asset="compactar_previsoes",
+    partitions_def=particoes_diarias,
+    description="Compara o checksum de conteúdo das previsões do dia entre Bronze (SQLite) e o manifesto Silver.",
+)
+def check_previsoes_checksum(context: AssetCheckExecutionContext) -> AssetCheckResult:
+    """Detecta previsões alteradas ou substituídas no Silver mesmo com contagens iguais."""
+    return verificar_checksum("previsoes", context.partition_key)
@@ -15,30 +15,13 @@ from dagster import MetadataValue, Output, asset
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 
-from src import coleta_previsoes, coleta_sptrans
-from src.database import get_db_path, registrar_linhagem
+from src import coleta_previsoes, coleta_sptrans, metricas
+from src.database import contagem_tabela, get_db_path, registrar_linhagem
+from src.rastreamento import coletar_etapas, resumo_etapas
 
 logger = logging.getLogger(__name__)
 
 
-def _contagem_tabela(tabela: str) -> int:
-    """Retorna row_count de uma tabela SQLite (0 se tabela vazia ou não existir)."""
-    try:
-        import sqlite3
-
-        path = get_db_path()
-        if not os.path.exists(path):
-            return 0
-        conn = sqlite3.connect(path)
-        try:
-            row = conn.execute(f"SELECT count(*) FROM {tabela}").fetchone()
-            return row[0] if row else 0
-        finally:
-            conn.close()
-    except Exception:
-        return 0
-
-
 @asset(
     group_name="coleta",
     description=(
@@ -51,19 +34,23 @@ def posicoes_sptrans() -> Output[int]:
     config = coleta_sptrans.get_config()
     linhas_alvo_ids = coleta_sptrans.get_linhas_alvo_ids(config)
     letreiros_alvo = coleta_sptrans.get_letreiros_alvo(linhas_alvo_ids)
-    coleta_sptrans.job(letreiros_alvo)
+    with coletar_etapas() as etapas:
+        inseridos = coleta_sptrans.job(letreiros_alvo) or 0
 
-    row_count = _contagem_tabela("posicoes")
+    row_count = contagem_tabela("posicoes")
     registrar_linhagem("posicoes_sptrans", "posicoes", "bronze", row_count, "ok")
 
-    logger.info("Asset posicoes_sptrans materializado com sucesso (%s registros).", row_count)
+    logger.info("Asset posicoes_sptrans materializado com sucesso (%s inseridos, %s no total).", inseridos, row_count)
+    metricas.gravar_textfile("posicoes_sptrans")
     return Output(
         row_count,
         metadata={
             "table": MetadataValue.text("posicoes"),
             "layer": MetadataValue.text("bronze"),
+            "rows_inserted": MetadataValue.int(inseridos),
             "row_count": MetadataValue.int(row_count),
             "db_path": MetadataValue.text(get_db_path()),
+            "stage_timings": MetadataValue.json(resumo_etapas(etapas)),
         },
     )
 
@@ -81,22 +68,27 @@ def previsoes_sptrans() -> Output[int]:
     token = coleta_previsoes.get_token(config)
     linhas_alvo = coleta_previsoes.get_linhas_alvo(config)
     session = requests.Session()
-    if coleta_previsoes.autenticar(token, session):
-        coleta_previsoes.job(session, linhas_alvo)
-        logger.info("Asset previsoes_sptrans materializado com sucesso.")
-    else:
-        logger.error("Falha na autenticação — pulando coleta de previsões.")
-
-    row_count = _contagem_tabela("previsoes")
+    inseridos = 0
+    with coletar_etapas() as etapas:
+        if coleta_previsoes.autenticar(token, session):
+            inseridos = coleta_previsoes.job(session, linhas_alvo) or 0
+            logger.info("Asset previsoes_sptrans materializado com sucesso.")
+        else:
+            logger.error("Falha na autenticação — pulando coleta de previsões.")
+
+    row_count = contagem_tabela("previsoes")
     registrar_linhagem("previsoes_sptrans", "previsoes", "bronze", row_count, "ok")
 
-    logger.info("Asset previsoes_sptrans: %s registros em previsoes.", row_count)
+    logger.info("Asset previsoes_sptrans: %s inseridos, %s registros em previsoes.", inseridos, row_count)
+    metricas.gravar_textfile("previsoes_sptrans")
     return Output(
         row_count,
         metadata={
             "table": MetadataValue.text("previsoes"),
             "layer": MetadataValue.text("bronze"),
+            "rows_inserted": MetadataValue.int(inseridos),
             "row_count": MetadataValue.int(row_count),
             "db_path": MetadataValue.text(get_db_path()),
+            "stage_timings": MetadataValue.json(resumo_etapas(etapas)),
         },
     )
@@ -3,159 +3,183 @@ Assets Dagster para processamento pós-coleta: compactação Parquet e expurgo.
 
 Envolve as funções de src/compactar_parquet.py e src/expurgar_sqlite.py
 sem modificá-las.
+
+Os quatro assets são particionados por dia (`particoes_diarias`): cada partição
+`YYYY-MM-DD` compacta/expurga exatamente aquele dia. Dias perdidos (queda do
+Dagster, banco fora do ar) são recuperados com um único backfill pela UI:
+
+- compactação: uma run por partição (`BackfillPolicy.multi_run`), executadas em
+  paralelo e limitadas pelo pool `POOL_COMPACTACAO` (limite em dagster_home/dagster.yaml);
+- expurgo: uma única run percorre o intervalo (`BackfillPolicy.single_run`), já que
+  DELETEs concorrentes no SQLite só disputariam o lock de escrita.
 """
 
 import logging
 import os
 import sys
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 
 import duckdb
-from dagster import MetadataValue, Output, asset
+from dagster import (
+    AssetExecutionContext,
+    BackfillPolicy,
+    DailyPartitionsDefinition,
+    MetadataValue,
+    Output,
+    asset,
+)
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 
-from src import compactar_parquet, expurgar_sqlite
+from src import compactar_parquet, expurgar_sqlite, metricas
 from src.database import get_connection, registrar_linhagem
+from src.rastreamento import coletar_etapas, resumo_etapas
 
 logger = logging.getLogger(__name__)
 
 JANELA_DIAS = 7
+FUSO_HORARIO = "America/Sao_Paulo"
+INICIO_PARTICOES = os.environ.get("SPTRANS_INICIO_PARTICOES", "2025-08-01")
+POOL_COMPACTACAO = "sptrans_compactacao"
+POOL_EXPURGO = "sptrans_expurgo"
 
+particoes_diarias = DailyPartitionsDefinition(start_date=INICIO_PARTICOES, timezone=FUSO_HORARIO)
 
-def _contagem_parquet(con: duckdb.DuckDBPyConnection, tabela: str) -> int:
-    """Retorna row_count total do Parquet para uma tabela."""
-    parquet_dir = os.path.join(compactar_parquet.PARQUET_DIR, tabela)
-    if not os.path.exists(parquet_dir):
-        return 0
-    try:
-        row = con.execute(f"SELECT count(*) FROM read_parquet('{parquet_dir}/**/*.parquet')").fetchone()
-        return row[0] if row else 0
-    except Exception:
-        return 0
 
+def _parquet_da_particao(tabela: str, dia: str) -> str:
+    """Diretório Silver da partição (dt=YYYY-MM-DD)."""
+    return os.path.join(compactar_parquet.PARQUET_DIR, tabela, f"dt={dia}")
 
-@asset(
-    group_name="processamento",
-    deps=["posicoes_sptrans"],
-    description=(
-        "Compacta dados de posições do SQLite para Parquet particionado por data "
-        "(camada analítica). Idempotente por partição."
-    ),
-)
-def compactar_posicoes() -> Output[int]:
-    """Exporta posições do dia anterior para Parquet."""
+
+def em_janela_quente(dia: str, hoje: date | None = None) -> bool:
+    """True se o dia ainda está dentro da janela operacional do SQLite (não pode ser expurgado)."""
+    hoje = hoje or datetime.now().date()
+    return datetime.strptime(dia, "%Y-%m-%d").date() >= hoje - timedelta(days=JANELA_DIAS)
+
+
+def _compactar(context: AssetExecutionContext, tabela: str) -> Output[int]:
+    """Exporta a partição (dia) do contexto para Parquet."""
+    data_alvo = context.partition_key
     if not os.path.exists(compactar_parquet.DB_PATH):
         logger.warning("Banco não encontrado. Pulando compactação.")
         return Output(0, metadata={"row_count": MetadataValue.int(0), "status": MetadataValue.text("skipped")})
 
-    data_alvo = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
     con = duckdb.connect()
     try:
-        total = compactar_parquet.exportar_tabela(con, "posicoes", filtro_data=data_alvo)
+        with coletar_etapas() as etapas:
+            total = compactar_parquet.exportar_tabela(con, tabela, filtro_data=data_alvo)
         if total:
-            registrar_linhagem("compactar_posicoes", "posicoes", "silver", total, "ok")
-        logger.info("compactar_posicoes: %s registros exportados para Parquet.", total)
+            registrar_linhagem(context.asset_key.path[-1], tabela, "silver", total, "ok")
+        logger.info("%s dt=%s: %s registros exportados para Parquet.", context.asset_key.path[-1], data_alvo, total)
     finally:
         con.close()
+    metricas.gravar_textfile(context.asset_key.path[-1])
 
     return Output(
         total or 0,
         metadata={
-            "table": MetadataValue.text("posicoes"),
+            "table": MetadataValue.text(tabela),
             "layer": MetadataValue.text("silver"),
             "row_count": MetadataValue.int(total or 0),
             "partition": MetadataValue.text(data_alvo),
+            "stage_timings": MetadataValue.json(resumo_etapas(etapas)),
+        },
+    )
+
+
+def _expurgar(context: AssetExecutionContext, tabela: str) -> Output[int]:
+    """Expurga do SQLite cada dia do intervalo de partições, respeitando a janela quente."""
+    if not os.path.exists(expurgar_sqlite.DB_PATH):
+        logger.warning("Banco não encontrado. Pulando expurgo.")
+        return Output(0, metadata={"row_count": MetadataValue.int(0), "status": MetadataValue.text("skipped")})
+
+    total = 0
+    expurgadas, ignoradas = [], []
+    with get_connection() as conn, coletar_etapas() as etapas:
+        for dia in context.partition_keys:
+            if em_janela_quente(dia):
+                ignoradas.append(dia)
+                continue
+            if not os.path.isdir(_parquet_da_particao(tabela, dia)):
+                # Sem Silver o dia não pode sair do Bronze (expurgo só ocorre após compactação)
+                if expurgar_sqlite.expurgar_dia(conn, tabela, dia, dry_run=True):
+                    logger.warning("%s dt=%s: partição Silver ausente. Expurgo ignorado.", tabela, dia)
+                    ignoradas.append(dia)
+                continue
+            total += expurgar_sqlite.expurgar_dia(conn, tabela, dia)
+            expurgadas.append(dia)
+
+    if total:
+        registrar_linhagem(context.asset_key.path[-1], tabela, "bronze", total, "ok")
+        logger.info("%s: %s registros removidos.", context.asset_key.path[-1], total)
+    metricas.gravar_textfile(context.asset_key.path[-1])
+
+    return Output(
+        total,
+        metadata={
+            "table": MetadataValue.text(tabela),
+            "action": MetadataValue.text("expurgo"),
+            "rows_removed": MetadataValue.int(total),
+            "partitions_purged": MetadataValue.int(len(expurgadas)),
+            "partitions_skipped": MetadataValue.text(", ".join(ignoradas) or "-"),
+            "stage_timings": MetadataValue.json(resumo_etapas(etapas)),
         },
     )
 
 
 @asset(
     group_name="processamento",
-    deps=["previsoes_sptrans"],
+    deps=["posicoes_sptrans"],
+    partitions_def=particoes_diarias,
+    backfill_policy=BackfillPolicy.multi_run(max_partitions_per_run=1),
+    pool=POOL_COMPACTACAO,
     description=(
-        "Compacta dados de previsões do SQLite para Parquet particionado por data "
+        "Compacta dados de posições do SQLite para Parquet particionado por data "
         "(camada analítica). Idempotente por partição."
     ),
 )
-def compactar_previsoes() -> Output[int]:
-    """Exporta previsões do dia anterior para Parquet."""
-    if not os.path.exists(compactar_parquet.DB_PATH):
-        logger.warning("Banco não encontrado. Pulando compactação.")
-        return Output(0, metadata={"row_count": MetadataValue.int(0), "status": MetadataValue.text("skipped")})
+def compactar_posicoes(context: AssetExecutionContext) -> Output[int]:
+    """Exporta as posições do dia da partição para Parquet."""
+    return _compactar(context, "posicoes")
 
-    data_alvo = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
-    con = duckdb.connect()
-    try:
-        total = compactar_parquet.exportar_tabela(con, "previsoes", filtro_data=data_alvo)
-        if total:
-            registrar_linhagem("compactar_previsoes", "previsoes", "silver", total, "ok")
-        logger.info("compactar_previsoes: %s registros exportados para Parquet.", total)
-    finally:
-        con.close()
 
-    return Output(
-        total or 0,
-        metadata={
-            "table": MetadataValue.text("previsoes"),
-            "layer": MetadataValue.text("silver"),
-            "row_count": MetadataValue.int(total or 0),
-            "partition": MetadataValue.text(data_alvo),
-        },
-    )
+@asset(
+    group_name="processamento",
+    deps=["previsoes_sptrans"],
+    partitions_def=particoes_diarias,
+    backfill_policy=BackfillPolicy.multi_run(max_partitions_per_run=1),
+    pool=POOL_COMPACTACAO,
+    description=(
+        "Compacta dados de previsões do SQLite para Parquet particionado por data "
+        "(camada analítica). Idempotente por partição."
+    ),
+)
+def compactar_previsoes(context: AssetExecutionContext) -> Output[int]:
+    """Exporta as previsões do dia da partição para Parquet."""
+    return _compactar(context, "previsoes")
 
 
 @asset(
     group_name="processamento",
     deps=["compactar_posicoes"],
+    partitions_def=particoes_diarias,
+    backfill_policy=BackfillPolicy.single_run(),
+    pool=POOL_EXPURGO,
     description=("Expurga posições com mais de N dias do SQLite (janela quente). O histórico permanece em Parquet."),
 )
-def expurgar_posicoes() -> Output[int]:
-    """Remove posições antigas do banco (janela quente)."""
-    if not os.path.exists(expurgar_sqlite.DB_PATH):
-        logger.warning("Banco não encontrado. Pulando expurgo.")
-        return Output(0, metadata={"row_count": MetadataValue.int(0), "status": MetadataValue.text("skipped")})
-
-    limite = datetime.now() - timedelta(days=JANELA_DIAS)
-    with get_connection() as conn:
-        total = expurgar_sqlite.expurgar(conn, "posicoes", limite, dry_run=False)
-        if total:
-            registrar_linhagem("expurgar_posicoes", "posicoes", "bronze", total, "ok")
-            logger.info("expurgar_posicoes: %s registros removidos.", total)
-
-    return Output(
-        total or 0,
-        metadata={
-            "table": MetadataValue.text("posicoes"),
-            "action": MetadataValue.text("expurgo"),
-            "rows_removed": MetadataValue.int(total or 0),
-        },
-    )
+def expurgar_posicoes(context: AssetExecutionContext) -> Output[int]:
+    """Remove do banco as posições dos dias da partição (fora da janela quente)."""
+    return _expurgar(context, "posicoes")
 
 
 @asset(
     group_name="processamento",
     deps=["compactar_previsoes"],
+    partitions_def=particoes_diarias,
+    backfill_policy=BackfillPolicy.single_run(),
+    pool=POOL_EXPURGO,
     description=("Expurga previsões com mais de N dias do SQLite (janela quente). O histórico permanece em Parquet."),
 )
-def expurgar_previsoes() -> Output[int]:
-    """Remove previsões antigas do banco (janela quente)."""
-    if not os.path.exists(expurgar_sqlite.DB_PATH):
-        logger.warning("Banco não encontrado. Pulando expurgo.")
-        return Output(0, metadata={"row_count": MetadataValue.int(0), "status": MetadataValue.text("skipped")})
-
-    limite = datetime.now() - timedelta(days=JANELA_DIAS)
-    with get_connection() as conn:
-        total = expurgar_sqlite.expurgar(conn, "previsoes", limite, dry_run=False)
-        if total:
-            registrar_linhagem("expurgar_previsoes", "previsoes", "bronze", total, "ok")
-            logger.info("expurgar_previsoes: %s registros removidos.", total)
-
-    return Output(
-        total or 0,
-        metadata={
-            "table": MetadataValue.text("previsoes"),
-            "action": MetadataValue.text("expurgo"),
-            "rows_removed": MetadataValue.int(total or 0),
-        },
-    )
+def expurgar_previsoes(context: AssetExecutionContext) -> Output[int]:
+    """Remove do banco as previsões dos dias da partição (fora da janela quente)."""
+    return _expurgar(context, "previsoes")
@@ -0,0 +1,417 @@
+"""
+Casos de benchmark: ingestão, compactação, expurgo, análise e kernels do dashboard.
+
+Cada caso recebe o `Ambiente` da rodada e devolve `Preparado(executar, linhas)`: a
+preparação (cópia do banco, leitura do payload, conexões) fica fora da medição e só
+`executar()` é cronometrado. Um caso que não se aplica ao ambiente (PostgreSQL sem
+`--postgres`, dashboard sem streamlit) levanta `CasoPulado`.
+
+Os casos rodam com DATABASE_URL removida (SQLite); os de PostgreSQL a definem só
+durante a própria execução.
+"""
+
+import json
+import os
+import shutil
+import sqlite3
+from collections.abc import Callable
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from benchmarks.gerador import COLUNAS_POSICOES, criar_banco, letreiros_alvo, registros
+
+CASOS = {}
+
+# SQLite aceita até 32766 parâmetros por comando; 500 linhas × 6 colunas fica bem abaixo
+LINHAS_POR_INSERT_MULTIPLO = 500
+
+
+class CasoPulado(Exception):
+    """O caso não se aplica a este ambiente (dependência ou banco ausente)."""
+
+
+@dataclass
+class Preparado:
+    executar: Callable[[], object]
+    linhas: int = 0
+
+
+@dataclass
+class Ambiente:
+    dados: object  # benchmarks.gerador.Dados
+    diretorio: str
+    postgres_url: str | None = None
+
+    def caminho(self, nome):
+        return os.path.join(self.diretorio, nome)
+
+
+def caso(nome):
+    """Registra a função de preparação de um caso em CASOS."""
+
+    def registrar(func):
+        CASOS[nome] = func
+        return func
+
+    return registrar
+
+
+@contextmanager
+def apontar(modulo, **atributos):
+    """Troca temporariamente constantes de módulo (caminhos de dados) e restaura ao sair."""
+    antigos = {nome: getattr(modulo, nome) for nome in atributos}
+    for nome, valor in atributos.items():
+        setattr(modulo, nome, valor)
+    try:
+        yield
+    finally:
+        for nome, valor in antigos.items():
+            setattr(modulo, nome, valor)
+
+
+@contextmanager
+def variavel_ambiente(nome, valor):
+    """Define (ou remove, com None) uma variável de ambiente durante o bloco."""
+    antigo = os.environ.pop(nome, None)
+    if valor is not None:
+        os.environ[nome] = valor
+    try:
+        yield
+    finally:
+        os.environ.pop(nome, None)
+        if antigo is not None:
+            os.environ[nome] = antigo
+
+
+def _lotes_por_coleta(df):
+    """Registros agrupados por coleta, como o coletor os grava (um INSERT em lote por ciclo)."""
+    return [registros(grupo) for _, grupo in df.groupby("timestamp_coleta", sort=True)]
+
+
+# --- Coletor ---
+
+
+@caso("coleta.parse_filtro")
+def parse_filtro(amb):
+    from src.coleta_sptrans import filtrar_posicoes
+
+    corpo = amb.dados.payload
+    alvo = letreiros_alvo(amb.dados.cenario)
+    n_veiculos = amb.dados.cenario.veiculos_api
+
+    def executar():
+        dados = json.loads(corpo)
+        return filtrar_posicoes(dados, alvo, datetime.now())
+
+    return Preparado(executar, n_veiculos)
+
+
+# --- Escrita no Bronze: executemany (caminho atual) × INSERT de várias linhas ---
+
+
+def inserir_lote_multiplo(conn, tabela, columns, registros_lote, marcador="?"):
+    """INSERT OR IGNORE com várias tuplas VALUES por comando (alternativa ao executemany)."""
+    from src.database import ajustar_contagem
+
+    tupla = "(" + ", ".join([marcador] * len(columns)) + ")"
+    cursor = conn.cursor()
+    inseridos = 0
+    for i in range(0, len(registros_lote), LINHAS_POR_INSERT_MULTIPLO):
+        bloco = registros_lote[i : i + LINHAS_POR_INSERT_MULTIPLO]
+        valores = ", ".join([tupla] * len(bloco))
+        parametros = [v for registro in bloco for v in registro]
+        cursor.execute(f"INSERT OR IGNORE INTO {tabela} ({', '.join(columns)}) VALUES {valores}", parametros)
+        inseridos += max(cursor.rowcount, 0)
+    if inseridos:
+        ajustar_contagem(conn, tabela, inseridos)
+    return inseridos
+
+
+def _insercao_sqlite(amb, inserir, compacto=False):
+    lotes = _lotes_por_coleta(amb.dados.posicoes)
+    caminho = amb.caminho("insercao.db")
+    if os.path.exists(caminho):
+        os.remove(caminho)
+    criar_banco(caminho, compacto=compacto)
+    conn = sqlite3.connect(caminho)
+
+    def executar():
+        try:
+            for lote in lotes:
+                inserir(conn, "posicoes", COLUNAS_POSICOES, lote)
+                conn.commit()
+        finally:
+            conn.close()
+
+    return Preparado(executar, sum(map(len, lotes)))
+
+
+@caso("insercao.sqlite.executemany")
+def insercao_sqlite_executemany(amb):
+    from src.database import inserir_lote
+
+    return _insercao_sqlite(amb, inserir_lote)
+
+
+@caso("insercao.sqlite.multiplo")
+def insercao_sqlite_multiplo(amb):
+    return _insercao_sqlite(amb, inserir_lote_multiplo)
+
+
+@caso("insercao.sqlite.compacto")
+def insercao_sqlite_compacto(amb):
+    """`inserir_lote` no schema compacto de posições (codificação + tabela WITHOUT ROWID)."""
+    from src.database import inserir_lote
+
+    return _insercao_sqlite(amb, inserir_lote, compacto=True)
+
+
+def _conexao_postgres_temporaria(url):
+    """Conexão PostgreSQL com `posicoes`/`contagem_tabelas` como tabelas TEMP (sombreiam as reais).
+
+    Nada é confirmado: as tabelas temporárias somem ao fechar a conexão e o banco real não é tocado.
+    """
+    from src.database import _schema_postgres
+
+    if not url:
+        raise CasoPulado("sem --postgres (URL do PostgreSQL).")
+    try:
+        import psycopg2
+    except ImportError as e:
+        raise CasoPulado("psycopg2 não instalado.") from e
+
+    conn = psycopg2.connect(url)
+    tabelas, indices = _schema_postgres()
+    cursor = conn.cursor()
+    for sql in tabelas:
+        if "posicoes (" in sql or "contagem_tabelas (" in sql:
+            cursor.execute(sql.replace("CREATE TABLE IF NOT EXISTS", "CREATE TEMP TABLE"))
+    cursor.execute(next(sql for sql in indices if "idx_posicoes_dedup" in sql))
+    return conn
+
+
+def _insercao_postgres(amb, inserir):
+    conn = _conexao_postgres_temporaria(amb.postgres_url)
+    lotes = _lotes_por_coleta(amb.dados.posicoes)
+
+    def executar():
+        try:
+            # inserir_lote/ajustar_contagem escolhem o dialeto (placeholders %s) por DATABASE_URL
+            with variavel_ambiente("DATABASE_URL", amb.postgres_url):
+                for lote in lotes:
+                    inserir(conn, "posicoes", COLUNAS_POSICOES, lote)
+        finally:
+            conn.rollback()
+            conn.close()
+
+    return Preparado(executar, sum(map(len, lotes)))
+
+
+def _execute_values(conn, tabela, columns, registros_lote):
+    """INSERT ... VALUES %s ON CONFLICT DO NOTHING via psycopg2.extras.execute_values."""
+    from psycopg2.extras import execute_values
+
+    from src.database import ajustar_contagem
+
+    # RETURNING: o rowcount de execute_values só cobre a última página
+    inseridos = len(
+        execute_values(
+            conn.cursor(),
+            f"INSERT INTO {tabela} ({', '.join(columns)}) VALUES %s ON CONFLICT DO NOTHING RETURNING 1",
+            registros_lote,
+            page_size=LINHAS_POR_INSERT_MULTIPLO,
+            fetch=True,
+        )
+    )
+    if inseridos:
+        ajustar_contagem(conn, tabela, inseridos)
+    return inseridos
+
+
+@caso("insercao.postgres.executemany")
+def insercao_postgres_executemany(amb):
+    from src.database import inserir_lote
+
+    return _insercao_postgres(amb, inserir_lote)
+
+
+@caso("insercao.postgres.execute_values")
+def insercao_postgres_execute_values(amb):
+    return _insercao_postgres(amb, _execute_values)
+
+
+# --- Compactação e expurgo ---
+
+
+@caso("compactacao.exportar_tabela")
+def compactacao_exportar_tabela(amb):
+    import duckdb
+
+    import src.compactar_parquet as cp
+
+    banco = amb.dados.banco
+    destino = amb.caminho("parquet")
+    shutil.rmtree(destino, ignore_errors=True)
+    con = duckdb.connect()
+
+    def executar():
+        try:
+            with apontar(cp, DB_PATH=banco, PARQUET_DIR=destino):
+                return cp.exportar_tabela(con, "posicoes")
+        finally:
+            con.close()
+
+    return Preparado(executar, len(amb.dados.posicoes))
+
+
+@caso("expurgo.expurgar")
+def expurgo_expurgar(amb):
+    from src.expurgar_sqlite import expurgar
+
+    cenario = amb.dados.cenario
+    copia = amb.caminho("expurgo.db")
+    shutil.copyfile(amb.dados.banco, copia)
+    # Remove a primeira metade dos dias (pelo menos um), como o expurgo diário da janela quente
+    limite = datetime.strptime(cenario.inicio, "%Y-%m-%d") + timedelta(days=max(1, cenario.dias // 2))
+    posicoes = amb.dados.posicoes
+    linhas = int((posicoes["timestamp_coleta"] < limite.isoformat()).sum())
+    conn = sqlite3.connect(copia)
+
+    def executar():
+        try:
+            return expurgar(conn, "posicoes", limite)
+        finally:
+            conn.close()
+
+    return Preparado(executar, linhas)
+
+
+# --- Análise ---
+
+
+@caso("analise_onibus.lotes_sqlite")
+def analise_lotes_sqlite(amb):
+    """Leitura em lotes + as-of join + montagem do resultado (o `main` do modo sqlite, sem publicar)."""
+    import src.analise_onibus as ao
+    from src.catalogo_linhas import carregar_catalogo
+
+    banco, catalogo_csv = amb.dados.banco, amb.dados.catalogo
+    carregar_catalogo(catalogo_csv)  # o cache do catálogo não entra na medição
+
+    def executar():
+        total = 0
+        with apontar(ao, DB_PATH=banco):
+            catalogo = carregar_catalogo(catalogo_csv)
+            agora = datetime.now()
+            for posicoes_df, previsoes_df in ao._iterar_lotes_sqlite():
+                total += len(ao._montar_resultado(ao.juntar_asof(posicoes_df, previsoes_df, catalogo), agora))
+        return total
+
+    return Preparado(executar, len(amb.dados.posicoes))
+
+
+@caso("viagens.segmentar")
+def viagens_segmentar(amb):
+    """Preparação dos pontos + inferência de terminais + segmentação de um dia inteiro de posições."""
+    from src import viagens
+
+    posicoes = amb.dados.posicoes
+
+    def executar():
+        pontos = viagens.preparar_pontos(posicoes)
+        return len(viagens.segmentar(pontos))
+
+    return Preparado(executar, len(posicoes))
+
+
+@caso("headways.calcular")
+def headways_calcular(amb):
+    """Passagens por parada (previsões) + headways + métricas de regularidade de um dia."""
+    from src import headways
+
+    previsoes = amb.dados.previsoes
+
+    def executar():
+        hw = headways.calcular_headways(headways.passagens_paradas(previsoes))
+        return len(headways.regularidade(hw))
+
+    return Preparado(executar, len(previsoes))
+
+
+@caso("precisao_previsoes.avaliar")
+def precisao_previsoes_avaliar(amb):
+    """Visitas + chegada observada pela maior aproximação + avaliação e resumo de um dia de previsões."""
+    from src import precisao_previsoes as pp
+    from src.headways import visitas_previsoes
+
+    posicoes, previsoes, paradas = amb.dados.posicoes, amb.dados.previsoes, amb.dados.paradas
+
+    def executar():
+        visitas = visitas_previsoes(previsoes)
+        chegadas = pp.inferir_chegadas(visitas, pp.trajetos(posicoes), paradas)
+        return len(pp.resumir(pp.avaliar(visitas, chegadas)))
+
+    return Preparado(executar, len(previsoes))
+
+
+@caso("catalogo_paradas.encaixar")
+def catalogo_paradas_encaixar(amb):
+    """Parada mais próxima (a até 50 m) de cada posição, pelo índice em grade (construído a cada repetição)."""
+    from src.catalogo_paradas import CatalogoParadas
+
+    posicoes, paradas = amb.dados.posicoes, amb.dados.paradas
+    latitude, longitude = posicoes["latitude"].to_numpy(), posicoes["longitude"].to_numpy()
+
+    def executar():
+        return int(CatalogoParadas(paradas).encaixar(latitude, longitude, raio_m=50)["id_parada"].notna().sum())
+
+    return Preparado(executar, len(posicoes))
+
+
+@caso("encaixe_rotas.encaixar")
+def encaixe_rotas_encaixar(amb):
+    """Posições projetadas nos shapes das linhas (referência linear, escolha do sentido e velocidade)."""
+    from src.encaixe_rotas import RedeRotas, encaixar_posicoes
+
+    posicoes, rede = amb.dados.posicoes, RedeRotas(amb.dados.rotas)
+    return Preparado(lambda: int(encaixar_posicoes(posicoes, rede)["shape_id"].notna().sum()), len(posicoes))
+
+
+@caso("mapa_velocidades.agregar")
+def mapa_velocidades_agregar(amb):
+    """Velocidade entre posições consecutivas + agregação por célula geohash e janela de 15 min."""
+    from src.mapa_velocidades import agregar_celulas, velocidades_instantaneas
+    from src.viagens import preparar_pontos
+
+    posicoes = amb.dados.posicoes
+    # Coletas do cenário mais espaçadas que LACUNA_MAX_MIN: a lacuna acompanha o intervalo
+    lacuna = max(amb.dados.cenario.intervalo_posicoes_min, 10)
+
+    def executar():
+        return len(agregar_celulas(velocidades_instantaneas(preparar_pontos(posicoes), lacuna)))
+
+    return Preparado(executar, len(posicoes))
+
+
+def _kernel_dashboard(nome):
+    try:
+        import src.dashboard_sptrans as dashboard
+    except ImportError as e:
+        raise CasoPulado(f"dashboard indisponível: {e}") from e
+    # Sem o cache do streamlit: cada repetição executa o kernel de fato
+    return getattr(dashboard, nome).__wrapped__
+
+
+@caso("dashboard.analyze_stuck_buses")
+def dashboard_stuck(amb):
+    kernel = _kernel_dashboard("analyze_stuck_buses")
+    df = amb.dados.resultados
+    return Preparado(lambda: kernel(df), len(df))
+
+
+@caso("dashboard.analyze_bunched_buses")
+def dashboard_bunched(amb):
+    kernel = _kernel_dashboard("analyze_bunched_buses")
+    df = amb.dados.resultados
+    return Preparado(lambda: kernel(df), len(df))
@@ -0,0 +1,311 @@
+"""
+Gerador de dados sintéticos para os benchmarks: N dias × M ônibus, reproduzível.
+
+Os ônibus andam pelas rotas do simulador da API (`src.simulador_olhovivo.Frota`),
+então posições consecutivas são coerentes (há deslocamento, ônibus próximos na mesma
+linha, paradas à frente) e as análises encontram o que analisar. Mesma semente e mesmos
+parâmetros → exatamente os mesmos dados, em qualquer máquina.
+
+Cada cenário produz:
+- `posicoes`: um ciclo a cada `intervalo_posicoes_min`, das 05h às 23h (horário do coletor);
+- `previsoes`: próxima parada e horário previsto de cada ônibus a cada `intervalo_previsoes_min`;
+- `resultados`: posições no schema de `resultados_analise` (entrada do dashboard);
+- o catálogo de linhas (CSV) correspondente às linhas sintéticas;
+- um payload de /Posicao em escala de cidade (`veiculos_api`) para o parse/filtro do coletor.
+"""
+
+import json
+import os
+import sqlite3
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from src.simulador_olhovivo import PONTOS_POR_ROTA, Frota
+
+HORA_INICIO = 5
+HORA_FIM = 23
+
+COLUNAS_POSICOES = ["timestamp_coleta", "id_onibus", "letreiro_linha", "latitude", "longitude", "timestamp_posicao"]
+COLUNAS_PREVISOES = ["timestamp_coleta", "id_linha", "id_onibus", "id_parada", "horario_previsao"]
+
+
+@dataclass(frozen=True)
+class Cenario:
+    """Parâmetros de um conjunto de dados sintético."""
+
+    nome: str
+    dias: int
+    onibus: int
+    linhas: int
+    intervalo_posicoes_min: int = 30
+    intervalo_previsoes_min: int = 5
+    veiculos_api: int = 15_000  # tamanho da frota no payload de /Posicao
+    fracao_linhas_alvo: float = 0.05  # linhas mantidas pelo filtro do coletor
+    seed: int = 42
+    inicio: str = "2025-08-11"
+
+    def como_dict(self):
+        return asdict(self)
+
+
+CENARIOS = {
+    "minimo": Cenario("minimo", dias=1, onibus=40, linhas=8, veiculos_api=500),
+    "pequeno": Cenario("pequeno", dias=1, onibus=500, linhas=100),
+    "medio": Cenario("medio", dias=3, onibus=2_000, linhas=400),
+    "grande": Cenario("grande", dias=7, onibus=5_000, linhas=1_000),
+}
+
+
+def instantes(cenario, intervalo_min):
+    """Instantes de coleta (datetime) de todos os dias do cenário, das HORA_INICIO às HORA_FIM."""
+    primeiro = datetime.strptime(cenario.inicio, "%Y-%m-%d")
+    passo = timedelta(minutes=intervalo_min)
+    saida = []
+    for d in range(cenario.dias):
+        t = primeiro + timedelta(days=d, hours=HORA_INICIO)
+        fim = primeiro + timedelta(days=d, hours=HORA_FIM)
+        while t <= fim:
+            saida.append(t)
+            t += passo
+    return saida
+
+
+def _segundos(cenario, instante):
+    """Relógio da frota: segundos desde a meia-noite do primeiro dia (independe do fuso da máquina)."""
+    return (instante - datetime.strptime(cenario.inicio, "%Y-%m-%d")).total_seconds()
+
+
+def frota(cenario):
+    """Frota armazenada (os M ônibus do cenário)."""
+    return Frota(n_veiculos=cenario.onibus, n_linhas=cenario.linhas, seed=cenario.seed, inicio=0.0)
+
+
+def gerar_posicoes(cenario, f=None):
+    """DataFrame no schema de `posicoes` (sem `id`), em ordem de coleta."""
+    f = f or frota(cenario)
+    letreiros = f.letreiro[f.servico].astype(str)
+    partes = []
+    for instante in instantes(cenario, cenario.intervalo_posicoes_min):
+        lat, lon = f.posicoes(_segundos(cenario, instante))
+        ts = instante.strftime("%Y-%m-%d %H:%M:%S")
+        # Como o campo "ta" da API: ISO em UTC (São Paulo é UTC-3, sem horário de verão)
+        ta = (instante + timedelta(hours=3)).strftime("%Y-%m-%dT%H:%M:%SZ")
+        partes.append(
+            pd.DataFrame(
+                {
+                    "timestamp_coleta": ts,
+                    "id_onibus": f.prefixo,
+                    "letreiro_linha": letreiros,
+                    "latitude": lat.round(6),
+                    "longitude": lon.round(6),
+                    "timestamp_posicao": ta,
+                }
+            )
+        )
+    return pd.concat(partes, ignore_index=True)
+
+
+def gerar_previsoes(cenario, f=None):
+    """DataFrame no schema de `previsoes` (sem `id`): a próxima parada de cada ônibus a cada coleta."""
+    f = f or frota(cenario)
+    id_linha = f.cl[f.servico]
+    partes = []
+    for instante in instantes(cenario, cenario.intervalo_previsoes_min):
+        agora = _segundos(cenario, instante)
+        progresso = f.progresso(agora)
+        k = np.minimum(np.ceil(progresso * (PONTOS_POR_ROTA - 1)).astype(np.int64), PONTOS_POR_ROTA - 1)
+        eta_s = (k / (PONTOS_POR_ROTA - 1) - progresso) / f.velocidade
+        chegada = pd.Timestamp(instante) + pd.to_timedelta(eta_s, unit="s")
+        partes.append(
+            pd.DataFrame(
+                {
+                    "timestamp_coleta": instante.strftime("%Y-%m-%d %H:%M:%S"),
+                    "id_linha": id_linha,
+                    "id_onibus": f.prefixo,
+                    "id_parada": f.paradas[f.servico, k],
+                    "horario_previsao": chegada.strftime("%H:%M"),
+                }
+            )
+        )
+    return pd.concat(partes, ignore_index=True)
+
+
+def gerar_paradas(cenario, f=None):
+    """DataFrame id_parada, latitude, longitude das paradas da frota (o que a tabela `paradas` guardaria)."""
+    f = f or frota(cenario)
+    paradas = pd.DataFrame(
+        {
+            "id_parada": f.paradas.ravel(),
+            "latitude": f.pontos[..., 0].ravel(),
+            "longitude": f.pontos[..., 1].ravel(),
+        }
+    )
+    return paradas.drop_duplicates("id_parada").sort_values("id_parada", ignore_index=True)
+
+
+def gerar_rotas(cenario, f=None):
+    """Vértices das rotas da frota no formato de `encaixe_rotas.ler_rotas_gtfs` (um shape por serviço)."""
+    f = f or frota(cenario)
+    n_servicos, k = f.pontos.shape[:2]
+    letreiros = np.repeat(f.letreiro.astype(str), k)
+    sentidos = np.repeat(f.sentido, k)
+    rotas = pd.DataFrame(
+        {
+            "letreiro_linha": letreiros,
+            "sentido": sentidos.astype("int8"),
+            "shape_id": np.char.add(np.char.add(letreiros, "-"), sentidos.astype(str)),
+            "latitude": f.pontos[..., 0].ravel(),
+            "longitude": f.pontos[..., 1].ravel(),
+        }
+    )
+    return rotas.sort_values(["letreiro_linha", "shape_id"], kind="stable", ignore_index=True)
+
+
+def gerar_resultados(posicoes):
+    """Posições no schema de `resultados_analise` (entrada de analyze_stuck_buses/analyze_bunched_buses).
+
+    `timestamp_analise` recebe o instante da coleta, para que cada ciclo forme um grupo.
+    """
+    return pd.DataFrame(
+        {
+            "timestamp_analise": pd.to_datetime(posicoes["timestamp_coleta"]),
+            "id_onibus": posicoes["id_onibus"],
+            "letreiro_linha": posicoes["letreiro_linha"],
+            "posicao_atual_lat": posicoes["latitude"],
+            "posicao_atual_lon": posicoes["longitude"],
+            "horario_posicao": posicoes["timestamp_posicao"],
+            "proximo_ponto_previsto": None,
+            "horario_previsto_chegada": None,
+        }
+    )
+
+
+def registros(df):
+    """Linhas do DataFrame como tuplas (o formato que os coletores passam a `inserir_lote`)."""
+    return list(df.itertuples(index=False, name=None))
+
+
+def escrever_catalogo(cenario, caminho, f=None):
+    """Grava o catálogo de linhas sintéticas no formato de data/todas_as_linhas.csv."""
+    f = f or frota(cenario)
+    numerico, tipo = np.char.partition(f.letreiro.astype(str), "-")[:, [0, 2]].T
+    pd.DataFrame(
+        {
+            "id_linha": f.cl,
+            "letreiro_numerico": numerico,
+            "tipo_letreiro": tipo,
+            "sentido": f.sentido,
+            "sentido_ida": f.lt0,
+            "sentido_volta": f.lt1,
+        }
+    ).to_csv(caminho, index=False)
+    return caminho
+
+
+def criar_banco(caminho, posicoes=None, previsoes=None, compacto=False):
+    """Cria um SQLite com o schema do projeto e (opcionalmente) carrega posições e previsões.
+
+    `compacto`: posições no schema compacto (carregadas no schema clássico e migradas).
+    """
+    from src.database import _schema_sqlite
+
+    tabelas, indices = _schema_sqlite(compacto=False)
+    conn = sqlite3.connect(caminho)
+    try:
+        for sql in [*tabelas, *indices]:
+            conn.execute(sql)
+        for tabela, df, colunas in (
+            ("posicoes", posicoes, COLUNAS_POSICOES),
+            ("previsoes", previsoes, COLUNAS_PREVISOES),
+        ):
+            if df is None:
+                continue
+            marcadores = ", ".join("?" * len(colunas))
+            conn.executemany(
+                f"INSERT INTO {tabela} ({', '.join(colunas)}) VALUES ({marcadores})", registros(df[colunas])
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO contagem_tabelas (tabela, total, atualizado_em) VALUES (?, ?, ?)",
+                (tabela, len(df), datetime.now().isoformat()),
+            )
+        conn.commit()
+    finally:
+        conn.close()
+    if compacto:
+        from src.migrar_compacto import migrar
+
+        conn = sqlite3.connect(caminho, isolation_level=None)
+        try:
+            migrar(conn)
+        finally:
+            conn.close()
+    return caminho
+
+
+def payload_posicao(cenario):
+    """Corpo (bytes) de uma resposta de /Posicao com `veiculos_api` veículos, ao meio-dia do primeiro dia."""
+    f = Frota(n_veiculos=cenario.veiculos_api, n_linhas=max(cenario.linhas, 1), seed=cenario.seed, inicio=0.0)
+    meio_dia = datetime.strptime(cenario.inicio, "%Y-%m-%d") + timedelta(hours=12)
+    return json.dumps(f.payload_posicao(_segundos(cenario, meio_dia))).encode("utf-8")
+
+
+def letreiros_alvo(cenario):
+    """Letreiros mantidos pelo filtro do coletor: os primeiros `fracao_linhas_alvo` das linhas."""
+    n = max(1, round(cenario.linhas * cenario.fracao_linhas_alvo))
+    return {f"{1000 + i}-10" for i in range(n)}
+
+
+class Dados:
+    """Dados de um cenário, gerados sob demanda e reaproveitados entre os casos de uma rodada."""
+
+    def __init__(self, cenario, diretorio):
+        self.cenario = cenario
+        self.diretorio = diretorio
+        self._cache = {}
+
+    def _obter(self, chave, gerar):
+        if chave not in self._cache:
+            self._cache[chave] = gerar()
+        return self._cache[chave]
+
+    @property
+    def frota(self):
+        return self._obter("frota", lambda: frota(self.cenario))
+
+    @property
+    def posicoes(self):
+        return self._obter("posicoes", lambda: gerar_posicoes(self.cenario, self.frota))
+
+    @property
+    def previsoes(self):
+        return self._obter("previsoes", lambda: gerar_previsoes(self.cenario, self.frota))
+
+    @property
+    def paradas(self):
+        return self._obter("paradas", lambda: gerar_paradas(self.cenario, self.frota))
+
+    @property
+    def rotas(self):
+        return self._obter("rotas", lambda: gerar_rotas(self.cenario, self.frota))
+
+    @property
+    def resultados(self):
+        return self._obter("resultados", lambda: gerar_resultados(self.posicoes))
+
+    @property
+    def payload(self):
+        return self._obter("payload", lambda: payload_posicao(self.cenario))
+
+    @property
+    def catalogo(self):
+        caminho = os.path.join(self.diretorio, "todas_as_linhas.csv")
+        return self._obter("catalogo", lambda: escrever_catalogo(self.cenario, caminho, self.frota))
+
+    @property
+    def banco(self):
+        """SQLite de referência, com todos os dados do cenário (os casos que alteram o banco trabalham numa cópia)."""
+        caminho = os.path.join(self.diretorio, "base.db")
+        return self._obter("banco", lambda: criar_banco(caminho, self.posicoes, self.previsoes))
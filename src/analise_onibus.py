@@ -4,45 +4,240 @@ Análise de frota SPTrans: cruza posições com previsões e salva resultados.
 Modo analítico (Parquet via DuckDB):
     python src/analise_onibus.py --mode parquet
 
-Modo legado (SQLite direto):
+Modo legado (SQLite direto, em lotes com orçamento de memória):
     python src/analise_onibus.py --mode sqlite  (ou omite --mode)
+    python src/analise_onibus.py --mode sqlite --memoria-mb 128
 
 No modo parquet, os dados históricos são lidos de data/parquet/ via DuckDB,
 com fallback para SQLite se o Parquet não existir.
+
+Cada posição é pareada (as-of join) com a previsão mais recente do mesmo
+ônibus e da mesma linha coletada até o seu `timestamp_coleta` — no máximo
+TOLERANCIA_ASOF_MIN minutos antes. No modo parquet o processamento é feito
+por partição diária (dt=YYYY-MM-DD), mantendo a memória limitada a um dia;
+no modo sqlite, em lotes de coletas consecutivas que cabem em `--memoria-mb`,
+o que permite analisar bancos maiores que a RAM.
+
+Incremental: cada execução processa apenas as posições com `timestamp_coleta`
+posterior à marca d'água (`analise_watermark`). Os resultados são publicados
+de forma atômica e somente por acréscimo:
+  - Parquet em data/parquet/resultados_analise/dt=YYYY-MM-DD/, um arquivo por
+    lote, gravado em arquivo temporário e renomeado (os.replace);
+    resultados_analise é um link simbólico para a versão publicada
+    (resultados_analise.v<instante>/);
+  - SQLite `resultados_analise`, na mesma transação que avança a marca d'água.
+Leitores nunca observam um resultado pela metade. Para reprocessar tudo, use
+`--reprocessar` (reconstrói a partir do início): os resultados novos são montados
+ao lado — tabela `resultados_analise_reconstrucao` e uma versão nova do Parquet —
+e só substituem os publicados quando a reconstrução termina (DROP + RENAME numa
+transação, depois o link trocado com os.replace); até lá os leitores continuam
+vendo os anteriores. Se a reconstrução falhar, a próxima execução a retoma da
+marca d'água na mesma tabela e na mesma versão.
 """
 
 import argparse
 import logging
 import os
 
-logging.basicConfig(
-    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
-)
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
 DB_PATH = os.path.join("data", "sptrans_data.db")
 PARQUET_DIR = os.path.join("data", "parquet")
 
+# Previsões mais antigas que isso (em relação à posição) não são pareadas
+TOLERANCIA_ASOF_MIN = 30
+
+# Orçamento de memória do modo SQLite em lotes; cada posição custa ~BYTES_POR_POSICAO
+# já contando o DataFrame, as previsões da janela e o resultado do as-of join
+MEMORIA_MB_PADRAO = 256
+BYTES_POR_POSICAO = 1024
+
+WATERMARK_NOME = "resultados_analise"
+# Onde `--reprocessar` monta os resultados no SQLite antes de trocá-los pelos publicados
+TABELA_RECONSTRUCAO = "resultados_analise_reconstrucao"
+# Versões do Parquet de resultados (data/parquet/resultados_analise.v<instante>/)
+PREFIXO_VERSAO = "resultados_analise.v"
+
+SQL_CREATE_WATERMARK = """
+    CREATE TABLE IF NOT EXISTS analise_watermark (
+        nome TEXT PRIMARY KEY,
+        ultimo_timestamp_coleta TEXT NOT NULL,
+        atualizado_em DATETIME NOT NULL
+    )
+"""
+
+COLUNAS_RESULTADO = [
+    "timestamp_analise",
+    "id_onibus",
+    "letreiro_linha",
+    "posicao_atual_lat",
+    "posicao_atual_lon",
+    "horario_posicao",
+    "proximo_ponto_previsto",
+    "horario_previsto_chegada",
+]
+
+
+def _previsao_por_coleta(previsoes_df):
+    """Reduz as previsões a uma linha por (coleta, linha, ônibus): a próxima parada prevista."""
+    return previsoes_df.sort_values("horario_previsao").drop_duplicates(
+        subset=["timestamp_coleta", "id_linha", "id_onibus"], keep="first"
+    )
+
+
+def juntar_asof(posicoes_df, previsoes_df, catalogo=None, tolerancia_min=TOLERANCIA_ASOF_MIN):
+    """Pareia cada posição com a última previsão do mesmo ônibus/linha até o seu timestamp_coleta.
+
+    Args:
+        posicoes_df: Posições (schema da tabela posicoes).
+        previsoes_df: Previsões (schema da tabela previsoes).
+        catalogo: CatalogoLinhas para mapear id_linha → letreiro; sem ele o
+            pareamento usa apenas id_onibus.
+        tolerancia_min: Idade máxima (minutos) da previsão em relação à posição.
+
+    Returns:
+        DataFrame com as colunas de posição + id_parada e horario_previsao
+        (nulos quando não há previsão dentro da tolerância).
+    """
+    import pandas as pd
+
+    posicoes = posicoes_df.copy()
+    posicoes["timestamp_coleta"] = pd.to_datetime(posicoes["timestamp_coleta"], format="ISO8601")
+    if previsoes_df is None or previsoes_df.empty:
+        posicoes["id_parada"] = None
+        posicoes["horario_previsao"] = None
+        return posicoes
+
+    previsoes = _previsao_por_coleta(previsoes_df)
+    previsoes = previsoes.assign(timestamp_coleta=pd.to_datetime(previsoes["timestamp_coleta"], format="ISO8601"))
+    chaves = ["id_onibus"]
+    if catalogo is not None and "letreiro_linha" in posicoes.columns:
+        letreiros = pd.Series(catalogo.letreiro_por_id(previsoes["id_linha"]), index=previsoes.index, dtype=object)
+        previsoes = previsoes.assign(letreiro_linha=letreiros).dropna(subset=["letreiro_linha"])
+        chaves.append("letreiro_linha")
+        posicoes["letreiro_linha"] = posicoes["letreiro_linha"].astype(object)
+
+    previsoes = previsoes[["timestamp_coleta", *chaves, "id_parada", "horario_previsao"]]
+    posicoes["id_onibus"] = posicoes["id_onibus"].astype("int64")
+    previsoes = previsoes.assign(id_onibus=previsoes["id_onibus"].astype("int64"))
+
+    return pd.merge_asof(
+        posicoes.sort_values("timestamp_coleta"),
+        previsoes.sort_values("timestamp_coleta"),
+        on="timestamp_coleta",
+        by=chaves,
+        direction="backward",
+        tolerance=pd.Timedelta(minutes=tolerancia_min),
+    )
+
+
+def _linhas_por_lote(memoria_mb):
+    """Converte o orçamento de memória (MB) em número máximo de posições por lote."""
+    return max(1, int(memoria_mb * 1024 * 1024 / BYTES_POR_POSICAO))
+
+
+def _planejar_lotes_sqlite(conn, desde, max_linhas):
+    """Agrupa coletas consecutivas em lotes de até `max_linhas` posições.
+
+    Lê apenas (timestamp_coleta, count) — uma linha por coleta, resolvida pelo
+    índice idx_posicoes_dedup (ou pela chave de `posicoes_compactas`) sem tocar nas linhas. Um lote nunca divide uma
+    coleta, de modo que a marca d'água continua sendo um único timestamp.
+
+    Returns:
+        Lista de (inicio_exclusivo, fim_inclusivo, n_posicoes).
+    """
+    from src.database import fonte_coleta
+
+    fonte = fonte_coleta(conn, "posicoes")
+    coluna = fonte.coluna
+    where, params = (f"WHERE {coluna} > ?", (fonte.parametro(desde),)) if desde is not None else ("", ())
+    coletas = conn.execute(
+        f"SELECT {coluna}, count(*) FROM {fonte.tabela} {where} GROUP BY {coluna} ORDER BY {coluna}",
+        params,
+    )
+    lotes = []
+    inicio, fim, n = desde, None, 0
+    for ts, qtd in coletas:
+        ts = fonte.valor(ts)
+        if n and n + qtd > max_linhas:
+            lotes.append((inicio, fim, n))
+            inicio, n = fim, 0
+        fim, n = ts, n + qtd
+    if n:
+        lotes.append((inicio, fim, n))
+    return lotes
+
+
+def _iterar_lotes_sqlite(desde=None, memoria_mb=MEMORIA_MB_PADRAO):
+    """Gera lotes (posições, previsões) do SQLite em ordem de timestamp_coleta, fora da memória.
 
-def _load_via_sqlite():
-    """Carrega dados via SQLite direto (modo legado)."""
+    Cada lote tem no máximo o número de posições que cabe em `memoria_mb`; as
+    previsões do lote cobrem a sua janela mais a tolerância do as-of join.
+    """
     import sqlite3
 
     import pandas as pd
 
     if not os.path.exists(DB_PATH):
         logging.error(f"Banco não encontrado em {DB_PATH}.")
-        return None, None
+        return
+
+    from src.database import fonte_coleta
 
     conn = sqlite3.connect(DB_PATH)
-    posicoes_df = pd.read_sql_query("SELECT * FROM posicoes", conn)
-    previsoes_df = pd.read_sql_query("SELECT * FROM previsoes", conn)
-    conn.close()
-    logging.info(f"SQLite: {len(posicoes_df)} posições, {len(previsoes_df)} previsões.")
-    return posicoes_df, previsoes_df
+    try:
+        fonte = fonte_coleta(conn, "posicoes")
+        lotes = _planejar_lotes_sqlite(conn, desde, _linhas_por_lote(memoria_mb))
+        total = sum(n for _, _, n in lotes)
+        if lotes:
+            logging.info(f"SQLite: {total} posições novas em {len(lotes)} lote(s) (orçamento: {memoria_mb} MB).")
+        processadas = 0
+        for i, (inicio, fim, n) in enumerate(lotes, start=1):
+            if inicio is None:
+                posicoes_df = pd.read_sql_query(
+                    f"{fonte.select} WHERE {fonte.coluna} <= ? ORDER BY {fonte.coluna}",
+                    conn,
+                    params=(fonte.parametro(fim),),
+                )
+                inicio_previsoes = str(pd.Timestamp(posicoes_df["timestamp_coleta"].iloc[0]))
+            else:
+                posicoes_df = pd.read_sql_query(
+                    f"{fonte.select} WHERE {fonte.coluna} > ? AND {fonte.coluna} <= ? ORDER BY {fonte.coluna}",
+                    conn,
+                    params=(fonte.parametro(inicio), fonte.parametro(fim)),
+                )
+                inicio_previsoes = str(inicio)
+            inicio_previsoes = str(pd.Timestamp(inicio_previsoes) - pd.Timedelta(minutes=TOLERANCIA_ASOF_MIN))
+            previsoes_df = pd.read_sql_query(
+                "SELECT * FROM previsoes WHERE timestamp_coleta >= ? AND timestamp_coleta <= ?",
+                conn,
+                params=(inicio_previsoes, fim),
+            )
+            processadas += n
+            logging.info(
+                f"Lote {i}/{len(lotes)} (até {fim}): {len(posicoes_df)} posições, {len(previsoes_df)} previsões "
+                f"— {processadas}/{total} ({processadas / total:.0%})."
+            )
+            yield posicoes_df, previsoes_df
+    finally:
+        conn.close()
+
+
+def _particoes(tabela_dir):
+    """Datas (YYYY-MM-DD) das partições dt= existentes, em ordem."""
+    if not os.path.isdir(tabela_dir):
+        return []
+    return sorted(d[3:] for d in os.listdir(tabela_dir) if d.startswith("dt="))
 
 
-def _load_via_parquet():
-    """Carrega dados via DuckDB sobre os Parquet (modo analítico)."""
+def _iterar_lotes_parquet(desde=None, memoria_mb=MEMORIA_MB_PADRAO):
+    """Gera um lote (posições, previsões) por partição diária do Parquet.
+
+    Só visita as partições a partir do dia da marca d'água `desde` e, dentro
+    delas, só as posições posteriores a ela. As previsões de cada dia incluem a
+    cauda do dia anterior (até a tolerância do as-of join), para que as
+    posições logo após a meia-noite sejam pareadas.
+    """
     import duckdb
     import pandas as pd
 
@@ -50,115 +245,333 @@ def _load_via_parquet():
     prev_path = os.path.join(PARQUET_DIR, "previsoes")
 
     if not os.path.isdir(pos_path):
-        logging.warning(
-            f"Parquet não encontrado em {pos_path}. Usando fallback SQLite."
-        )
-        return _load_via_sqlite()
+        logging.warning(f"Parquet não encontrado em {pos_path}. Usando fallback SQLite.")
+        yield from _iterar_lotes_sqlite(desde, memoria_mb)
+        return
+
+    tem_previsoes = bool(_particoes(prev_path))
+    desde_ts = pd.Timestamp(desde) if desde is not None else None
+    particoes = _particoes(pos_path)
+    if desde_ts is not None:
+        particoes = [dt for dt in particoes if dt >= desde_ts.strftime("%Y-%m-%d")]
 
     con = duckdb.connect()
-    posicoes_df = con.execute(
-        f"SELECT * EXCLUDE (dt) FROM read_parquet('{pos_path}/**/*.parquet')"
-    ).fetchdf()
-    if os.path.isdir(prev_path):
-        previsoes_df = con.execute(
-            f"SELECT * EXCLUDE (dt) FROM read_parquet('{prev_path}/**/*.parquet')"
-        ).fetchdf()
-    else:
-        previsoes_df = pd.DataFrame()
-    con.close()
-    logging.info(
-        f"Parquet: {len(posicoes_df)} posições, {len(previsoes_df)} previsões."
+    try:
+        for dt in particoes:
+            sql = f"SELECT * EXCLUDE (dt) FROM read_parquet('{pos_path}/dt={dt}/*.parquet', hive_partitioning = true)"
+            if desde_ts is not None:
+                posicoes_df = con.execute(sql + " WHERE timestamp_coleta > ?", [desde_ts.to_pydatetime()]).fetchdf()
+            else:
+                posicoes_df = con.execute(sql).fetchdf()
+            if posicoes_df.empty:
+                continue
+            if tem_previsoes:
+                inicio = pd.Timestamp(dt) - pd.Timedelta(minutes=TOLERANCIA_ASOF_MIN)
+                fim = pd.Timestamp(dt) + pd.Timedelta(days=1)
+                previsoes_df = con.execute(
+                    f"SELECT * EXCLUDE (dt) FROM read_parquet('{prev_path}/**/*.parquet', hive_partitioning = true) "
+                    "WHERE dt BETWEEN ? AND ? AND timestamp_coleta >= ? AND timestamp_coleta < ?",
+                    [inicio.date(), pd.Timestamp(dt).date(), inicio.to_pydatetime(), fim.to_pydatetime()],
+                ).fetchdf()
+            else:
+                previsoes_df = pd.DataFrame()
+            logging.info(f"Parquet dt={dt}: {len(posicoes_df)} posições, {len(previsoes_df)} previsões.")
+            yield posicoes_df, previsoes_df
+    finally:
+        con.close()
+
+
+def _montar_resultado(df_final, timestamp_analise):
+    """Renomeia/seleciona as colunas no schema de resultados_analise."""
+    df_final = df_final.rename(
+        columns={
+            "latitude": "posicao_atual_lat",
+            "longitude": "posicao_atual_lon",
+            "timestamp_posicao": "horario_posicao",
+            "id_parada": "proximo_ponto_previsto",
+            "horario_previsao": "horario_previsto_chegada",
+        }
     )
-    return posicoes_df, previsoes_df
+    df_final["timestamp_analise"] = timestamp_analise
+    for col in COLUNAS_RESULTADO:
+        if col not in df_final.columns:
+            df_final[col] = None
+    return df_final[COLUNAS_RESULTADO]
 
 
-def main():
-    parser = argparse.ArgumentParser(
-        description="Análise de frota SPTrans (Parquet ou SQLite)"
+def _tipar_resultado(df):
+    """Fixa os tipos do resultado para que todos os arquivos Parquet tenham o mesmo schema."""
+    import pandas as pd
+
+    return df.astype(
+        {
+            "id_onibus": "int64",
+            "posicao_atual_lat": "float64",
+            "posicao_atual_lon": "float64",
+            "proximo_ponto_previsto": "Int64",
+        }
+    ).assign(
+        timestamp_analise=pd.to_datetime(df["timestamp_analise"]),
+        letreiro_linha=df["letreiro_linha"].astype(object),
+        horario_posicao=df["horario_posicao"].map(lambda v: None if pd.isna(v) else str(v)).astype(object),
+        horario_previsto_chegada=df["horario_previsto_chegada"].astype(object),
+    )
+
+
+def ler_watermark(conn):
+    """Último timestamp_coleta já analisado (texto ISO) ou None na primeira execução."""
+    conn.execute(SQL_CREATE_WATERMARK)
+    row = conn.execute(
+        "SELECT ultimo_timestamp_coleta FROM analise_watermark WHERE nome = ?", (WATERMARK_NOME,)
+    ).fetchone()
+    return row[0] if row else None
+
+
+def _token_lote(watermark):
+    """Nome de arquivo determinístico para o lote que começa na marca d'água (reexecução sobrescreve)."""
+    if watermark is None:
+        return "inicial"
+    return "".join(c for c in str(watermark) if c.isdigit())
+
+
+def _dir_resultados():
+    """Caminho que os leitores abrem: link simbólico para a versão publicada (resultados_analise.v<...>/)."""
+    return os.path.join(PARQUET_DIR, "resultados_analise")
+
+
+def _versoes_parquet():
+    """Nomes dos diretórios de versão dos resultados Parquet, da mais antiga para a mais nova."""
+    if not os.path.isdir(PARQUET_DIR):
+        return []
+    return sorted(
+        nome
+        for nome in os.listdir(PARQUET_DIR)
+        if nome.startswith(PREFIXO_VERSAO) and os.path.isdir(os.path.join(PARQUET_DIR, nome))
+    )
+
+
+def _versao_publicada():
+    """Versão para a qual resultados_analise/ aponta (None se ainda não é um link)."""
+    destino = _dir_resultados()
+    return os.readlink(destino) if os.path.islink(destino) else None
+
+
+def _dir_reconstrucao(do_zero=False):
+    """Versão (ainda não publicada) em que a reconstrução monta o Parquet novo.
+
+    Retoma a mais nova posterior à publicada; com `do_zero`, ou se não houver, descarta
+    as pendentes e cria outra.
+    """
+    import shutil
+    from datetime import datetime
+
+    publicada = _versao_publicada() or ""
+    pendentes = [v for v in _versoes_parquet() if v > publicada]
+    if pendentes and not do_zero:
+        return os.path.join(PARQUET_DIR, pendentes[-1])
+    for versao in pendentes:
+        shutil.rmtree(os.path.join(PARQUET_DIR, versao))
+    nova = os.path.join(PARQUET_DIR, f"{PREFIXO_VERSAO}{datetime.now():%Y%m%dT%H%M%S%f}")
+    os.makedirs(nova)
+    return nova
+
+
+def _publicar_parquet(resultado, timestamps_coleta, watermark, destino=None):
+    """Publica o lote em `destino`/dt=YYYY-MM-DD/ (tmp + os.replace, atômico por arquivo).
+
+    `destino` padrão: resultados_analise/ (o publicado).
+    """
+    destino = destino or _dir_resultados()
+    dias = timestamps_coleta.dt.strftime("%Y-%m-%d")
+    nome = f"part-{_token_lote(watermark)}.parquet"
+    for dt, grupo in resultado.groupby(dias.to_numpy()):
+        particao = os.path.join(destino, f"dt={dt}")
+        os.makedirs(particao, exist_ok=True)
+        tmp_path = os.path.join(particao, f".{nome}.tmp")
+        grupo.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, os.path.join(particao, nome))
+
+
+def _inserir_resultados(conn, tabela, resultado):
+    """INSERT do lote na transação do chamador (o `to_sql` do pandas faria commit por conta própria)."""
+    registros = resultado.astype(object).where(resultado.notna(), None)
+    registros["timestamp_analise"] = resultado["timestamp_analise"].map(lambda ts: ts.isoformat(sep=" "))
+    colunas = list(resultado.columns)
+    conn.executemany(
+        f"INSERT INTO {tabela} ({', '.join(colunas)}) VALUES ({', '.join('?' * len(colunas))})",
+        registros.itertuples(index=False, name=None),
     )
+
+
+def _publicar_lote(conn, resultado, timestamps_coleta, watermark, tabela="resultados_analise", destino=None):
+    """Publica um lote e avança a marca d'água; retorna a nova marca d'água.
+
+    A escrita no SQLite (resultados em `tabela` + marca d'água) é uma única
+    transação. O Parquet é publicado antes: se o processo cair entre os dois
+    passos, a reexecução parte da mesma marca d'água e sobrescreve o mesmo arquivo.
+    """
+    from datetime import datetime
+
+    novo_watermark = str(timestamps_coleta.max())
+    resultado = _tipar_resultado(resultado)
+    _publicar_parquet(resultado, timestamps_coleta, watermark, destino)
+
+    with conn:
+        _inserir_resultados(conn, tabela, resultado)
+        conn.execute(
+            "INSERT INTO analise_watermark (nome, ultimo_timestamp_coleta, atualizado_em) VALUES (?, ?, ?) "
+            "ON CONFLICT(nome) DO UPDATE SET ultimo_timestamp_coleta = excluded.ultimo_timestamp_coleta, "
+            "atualizado_em = excluded.atualizado_em",
+            (WATERMARK_NOME, novo_watermark, datetime.now().isoformat()),
+        )
+    return novo_watermark
+
+
+def _em_reconstrucao(conn):
+    """True se há uma reconstrução (`--reprocessar`) em andamento: a tabela dela existe."""
+    cursor = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (TABELA_RECONSTRUCAO,))
+    return cursor.fetchone() is not None
+
+
+def _iniciar_reconstrucao(conn):
+    """Recria vazia a tabela de reconstrução (schema de resultados_analise) e apaga a marca d'água.
+
+    Uma transação só: ou a reconstrução começa do zero, ou nada muda. Os publicados
+    continuam intactos até `_concluir_reconstrucao`.
+    """
+    (ddl,) = conn.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'resultados_analise'"
+    ).fetchone()
+    conn.execute("BEGIN")  # o sqlite3 não abre transação sozinho antes de DDL
+    with conn:
+        conn.execute(f"DROP TABLE IF EXISTS {TABELA_RECONSTRUCAO}")
+        conn.execute(ddl.replace("resultados_analise", TABELA_RECONSTRUCAO, 1))
+        conn.execute("DELETE FROM analise_watermark WHERE nome = ?", (WATERMARK_NOME,))
+
+
+def _concluir_reconstrucao(conn):
+    """Troca resultados_analise pela tabela reconstruída (DROP + RENAME numa transação) e depois o Parquet.
+
+    O commit da troca no SQLite decide: se o processo cair antes da troca do Parquet,
+    a próxima execução a completa (versão mais nova que a publicada, sem tabela de reconstrução).
+    """
+    conn.execute("BEGIN")
+    with conn:
+        conn.execute("DROP TABLE resultados_analise")
+        conn.execute(f"ALTER TABLE {TABELA_RECONSTRUCAO} RENAME TO resultados_analise")
+    _publicar_versao_parquet()
+
+
+def _publicar_versao_parquet():
+    """Aponta resultados_analise/ para a versão mais nova e apaga as anteriores (idempotente).
+
+    A troca é um link simbólico novo renomeado por cima do antigo (os.replace): quem abre
+    o caminho vê a versão anterior inteira ou a nova inteira, nunca um diretório ausente.
+    Só a migração de um resultados_analise/ que ainda é diretório comum (layout anterior
+    às versões) passa por um instante sem ele, uma única vez.
+    """
+    import shutil
+
+    versoes = _versoes_parquet()
+    if not versoes:
+        return
+    destino, nova = _dir_resultados(), versoes[-1]
+    if _versao_publicada() != nova:
+        if os.path.isdir(destino) and not os.path.islink(destino):
+            os.replace(destino, os.path.join(PARQUET_DIR, f"{PREFIXO_VERSAO}0-legado"))
+        tmp_path = os.path.join(PARQUET_DIR, ".resultados_analise.tmp")
+        if os.path.lexists(tmp_path):
+            os.remove(tmp_path)
+        os.symlink(nova, tmp_path)  # alvo relativo: o diretório de dados pode ser montado noutro lugar
+        os.replace(tmp_path, destino)
+    for versao in _versoes_parquet():
+        if versao != nova:
+            shutil.rmtree(os.path.join(PARQUET_DIR, versao), ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Análise de frota SPTrans (Parquet ou SQLite)")
     parser.add_argument(
         "--mode",
         choices=["sqlite", "parquet"],
         default="sqlite",
         help="Fonte de dados: sqlite (legado, padrão) ou parquet (DuckDB)",
     )
+    parser.add_argument(
+        "--reprocessar",
+        action="store_true",
+        help="Ignora a marca d'água e reconstrói os resultados a partir do início.",
+    )
+    parser.add_argument(
+        "--memoria-mb",
+        type=int,
+        default=MEMORIA_MB_PADRAO,
+        help=f"Orçamento de memória por lote no modo sqlite (padrão: {MEMORIA_MB_PADRAO} MB).",
+    )
     args = parser.parse_args()
 
+    import sqlite3
     from datetime import datetime
 
     import pandas as pd
 
-    if args.mode == "parquet":
-        posicoes_df, previsoes_df = _load_via_parquet()
-    else:
-        posicoes_df, previsoes_df = _load_via_sqlite()
+    from src.catalogo_linhas import carregar_catalogo_opcional
+    from src.database import SQL_CREATE_RESULTADOS_ANALISE
 
-    if posicoes_df is None or posicoes_df.empty:
-        logging.warning("Nenhum dado de posição. Encerrando.")
+    if not os.path.exists(DB_PATH):
+        logging.error(f"Banco não encontrado em {DB_PATH}.")
         return
 
-    # --- Processamento (idêntico ao original) ---
-    if previsoes_df is not None and not previsoes_df.empty:
-        previsoes_df_unicas = previsoes_df.sort_values(
-            by="horario_previsao"
-        ).drop_duplicates(subset=["id_onibus"], keep="first")
-        logging.info(f"{len(previsoes_df_unicas)} previsões únicas (uma por ônibus).")
-        df_final = pd.merge(
-            posicoes_df, previsoes_df_unicas, on="id_onibus", how="left"
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        conn.execute(SQL_CREATE_RESULTADOS_ANALISE)
+        watermark = ler_watermark(conn)
+        em_reconstrucao = _em_reconstrucao(conn)
+        if not em_reconstrucao:
+            # Completa a troca do Parquet de uma reconstrução já confirmada no SQLite, se faltou
+            _publicar_versao_parquet()
+        if args.reprocessar or (watermark is None and not em_reconstrucao):
+            _iniciar_reconstrucao(conn)
+            watermark, em_reconstrucao = None, True
+        elif em_reconstrucao:
+            # Reconstrução anterior interrompida: continua da marca d'água na tabela e no diretório dela
+            logging.info("Retomando a reconstrução interrompida dos resultados.")
+        tabela, destino = (
+            (TABELA_RECONSTRUCAO, _dir_reconstrucao(do_zero=watermark is None))
+            if em_reconstrucao
+            else ("resultados_analise", None)
         )
-    else:
-        df_final = posicoes_df
+        if watermark:
+            logging.info(f"Processando posições posteriores à marca d'água {watermark}.")
+        else:
+            logging.info("Sem marca d'água: reconstruindo resultados a partir do início.")
 
-    df_final["timestamp_analise"] = datetime.now()
-    df_final.rename(
-        columns={
-            "latitude": "posicao_atual_lat",
-            "longitude": "posicao_atual_lon",
-            "timestamp_posicao": "horario_posicao",
-            "id_parada": "proximo_ponto_previsto",
-            "horario_previsao": "horario_previsto_chegada",
-        },
-        inplace=True,
-    )
-
-    colunas_tabela = [
-        "timestamp_analise",
-        "id_onibus",
-        "letreiro_linha",
-        "posicao_atual_lat",
-        "posicao_atual_lon",
-        "horario_posicao",
-        "proximo_ponto_previsto",
-        "horario_previsto_chegada",
-    ]
-    for col in colunas_tabela:
-        if col not in df_final.columns:
-            df_final[col] = None
-    df_final = df_final[colunas_tabela]
+        if args.mode == "parquet":
+            lotes = _iterar_lotes_parquet(watermark, args.memoria_mb)
+        else:
+            lotes = _iterar_lotes_sqlite(watermark, args.memoria_mb)
+        catalogo = carregar_catalogo_opcional("as-of join usará apenas id_onibus (sem linha)")
+        timestamp_analise = datetime.now()
 
-    # Salva resultados no SQLite (sempre, independente da fonte)
-    import sqlite3
+        total = 0
+        for posicoes_df, previsoes_df in lotes:
+            if posicoes_df is None or posicoes_df.empty:
+                continue
+            df_juntado = juntar_asof(posicoes_df, previsoes_df, catalogo)
+            timestamps_coleta = pd.to_datetime(df_juntado["timestamp_coleta"]).reset_index(drop=True)
+            resultado = _montar_resultado(df_juntado, timestamp_analise).reset_index(drop=True)
+            watermark = _publicar_lote(conn, resultado, timestamps_coleta, watermark, tabela, destino)
+            total += len(resultado)
+        if em_reconstrucao:
+            _concluir_reconstrucao(conn)
+    finally:
+        conn.close()
 
-        # Renomear para schema do resultados_analise
-        df_final = df_final.rename(columns={
-            "latitude": "posicao_atual_lat",
-            "longitude": "posicao_atual_lon",
-            "timestamp_posicao": "horario_posicao",
-            "id_parada": "proximo_ponto_previsto",
-            "horario_previsao": "horario_previsto_chegada",
-        })
-        df_final["timestamp_analise"] = datetime.now()
+    if total == 0:
+        logging.info("Nenhuma posição nova desde a última análise. Encerrando.")
+        return
+    logging.info(f"Análise concluída: {total} novos resultados publicados (marca d'água: {watermark}).")
 
-    # Salva resultados no SQLite (sempre, independente da fonte)
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM resultados_analise;")
-    conn.commit()
-    df_final.to_sql("resultados_analise", conn, if_exists="append", index=False)
-    conn.close()
-    logging.info(
-        f"Análise concluída: {len(df_final)} resultados salvos em resultados_analise."
-    )
 
 if __name__ == "__main__":
     main()
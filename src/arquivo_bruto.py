@@ -0,0 +1,147 @@
+"""
+Arquivo das respostas brutas da API Olho Vivo (zstd, um arquivo por hora).
+
+Os coletores gravam aqui o corpo de cada resposta de `/Posicao` e `/Previsao/Linha`
+exatamente como chegou, antes de qualquer filtro: mudar `LINHAS_ALVO` ou extrair um
+campo novo (`a`, `ta`, `sl`...) passa a ser um reprocessamento do arquivo
+(src/reprocessar_bruto.py), não uma nova coleta.
+
+Layout (particionado como o Silver):
+
+    data/bruto/<endpoint>/dt=YYYY-MM-DD/<endpoint>-YYYYMMDDTHH.zst
+
+Cada arquivo é uma sequência de frames zstd independentes, um por resposta, com
+conteúdo `<cabeçalho JSON>\\n<corpo bruto>`; o cabeçalho traz `ts` (o mesmo
+`timestamp_coleta` gravado no Bronze), `endpoint` e `params`. Anexar um frame não
+reescreve o arquivo, e um frame truncado por queda do processo só perde a si mesmo.
+
+Configuração: `SPTRANS_ARQUIVO_DIR` (padrão data/bruto); vazio desliga o arquivo.
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime
+
+import zstandard
+
+from src import metricas
+
+logger = logging.getLogger(__name__)
+
+ARQUIVO_DIR_PADRAO = os.path.join("data", "bruto")
+NIVEL_ZSTD = 3
+EXTENSAO = ".zst"
+
+# Nome do diretório/arquivo de cada endpoint da API
+ENDPOINTS = {"/Posicao": "posicao", "/Previsao/Linha": "previsao_linha"}
+
+_PADRAO_ARQUIVO = re.compile(r"^(?P<nome>[a-z_]+)-(?P<hora>\d{8}T\d{2})" + re.escape(EXTENSAO) + "$")
+_lock_escrita = threading.Lock()
+
+
+@dataclass
+class Snapshot:
+    """Uma resposta arquivada."""
+
+    ts: datetime
+    endpoint: str
+    corpo: bytes
+    params: dict = field(default_factory=dict)
+
+    def json(self):
+        return json.loads(self.corpo)
+
+
+def diretorio_arquivo():
+    """Diretório raiz do arquivo (None se desligado por SPTRANS_ARQUIVO_DIR vazia)."""
+    return os.environ.get("SPTRANS_ARQUIVO_DIR", ARQUIVO_DIR_PADRAO) or None
+
+
+def caminho_bucket(endpoint, ts, diretorio=None):
+    """Arquivo da hora de `ts` para o endpoint."""
+    nome = ENDPOINTS[endpoint]
+    diretorio = diretorio or diretorio_arquivo()
+    return os.path.join(diretorio, nome, f"dt={ts:%Y-%m-%d}", f"{nome}-{ts:%Y%m%dT%H}{EXTENSAO}")
+
+
+def arquivar(endpoint, corpo, ts, params=None, diretorio=None):
+    """Anexa a resposta ao arquivo da hora como um frame zstd. Retorna o caminho (None se desligado)."""
+    diretorio = diretorio or diretorio_arquivo()
+    if diretorio is None:
+        return None
+    cabecalho = {"ts": ts.isoformat(), "endpoint": endpoint, "params": params or {}}
+    frame = zstandard.ZstdCompressor(level=NIVEL_ZSTD).compress(
+        json.dumps(cabecalho, ensure_ascii=False).encode("utf-8") + b"\n" + bytes(corpo)
+    )
+    caminho = caminho_bucket(endpoint, ts, diretorio)
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    # Um write por frame: leitores concorrentes veem frames inteiros ou um final truncado
+    with _lock_escrita, open(caminho, "ab") as f:
+        f.write(frame)
+    metricas.ARQUIVO_BYTES.inc(len(frame), endpoint=endpoint)
+    return caminho
+
+
+def arquivar_sem_falhar(endpoint, corpo, ts, params=None):
+    """`arquivar` para os coletores: um erro de disco nunca derruba o ciclo de coleta."""
+    try:
+        return arquivar(endpoint, corpo, ts, params)
+    except Exception as e:
+        logger.error(f"Falha ao arquivar a resposta bruta de {endpoint}: {e}")
+        return None
+
+
+def hora_do_arquivo(caminho):
+    """Início da hora coberta pelo arquivo (pelo nome), ou None se o nome não segue o layout."""
+    m = _PADRAO_ARQUIVO.match(os.path.basename(caminho))
+    return datetime.strptime(m["hora"], "%Y%m%dT%H") if m else None
+
+
+def listar_arquivos(endpoint, inicio=None, fim=None, diretorio=None):
+    """Arquivos do endpoint em ordem cronológica, opcionalmente só as horas que tocam [inicio, fim]."""
+    diretorio = diretorio or diretorio_arquivo() or ARQUIVO_DIR_PADRAO
+    raiz = os.path.join(diretorio, ENDPOINTS[endpoint])
+    if not os.path.isdir(raiz):
+        return []
+    arquivos = []
+    for particao in sorted(os.listdir(raiz)):
+        if not particao.startswith("dt="):
+            continue
+        for nome in sorted(os.listdir(os.path.join(raiz, particao))):
+            hora = hora_do_arquivo(nome)
+            if hora is None:
+                continue
+            if inicio is not None and hora < inicio.replace(minute=0, second=0, microsecond=0):
+                continue
+            if fim is not None and hora > fim:
+                continue
+            arquivos.append(os.path.join(raiz, particao, nome))
+    return arquivos
+
+
+def ler_snapshots(caminho, inicio=None, fim=None):
+    """Snapshots do arquivo, na ordem em que foram gravados (filtrando por `ts` se pedido)."""
+    with open(caminho, "rb") as f:
+        restante = f.read()
+    decompressor = zstandard.ZstdDecompressor()
+    while restante:
+        frame = decompressor.decompressobj()
+        try:
+            conteudo = frame.decompress(restante)
+        except zstandard.ZstdError as e:
+            logger.warning(f"{caminho}: frame corrompido ({e}); ignorando o restante do arquivo.")
+            return
+        if not frame.eof:
+            logger.warning(f"{caminho}: último frame truncado; ignorado.")
+            return
+        restante = frame.unused_data
+        linha, _, corpo = conteudo.partition(b"\n")
+        cabecalho = json.loads(linha)
+        ts = datetime.fromisoformat(cabecalho["ts"])
+        if (inicio is not None and ts < inicio) or (fim is not None and ts > fim):
+            continue
+        yield Snapshot(ts, cabecalho["endpoint"], corpo, cabecalho.get("params", {}))
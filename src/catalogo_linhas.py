@@ -0,0 +1,191 @@
+"""
+Catálogo de linhas SPTrans indexado (letreiro → id_linha, nomes, sentido).
+
+Carrega `data/todas_as_linhas.csv` uma única vez por processo, normaliza os
+tipos (inteiros compactos + categorias) e mantém um cache Parquet ao lado do
+CSV (`data/todas_as_linhas.parquet`). Enquanto o CSV não mudar (mtime), as
+execuções seguintes — inclusive cada materialização Dagster, que roda em
+processo novo — leem o Parquet tipado em vez de reprocessar o CSV.
+
+Uso:
+    from src.catalogo_linhas import carregar_catalogo, carregar_catalogo_opcional
+
+    catalogo = carregar_catalogo()                # FileNotFoundError sem o CSV
+    catalogo = carregar_catalogo_opcional("sem letreiros")  # None (com aviso) sem o CSV
+    catalogo.letreiros_de([2160, 34928])          # {'8000-10'}
+    catalogo.letreiro_por_id(df["id_linha"])      # vetorizado
+    catalogo.nome_por_letreiro(df["letreiro_linha"])
+
+Sentido: a API Olho Vivo codifica o sentido 2 como `cl = cl_sentido1 + 32768`.
+Se o CSV tiver a coluna `sentido`, ela é usada; caso contrário o sentido é
+derivado do próprio `id_linha`.
+"""
+
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+CATALOGO_LINHAS_PATH = os.path.join("data", "todas_as_linhas.csv")
+
+OFFSET_SENTIDO_2 = 32768
+TIPO_LETREIRO_PADRAO = 10
+
+COLUNAS = [
+    "id_linha",
+    "letreiro",
+    "letreiro_numerico",
+    "tipo_letreiro",
+    "sentido",
+    "sentido_ida",
+    "sentido_volta",
+    "nome_linha",
+]
+
+logger = logging.getLogger(__name__)
+
+# Cache em memória: {caminho_csv: (mtime, CatalogoLinhas)}
+_CACHE: dict = {}
+
+
+def montar_letreiro(letreiro_numerico, tipo_letreiro):
+    """Monta o letreiro 'lt-tl' (ex: '8000-10') de forma vetorizada."""
+    numerico = pd.Series(letreiro_numerico).astype(str)
+    tipo = pd.to_numeric(pd.Series(tipo_letreiro, index=numerico.index), errors="coerce")
+    tipo = tipo.fillna(TIPO_LETREIRO_PADRAO).astype(int).astype(str)
+    return numerico + "-" + tipo
+
+
+def normalizar_letreiros(letreiros):
+    """Completa letreiros sem tipo ('8000' → '8000-10'), como a API exibe por padrão."""
+    letreiros = pd.Index(letreiros).astype(str)
+    return letreiros.where(letreiros.str.contains("-", regex=False), letreiros + f"-{TIPO_LETREIRO_PADRAO}")
+
+
+def indice_nomes(lines_df):
+    """Série `letreiro → nome_linha` a partir de um DataFrame de linhas (catálogo ou CSV cru)."""
+    if "letreiro" in lines_df.columns:
+        letreiros = lines_df["letreiro"].astype(str)
+    else:
+        letreiros = montar_letreiro(lines_df["letreiro_numerico"], lines_df["tipo_letreiro"])
+    nomes = pd.Series(lines_df["nome_linha"].to_numpy(), index=letreiros.to_numpy())
+    return nomes[~nomes.index.duplicated(keep="first")]
+
+
+def _normalizar(df_csv):
+    """Converte o CSV cru no frame compacto e tipado do catálogo."""
+    df = pd.DataFrame()
+    df["id_linha"] = pd.to_numeric(df_csv["id_linha"], errors="coerce")
+    df["letreiro_numerico"] = df_csv["letreiro_numerico"].astype(str)
+    df["tipo_letreiro"] = pd.to_numeric(df_csv["tipo_letreiro"], errors="coerce").fillna(TIPO_LETREIRO_PADRAO)
+    df = df.dropna(subset=["id_linha"])
+    df_csv = df_csv.loc[df.index]
+
+    if "sentido" in df_csv.columns:
+        sentido = pd.to_numeric(df_csv["sentido"], errors="coerce")
+    else:
+        sentido = pd.Series(np.where(df["id_linha"] >= OFFSET_SENTIDO_2, 2, 1), index=df.index)
+
+    df["id_linha"] = df["id_linha"].astype("int32")
+    df["tipo_letreiro"] = df["tipo_letreiro"].astype("int16")
+    df["sentido"] = sentido.fillna(1).astype("int8")
+    df["letreiro"] = montar_letreiro(df["letreiro_numerico"], df["tipo_letreiro"])
+    df["sentido_ida"] = df_csv.get("sentido_ida", pd.Series("", index=df.index)).fillna("").astype(str)
+    df["sentido_volta"] = df_csv.get("sentido_volta", pd.Series("", index=df.index)).fillna("").astype(str)
+    df["nome_linha"] = df["sentido_ida"] + " / " + df["sentido_volta"]
+
+    for col in ("letreiro", "letreiro_numerico"):
+        df[col] = df[col].astype("category")
+    df = df.drop_duplicates(subset=["id_linha"]).sort_values("id_linha").reset_index(drop=True)
+    return df[COLUNAS]
+
+
+class CatalogoLinhas:
+    """Catálogo de linhas com índices pré-construídos para buscas vetorizadas."""
+
+    def __init__(self, df):
+        self.df = df
+        self._por_id = df.set_index("id_linha")
+        self._nomes = indice_nomes(df)
+
+    def __len__(self):
+        return len(self.df)
+
+    def letreiros_de(self, ids_linha):
+        """Conjunto de letreiros ('8000-10') correspondentes aos ids de linha informados."""
+        letreiros = self._por_id["letreiro"].reindex(pd.Index(ids_linha, dtype="int64")).dropna()
+        return set(letreiros.astype(str))
+
+    def ids_de(self, letreiros):
+        """Ids de linha (ambos os sentidos) correspondentes aos letreiros informados."""
+        mascara = self.df["letreiro"].astype(str).isin(set(letreiros))
+        return self.df.loc[mascara, "id_linha"].to_numpy()
+
+    def letreiro_por_id(self, ids_linha):
+        """Letreiro para cada id de linha (vetorizado; NaN quando desconhecido)."""
+        ids = pd.Index(pd.to_numeric(pd.Series(ids_linha), errors="coerce"))
+        return self._por_id["letreiro"].astype(str).reindex(ids).to_numpy()
+
+    def nome_por_letreiro(self, letreiros):
+        """Nome descritivo ('ida / volta') para cada letreiro (vetorizado; NaN quando desconhecido)."""
+        return normalizar_letreiros(letreiros).map(self._nomes).to_numpy()
+
+
+def _ler_cache(cache_path, mtime_csv):
+    if not os.path.exists(cache_path) or os.path.getmtime(cache_path) < mtime_csv:
+        return None
+    try:
+        return pd.read_parquet(cache_path)
+    except Exception as e:
+        logger.warning(f"Cache do catálogo ilegível ({cache_path}): {e}. Recarregando do CSV.")
+        return None
+
+
+def _gravar_cache(df, cache_path):
+    try:
+        os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+        tmp_path = cache_path + ".tmp"
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, cache_path)
+    except Exception as e:
+        logger.warning(f"Não foi possível gravar o cache do catálogo em {cache_path}: {e}")
+
+
+def carregar_catalogo(csv_path=None, cache_path=None):
+    """Retorna o catálogo de linhas, carregado uma vez por processo e por versão do CSV.
+
+    Raises:
+        FileNotFoundError: se o CSV do catálogo não existir.
+    """
+    csv_path = csv_path or CATALOGO_LINHAS_PATH
+    cache_path = cache_path or os.path.splitext(csv_path)[0] + ".parquet"
+    if not os.path.exists(csv_path):
+        raise FileNotFoundError(f"Catálogo de linhas não encontrado em: {csv_path}")
+
+    mtime_csv = os.path.getmtime(csv_path)
+    em_memoria = _CACHE.get(csv_path)
+    if em_memoria and em_memoria[0] == mtime_csv:
+        return em_memoria[1]
+
+    df = _ler_cache(cache_path, mtime_csv)
+    if df is None:
+        df = _normalizar(pd.read_csv(csv_path))
+        _gravar_cache(df, cache_path)
+        logger.info(f"Catálogo de linhas carregado do CSV ({len(df)} linhas) e cacheado em {cache_path}.")
+
+    catalogo = CatalogoLinhas(df)
+    _CACHE[csv_path] = (mtime_csv, catalogo)
+    return catalogo
+
+
+def carregar_catalogo_opcional(sem_catalogo, csv_path=None):
+    """Como `carregar_catalogo`, mas None se o CSV não existir, para quem só anota com o catálogo.
+
+    `sem_catalogo` completa o aviso dizendo o que sai diferente sem ele.
+    """
+    try:
+        return carregar_catalogo(csv_path)
+    except FileNotFoundError:
+        logger.warning(f"Catálogo de linhas ausente ({csv_path or CATALOGO_LINHAS_PATH}): {sem_catalogo}.")
+        return None
@@ -0,0 +1,414 @@
+"""
+Catálogo de paradas (id → nome, coordenadas) com índice espacial em grade.
+
+Fontes, em ordem de prioridade (um id que aparece em mais de uma fica com a primeira):
+
+1. GTFS local: `data/gtfs/stops.txt` (stop_id, stop_name, stop_lat, stop_lon; só
+   location_type 0/vazio). Na SPTrans o stop_id do GTFS é o `cp` da API Olho Vivo;
+2. API Olho Vivo: `GET /Parada/BuscarParadasPorLinha?codigoLinha=<cl>` para as linhas
+   alvo (`--api`);
+3. a tabela `paradas` do banco, preenchida pelo coletor de previsões.
+
+O catálogo é gravado em `data/paradas.parquet` (tmp + os.replace) e carregado uma vez
+por processo e por versão do arquivo (mtime), como o catálogo de linhas.
+
+Índice espacial (`IndiceParadas`): grade uniforme de TAMANHO_CELULA_M sobre uma projeção
+equiretangular local (erro < 0,5% nas distâncias dentro de uma região metropolitana).
+As consultas são vetorizadas sobre todos os pontos de uma vez — um laço só sobre os
+deslocamentos de célula vizinhos, nunca sobre pontos ou paradas:
+
+- `vizinhos(lat, lon, k)`: k paradas mais próximas, exato (a busca cresce em anéis de
+  células até o k-ésimo vizinho estar garantidamente dentro da área varrida);
+- `no_raio(lat, lon, raio_m)`: todos os pares (ponto, parada) a até `raio_m`.
+
+Uso:
+    python -m src.catalogo_paradas                      # GTFS (se houver) + tabela paradas
+    python -m src.catalogo_paradas --api                # + API para as LINHAS_ALVO do config
+    python -m src.catalogo_paradas --gtfs /tmp/gtfs/stops.txt
+
+    from src.catalogo_paradas import carregar_catalogo_paradas
+
+    catalogo = carregar_catalogo_paradas()
+    encaixe = catalogo.encaixar(df["latitude"], df["longitude"], raio_m=50)  # id_parada, distancia_m
+"""
+
+import argparse
+import json
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+import requests
+
+from src.geo import RAIO_TERRA_M
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger(__name__)
+
+PARADAS_PARQUET_PATH = os.path.join("data", "paradas.parquet")
+GTFS_STOPS_PATH = os.path.join("data", "gtfs", "stops.txt")
+
+TAMANHO_CELULA_M = 250
+# Acima deste anel (células) a busca de vizinhos passa à força bruta em blocos: só pontos
+# muito longe de qualquer parada chegam aqui
+ANEL_MAXIMO = 16
+PARES_POR_BLOCO = 5_000_000
+# Consultas grandes são feitas em blocos de pontos para limitar a memória dos pares candidatos
+PONTOS_POR_BLOCO = 200_000
+CELULAS_MAXIMAS = 4_000_000
+
+COLUNAS = ["id_parada", "nome", "latitude", "longitude", "fonte"]
+TIPOS = {"id_parada": "int64", "nome": "object", "latitude": "float64", "longitude": "float64", "fonte": "category"}
+
+# Cache em memória: {caminho: (mtime, CatalogoParadas)}
+_CACHE: dict = {}
+
+
+def _normalizar(df, fonte):
+    """Frame tipado do catálogo; descarta ids não numéricos e coordenadas inválidas (0,0 inclusive)."""
+    paradas = pd.DataFrame(
+        {
+            "id_parada": pd.to_numeric(df["id_parada"], errors="coerce"),
+            "nome": df["nome"].astype(object) if "nome" in df else None,
+            "latitude": pd.to_numeric(df["latitude"], errors="coerce"),
+            "longitude": pd.to_numeric(df["longitude"], errors="coerce"),
+            "fonte": fonte,
+        }
+    ).dropna(subset=["id_parada", "latitude", "longitude"])
+    valida = (
+        paradas["latitude"].between(-90, 90)
+        & paradas["longitude"].between(-180, 180)
+        & ((paradas["latitude"] != 0) | (paradas["longitude"] != 0))
+    )
+    return paradas[valida].astype({c: t for c, t in TIPOS.items() if c != "fonte"})
+
+
+def ler_stops_gtfs(caminho=None):
+    """stops.txt do GTFS → paradas (só location_type 0/vazio: paradas, não estações/entradas)."""
+    stops = pd.read_csv(caminho or GTFS_STOPS_PATH, dtype={"stop_id": str}, encoding="utf-8-sig")
+    if "location_type" in stops:
+        stops = stops[pd.to_numeric(stops["location_type"], errors="coerce").fillna(0) == 0]
+    stops = stops.rename(
+        columns={"stop_id": "id_parada", "stop_name": "nome", "stop_lat": "latitude", "stop_lon": "longitude"}
+    )
+    return _normalizar(stops, "gtfs")
+
+
+def buscar_paradas_api(session, codigos_linha):
+    """Paradas das linhas via `/Parada/BuscarParadasPorLinha` (sessão já autenticada)."""
+    from src import coleta_previsoes
+
+    registros = []
+    for codigo in codigos_linha:
+        url = f"{coleta_previsoes.BASE_URL}/Parada/BuscarParadasPorLinha?codigoLinha={codigo}"
+        try:
+            resp = session.get(url, timeout=30)
+            resp.raise_for_status()
+            registros.extend(resp.json() or [])
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Erro ao buscar paradas da linha {codigo}: {e}")
+        except json.JSONDecodeError:
+            logger.error(f"Resposta inválida (não-JSON) para as paradas da linha {codigo}.")
+    df = pd.DataFrame(registros, columns=["cp", "np", "py", "px"])
+    return _normalizar(
+        df.rename(columns={"cp": "id_parada", "np": "nome", "py": "latitude", "px": "longitude"}), "api"
+    )
+
+
+def paradas_da_coleta():
+    """Tabela `paradas` do banco (coordenadas vistas pelo coletor de previsões)."""
+    from src.database import COLUNAS_PARADAS, get_connection, ler_paradas
+
+    with get_connection() as conn:
+        return _normalizar(pd.DataFrame(ler_paradas(conn), columns=COLUNAS_PARADAS), "coleta")
+
+
+def combinar(*fontes):
+    """Junta as fontes na ordem dada; um id repetido fica com a primeira fonte em que aparece."""
+    fontes = [f for f in fontes if f is not None and not f.empty]
+    if not fontes:
+        return pd.DataFrame({c: pd.Series(dtype=t) for c, t in TIPOS.items()})
+    paradas = pd.concat(fontes, ignore_index=True).drop_duplicates("id_parada", keep="first")
+    paradas = paradas.sort_values("id_parada", ignore_index=True)
+    return paradas[COLUNAS].astype(TIPOS)
+
+
+def gravar_catalogo(paradas, caminho=None):
+    """Grava o catálogo em Parquet de forma atômica (tmp + os.replace)."""
+    caminho = caminho or PARADAS_PARQUET_PATH
+    os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+    tmp_path = caminho + ".tmp"
+    paradas.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, caminho)
+
+
+def _ordem_ponto_distancia(p, d):
+    """Ordem dos pares por (ponto, distância); uma chave inteira (ponto, mm) ordena bem mais rápido que lexsort."""
+    mm = np.minimum(np.round(d * 1000), 2**32 - 1).astype("int64")
+    return np.argsort((p << 32) | mm, kind="stable")
+
+
+class IndiceParadas:
+    """Grade uniforme sobre coordenadas projetadas para consultas kNN e por raio vetorizadas.
+
+    As paradas ficam ordenadas por célula e uma tabela densa dá o intervalo de cada célula,
+    de modo que achar as paradas de uma célula vizinha é só aritmética e indexação.
+    """
+
+    def __init__(self, latitude, longitude, tamanho_celula_m=TAMANHO_CELULA_M):
+        latitude = np.asarray(latitude, dtype="float64")
+        longitude = np.asarray(longitude, dtype="float64")
+        self._lat0 = float(latitude.mean()) if len(latitude) else 0.0
+        self._lon0 = float(longitude.mean()) if len(longitude) else 0.0
+        self._ky = RAIO_TERRA_M * np.pi / 180
+        self._kx = self._ky * np.cos(np.radians(self._lat0))
+        x, y = self._projetar(latitude, longitude)
+
+        # Catálogos muito espalhados (GTFS estadual, coordenadas erradas) aumentam a célula
+        # para a tabela densa não passar de CELULAS_MAXIMAS
+        self.tamanho_celula_m = float(tamanho_celula_m)
+        extensao = (np.ptp(x), np.ptp(y)) if len(x) else (0.0, 0.0)
+        celulas = (extensao[0] / self.tamanho_celula_m + 1) * (extensao[1] / self.tamanho_celula_m + 1)
+        if celulas > CELULAS_MAXIMAS:
+            self.tamanho_celula_m *= float(np.sqrt(celulas / CELULAS_MAXIMAS)) * 1.01
+
+        cx, cy = self._celula(x, y)
+        self._cx0, self._cy0 = (int(cx.min()), int(cy.min())) if len(x) else (0, 0)
+        self._nx = int(cx.max()) - self._cx0 + 1 if len(x) else 0
+        self._ny = int(cy.max()) - self._cy0 + 1 if len(x) else 0
+        ids = (cx - self._cx0) * self._ny + (cy - self._cy0)
+        # Paradas na ordem das células; a célula c ocupa [_inicio[c], _inicio[c + 1])
+        self._ordem = np.argsort(ids, kind="stable")
+        self._x, self._y = x[self._ordem], y[self._ordem]
+        contagem = np.bincount(ids, minlength=self._nx * self._ny)
+        self._inicio = np.concatenate([[0], np.cumsum(contagem)])
+
+    def __len__(self):
+        return len(self._ordem)
+
+    def _projetar(self, latitude, longitude):
+        latitude = np.asarray(latitude, dtype="float64")
+        longitude = np.asarray(longitude, dtype="float64")
+        return (longitude - self._lon0) * self._kx, (latitude - self._lat0) * self._ky
+
+    def _celula(self, x, y):
+        return (
+            np.floor(x / self.tamanho_celula_m).astype("int64"),
+            np.floor(y / self.tamanho_celula_m).astype("int64"),
+        )
+
+    def _pares_no_quadrado(self, x, y, pontos, anel):
+        """Pares (ponto, parada ordenada, distância) das células a até `anel` células da célula do ponto."""
+        cx, cy = self._celula(x[pontos], y[pontos])
+        cx, cy = cx - self._cx0, cy - self._cy0
+        partes_p, partes_s = [], []
+        for dx in range(-anel, anel + 1):
+            vx = cx + dx
+            for dy in range(-anel, anel + 1):
+                vy = cy + dy
+                dentro = (vx >= 0) & (vx < self._nx) & (vy >= 0) & (vy < self._ny)
+                celula = (vx * self._ny + vy)[dentro]
+                lo = self._inicio[celula]
+                n = self._inicio[celula + 1] - lo
+                total = int(n.sum())
+                if not total:
+                    continue
+                partes_p.append(np.repeat(pontos[dentro], n))
+                partes_s.append(np.repeat(lo - np.cumsum(n) + n, n) + np.arange(total))
+        if not partes_p:
+            vazio = np.empty(0, dtype="int64")
+            return vazio, vazio, np.empty(0)
+        p, s = np.concatenate(partes_p), np.concatenate(partes_s)
+        return p, s, np.hypot(x[p] - self._x[s], y[p] - self._y[s])
+
+    def _forca_bruta(self, x, y, pontos, k, distancias, indices):
+        """k mais próximas por matriz densa ponto × parada, em blocos de até PARES_POR_BLOCO."""
+        k_validos = min(k, len(self))
+        por_bloco = max(1, PARES_POR_BLOCO // len(self))
+        for inicio in range(0, len(pontos), por_bloco):
+            bloco = pontos[inicio : inicio + por_bloco]
+            d = np.hypot(x[bloco, None] - self._x[None, :], y[bloco, None] - self._y[None, :])
+            s = np.argpartition(d, k_validos - 1, axis=1)[:, :k_validos]
+            ds = np.take_along_axis(d, s, axis=1)
+            ordem = np.argsort(ds, axis=1)
+            distancias[bloco, :k_validos] = np.take_along_axis(ds, ordem, axis=1)
+            indices[bloco, :k_validos] = self._ordem[np.take_along_axis(s, ordem, axis=1)]
+
+    @staticmethod
+    def _k_menores(p, s, d, k):
+        """Dos pares, os k de menor distância por ponto: (p, s, d, posto), posto 0 = mais próxima."""
+        ordem = _ordem_ponto_distancia(p, d)
+        p, s, d = p[ordem], s[ordem], d[ordem]
+        novo = np.ones(len(p), dtype=bool)
+        novo[1:] = p[1:] != p[:-1]
+        posto = np.arange(len(p)) - np.maximum.accumulate(np.where(novo, np.arange(len(p)), 0))
+        fica = posto < k
+        return p[fica], s[fica], d[fica], posto[fica]
+
+    def vizinhos(self, latitude, longitude, k=1):
+        """k paradas mais próximas de cada ponto.
+
+        Returns:
+            (distancias_m, indices): arrays (n, k); índice -1 e distância inf quando o
+            catálogo tem menos de k paradas. Os índices são posições nas coordenadas do construtor.
+        """
+        x, y = self._projetar(latitude, longitude)
+        n = len(x)
+        distancias = np.full((n, k), np.inf)
+        indices = np.full((n, k), -1, dtype="int64")
+        if not len(self):
+            return distancias, indices
+        for inicio in range(0, n, PONTOS_POR_BLOCO):
+            self._vizinhos_bloco(x, y, np.arange(inicio, min(inicio + PONTOS_POR_BLOCO, n)), k, distancias, indices)
+        return distancias, indices
+
+    def _vizinhos_bloco(self, x, y, pendentes, k, distancias, indices):
+        anel = 1
+        while len(pendentes):
+            if anel > ANEL_MAXIMO:
+                self._forca_bruta(x, y, pendentes, k, distancias, indices)
+                return
+            p, s, d, posto = self._k_menores(*self._pares_no_quadrado(x, y, pendentes, anel), k)
+            distancias[p, posto], indices[p, posto] = d, self._ordem[s]
+            # Resolvido quando o k-ésimo vizinho está mais perto que a borda do quadrado varrido
+            # (nada fora dele pode ser mais próximo) ou quando o quadrado já cobre a grade toda
+            c = self.tamanho_celula_m
+            xp, yp = x[pendentes], y[pendentes]
+            cx, cy = self._celula(xp, yp)
+            borda = np.minimum.reduce(
+                [xp - (cx - anel) * c, (cx + anel + 1) * c - xp, yp - (cy - anel) * c, (cy + anel + 1) * c - yp]
+            )
+            gx, gy = cx - self._cx0, cy - self._cy0
+            cobriu_tudo = (
+                (gx - anel <= 0) & (gx + anel >= self._nx - 1) & (gy - anel <= 0) & (gy + anel >= self._ny - 1)
+            )
+            resolvido = (distancias[pendentes, k - 1] <= borda) | cobriu_tudo
+            pendentes = pendentes[~resolvido]
+            anel *= 2
+
+    def no_raio(self, latitude, longitude, raio_m):
+        """Todos os pares (ponto, parada) a até `raio_m`, ordenados por ponto e distância.
+
+        Returns:
+            (i_ponto, indice_parada, distancia_m) — arrays 1-D do mesmo tamanho.
+        """
+        x, y = self._projetar(latitude, longitude)
+        if not len(self) or not len(x):
+            vazio = np.empty(0, dtype="int64")
+            return vazio, vazio, np.empty(0)
+        anel = max(1, int(np.ceil(raio_m / self.tamanho_celula_m)))
+        partes = []
+        for inicio in range(0, len(x), PONTOS_POR_BLOCO):
+            p, s, d = self._pares_no_quadrado(x, y, np.arange(inicio, min(inicio + PONTOS_POR_BLOCO, len(x))), anel)
+            dentro = d <= raio_m
+            partes.append((p[dentro], s[dentro], d[dentro]))
+        p, s, d = (np.concatenate(c) for c in zip(*partes))
+        ordem = _ordem_ponto_distancia(p, d)
+        return p[ordem], self._ordem[s[ordem]], d[ordem]
+
+
+class CatalogoParadas:
+    """Catálogo de paradas com o índice espacial construído sob demanda."""
+
+    def __init__(self, df, tamanho_celula_m=TAMANHO_CELULA_M):
+        self.df = df.reset_index(drop=True)
+        self._tamanho_celula_m = tamanho_celula_m
+        self._indice = None
+
+    def __len__(self):
+        return len(self.df)
+
+    @property
+    def indice(self):
+        if self._indice is None:
+            self._indice = IndiceParadas(self.df["latitude"], self.df["longitude"], self._tamanho_celula_m)
+        return self._indice
+
+    def mais_proximas(self, latitude, longitude, k=1):
+        """(ids (n, k), distancias_m (n, k)) das k paradas mais próximas; id -1 se não houver."""
+        distancias, indices = self.indice.vizinhos(latitude, longitude, k)
+        ids = np.where(indices >= 0, self.df["id_parada"].to_numpy()[np.maximum(indices, 0)], -1)
+        return ids, distancias
+
+    def no_raio(self, latitude, longitude, raio_m):
+        """DataFrame (i_ponto, id_parada, distancia_m) com todas as paradas a até `raio_m` de cada ponto."""
+        p, s, d = self.indice.no_raio(latitude, longitude, raio_m)
+        return pd.DataFrame({"i_ponto": p, "id_parada": self.df["id_parada"].to_numpy()[s], "distancia_m": d})
+
+    def encaixar(self, latitude, longitude, raio_m):
+        """Parada mais próxima de cada ponto, se a até `raio_m`: DataFrame id_parada (Int64), distancia_m."""
+        ids, distancias = self.mais_proximas(latitude, longitude, k=1)
+        perto = distancias[:, 0] <= raio_m
+        return pd.DataFrame(
+            {
+                "id_parada": pd.Series(ids[:, 0], dtype="Int64").where(perto),
+                "distancia_m": np.where(perto, distancias[:, 0], np.nan),
+            }
+        )
+
+
+def carregar_catalogo_paradas(caminho=None):
+    """Retorna o catálogo de paradas, carregado uma vez por processo e por versão do Parquet.
+
+    Raises:
+        FileNotFoundError: se o catálogo ainda não foi construído (`python -m src.catalogo_paradas`).
+    """
+    caminho = caminho or PARADAS_PARQUET_PATH
+    if not os.path.exists(caminho):
+        raise FileNotFoundError(f"Catálogo de paradas não encontrado em: {caminho}")
+
+    mtime = os.path.getmtime(caminho)
+    em_memoria = _CACHE.get(caminho)
+    if em_memoria and em_memoria[0] == mtime:
+        return em_memoria[1]
+
+    catalogo = CatalogoParadas(pd.read_parquet(caminho))
+    _CACHE[caminho] = (mtime, catalogo)
+    return catalogo
+
+
+def construir_catalogo(gtfs_path=None, session=None, codigos_linha=None, incluir_coleta=True, caminho=None):
+    """Lê as fontes disponíveis, combina por prioridade e grava o Parquet; retorna o catálogo."""
+    gtfs_path = gtfs_path or GTFS_STOPS_PATH
+    fontes = []
+    if os.path.exists(gtfs_path):
+        fontes.append(ler_stops_gtfs(gtfs_path))
+        logger.info(f"GTFS: {len(fontes[-1])} paradas de {gtfs_path}.")
+    if session is not None and codigos_linha:
+        fontes.append(buscar_paradas_api(session, codigos_linha))
+        logger.info(f"API: {len(fontes[-1])} paradas de {len(codigos_linha)} linha(s).")
+    if incluir_coleta:
+        fontes.append(paradas_da_coleta())
+        logger.info(f"Coleta: {len(fontes[-1])} paradas da tabela 'paradas'.")
+
+    paradas = combinar(*fontes)
+    gravar_catalogo(paradas, caminho)
+    logger.info(f"Catálogo de paradas gravado em {caminho or PARADAS_PARQUET_PATH}: {len(paradas)} paradas.")
+    return paradas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Constrói o catálogo de paradas (GTFS, API e coleta) em Parquet")
+    parser.add_argument("--gtfs", help=f"stops.txt do GTFS (padrão: {GTFS_STOPS_PATH}, se existir).")
+    parser.add_argument("--api", action="store_true", help="Consulta a API para as LINHAS_ALVO do config.")
+    parser.add_argument("--sem-coleta", action="store_true", help="Ignora a tabela 'paradas' do banco.")
+    parser.add_argument("--saida", help=f"Parquet de saída (padrão: {PARADAS_PARQUET_PATH}).")
+    args = parser.parse_args()
+
+    session = codigos = None
+    if args.api:
+        from src import coleta_previsoes
+
+        config = coleta_previsoes.get_config()
+        session = requests.Session()
+        if not coleta_previsoes.autenticar(coleta_previsoes.get_token(config), session):
+            logger.error("Falha na autenticação; catálogo montado sem a API.")
+            session = None
+        codigos = coleta_previsoes.get_linhas_alvo(config)
+
+    construir_catalogo(args.gtfs, session, codigos, incluir_coleta=not args.sem_coleta, caminho=args.saida)
+
+
+if __name__ == "__main__":
+    main()
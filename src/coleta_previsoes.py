@@ -7,10 +7,16 @@ from datetime import datetime
 
 import requests
 
+from src import arquivo_bruto, metricas
+from src.catalogo_linhas import CATALOGO_LINHAS_PATH, carregar_catalogo
+from src.contracts import PrevisaoBronze, validar_colunas
 from src.database import (
     get_connection,
-    insert_sql,
+    inserir_lote,
+    registrar_lote,
+    registrar_paradas,
 )
+from src.rastreamento import span
 
 # --- Configuração de Logging (stdout para Docker) ---
 logging.basicConfig(
@@ -20,9 +26,11 @@ logging.basicConfig(
 )
 
 # --- Configuração do Projeto ---
-BASE_URL = "http://api.olhovivo.sptrans.com.br/v2.1"
+# SPTRANS_BASE_URL aponta os coletores para outro servidor (ex: src/simulador_olhovivo.py)
+BASE_URL = os.environ.get("SPTRANS_BASE_URL", "http://api.olhovivo.sptrans.com.br/v2.1")
 CONFIG_FILE = os.path.join("config", "config.ini")
 INTERVALO_COLETA_SEGUNDOS = 300  # 5 minutos
+COLUNAS = ["timestamp_coleta", "id_linha", "id_onibus", "id_parada", "horario_previsao"]
 
 
 # --- Funções de Configuração ---
@@ -46,10 +54,23 @@ def get_linhas_alvo(config):
         linhas_str = config["COLETA"]["LINHAS_ALVO"]
         linhas = [int(x.strip()) for x in linhas_str.split(",")]
         logging.info(f"Linhas alvo carregadas da configuração: {linhas}")
-        return linhas
     except (KeyError, ValueError) as e:
         logging.error(f"Erro ao ler ou processar as linhas alvo do config.ini: {e}")
         return []
+    _conferir_linhas_no_catalogo(linhas)
+    return linhas
+
+
+def _conferir_linhas_no_catalogo(linhas):
+    """Avisa sobre ids de linha ausentes no catálogo (o catálogo é opcional para previsões)."""
+    try:
+        catalogo = carregar_catalogo()
+    except FileNotFoundError:
+        return
+    letreiros = catalogo.letreiro_por_id(linhas)
+    desconhecidas = [linha for linha, letreiro in zip(linhas, letreiros) if not isinstance(letreiro, str)]
+    if desconhecidas:
+        logging.warning(f"Linhas alvo ausentes do catálogo {CATALOGO_LINHAS_PATH}: {desconhecidas}")
 
 
 # --- Funções da API ---
@@ -64,71 +85,131 @@ def autenticar(token, session):
         return False
 
 
-def coletar_previsao_linha(session, codigo_linha):
+def coletar_previsao_linha(session, codigo_linha, timestamp_coleta=None):
+    """GET /Previsao/Linha decodificado. Com `timestamp_coleta`, arquiva o corpo bruto (src/arquivo_bruto.py)."""
     url = f"{BASE_URL}/Previsao/Linha?codigoLinha={codigo_linha}"
     try:
-        resp = session.get(url, timeout=30)
+        with span("previsoes.api", linha=codigo_linha), metricas.API_LATENCIA.medir(endpoint="/Previsao/Linha"):
+            resp = session.get(url, timeout=30)
         resp.raise_for_status()
-        return resp.json()
+        metricas.API_BYTES.observar(len(resp.content), endpoint="/Previsao/Linha")
+        if timestamp_coleta is not None:
+            arquivo_bruto.arquivar_sem_falhar(
+                "/Previsao/Linha", resp.content, timestamp_coleta, {"codigoLinha": codigo_linha}
+            )
+        with span("previsoes.json_decode", linha=codigo_linha):
+            return resp.json()
     except requests.exceptions.RequestException as e:
+        metricas.API_ERROS.inc(endpoint="/Previsao/Linha")
         logging.error(f"Erro de conexão ao coletar previsões para a linha {codigo_linha}: {e}")
         return None
     except json.JSONDecodeError:
+        metricas.API_ERROS.inc(endpoint="/Previsao/Linha")
         logging.error(f"Erro ao decodificar a resposta JSON da API para a linha {codigo_linha}.")
         return None
 
 
+def _registrar_lote_sem_gravacao(timestamp_coleta, esperados=0):
+    """Batimento de um ciclo que não gravou nada (o monitor o trata como lote vazio)."""
+    try:
+        with get_connection() as conn:
+            registrar_lote(conn, "previsoes", timestamp_coleta, esperados, 0)
+    except Exception as e:
+        logging.error(f"Não foi possível registrar o batimento do ciclo de previsões: {e}")
+
+
+def registros_previsao(dados, linha_id, timestamp_coleta):
+    """Achata um payload de /Previsao/Linha em registros no formato de `previsoes`."""
+    registros = []
+    for ponto in dados["ps"]:
+        id_parada = ponto.get("cp")
+        for veiculo in ponto.get("vs", []):
+            registros.append(
+                (
+                    timestamp_coleta,
+                    linha_id,
+                    veiculo.get("p"),
+                    id_parada,
+                    veiculo.get("t"),
+                )
+            )
+    return registros
+
+
+def paradas_previsao(dados):
+    """Paradas do payload de /Previsao/Linha com coordenadas: [(id_parada, nome, latitude, longitude)]."""
+    paradas = []
+    for ponto in dados["ps"]:
+        if ponto.get("cp") is None or ponto.get("py") is None or ponto.get("px") is None:
+            continue
+        paradas.append((ponto["cp"], ponto.get("np"), ponto["py"], ponto["px"]))
+    return paradas
+
+
+def validar_registros(registros):
+    """Contrato Bronze aplicado em lote (vetorizado) antes do INSERT; devolve só os válidos."""
+    with span("previsoes.contrato"):
+        validacao = validar_colunas(PrevisaoBronze, registros, colunas=COLUNAS)
+    if validacao.n_rejeitados:
+        logging.warning(
+            f"{validacao.n_rejeitados} registros de previsão rejeitados pelo contrato: {validacao.resumo()}"
+        )
+        registros = validacao.filtrar(registros)
+    return registros
+
+
 # --- Job de Coleta e Armazenamento no Banco de Dados ---
 def job(session, linhas_alvo):
-    """Coleta dados para as linhas alvo e os insere no banco de dados SQLite."""
+    """Coleta dados para as linhas alvo e os insere no banco de dados SQLite.
+
+    Retorna o número de registros efetivamente inseridos (None se o ciclo não chegou a gravar).
+    """
+    with span("previsoes.ciclo", perfil=True), metricas.CICLO.medir(coletor="previsoes"):
+        return _ciclo(session, linhas_alvo)
+
+
+def _ciclo(session, linhas_alvo):
     if not linhas_alvo:
         logging.warning("Nenhuma linha alvo configurada. Pulando ciclo de coleta.")
         return
 
     timestamp_coleta = datetime.now()
     registros_para_salvar = []
+    paradas = {}
 
     for linha_id in linhas_alvo:
         logging.info(f"Coletando previsões para a linha: {linha_id}")
-        dados = coletar_previsao_linha(session, linha_id)
+        dados = coletar_previsao_linha(session, linha_id, timestamp_coleta)
         if not dados or not dados.get("ps"):
             logging.warning(f"Nenhum dado de previsão foi coletado para a linha {linha_id}.")
             continue
 
         # Processa os dados para inserção no banco
-        for ponto in dados["ps"]:
-            id_parada = ponto.get("cp")
-            for veiculo in ponto.get("vs", []):
-                registros_para_salvar.append(
-                    (
-                        timestamp_coleta,
-                        linha_id,
-                        veiculo.get("p"),
-                        id_parada,
-                        veiculo.get("t"),
-                    )
-                )
+        registros_para_salvar.extend(registros_previsao(dados, linha_id, timestamp_coleta))
+        paradas.update((parada[0], parada) for parada in paradas_previsao(dados))
+
+    esperados = len(registros_para_salvar)
+    registros_para_salvar = validar_registros(registros_para_salvar)
 
     if not registros_para_salvar:
         logging.warning("Nenhum registro de previsão para salvar no banco de dados neste ciclo.")
+        _registrar_lote_sem_gravacao(timestamp_coleta, esperados)
         return
 
     # Conecta ao banco e insere os dados
-    columns = [
-        "timestamp_coleta",
-        "id_linha",
-        "id_onibus",
-        "id_parada",
-        "horario_previsao",
-    ]
-    sql = insert_sql("previsoes", columns)
     try:
         with get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.executemany(sql, registros_para_salvar)
-        logging.info(f"{len(registros_para_salvar)} novos registros de previsão foram salvos no banco de dados.")
+            registrar_paradas(conn, list(paradas.values()))
+            inseridos = inserir_lote(conn, "previsoes", COLUNAS, registros_para_salvar)
+            registrar_lote(conn, "previsoes", timestamp_coleta, esperados, inseridos)
     except Exception as e:
         logging.error(f"Ocorreu um erro ao salvar os dados: {e}")
+        return None
+    duplicados = len(registros_para_salvar) - inseridos
+    logging.info(
+        f"{inseridos} novos registros de previsão foram salvos no banco de dados ({duplicados} duplicados ignorados)."
+    )
+    return inseridos
 
 
 # --- Execução Principal ---
@@ -143,6 +224,7 @@ def main():
         return
 
     session = requests.Session()
+    metricas.iniciar_servidor()
 
     while True:
         if not autenticar(token, session):
@@ -6,14 +6,18 @@ import time
 from datetime import datetime
 from datetime import time as time_obj
 
-import pandas as pd
 import requests
 import schedule
 
+from src import arquivo_bruto, metricas
+from src.catalogo_linhas import carregar_catalogo
+from src.contracts import PosicaoBronze, validar_colunas
 from src.database import (
     get_connection,
-    insert_sql,
+    inserir_lote,
+    registrar_lote,
 )
+from src.rastreamento import span
 
 # --- Configuração de Logging (stdout para Docker) ---
 logging.basicConfig(
@@ -23,9 +27,10 @@ logging.basicConfig(
 )
 
 # --- Configuração do Projeto ---
-BASE_URL = "http://api.olhovivo.sptrans.com.br/v2.1"
+# SPTRANS_BASE_URL aponta os coletores para outro servidor (ex: src/simulador_olhovivo.py)
+BASE_URL = os.environ.get("SPTRANS_BASE_URL", "http://api.olhovivo.sptrans.com.br/v2.1")
 CONFIG_FILE = os.path.join("config", "config.ini")
-CATALOGO_LINHAS_PATH = os.path.join("data", "todas_as_linhas.csv")
+COLUNAS = ["timestamp_coleta", "id_onibus", "letreiro_linha", "latitude", "longitude", "timestamp_posicao"]
 
 
 # --- Funções de Configuração e API ---
@@ -55,15 +60,9 @@ def get_linhas_alvo_ids(config):
 
 def get_letreiros_alvo(linhas_alvo_ids):
     """Cria um conjunto de letreiros de linha formatados (ex: '8000-10') para filtragem."""
-    if not os.path.exists(CATALOGO_LINHAS_PATH):
-        raise FileNotFoundError(f"Catálogo de linhas não encontrado em: {CATALOGO_LINHAS_PATH}")
-
-    df_linhas = pd.read_csv(CATALOGO_LINHAS_PATH)
-    # Filtra o DataFrame para manter apenas as linhas cujos IDs estão na nossa lista alvo
-    df_filtrado = df_linhas[df_linhas["id_linha"].isin(linhas_alvo_ids)]
-
-    # Cria o letreiro no formato 'lt-tl' e o retorna como um conjunto (set) para buscas rápidas
-    letreiros_set = set(df_filtrado["letreiro_numerico"].astype(str) + "-" + df_filtrado["tipo_letreiro"].astype(str))
+    # O catálogo é carregado uma vez por processo (cache Parquet ao lado do CSV)
+    catalogo = carregar_catalogo()
+    letreiros_set = catalogo.letreiros_de(linhas_alvo_ids)
     logging.info(f"{len(letreiros_set)} letreiros de linha alvo carregados para filtragem.")
     return letreiros_set
 
@@ -79,23 +78,99 @@ def autenticar(token, session):
         return False
 
 
-def coletar_posicoes(session):
+def coletar_posicoes(session, timestamp_coleta=None):
+    """GET /Posicao decodificado. Com `timestamp_coleta`, arquiva o corpo bruto (src/arquivo_bruto.py)."""
     url = f"{BASE_URL}/Posicao"
     try:
-        resp = session.get(url, timeout=45)
+        with span("posicoes.api"), metricas.API_LATENCIA.medir(endpoint="/Posicao"):
+            resp = session.get(url, timeout=45)
         resp.raise_for_status()
-        return resp.json()
+        metricas.API_BYTES.observar(len(resp.content), endpoint="/Posicao")
+        if timestamp_coleta is not None:
+            arquivo_bruto.arquivar_sem_falhar("/Posicao", resp.content, timestamp_coleta)
+        with span("posicoes.json_decode", bytes=len(resp.content)):
+            return resp.json()
     except requests.exceptions.RequestException as e:
+        metricas.API_ERROS.inc(endpoint="/Posicao")
         logging.error(f"Erro de conexão ao coletar posições: {e}")
         return None
     except json.JSONDecodeError:
+        metricas.API_ERROS.inc(endpoint="/Posicao")
         logging.error("Erro ao decodificar a resposta JSON da API de posições.")
         return None
 
 
+def _registrar_lote_sem_gravacao(timestamp_coleta, esperados=0):
+    """Batimento de um ciclo que não gravou nada (o monitor o trata como lote vazio)."""
+    try:
+        with get_connection() as conn:
+            registrar_lote(conn, "posicoes", timestamp_coleta, esperados, 0)
+    except Exception as e:
+        logging.error(f"Não foi possível registrar o batimento do ciclo de posições: {e}")
+
+
+def filtrar_posicoes(dados, letreiros_alvo, timestamp_coleta):
+    """Mantém só os veículos das linhas alvo do payload de /Posicao.
+
+    Retorna (registros no formato de `posicoes`, total de veículos na resposta).
+    """
+    registros = []
+    total_veiculos_api = 0
+    for linha in dados["l"]:
+        letreiro_linha = linha.get("c")
+        total_veiculos_api += len(linha.get("vs", []))
+        # Verifica se o letreiro da linha está na nossa lista de interesse
+        if letreiro_linha in letreiros_alvo:
+            for veiculo in linha.get("vs", []):
+                registros.append(
+                    (
+                        timestamp_coleta,
+                        veiculo.get("p"),
+                        letreiro_linha,
+                        veiculo.get("py"),
+                        veiculo.get("px"),
+                        veiculo.get("ta"),
+                    )
+                )
+    return registros, total_veiculos_api
+
+
+def preparar_registros(dados, letreiros_alvo, timestamp_coleta):
+    """Filtro de linhas alvo + contrato Bronze sobre um payload de /Posicao.
+
+    Usado pelo ciclo de coleta e pelo reprocessamento do arquivo bruto (src/reprocessar_bruto.py).
+    Retorna (registros válidos, esperados = veículos mantidos pelo filtro).
+    """
+    with span("posicoes.filtro", linhas=len(dados["l"])):
+        registros, total_veiculos_api = filtrar_posicoes(dados, letreiros_alvo, timestamp_coleta)
+
+    esperados = len(registros)
+    metricas.VEICULOS_VISTOS.inc(total_veiculos_api, coletor="posicoes")
+    metricas.VEICULOS_MANTIDOS.inc(esperados, coletor="posicoes")
+    logging.info(f"API retornou {total_veiculos_api} veículos. Após o filtro, {esperados} serão salvos.")
+
+    # Contrato Bronze aplicado em lote (vetorizado) antes do INSERT
+    with span("posicoes.contrato"):
+        validacao = validar_colunas(PosicaoBronze, registros, colunas=COLUNAS)
+    if validacao.n_rejeitados:
+        logging.warning(
+            f"{validacao.n_rejeitados} registros de POSIÇÃO rejeitados pelo contrato: {validacao.resumo()}"
+        )
+        registros = validacao.filtrar(registros)
+    return registros, esperados
+
+
 # --- Job de Coleta com Filtro Inteligente ---
 def job(letreiros_alvo):
-    """Coleta os dados de posição, filtra pelas linhas de interesse e insere no banco."""
+    """Coleta os dados de posição, filtra pelas linhas de interesse e insere no banco.
+
+    Retorna o número de registros efetivamente inseridos (None se o ciclo não chegou a gravar).
+    """
+    with span("posicoes.ciclo", perfil=True), metricas.CICLO.medir(coletor="posicoes"):
+        return _ciclo(letreiros_alvo)
+
+
+def _ciclo(letreiros_alvo):
     horario_inicio = time_obj(5, 0)
     horario_fim = time_obj(23, 0)
     agora = datetime.now().time()
@@ -116,58 +191,37 @@ def job(letreiros_alvo):
     session = requests.Session()
     if not autenticar(token, session):
         logging.error("Não foi possível autenticar na API. Abortando ciclo.")
+        _registrar_lote_sem_gravacao(datetime.now())
         return
 
-    dados = coletar_posicoes(session)
+    # O mesmo instante identifica o snapshot no arquivo bruto e no Bronze (o replay reproduz a chave de dedup)
+    timestamp_coleta = datetime.now()
+    dados = coletar_posicoes(session, timestamp_coleta)
     if not dados or not dados.get("l"):
         logging.warning("Nenhum dado de posição foi coletado neste ciclo.")
+        _registrar_lote_sem_gravacao(timestamp_coleta)
         return
 
-    timestamp_coleta = datetime.now()
-    registros_para_salvar = []
-    total_veiculos_api = 0
     # O FILTRO INTELIGENTE ACONTECE AQUI!
-    for linha in dados["l"]:
-        letreiro_linha = linha.get("c")
-        total_veiculos_api += len(linha.get("vs", []))
-        # Verifica se o letreiro da linha está na nossa lista de interesse
-        if letreiro_linha in letreiros_alvo:
-            for veiculo in linha.get("vs", []):
-                registros_para_salvar.append(
-                    (
-                        timestamp_coleta,
-                        veiculo.get("p"),
-                        letreiro_linha,
-                        veiculo.get("py"),
-                        veiculo.get("px"),
-                        veiculo.get("ta"),
-                    )
-                )
-
-    logging.info(
-        f"API retornou {total_veiculos_api} veículos. Após o filtro, {len(registros_para_salvar)} serão salvos."
-    )
+    registros_para_salvar, esperados = preparar_registros(dados, letreiros_alvo, timestamp_coleta)
 
     if not registros_para_salvar:
         logging.warning("Nenhum registro de posição para as linhas alvo. Nada a salvar.")
+        _registrar_lote_sem_gravacao(timestamp_coleta, esperados)
         return
 
-    columns = [
-        "timestamp_coleta",
-        "id_onibus",
-        "letreiro_linha",
-        "latitude",
-        "longitude",
-        "timestamp_posicao",
-    ]
-    sql = insert_sql("posicoes", columns)
     try:
         with get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.executemany(sql, registros_para_salvar)
-        logging.info(f"{len(registros_para_salvar)} novos registros de POSIÇÃO foram salvos no banco de dados.")
+            inseridos = inserir_lote(conn, "posicoes", COLUNAS, registros_para_salvar)
+            registrar_lote(conn, "posicoes", timestamp_coleta, esperados, inseridos)
     except Exception as e:
         logging.error(f"Ocorreu um erro ao salvar os dados de posição: {e}")
+        return None
+    duplicados = len(registros_para_salvar) - inseridos
+    logging.info(
+        f"{inseridos} novos registros de POSIÇÃO foram salvos no banco de dados ({duplicados} duplicados ignorados)."
+    )
+    return inseridos
 
 
 # --- Execução Principal ---
@@ -182,6 +236,8 @@ def main():
         logging.error(f"Erro fatal ao carregar a configuração do filtro: {e}")
         return
 
+    metricas.iniciar_servidor()
+
     # Passamos a usar uma função lambda para que o schedule possa chamar o job com o argumento necessário
     schedule.every(30).minutes.do(lambda: job(letreiros_alvo))
     logging.info("Coleta de posições agendada para verificação a cada 30 minutos.")
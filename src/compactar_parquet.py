@@ -13,10 +13,25 @@ Dependências: duckdb, pyarrow (pip install duckdb pyarrow)
 """
 
 import argparse
+import fcntl
+import json
 import logging
 import os
+import sqlite3
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
 
 import duckdb
+import pandas as pd
+import pyarrow as pa
+
+from src import metricas
+from src.contracts import PosicaoSilver, PrevisaoSilver, validar_colunas
+from src.database import ESCALA_COORDENADA, fonte_coleta
+from src.expurgar_sqlite import limites_do_dia
+from src.rastreamento import rastrear
 
 logging.basicConfig(
     level=logging.INFO,
@@ -25,12 +40,227 @@ logging.basicConfig(
 
 DB_PATH = os.path.join("data", "sptrans_data.db")
 PARQUET_DIR = os.path.join("data", "parquet")
+LINHAS_POR_LOTE_VALIDACAO = 500_000
+MANIFESTO = "_manifest.json"
+
+# Colunas que entram no checksum de conteúdo de cada partição (chave natural + valores)
+COLUNAS_CHECKSUM = {
+    "posicoes": ["timestamp_coleta", "id_onibus", "letreiro_linha", "latitude", "longitude"],
+    "previsoes": ["timestamp_coleta", "id_linha", "id_onibus", "id_parada", "horario_previsao"],
+}
+
+# Schema compacto de posições (src/database.py) decodificado no DuckDB, com os tipos do export de `posicoes`
+SQL_POSICOES_COMPACTAS = """(
+    SELECT
+        CAST(NULL AS BIGINT) AS id,
+        make_timestamp(p.ts_coleta * 1000000) AS timestamp_coleta,
+        p.id_onibus AS id_onibus,
+        l.letreiro_linha AS letreiro_linha,
+        CAST(p.lat_e6 AS DOUBLE) / {escala} AS latitude,
+        CAST(p.lon_e6 AS DOUBLE) / {escala} AS longitude,
+        make_timestamp(p.ts_posicao * 1000000) AS timestamp_posicao
+    FROM sqlite_scan('{db}', 'posicoes_compactas') p
+    LEFT JOIN sqlite_scan('{db}', 'linhas') l ON l.id_letreiro = p.id_letreiro
+)"""
+
+
+def _posicoes_compactas(db_path):
+    """True se `posicoes` é a view do schema compacto no SQLite em `db_path`."""
+    try:
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    except sqlite3.OperationalError:
+        return False  # banco ausente: o sqlite_scan reporta o erro
+    try:
+        cursor = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'view' AND name = 'posicoes'")
+        return cursor.fetchone() is not None
+    finally:
+        conn.close()
+
+
+def fonte_sqlite(tabela, db_path=None):
+    """Relação DuckDB com a tabela lógica do Bronze (decodifica `posicoes` no schema compacto)."""
+    db_path = db_path or DB_PATH
+    if tabela == "posicoes" and _posicoes_compactas(db_path):
+        return SQL_POSICOES_COMPACTAS.format(db=db_path, escala=float(ESCALA_COORDENADA))
+    return f"sqlite_scan('{db_path}', '{tabela}')"
+
+
+def _validar_export(con, tabela):
+    """Aplica o contrato Silver sobre `__temp_export` em lotes Arrow; retorna a contagem de rejeitados por motivo.
+
+    Só registra (alarme): Silver continua espelhando Bronze para a reconciliação.
+    """
+    modelo = {"posicoes": PosicaoSilver, "previsoes": PrevisaoSilver}.get(tabela)
+    if modelo is None:
+        return {}
+    motivos = Counter()
+    sql = "SELECT * REPLACE (strftime(dt, '%Y-%m-%d') AS dt) FROM __temp_export"
+    leitor = con.execute(sql).to_arrow_reader(LINHAS_POR_LOTE_VALIDACAO)
+    for lote in leitor:
+        motivos.update(validar_colunas(modelo, lote).resumo())
+    if motivos:
+        logging.warning(f"  → Contrato {modelo.__name__}: rejeitados por motivo {dict(motivos)}")
+    return dict(motivos)
+
+
+def ler_manifesto(destino):
+    """Manifesto da tabela Silver: {"particoes": {dt: {"linhas": n, "arquivos": k, ...}}} (vazio se ausente)."""
+    caminho = os.path.join(destino, MANIFESTO)
+    if not os.path.exists(caminho):
+        return {"particoes": {}}
+    with open(caminho, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def contar_por_rodape(con, destino, dts=None):
+    """Contagem de linhas por dt lida só dos rodapés Parquet (sem ler os dados)."""
+    padroes = [f"{destino}/dt={dt}/*.parquet" for dt in dts] if dts else [f"{destino}/dt=*/*.parquet"]
+    contagens = {}
+    for padrao in padroes:
+        try:
+            linhas = con.execute("SELECT file_name, num_rows FROM parquet_file_metadata(?)", [padrao]).fetchall()
+        except duckdb.IOException:
+            continue  # partição sem arquivos
+        for arquivo, num_rows in linhas:
+            dt = os.path.basename(os.path.dirname(arquivo)).removeprefix("dt=")
+            linhas_dt, arquivos_dt = contagens.get(dt, (0, 0))
+            contagens[dt] = (linhas_dt + num_rows, arquivos_dt + 1)
+    return contagens
+
+
+def _expr_checksum(colunas):
+    """Soma (mod 2^64) dos hashes de 64 bits das colunas de cada linha: independe da ordem das linhas."""
+    return f"CAST(sum(CAST(hash({', '.join(colunas)}) AS HUGEINT)) % 18446744073709551616 AS UBIGINT)"
+
+
+def checksum_parquet(con, destino, dt, colunas):
+    """Checksum de conteúdo da partição Silver dt=YYYY-MM-DD (lê só as colunas do checksum)."""
+    row = con.execute(f"SELECT {_expr_checksum(colunas)} FROM read_parquet('{destino}/dt={dt}/*.parquet')").fetchone()
+    return f"{row[0] or 0:016x}"
+
+
+def checksum_sqlite(con, tabela, dia, colunas, db_path=None):
+    """Checksum de conteúdo do dia no Bronze, com os mesmos tipos do export.
+
+    O sqlite_scan do DuckDB não empurra filtros para o SQLite (leria o Bronze inteiro);
+    então o intervalo do dia é lido no próprio SQLite, pelo índice de `timestamp_coleta`
+    (`ts_coleta` no schema compacto), e o DuckDB só tipa e soma os hashes desses lotes.
+    """
+    db_path = db_path or DB_PATH
+    descricao = con.execute(f"DESCRIBE SELECT {', '.join(colunas)} FROM {fonte_sqlite(tabela, db_path)}").fetchall()
+    tipados = ", ".join(f"CAST({nome} AS {tipo}) AS {nome}" for nome, tipo, *_ in descricao)
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        fonte = fonte_coleta(conn, tabela)
+        cursor = conn.execute(
+            f"SELECT {', '.join(colunas)} FROM ({fonte.select} WHERE {fonte.coluna} >= ? AND {fonte.coluna} < ?)",
+            tuple(fonte.parametro(limite) for limite in limites_do_dia(dia)),
+        )
+        soma = 0
+        while linhas := cursor.fetchmany(LINHAS_POR_LOTE_VALIDACAO):
+            lote = pa.table({nome: pa.array(valores) for nome, valores in zip(colunas, zip(*linhas))})
+            con.register("__checksum_lote", lote)
+            try:
+                row = con.execute(f"SELECT {_expr_checksum(colunas)} FROM (SELECT {tipados} FROM __checksum_lote)")
+                soma = (soma + (row.fetchone()[0] or 0)) % 2**64  # a soma dos hashes é mod 2^64
+            finally:
+                con.unregister("__checksum_lote")
+    finally:
+        conn.close()
+    return f"{soma:016x}"
 
 
+def atualizar_manifesto(con, destino, dts=None):
+    """Atualiza o manifesto com as partições `dts` (ou todas, se o manifesto ainda não existir).
+
+    A gravação é atômica (arquivo temporário + os.replace), então leitores nunca
+    veem um manifesto pela metade; o lock serializa backfills paralelos que
+    atualizam partições diferentes da mesma tabela.
+    """
+    with open(os.path.join(destino, MANIFESTO + ".lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        return _regravar_manifesto(con, destino, dts)
+
+
+def _regravar_manifesto(con, destino, dts):
+    manifesto = ler_manifesto(destino)
+    if not manifesto["particoes"]:
+        dts = None  # primeiro manifesto: varre os rodapés de todas as partições
+    agora = datetime.now().isoformat(timespec="seconds")
+    colunas = COLUNAS_CHECKSUM.get(os.path.basename(os.path.normpath(destino)))
+    for dt, (linhas, arquivos) in contar_por_rodape(con, destino, dts).items():
+        manifesto["particoes"][dt] = {"linhas": linhas, "arquivos": arquivos, "atualizado_em": agora}
+        if colunas:
+            manifesto["particoes"][dt]["checksum"] = checksum_parquet(con, destino, dt, colunas)
+    manifesto["particoes"] = dict(sorted(manifesto["particoes"].items()))
+    manifesto["total_linhas"] = sum(p["linhas"] for p in manifesto["particoes"].values())
+
+    tmp_path = os.path.join(destino, MANIFESTO + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifesto, f, indent=2)
+    os.replace(tmp_path, os.path.join(destino, MANIFESTO))
+    return manifesto
+
+
+def ler_particao(parquet_dir, tabela, dia, colunas):
+    """Colunas da partição `tabela`/dt=`dia` sob `parquet_dir`; None se a partição não existe."""
+    origem = os.path.join(parquet_dir, tabela, f"dt={dia}")
+    if not os.path.isdir(origem):
+        return None
+    con = duckdb.connect()
+    try:
+        return con.execute(f"SELECT {', '.join(colunas)} FROM read_parquet('{origem}/*.parquet')").fetchdf()
+    finally:
+        con.close()
+
+
+def particao_vazia(tipos):
+    """DataFrame sem linhas com o schema `tipos` ({coluna: dtype}), para publicar um dia sem dados."""
+    return pd.DataFrame({coluna: pd.Series(dtype=tipo) for coluna, tipo in tipos.items()})
+
+
+def publicar_particao(df, destino, dia, arquivo):
+    """Grava `destino`/dt=`dia`/`arquivo` de forma atômica (tmp + os.replace)."""
+    particao = os.path.join(destino, f"dt={dia}")
+    os.makedirs(particao, exist_ok=True)
+    tmp_path = os.path.join(particao, f".{arquivo}.tmp")
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, os.path.join(particao, arquivo))
+
+
+def processar_particoes(fn, dias, destino, processos=None):
+    """Roda `fn(dia)` em paralelo (um dia por tarefa) e atualiza o manifesto; retorna {dia: fn(dia)}.
+
+    `destino` é o diretório da tabela que `fn` publica, ou uma lista deles quando publica
+    mais de uma. `fn` vai para outro processo: função de módulo ou functools.partial dela.
+    `processos=1` roda sem pool.
+    """
+    resultado = {}
+    if processos == 1 or len(dias) <= 1:
+        for dia in dias:
+            resultado[dia] = fn(dia)
+    else:
+        with ProcessPoolExecutor(max_workers=processos) as pool:
+            tarefas = {pool.submit(fn, dia): dia for dia in dias}
+            for tarefa in as_completed(tarefas):
+                resultado[tarefas[tarefa]] = tarefa.result()
+
+    if dias:
+        con = duckdb.connect()
+        try:
+            for tabela in [destino] if isinstance(destino, str) else destino:
+                atualizar_manifesto(con, tabela, list(dias))
+        finally:
+            con.close()
+    return dict(sorted(resultado.items()))
+
+
+@rastrear("compactacao.exportar_tabela", perfil=True)
 def exportar_tabela(con, tabela, filtro_data=None):
     """Exporta tabela do SQLite para Parquet particionado por dt."""
     destino = os.path.join(PARQUET_DIR, tabela)
     os.makedirs(destino, exist_ok=True)
+    inicio = time.perf_counter()
 
     # Cria tabela temporária no DuckDB com a partição dt
     if filtro_data:
@@ -38,7 +268,7 @@ def exportar_tabela(con, tabela, filtro_data=None):
         con.execute(f"""
             CREATE OR REPLACE TABLE __temp_export AS
             SELECT *, CAST(timestamp_coleta AS DATE) AS dt
-            FROM sqlite_scan('{DB_PATH}', '{tabela}')
+            FROM {fonte_sqlite(tabela)}
             WHERE CAST(timestamp_coleta AS DATE) = '{filtro_data}'
         """)
     else:
@@ -46,7 +276,7 @@ def exportar_tabela(con, tabela, filtro_data=None):
         con.execute(f"""
             CREATE OR REPLACE TABLE __temp_export AS
             SELECT *, CAST(timestamp_coleta AS DATE) AS dt
-            FROM sqlite_scan('{DB_PATH}', '{tabela}')
+            FROM {fonte_sqlite(tabela)}
         """)
 
     rows = con.execute("SELECT count(*) FROM __temp_export").fetchone()[0]
@@ -54,6 +284,10 @@ def exportar_tabela(con, tabela, filtro_data=None):
         logging.info("  → Nenhum registro para exportar. Pulando.")
         return 0
 
+    _validar_export(con, tabela)
+
+    dts = [str(dt) for (dt,) in con.execute("SELECT DISTINCT dt FROM __temp_export").fetchall()]
+
     con.execute(f"""
         COPY __temp_export TO '{destino}'
         (FORMAT PARQUET, PARTITION_BY (dt), OVERWRITE_OR_IGNORE)
@@ -61,18 +295,17 @@ def exportar_tabela(con, tabela, filtro_data=None):
 
     con.execute("DROP TABLE IF EXISTS __temp_export")
 
-    # Verificação pós-escrita
-    count = con.execute(
-        f"SELECT count(*) FROM read_parquet('{destino}/**/*.parquet')"
-    ).fetchone()[0]
-    logging.info(f"  → {count} registros exportados para Parquet.")
+    # Verificação pós-escrita: rodapés das partições escritas → manifesto (sem reler os dados)
+    count = atualizar_manifesto(con, destino, dts)["total_linhas"]
+    duracao = time.perf_counter() - inicio
+    metricas.COMPACTACAO_SEGUNDOS.observar(duracao, tabela=tabela)
+    metricas.COMPACTACAO_TAXA.definir(rows / duracao if duracao > 0 else 0, tabela=tabela)
+    logging.info(f"  → {count} registros na tabela Parquet ({rows} exportados em {duracao:.1f}s).")
     return count
 
 
 def main():
-    parser = argparse.ArgumentParser(
-        description="Compacta SQLite → Parquet particionado (idempotente)"
-    )
+    parser = argparse.ArgumentParser(description="Compacta SQLite → Parquet particionado (idempotente)")
     parser.add_argument(
         "--date",
         help="Exportar apenas uma data específica (YYYY-MM-DD). Omite para exportar tudo.",
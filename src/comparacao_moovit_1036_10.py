@@ -2,8 +2,14 @@ import streamlit as st
 import pandas as pd
 import sqlite3
 import os
+import sys
 from datetime import datetime, timedelta
 
+# `streamlit run src/comparacao_moovit_1036_10.py` só coloca src/ no sys.path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from src.posicoes_atuais import posicoes_atuais  # noqa: E402
+
 # --- Configuração ---
 st.set_page_config(page_title="Comparação ETL vs Moovit", layout="wide")
 DB_PATH = os.path.join('data', 'sptrans_data.db')
@@ -14,10 +20,9 @@ def load_own_data(line="1036-10"):
         st.error(f"DB não encontrado: {DB_PATH}")
         return pd.DataFrame(), pd.DataFrame()
     try:
+        # Posições: a última de cada ônibus da linha (posicoes_atuais em memória, sem varrer o histórico)
+        df_pos = posicoes_atuais(letreiros=[line])[['timestamp_coleta', 'latitude', 'longitude', 'letreiro_linha']]
         conn = sqlite3.connect(DB_PATH)
-        # Posições
-        df_pos = pd.read_sql(f"SELECT timestamp_coleta, latitude, longitude, letreiro_linha FROM posicoes WHERE letreiro_linha = '{line}' ORDER BY timestamp_coleta DESC LIMIT 50;", conn)
-        df_pos['timestamp_coleta'] = pd.to_datetime(df_pos['timestamp_coleta'])
         # Previsões
         df_prev = pd.read_sql(f"SELECT timestamp_coleta, id_parada, horario_previsao FROM previsoes WHERE id_linha = 1036 ORDER BY timestamp_coleta DESC LIMIT 50;", conn)
         df_prev['timestamp_coleta'] = pd.to_datetime(df_prev['timestamp_coleta'])
@@ -10,11 +10,26 @@ Uso:
     erros = validar_lote(PosicaoBronze, lista_de_dicts)
     if erros:
         logger.warning("%s registros rejeitados por schema", len(erros))
+
+Validação em lote vetorizada (coluna a coluna, sem instanciar um model por
+linha) — rápida o bastante para rodar inline nos coletores e na compactação:
+
+    from src.contracts import PosicaoBronze, validar_colunas
+
+    resultado = validar_colunas(PosicaoBronze, registros, colunas=columns)
+    registros_validos = resultado.filtrar(registros)
+    logger.warning("Rejeitados por motivo: %s", resultado.resumo())
 """
 
+import types
+import typing
+from collections import Counter
 from datetime import datetime
 from typing import Any
 
+import annotated_types
+import numpy as np
+import pandas as pd
 from pydantic import BaseModel, Field
 
 # ─── Bronze (dado raw do SQLite, exatamente como chega da API) ───
@@ -107,3 +122,144 @@ def validar_lote(model_class: type[BaseModel], registros: list[dict[str, Any]])
         except Exception as exc:
             erros.append({"indice": i, "registro": rec, "erro": str(exc)})
     return erros
+
+
+# ─── Validação vetorizada ───
+
+
+class ResultadoValidacao:
+    """Resultado de `validar_colunas`: máscara de rejeição + códigos de motivo por linha.
+
+    Attributes:
+        rejeitados: np.ndarray[bool] — True para linhas que violam o contrato.
+        motivos: np.ndarray[object] — códigos separados por ";" (ex:
+            "latitude:le;id_onibus:gt"); string vazia para linhas válidas.
+    """
+
+    def __init__(self, rejeitados, motivos):
+        self.rejeitados = rejeitados
+        self.motivos = motivos
+
+    def __len__(self):
+        return len(self.rejeitados)
+
+    @property
+    def n_rejeitados(self) -> int:
+        return int(self.rejeitados.sum())
+
+    def filtrar(self, registros):
+        """Mantém apenas os registros válidos (lista, DataFrame ou pyarrow.Table)."""
+        if isinstance(registros, pd.DataFrame):
+            return registros[~self.rejeitados]
+        if hasattr(registros, "filter") and hasattr(registros, "num_rows"):
+            return registros.filter(~self.rejeitados)
+        return [r for r, rejeitado in zip(registros, self.rejeitados) if not rejeitado]
+
+    def resumo(self) -> dict[str, int]:
+        """Contagem de linhas por código de motivo."""
+        contagem: Counter = Counter()
+        for motivo in self.motivos[self.rejeitados]:
+            contagem.update(motivo.split(";"))
+        return dict(contagem)
+
+
+def _tipo_base(annotation):
+    """Extrai (tipo, opcional) de anotações como `int`, `str | None`, `Optional[datetime]`."""
+    if isinstance(annotation, types.UnionType) or typing.get_origin(annotation) is typing.Union:
+        args = [a for a in typing.get_args(annotation) if a is not type(None)]
+        return (args[0] if len(args) == 1 else object), True
+    return annotation, False
+
+
+def _como_colunas(dados, colunas=None) -> dict[str, pd.Series]:
+    """Normaliza DataFrame, pyarrow.Table/RecordBatch, dict de arrays ou lista de tuplas em colunas."""
+    if isinstance(dados, pd.DataFrame):
+        return {c: dados[c].reset_index(drop=True) for c in dados.columns}
+    if hasattr(dados, "column_names") and hasattr(dados, "column"):
+        return {c: pd.Series(dados.column(c).to_numpy(zero_copy_only=False)) for c in dados.column_names}
+    if isinstance(dados, dict):
+        return {c: pd.Series(np.asarray(v, dtype=object) if isinstance(v, list) else v) for c, v in dados.items()}
+    if colunas is None:
+        raise ValueError("Informe `colunas` para validar uma lista de tuplas.")
+    if not dados:
+        return {c: pd.Series([], dtype=object) for c in colunas}
+    matriz = np.empty((len(dados), len(colunas)), dtype=object)
+    matriz[:] = dados
+    return {c: pd.Series(matriz[:, i]) for i, c in enumerate(colunas)}
+
+
+def _regras_do_campo(nome, serie, field):
+    """Gera pares (código, máscara_de_violação) para um campo do model."""
+    tipo, opcional = _tipo_base(field.annotation)
+    nulo = serie.isna().to_numpy()
+    if field.is_required() and not opcional:
+        yield f"{nome}:nulo", nulo
+
+    presente = ~nulo
+    if tipo in (int, float):
+        numerico = pd.to_numeric(serie, errors="coerce")
+        valores = numerico.to_numpy(dtype="float64", na_value=np.nan)
+        yield f"{nome}:tipo", presente & np.isnan(valores)
+        if tipo is int:
+            yield f"{nome}:tipo", presente & ~np.isnan(valores) & (np.mod(valores, 1) != 0)
+    elif tipo is datetime:
+        if pd.api.types.is_datetime64_any_dtype(serie):
+            convertido = serie
+        else:
+            convertido = pd.to_datetime(serie, errors="coerce", format="ISO8601", utc=True)
+        yield f"{nome}:tipo", presente & convertido.isna().to_numpy()
+        return
+    else:
+        valores = None
+
+    textos = serie.astype(str) if tipo is str else None
+    for meta in field.metadata:
+        if isinstance(meta, annotated_types.Gt) and valores is not None:
+            yield f"{nome}:gt", presente & ~(valores > meta.gt)
+        elif isinstance(meta, annotated_types.Ge) and valores is not None:
+            yield f"{nome}:ge", presente & ~(valores >= meta.ge)
+        elif isinstance(meta, annotated_types.Lt) and valores is not None:
+            yield f"{nome}:lt", presente & ~(valores < meta.lt)
+        elif isinstance(meta, annotated_types.Le) and valores is not None:
+            yield f"{nome}:le", presente & ~(valores <= meta.le)
+        elif isinstance(meta, annotated_types.MaxLen) and textos is not None:
+            yield f"{nome}:max_length", presente & (textos.str.len().to_numpy() > meta.max_length)
+        elif getattr(meta, "pattern", None) and textos is not None:
+            casa = textos.str.contains(meta.pattern, regex=True).fillna(False).to_numpy(dtype=bool)
+            yield f"{nome}:pattern", presente & ~casa
+
+
+def validar_colunas(model_class: type[BaseModel], dados, colunas: list[str] | None = None) -> ResultadoValidacao:
+    """Valida um lote inteiro contra o contrato, coluna a coluna (vetorizado).
+
+    As regras (nulidade, tipo, gt/ge/lt/le, max_length, pattern) são derivadas
+    dos `Field` do próprio Pydantic model, então o contrato continua tendo uma
+    única definição. Colunas extras são ignoradas (como `extra="ignore"`).
+
+    Args:
+        model_class: Classe Pydantic (ex: PosicaoBronze).
+        dados: DataFrame, pyarrow.Table/RecordBatch, dict de arrays ou lista
+            de tuplas (neste caso, informe `colunas`).
+        colunas: Nomes das colunas, na ordem das tuplas.
+
+    Returns:
+        ResultadoValidacao com a máscara de rejeitados e os códigos de motivo.
+    """
+    series = _como_colunas(dados, colunas)
+    n = len(next(iter(series.values()))) if series else 0
+    rejeitados = np.zeros(n, dtype=bool)
+    motivos = np.full(n, "", dtype=object)
+
+    for nome, field in model_class.model_fields.items():
+        if nome not in series:
+            if field.is_required():
+                rejeitados[:] = True
+                motivos = motivos + f"{nome}:ausente;"
+            continue
+        for codigo, violacao in _regras_do_campo(nome, series[nome], field):
+            if violacao.any():
+                rejeitados |= violacao
+                motivos = np.where(violacao, motivos + f"{codigo};", motivos)
+
+    motivos = pd.Series(motivos, dtype=object).str.rstrip(";").to_numpy(dtype=object)
+    return ResultadoValidacao(rejeitados, motivos)
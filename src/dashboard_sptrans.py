@@ -10,11 +10,27 @@ Uso:
 """
 
 import os
+import sys
 
 import pandas as pd
 import streamlit as st
 from geopy.distance import great_circle
 
+# `streamlit run src/dashboard_sptrans.py` só coloca src/ no sys.path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from src.catalogo_linhas import (  # noqa: E402
+    CATALOGO_LINHAS_PATH,
+    CatalogoLinhas,
+    carregar_catalogo,
+    indice_nomes,
+    normalizar_letreiros,
+)
+from src.encaixe_rotas import avanco_na_rota, carregar_rede_rotas  # noqa: E402
+from src.mapa_velocidades import centro_celula  # noqa: E402
+from src.posicoes_atuais import posicoes_atuais  # noqa: E402
+from src.rastreamento import rastrear  # noqa: E402
+
 # --- Configuração da Página ---
 st.set_page_config(
     page_title="Dashboard de Análise SPTrans",
@@ -24,13 +40,16 @@ st.set_page_config(
 
 DB_PATH = os.path.join("data", "sptrans_data.db")
 PARQUET_DIR = os.path.join("data", "parquet")
-CSV_PATH = os.path.join("data", "todas_as_linhas.csv")
+VELOCIDADES_DIR = os.path.join(PARQUET_DIR, "gold", "velocidades")
+# Escala de cor do mapa de velocidades: vermelho em 0 km/h, verde a partir daqui
+VELOCIDADE_LIVRE_KMH = 30
 
 
 # --- Funções de Carregamento de Dados ---
 
 
 @st.cache_data
+@rastrear("dashboard.load_data")
 def load_data():
     """Carrega dados da tabela resultados_analise, tentando Parquet→DuckDB primeiro."""
     parquet_result = os.path.join(PARQUET_DIR, "resultados_analise")
@@ -74,48 +93,95 @@ def load_data():
 
 @st.cache_data
 def load_line_names(csv_path):
-    """Carrega o mapeamento de linhas do arquivo CSV."""
-    if not os.path.exists(csv_path):
-        return None
+    """Carrega o catálogo de linhas (indexado e cacheado em Parquet ao lado do CSV)."""
     try:
-        df_linhas = pd.read_csv(csv_path)
-        df_linhas["nome_linha"] = df_linhas["sentido_ida"] + " / " + df_linhas["sentido_volta"]
-        return df_linhas
+        return carregar_catalogo(csv_path)
+    except FileNotFoundError:
+        return None
     except Exception as e:
         st.error(f"Erro ao carregar o arquivo de nomes de linha: {e}")
         return None
 
 
+@rastrear("dashboard.load_current_positions")
+def load_current_positions(linha="Todas"):
+    """Última posição de cada ônibus (tabela `posicoes_atuais`, cópia em memória); None se indisponível.
+
+    Sem `st.cache_data`: a cópia de src/posicoes_atuais.py já só relê o banco quando chega um lote novo.
+    """
+    try:
+        df = posicoes_atuais(None if linha == "Todas" else [linha])
+    except Exception:
+        return None
+    if df.empty:
+        return None
+    return df.rename(columns={"latitude": "lat", "longitude": "lon"})
+
+
+@st.cache_resource
+def load_route_network():
+    """Rede de rotas do GTFS local (data/gtfs), se houver: mede o avanço ao longo da rota."""
+    try:
+        return carregar_rede_rotas()
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        st.warning(f"Rotas do GTFS indisponíveis: {e}")
+        return None
+
+
+def speed_heatmap_days(velocidades_dir=VELOCIDADES_DIR):
+    """Dias (YYYY-MM-DD) com mapa de velocidades publicado, do mais recente ao mais antigo."""
+    if not os.path.isdir(velocidades_dir):
+        return []
+    return sorted((d.removeprefix("dt=") for d in os.listdir(velocidades_dir) if d.startswith("dt=")), reverse=True)
+
+
+@st.cache_data
+@rastrear("dashboard.load_speed_heatmap")
+def load_speed_heatmap(dia, velocidades_dir=VELOCIDADES_DIR):
+    """Mapa de velocidades (Gold, de src/mapa_velocidades.py) de um dia, com o centro e a cor de cada célula.
+
+    Lê só o agregado por (janela, célula) — nunca as posições.
+    """
+    import duckdb
+
+    con = duckdb.connect()
+    try:
+        df = con.execute(
+            f"SELECT * FROM read_parquet('{os.path.join(velocidades_dir, f'dt={dia}')}/*.parquet')"
+        ).fetchdf()
+    finally:
+        con.close()
+    df["lat"], df["lon"] = centro_celula(df["celula"].to_numpy())
+    fracao = (df["velocidade_mediana_kmh"].to_numpy("float64") / VELOCIDADE_LIVRE_KMH).clip(0, 1)
+    df["cor"] = [[int(255 * (1 - f)), int(200 * f), 0, 160] for f in fracao]
+    return df
+
+
 def enrich_with_line_names(result_df, lines_df):
-    """Adiciona nomes descritivos das linhas ao dataframe de resultado."""
+    """Adiciona nomes descritivos das linhas ao dataframe de resultado.
+
+    `lines_df` pode ser o `CatalogoLinhas` (índice pré-construído) ou um
+    DataFrame com `letreiro_numerico`, `tipo_letreiro` e `nome_linha`.
+    """
     if lines_df is None or result_df.empty:
         result_df["nome_linha"] = result_df.index
         return result_df.set_index("nome_linha")
 
-    result_df_copy = result_df.reset_index().rename(columns={"index": "letreiro_linha"})
-    result_df_copy["letreiro_numerico"] = result_df_copy["letreiro_linha"].apply(lambda x: x.split("-")[0])
-    result_df_copy["tipo_letreiro"] = result_df_copy["letreiro_linha"].apply(
-        lambda x: int(x.split("-")[1]) if "-" in x else 10
-    )
+    letreiros = pd.Index(result_df.index).astype(str)
+    if isinstance(lines_df, CatalogoLinhas):
+        nomes = lines_df.nome_por_letreiro(letreiros)
+    else:
+        nomes = normalizar_letreiros(letreiros).map(indice_nomes(lines_df)).to_numpy()
 
-    lines_df_copy = lines_df.copy()
-    lines_df_copy["letreiro_numerico"] = lines_df_copy["letreiro_numerico"].astype(str)
-    lines_df_copy["tipo_letreiro"] = pd.to_numeric(lines_df_copy["tipo_letreiro"])
-
-    enriched_df = pd.merge(
-        result_df_copy,
-        lines_df_copy[["letreiro_numerico", "tipo_letreiro", "nome_linha"]],
-        on=["letreiro_numerico", "tipo_letreiro"],
-        how="left",
-    )
-    enriched_df["nome_linha"] = enriched_df["nome_linha"].fillna(enriched_df["letreiro_linha"])
-    enriched_df.set_index("nome_linha", inplace=True)
-
-    original_cols = [col for col in result_df.columns]
-    return enriched_df[original_cols]
+    enriched_df = result_df.copy()
+    enriched_df.index = pd.Index(pd.Series(nomes, dtype=object).fillna(pd.Series(letreiros)), name="nome_linha")
+    return enriched_df
 
 
 @st.cache_data
+@rastrear("dashboard.analyze_stuck_buses")
 def analyze_stuck_buses(df):
     """Processa o dataframe para identificar ônibus parados."""
     df_copy = df.copy()
@@ -149,10 +215,24 @@ def analyze_stuck_buses(df):
             ),
         )
     )
+    # Com as rotas do GTFS, vale o avanço ao longo da rota (um ônibus que deu a volta num
+    # laço termina perto de onde começou, mas andou); sem encaixe, a distância em linha reta
+    rede = load_route_network()
+    if rede is not None and not df_copy.empty:
+        pontos = df_copy.rename(
+            columns={
+                "posicao_atual_lat": "latitude",
+                "posicao_atual_lon": "longitude",
+                "horario_posicao_dt": "instante",
+            }
+        )
+        avanco_km = avanco_na_rota(pontos, rede) / 1000
+        analise_parada["distancia_km"] = avanco_km.reindex(analise_parada.index).fillna(analise_parada["distancia_km"])
     return analise_parada[(analise_parada["tempo_decorrido_min"] > 10) & (analise_parada["distancia_km"] < 0.1)]
 
 
 @st.cache_data
+@rastrear("dashboard.analyze_bunched_buses")
 def analyze_bunched_buses(df, threshold_meters=200):
     """Processa o dataframe para identificar 'comboios' de ônibus."""
     bunched_events = []
@@ -179,7 +259,7 @@ st.markdown(
 )
 
 df_raw = load_data()
-df_linhas = load_line_names(CSV_PATH)
+df_linhas = load_line_names(CATALOGO_LINHAS_PATH)
 
 if df_raw is None or df_raw.empty:
     st.warning(
@@ -253,19 +333,59 @@ else:
     df_previsoes, df_geo, df_csv = load_etl_insights(relatorios_path)
 
     # --- Abas para organizar o conteúdo ---
-    tab_mapa, tab_parados, tab_comboios, tab_qualidade = st.tabs(
-        ["📍 Mapa da Frota", "🛑 Ônibus Parados", "🚍 Comboios de Ônibus", "📊 Qualidade ETL e Insights"]
+    tab_mapa, tab_velocidades, tab_parados, tab_comboios, tab_qualidade = st.tabs(
+        [
+            "📍 Mapa da Frota",
+            "🚦 Velocidades",
+            "🛑 Ônibus Parados",
+            "🚍 Comboios de Ônibus",
+            "📊 Qualidade ETL e Insights",
+        ]
     )
 
     with tab_mapa:
         st.subheader(f"Exibindo a última posição conhecida para: {linha_selecionada}")
-        df_mapa_latest = df_mapa.sort_values("timestamp_analise").drop_duplicates(subset=["id_onibus"], keep="last")
-        df_mapa_latest = df_mapa_latest.rename(columns={"posicao_atual_lat": "lat", "posicao_atual_lon": "lon"})
+        df_mapa_latest = load_current_positions(linha_selecionada)
+        if df_mapa_latest is None:
+            # Sem posicoes_atuais (banco sem coletor): última posição de cada ônibus nos resultados
+            df_mapa_latest = df_mapa.sort_values("timestamp_analise").drop_duplicates(
+                subset=["id_onibus"], keep="last"
+            )
+            df_mapa_latest = df_mapa_latest.rename(columns={"posicao_atual_lat": "lat", "posicao_atual_lon": "lon"})
         if not df_mapa_latest[["lat", "lon"]].empty:
             st.map(df_mapa_latest[["lat", "lon"]].dropna())
         else:
             st.warning("Não há dados de localização para a seleção atual.")
 
+    with tab_velocidades:
+        st.subheader("Mapa de Velocidades por Região")
+        st.markdown(
+            "Velocidade mediana dos ônibus em cada célula (~150 m) a cada 15 minutos, calculada entre "
+            "posições consecutivas de cada veículo. Vermelho indica trânsito lento; verde, fluxo livre "
+            f"(≥ {VELOCIDADE_LIVRE_KMH} km/h)."
+        )
+        dias_velocidades = speed_heatmap_days()
+        if not dias_velocidades:
+            st.info("Mapa de velocidades ainda não calculado. Execute `python -m src.mapa_velocidades`.")
+        else:
+            dia_velocidades = st.selectbox("Dia", dias_velocidades)
+            df_velocidades = load_speed_heatmap(dia_velocidades)
+            janelas = sorted(df_velocidades["janela"].unique())
+            if not janelas:
+                st.warning("Não há velocidades calculadas para este dia.")
+            else:
+                janela = st.select_slider(
+                    "Janela de 15 minutos",
+                    options=janelas,
+                    value=janelas[-1],
+                    format_func=lambda j: pd.Timestamp(j).strftime("%H:%M"),
+                )
+                df_janela = df_velocidades[df_velocidades["janela"] == janela]
+                st.map(df_janela, latitude="lat", longitude="lon", color="cor", size=60)
+                col_v1, col_v2 = st.columns(2)
+                col_v1.metric("Células com ônibus", len(df_janela))
+                col_v2.metric("Velocidade mediana (km/h)", f"{df_janela['velocidade_mediana_kmh'].median():.1f}")
+
     with tab_parados:
         st.subheader("Detecção de Anomalias: Ônibus Parados")
         st.markdown(
@@ -0,0 +1,482 @@
+"""
+Encaixe das posições nas rotas (GTFS `shapes.txt`) com referência linear.
+
+Cada posição de `posicoes` é projetada na polilinha da rota da sua linha e ganha a
+distância percorrida ao longo da rota (`distancia_rota_m`, desde o início do shape) e o
+desvio perpendicular até ela (`desvio_m`). Em rotas com curvas, laços ou ida e volta pela
+mesma rua, a diferença entre duas distâncias ao longo da rota mede o avanço real do
+ônibus — a distância em linha reta entre duas posições não.
+
+Rotas: `data/gtfs/shapes.txt` + `trips.txt` (route_id → shape_id, direction_id). Na SPTrans
+o route_id é o letreiro ('8000-10') e direction_id 0/1 vira `sentido` 1/2. Os vértices
+ficam num cache Parquet ao lado do GTFS (`rotas.parquet`), refeito quando os .txt mudam.
+
+Índice (`RedeRotas`): cada segmento da rota é registrado nas células de uma grade de
+TAMANHO_CELULA_M que sua caixa envolvente, alargada por RAIO_ENCAIXE_M, toca; a chave
+da célula inclui a linha, então cada linha tem o seu índice espacial e uma posição só
+enxerga os segmentos da própria linha na própria célula. A projeção é vetorizada em
+blocos de posições (pares posição × segmento candidato, sem laço por ponto ou linha).
+
+Escolha do shape: quando mais de um shape da linha passa a até TOLERANCIA_SENTIDO_M do
+melhor desvio (ida e volta pela mesma rua), vale o que o ônibus percorre para a frente
+(avanço maior que RUIDO_AVANCO_M desde a posição anterior, e plausível até
+VELOCIDADE_MAXIMA_KMH); posições sem avanço
+(parado, primeira do dia) herdam o shape da decisão mais próxima do mesmo ônibus.
+
+Saída: data/parquet/posicoes_rota/dt=YYYY-MM-DD/posicoes_rota.parquet, com a velocidade
+ao longo da rota entre posições consecutivas (`velocidade_rota_kmh`).
+
+Uso:
+    python -m src.encaixe_rotas                                   # todas as partições de posicoes
+    python -m src.encaixe_rotas --inicio 2025-08-01 --fim 2025-08-31 --processos 8
+
+    from src.encaixe_rotas import carregar_rede_rotas, encaixar_posicoes
+
+    encaixadas = encaixar_posicoes(posicoes, carregar_rede_rotas())
+"""
+
+import argparse
+import functools
+import logging
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.catalogo_linhas import normalizar_letreiros
+from src.compactar_parquet import processar_particoes, publicar_particao
+from src.geo import RAIO_TERRA_M
+from src.viagens import ler_posicoes_do_dia, particoes_posicoes, preparar_pontos
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger(__name__)
+
+GTFS_DIR = os.path.join("data", "gtfs")
+ARQUIVO_ROTAS = "rotas.parquet"
+PARQUET_DIR = os.path.join("data", "parquet")
+ARQUIVO_POSICOES_ROTA = "posicoes_rota.parquet"
+
+RAIO_ENCAIXE_M = 60
+TAMANHO_CELULA_M = 100
+TOLERANCIA_SENTIDO_M = 25
+RUIDO_AVANCO_M = 10
+# Avanço acima disso (GPS saltando, ônibus que recomeça a rota) não conta como movimento
+VELOCIDADE_MAXIMA_KMH = 90
+LACUNA_VELOCIDADE_MIN = 10
+PONTOS_POR_BLOCO = 100_000
+
+COLUNAS_VERTICES = ["letreiro_linha", "sentido", "shape_id", "latitude", "longitude"]
+
+TIPOS_POSICOES_ROTA = {
+    "letreiro_linha": "object",
+    "id_onibus": "int64",
+    "instante": "datetime64[us]",
+    "latitude": "float64",
+    "longitude": "float64",
+    "shape_id": "object",
+    "sentido": "Int8",
+    "distancia_rota_m": "float64",
+    "desvio_m": "float64",
+    "velocidade_rota_kmh": "float64",
+}
+
+# Cache em memória: {gtfs_dir: (mtime, RedeRotas)}
+_CACHE: dict = {}
+
+_BITS_CELULA = 21
+
+
+def ler_rotas_gtfs(gtfs_dir=None):
+    """shapes.txt + trips.txt → vértices (COLUNAS_VERTICES) na ordem de percurso de cada shape."""
+    gtfs_dir = gtfs_dir or GTFS_DIR
+    shapes = pd.read_csv(
+        os.path.join(gtfs_dir, "shapes.txt"),
+        usecols=["shape_id", "shape_pt_lat", "shape_pt_lon", "shape_pt_sequence"],
+        dtype={"shape_id": str},
+        encoding="utf-8-sig",
+    )
+    trips = pd.read_csv(
+        os.path.join(gtfs_dir, "trips.txt"), dtype={"route_id": str, "shape_id": str}, encoding="utf-8-sig"
+    )
+    if "direction_id" not in trips:
+        trips["direction_id"] = 0
+    formas = trips.dropna(subset=["shape_id"]).drop_duplicates(["route_id", "shape_id"])
+    formas = pd.DataFrame(
+        {
+            "letreiro_linha": normalizar_letreiros(formas["route_id"]).to_numpy(),
+            "sentido": pd.to_numeric(formas["direction_id"], errors="coerce").fillna(0).astype("int8").to_numpy() + 1,
+            "shape_id": formas["shape_id"].to_numpy(),
+        }
+    )
+    vertices = formas.merge(
+        shapes.rename(columns={"shape_pt_lat": "latitude", "shape_pt_lon": "longitude"}), on="shape_id"
+    )
+    vertices = vertices.sort_values(["letreiro_linha", "shape_id", "shape_pt_sequence"], ignore_index=True)
+    return vertices[COLUNAS_VERTICES]
+
+
+class RedeRotas:
+    """Shapes das linhas com um índice espacial de segmentos por linha (grade)."""
+
+    def __init__(self, vertices, raio_m=RAIO_ENCAIXE_M, tamanho_celula_m=TAMANHO_CELULA_M):
+        v = vertices.reset_index(drop=True)
+        self.raio_m = float(raio_m)
+        self.tamanho_celula_m = float(tamanho_celula_m)
+        letreiros = v["letreiro_linha"].astype(str).to_numpy()
+        shapes = v["shape_id"].astype(str).to_numpy()
+
+        # Um shape por linha é uma "forma"; os vértices de cada forma são contíguos e em ordem
+        nova = np.ones(len(v), dtype=bool)
+        nova[1:] = (letreiros[1:] != letreiros[:-1]) | (shapes[1:] != shapes[:-1])
+        forma = np.cumsum(nova) - 1
+        self.formas = pd.DataFrame(
+            {
+                "letreiro_linha": letreiros[nova],
+                "shape_id": shapes[nova],
+                "sentido": v["sentido"].to_numpy()[nova].astype("int8"),
+            }
+        )
+        self._linhas = pd.Index(pd.unique(self.formas["letreiro_linha"]))
+        linha_da_forma = self._linhas.get_indexer(self.formas["letreiro_linha"])
+
+        lat = v["latitude"].to_numpy(dtype="float64")
+        lon = v["longitude"].to_numpy(dtype="float64")
+        self._lat0 = float(lat.mean()) if len(lat) else 0.0
+        self._lon0 = float(lon.mean()) if len(lon) else 0.0
+        self._ky = RAIO_TERRA_M * np.pi / 180
+        self._kx = self._ky * np.cos(np.radians(self._lat0))
+        x, y = self._projetar(lat, lon)
+
+        # Distância acumulada ao longo de cada forma, a partir do primeiro vértice
+        passo = np.zeros(len(v))
+        passo[1:] = np.hypot(np.diff(x), np.diff(y))
+        passo[nova] = 0
+        acumulado = np.cumsum(passo)
+        self.formas["comprimento_m"] = np.add.reduceat(passo, np.flatnonzero(nova)) if len(v) else np.empty(0)
+        acumulado -= acumulado[np.flatnonzero(nova)][forma]
+
+        # Segmentos: vértices consecutivos da mesma forma
+        i = np.flatnonzero(~nova[1:])
+        self._x0, self._y0 = x[i], y[i]
+        self._dx, self._dy = x[i + 1] - x[i], y[i + 1] - y[i]
+        self._d0 = acumulado[i]
+        self._forma = forma[i]
+
+        # Cada segmento entra em todas as células que sua caixa (+ raio) toca
+        c = self.tamanho_celula_m
+        self._ox = (x.min() if len(x) else 0.0) - self.raio_m - c
+        self._oy = (y.min() if len(y) else 0.0) - self.raio_m - c
+        gx0 = np.floor((np.minimum(self._x0, self._x0 + self._dx) - self.raio_m - self._ox) / c).astype("int64")
+        gx1 = np.floor((np.maximum(self._x0, self._x0 + self._dx) + self.raio_m - self._ox) / c).astype("int64")
+        gy0 = np.floor((np.minimum(self._y0, self._y0 + self._dy) - self.raio_m - self._oy) / c).astype("int64")
+        gy1 = np.floor((np.maximum(self._y0, self._y0 + self._dy) + self.raio_m - self._oy) / c).astype("int64")
+        altura = gy1 - gy0 + 1
+        n = (gx1 - gx0 + 1) * altura
+        seg = np.repeat(np.arange(len(i)), n)
+        k = np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n)
+        chaves = self._chave(linha_da_forma[self._forma[seg]], gx0[seg] + k // altura[seg], gy0[seg] + k % altura[seg])
+        ordem = np.argsort(chaves, kind="stable")
+        self._segmentos = seg[ordem]
+        self._chaves, self._inicio = np.unique(chaves[ordem], return_index=True)
+        self._fim = np.append(self._inicio[1:], len(ordem))
+
+    def __len__(self):
+        return len(self.formas)
+
+    def _projetar(self, latitude, longitude):
+        latitude = np.asarray(latitude, dtype="float64")
+        longitude = np.asarray(longitude, dtype="float64")
+        return (longitude - self._lon0) * self._kx, (latitude - self._lat0) * self._ky
+
+    @staticmethod
+    def _chave(linha, gx, gy):
+        return (linha.astype("int64") << (2 * _BITS_CELULA)) | (gx << _BITS_CELULA) | gy
+
+    def _codigos_linha(self, letreiros):
+        """Índice da linha de cada letreiro (-1: linha sem shape); categorias são resolvidas uma vez só."""
+        letreiros = pd.Series(letreiros, copy=False)
+        if isinstance(letreiros.dtype, pd.CategoricalDtype):
+            por_categoria = self._linhas.get_indexer(letreiros.cat.categories.astype(str))
+            return np.append(por_categoria, -1)[letreiros.cat.codes.to_numpy()]
+        return self._linhas.get_indexer(letreiros.astype(str))
+
+    def candidatos(self, letreiros, latitude, longitude):
+        """Melhor projeção de cada posição em cada forma da sua linha a até `raio_m`.
+
+        Returns:
+            (i_ponto, forma, distancia_rota_m, desvio_m), ordenados por (ponto, forma).
+        """
+        codigos = self._codigos_linha(letreiros)
+        x, y = self._projetar(latitude, longitude)
+        partes = [
+            self._candidatos_bloco(codigos, x, y, inicio, min(inicio + PONTOS_POR_BLOCO, len(x)))
+            for inicio in range(0, len(x), PONTOS_POR_BLOCO)
+        ]
+        if not partes:
+            vazio = np.empty(0, dtype="int64")
+            return vazio, vazio, np.empty(0), np.empty(0)
+        return tuple(np.concatenate(c) for c in zip(*partes))
+
+    def _candidatos_bloco(self, codigos, x, y, inicio, fim):
+        pontos = np.arange(inicio, fim)
+        c = self.tamanho_celula_m
+        gx = np.floor((x[pontos] - self._ox) / c).astype("int64")
+        gy = np.floor((y[pontos] - self._oy) / c).astype("int64")
+        limite = 1 << _BITS_CELULA
+        valido = (codigos[pontos] >= 0) & (gx >= 0) & (gx < limite) & (gy >= 0) & (gy < limite)
+        chave = self._chave(codigos[pontos], np.where(valido, gx, 0), np.where(valido, gy, 0))
+        pos = np.minimum(np.searchsorted(self._chaves, chave), max(len(self._chaves) - 1, 0))
+        achou = valido & (self._chaves[pos] == chave) if len(self._chaves) else valido & False
+        lo = self._inicio[pos[achou]]
+        n = self._fim[pos[achou]] - lo
+        p = np.repeat(pontos[achou], n)
+        seg = self._segmentos[np.repeat(lo - np.cumsum(n) + n, n) + np.arange(n.sum())]
+
+        # Projeção no segmento (t ∈ [0, 1]) em metros locais
+        dx, dy = self._dx[seg], self._dy[seg]
+        quadrado = dx * dx + dy * dy
+        t = ((x[p] - self._x0[seg]) * dx + (y[p] - self._y0[seg]) * dy) / np.where(quadrado > 0, quadrado, 1)
+        t = np.clip(t, 0, 1)
+        desvio = np.hypot(x[p] - self._x0[seg] - t * dx, y[p] - self._y0[seg] - t * dy)
+        perto = desvio <= self.raio_m
+        p, seg, desvio = p[perto], seg[perto], desvio[perto]
+        distancia = self._d0[seg] + t[perto] * np.sqrt(quadrado[perto])
+        forma = self._forma[seg]
+
+        # Melhor segmento por (ponto, forma): chave inteira (ponto, forma, desvio em mm)
+        mm = np.minimum(np.round(desvio * 1000), (1 << 26) - 1).astype("int64")
+        ordem = np.argsort(((p - inicio) << 46) | (forma << 26) | mm, kind="stable")
+        p, forma, distancia, desvio = p[ordem], forma[ordem], distancia[ordem], desvio[ordem]
+        primeiro = np.ones(len(p), dtype=bool)
+        primeiro[1:] = (p[1:] != p[:-1]) | (forma[1:] != forma[:-1])
+        return p[primeiro], forma[primeiro], distancia[primeiro], desvio[primeiro]
+
+    def projetar(self, letreiros, latitude, longitude):
+        """Projeção de cada posição na forma mais próxima, sem olhar a sequência do ônibus.
+
+        Returns:
+            (forma, distancia_rota_m, desvio_m) — arrays do tamanho da entrada; forma -1 e NaN sem encaixe.
+        """
+        n = len(np.asarray(latitude))
+        p, forma, distancia, desvio = self.candidatos(letreiros, latitude, longitude)
+        mm = np.minimum(np.round(desvio * 1000), (1 << 26) - 1).astype("int64")
+        ordem = np.argsort((p << 26) | mm, kind="stable")
+        primeiro = ordem[np.r_[True, p[ordem][1:] != p[ordem][:-1]]] if len(p) else ordem
+        saida_forma = np.full(n, -1, dtype="int64")
+        saida_distancia, saida_desvio = np.full(n, np.nan), np.full(n, np.nan)
+        saida_forma[p[primeiro]] = forma[primeiro]
+        saida_distancia[p[primeiro]] = distancia[primeiro]
+        saida_desvio[p[primeiro]] = desvio[primeiro]
+        return saida_forma, saida_distancia, saida_desvio
+
+
+def _preencher_por_onibus(valor, inicio_onibus, fim_onibus):
+    """Propaga o último valor >= 0 para a frente dentro do ônibus e, na falta, o próximo para trás."""
+    n = len(valor)
+    idx = np.arange(n)
+    anterior = np.maximum.accumulate(np.where(valor >= 0, idx, -1))
+    seguinte = np.minimum.accumulate(np.where(valor >= 0, idx, n)[::-1])[::-1]
+    preenchido = np.where(anterior >= inicio_onibus, valor[np.maximum(anterior, 0)], -1)
+    return np.where(
+        preenchido >= 0, preenchido, np.where(seguinte <= fim_onibus, valor[np.minimum(seguinte, n - 1)], -1)
+    )
+
+
+def encaixar(pontos, rede):
+    """Encaixa pontos ordenados por (letreiro_linha, id_onibus, instante) na rede.
+
+    Returns:
+        (forma, distancia_rota_m, desvio_m) alinhados a `pontos`; forma -1 e NaN sem encaixe.
+    """
+    n = len(pontos)
+    forma_escolhida = np.full(n, -1, dtype="int64")
+    distancia_escolhida, desvio_escolhido = np.full(n, np.nan), np.full(n, np.nan)
+    p, forma, distancia, desvio = rede.candidatos(pontos["letreiro_linha"], pontos["latitude"], pontos["longitude"])
+    if not len(p):
+        return forma_escolhida, distancia_escolhida, desvio_escolhido
+
+    onibus = pontos["id_onibus"].to_numpy()
+    linha = pd.Categorical(pontos["letreiro_linha"]).codes
+    novo_onibus = np.ones(n, dtype=bool)
+    novo_onibus[1:] = (onibus[1:] != onibus[:-1]) | (linha[1:] != linha[:-1])
+    idx = np.arange(n)
+    inicio_onibus = np.maximum.accumulate(np.where(novo_onibus, idx, 0))
+    fim_onibus = np.minimum.accumulate(np.where(np.r_[novo_onibus[1:], True], idx, n)[::-1])[::-1]
+
+    # Avanço na mesma forma desde a posição anterior do ônibus
+    n_formas = max(len(rede), 1)
+    chave = p * n_formas + forma
+    anterior = np.where(novo_onibus, -1, idx - 1)[p]
+    chave_anterior = anterior * n_formas + forma
+    pos = np.minimum(np.searchsorted(chave, chave_anterior), len(chave) - 1)
+    tem_anterior = (anterior >= 0) & (chave[pos] == chave_anterior)
+    avanco = np.where(tem_anterior, distancia - distancia[pos], np.nan)
+    instante = pontos["instante"].to_numpy()
+    dt = (instante[p] - instante[np.maximum(anterior, 0)]) / np.timedelta64(1, "s")
+    plausivel = avanco <= VELOCIDADE_MAXIMA_KMH / 3.6 * dt + RUIDO_AVANCO_M
+    classe = np.where((avanco > RUIDO_AVANCO_M) & plausivel, 0, np.where(avanco < -RUIDO_AVANCO_M, 2, 1))
+
+    # Formas ambíguas: a até TOLERANCIA_SENTIDO_M do melhor desvio do ponto
+    inicio_grupo = np.flatnonzero(np.r_[True, p[1:] != p[:-1]])
+    grupo = np.cumsum(np.r_[True, p[1:] != p[:-1]]) - 1
+    perto = desvio <= np.minimum.reduceat(desvio, inicio_grupo)[grupo] + TOLERANCIA_SENTIDO_M
+    n_perto = np.add.reduceat(perto.astype("int64"), inicio_grupo)[grupo]
+    n_avancando = np.add.reduceat((perto & (classe == 0)).astype("int64"), inicio_grupo)[grupo]
+    decidido = perto & ((n_perto == 1) | ((classe == 0) & (n_avancando == 1)))
+    decisao = np.full(n, -1, dtype="int64")
+    decisao[p[decidido]] = forma[decidido]
+    preferida = _preencher_por_onibus(decisao, inicio_onibus, fim_onibus)
+
+    # Escolha: forma preferida entre as ambíguas; senão a de melhor classe e menor desvio
+    penalidade = np.where(~perto, 2, np.where(forma == preferida[p], 0, 1))
+    mm = np.minimum(np.round(desvio * 1000), (1 << 17) - 1).astype("int64")
+    ordem = np.argsort((p << 21) | (penalidade << 19) | (classe << 17) | mm, kind="stable")
+    primeiro = ordem[np.r_[True, p[ordem][1:] != p[ordem][:-1]]]
+    forma_escolhida[p[primeiro]] = forma[primeiro]
+    distancia_escolhida[p[primeiro]] = distancia[primeiro]
+    desvio_escolhido[p[primeiro]] = desvio[primeiro]
+    return forma_escolhida, distancia_escolhida, desvio_escolhido
+
+
+def encaixar_posicoes(posicoes, rede):
+    """Posições (schema de `posicoes`) → pontos com shape, distância ao longo da rota e velocidade."""
+    pontos = preparar_pontos(posicoes)
+    forma, distancia, desvio = encaixar(pontos, rede)
+    encaixado = forma >= 0
+    formas = rede.formas.iloc[np.maximum(forma, 0)]
+    pontos["shape_id"] = np.where(encaixado, formas["shape_id"].to_numpy(), None)
+    pontos["sentido"] = pd.array(formas["sentido"].to_numpy(), dtype="Int8")
+    pontos.loc[~encaixado, "sentido"] = pd.NA
+    pontos["distancia_rota_m"] = distancia
+    pontos["desvio_m"] = desvio
+
+    # Velocidade entre posições consecutivas do mesmo ônibus na mesma forma
+    onibus = pontos["id_onibus"].to_numpy()
+    instante = pontos["instante"].to_numpy()
+    velocidade = np.full(len(pontos), np.nan)
+    if len(pontos) > 1:
+        dt = (instante[1:] - instante[:-1]) / np.timedelta64(1, "s")
+        avanco = distancia[1:] - distancia[:-1]
+        valido = (
+            (onibus[1:] == onibus[:-1])
+            & (forma[1:] == forma[:-1])
+            & encaixado[1:]
+            & (dt > 0)
+            & (dt <= LACUNA_VELOCIDADE_MIN * 60)
+            & (avanco >= -RUIDO_AVANCO_M)
+            & (avanco <= VELOCIDADE_MAXIMA_KMH / 3.6 * dt + RUIDO_AVANCO_M)
+        )
+        velocidade[1:][valido] = np.maximum(avanco[valido], 0) / dt[valido] * 3.6
+    pontos["velocidade_rota_kmh"] = velocidade
+    pontos["letreiro_linha"] = pontos["letreiro_linha"].astype(str)
+    return pontos.astype(TIPOS_POSICOES_ROTA)
+
+
+def avanco_na_rota(pontos, rede):
+    """Avanço (m, absoluto) ao longo da rota entre a primeira e a última posição de cada ônibus.
+
+    `pontos`: letreiro_linha, id_onibus, instante, latitude, longitude, em qualquer ordem.
+    Série indexada por id_onibus; NaN quando uma das pontas não encaixou ou caíram em shapes diferentes.
+    """
+    letreiros = pontos["letreiro_linha"].astype(str).astype("category")
+    ordem = np.lexsort((pontos["instante"].to_numpy(), pontos["id_onibus"].to_numpy(), letreiros.cat.codes.to_numpy()))
+    ordenados = pontos.iloc[ordem].reset_index(drop=True)
+    forma, distancia, _ = encaixar(ordenados, rede)
+    pontas = pd.DataFrame({"id_onibus": ordenados["id_onibus"], "forma": forma, "distancia": distancia})
+    por_onibus = pontas.groupby("id_onibus", sort=False)
+    primeira, ultima = por_onibus.head(1).set_index("id_onibus"), por_onibus.tail(1).set_index("id_onibus")
+    ultima = ultima.reindex(primeira.index)
+    mesma_forma = (primeira["forma"] == ultima["forma"]) & (primeira["forma"] >= 0)
+    return (ultima["distancia"] - primeira["distancia"]).abs().where(mesma_forma)
+
+
+def carregar_rede_rotas(gtfs_dir=None):
+    """Retorna a rede de rotas, carregada uma vez por processo e por versão do GTFS.
+
+    Raises:
+        FileNotFoundError: se não houver `shapes.txt`/`trips.txt` em `gtfs_dir`.
+    """
+    gtfs_dir = gtfs_dir or GTFS_DIR
+    fontes = [os.path.join(gtfs_dir, nome) for nome in ("shapes.txt", "trips.txt")]
+    for fonte in fontes:
+        if not os.path.exists(fonte):
+            raise FileNotFoundError(f"GTFS sem {os.path.basename(fonte)} em: {gtfs_dir}")
+
+    mtime = max(os.path.getmtime(fonte) for fonte in fontes)
+    em_memoria = _CACHE.get(gtfs_dir)
+    if em_memoria and em_memoria[0] == mtime:
+        return em_memoria[1]
+
+    cache_path = os.path.join(gtfs_dir, ARQUIVO_ROTAS)
+    vertices = None
+    if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= mtime:
+        try:
+            vertices = pd.read_parquet(cache_path)
+        except Exception as e:
+            logger.warning(f"Cache das rotas ilegível ({cache_path}): {e}. Recarregando do GTFS.")
+    if vertices is None:
+        vertices = ler_rotas_gtfs(gtfs_dir)
+        try:
+            tmp_path = cache_path + ".tmp"
+            vertices.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, cache_path)
+        except Exception as e:
+            logger.warning(f"Não foi possível gravar o cache das rotas em {cache_path}: {e}")
+        logger.info(f"Rotas carregadas do GTFS ({len(vertices)} vértices) e cacheadas em {cache_path}.")
+
+    rede = RedeRotas(vertices)
+    _CACHE[gtfs_dir] = (mtime, rede)
+    return rede
+
+
+def processar_dia(dia, gtfs_dir=None, parquet_dir=None):
+    """Encaixa e publica as posições de um dia; retorna o número de posições encaixadas."""
+    parquet_dir = parquet_dir or PARQUET_DIR
+    inicio = time.perf_counter()
+    encaixadas = encaixar_posicoes(ler_posicoes_do_dia(dia, parquet_dir), carregar_rede_rotas(gtfs_dir))
+    publicar_particao(encaixadas, os.path.join(parquet_dir, "posicoes_rota"), dia, ARQUIVO_POSICOES_ROTA)
+    n_encaixadas = int(encaixadas["shape_id"].notna().sum())
+    logging.info(
+        f"posicoes_rota dt={dia}: {n_encaixadas}/{len(encaixadas)} posições encaixadas "
+        f"em {time.perf_counter() - inicio:.1f}s."
+    )
+    return n_encaixadas
+
+
+def processar_dias(dias, gtfs_dir=None, processos=None, parquet_dir=None):
+    """Processa os dias com `processar_particoes` (um por tarefa; `processos=1` sem pool); retorna {dia: encaixadas}."""
+    parquet_dir = parquet_dir or PARQUET_DIR
+    fn = functools.partial(processar_dia, gtfs_dir=gtfs_dir, parquet_dir=parquet_dir)
+    return processar_particoes(fn, dias, os.path.join(parquet_dir, "posicoes_rota"), processos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Encaixa as posições (Silver) nas rotas do GTFS por dia")
+    parser.add_argument("--inicio", help="Primeiro dia (YYYY-MM-DD).")
+    parser.add_argument("--fim", help="Último dia, inclusive (YYYY-MM-DD).")
+    parser.add_argument("--processos", type=int, default=os.cpu_count(), help="Processos paralelos (1 = sem pool).")
+    parser.add_argument("--gtfs", help=f"Diretório do GTFS com shapes.txt e trips.txt (padrão: {GTFS_DIR}).")
+    args = parser.parse_args()
+
+    dias = particoes_posicoes(inicio=args.inicio, fim=args.fim)
+    if not dias:
+        logging.warning(f"Nenhuma partição de posições em {os.path.join(PARQUET_DIR, 'posicoes')} no período.")
+        return
+    try:
+        carregar_rede_rotas(args.gtfs)
+    except FileNotFoundError as e:
+        logging.error(f"{e}. Coloque o GTFS da SPTrans (shapes.txt, trips.txt) em {args.gtfs or GTFS_DIR}.")
+        return
+
+    inicio = time.perf_counter()
+    logging.info(f"Encaixando posições de {len(dias)} dia(s) nas rotas com {args.processos} processo(s)...")
+    resultado = processar_dias(dias, args.gtfs, args.processos)
+    logging.info(
+        f"Encaixe concluído: {sum(resultado.values())} posições em {len(dias)} dia(s), "
+        f"{time.perf_counter() - inicio:.1f}s."
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -15,9 +15,12 @@ Uso:
 import argparse
 import logging
 import os
+import time
 from datetime import datetime, timedelta
 
-from src.database import DB_PATH, get_connection
+from src import metricas
+from src.database import DB_PATH, ajustar_contagem, fonte_coleta, get_connection, is_postgres
+from src.rastreamento import rastrear
 
 logging.basicConfig(
     level=logging.INFO,
@@ -25,13 +28,14 @@ logging.basicConfig(
 )
 
 
+@rastrear("expurgo.expurgar")
 def expurgar(conn, tabela, limite, dry_run=False):
     """Remove registros da tabela com timestamp_coleta anterior ao limite."""
+    inicio = time.perf_counter()
+    fonte = fonte_coleta(conn, tabela)
+    filtro, params = f"{fonte.coluna} < ?", (fonte.parametro(limite.isoformat()),)
     cursor = conn.cursor()
-    cursor.execute(
-        f"SELECT count(*) FROM {tabela} WHERE timestamp_coleta < ?",
-        (limite.isoformat(),),
-    )
+    cursor.execute(f"SELECT count(*) FROM {fonte.tabela} WHERE {filtro}", params)
     total = cursor.fetchone()[0]
 
     if total == 0:
@@ -42,16 +46,52 @@ def expurgar(conn, tabela, limite, dry_run=False):
         logging.info(f"  '{tabela}': {total} registros seriam removidos (dry-run).")
         return total
 
-    cursor.execute(
-        f"DELETE FROM {tabela} WHERE timestamp_coleta < ?",
-        (limite.isoformat(),),
-    )
-    conn.commit()
+    cursor.execute(f"DELETE FROM {fonte.tabela} WHERE {filtro}", params)
     removidos = cursor.rowcount
+    ajustar_contagem(conn, tabela, -removidos)
+    conn.commit()
+    metricas.EXPURGO_SEGUNDOS.observar(time.perf_counter() - inicio, tabela=tabela)
+    metricas.EXPURGO_LINHAS.inc(removidos, tabela=tabela)
     logging.info(f"  '{tabela}': {removidos} registros expurgados.")
     return removidos
 
 
+def limites_do_dia(dia):
+    """Intervalo [início, fim) de `timestamp_coleta` para o dia 'YYYY-MM-DD' (usa o índice por timestamp)."""
+    inicio = datetime.strptime(dia, "%Y-%m-%d")
+    return inicio.strftime("%Y-%m-%d"), (inicio + timedelta(days=1)).strftime("%Y-%m-%d")
+
+
+@rastrear("expurgo.expurgar_dia")
+def expurgar_dia(conn, tabela, dia, dry_run=False):
+    """Remove os registros de um único dia (partição 'YYYY-MM-DD') da tabela."""
+    ph = "%s" if is_postgres() else "?"
+    fonte = fonte_coleta(conn, tabela)
+    filtro = f"{fonte.coluna} >= {ph} AND {fonte.coluna} < {ph}"
+    params = tuple(fonte.parametro(limite) for limite in limites_do_dia(dia))
+    inicio = time.perf_counter()
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT count(*) FROM {fonte.tabela} WHERE {filtro}", params)
+    total = cursor.fetchone()[0]
+
+    if total == 0:
+        logging.info(f"  '{tabela}' dt={dia}: nenhum registro para expurgar.")
+        return 0
+
+    if dry_run:
+        logging.info(f"  '{tabela}' dt={dia}: {total} registros seriam removidos (dry-run).")
+        return total
+
+    cursor.execute(f"DELETE FROM {fonte.tabela} WHERE {filtro}", params)
+    removidos = cursor.rowcount
+    ajustar_contagem(conn, tabela, -removidos)
+    conn.commit()
+    metricas.EXPURGO_SEGUNDOS.observar(time.perf_counter() - inicio, tabela=tabela)
+    metricas.EXPURGO_LINHAS.inc(removidos, tabela=tabela)
+    logging.info(f"  '{tabela}' dt={dia}: {removidos} registros expurgados.")
+    return removidos
+
+
 def main():
     parser = argparse.ArgumentParser(description="Expurga janela quente do SQLite (mantém apenas N dias recentes)")
     parser.add_argument(
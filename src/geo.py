@@ -0,0 +1,22 @@
+"""
+Funções geográficas vetorizadas (numpy) para as etapas analíticas.
+
+Todas aceitam escalares, arrays numpy ou Series pandas e devolvem arrays
+(ou escalares) em metros — sem laço Python por ponto.
+
+Uso:
+    from src.geo import haversine_m
+
+    passo_m = haversine_m(lat[:-1], lon[:-1], lat[1:], lon[1:])
+"""
+
+import numpy as np
+
+RAIO_TERRA_M = 6_371_008.8  # raio médio (IUGG)
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    """Distância de grande círculo em metros entre (lat1, lon1) e (lat2, lon2), em graus."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype="float64")) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * RAIO_TERRA_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
@@ -0,0 +1,339 @@
+"""
+Headways e regularidade por linha, ponto e período (Silver → Gold).
+
+Passagens — o instante em que um ônibus passa por um ponto da linha — vêm de duas fontes:
+
+- paradas (`previsoes`): cada (id_linha, id_parada, id_onibus) aparece nas coletas enquanto
+  o ônibus se aproxima da parada e some quando ele passa. Uma "visita" é uma sequência de
+  coletas sem buraco maior que LACUNA_VISITA_MIN; a passagem é o último `horario_previsao`
+  (HH:MM) da visita. Visitas ainda abertas na última coleta da linha são descartadas;
+- terminais (`viagens`, de src/viagens.py): a partida de cada viagem que começa num terminal.
+
+Ordenadas as passagens de cada ponto, o headway é a diferença entre passagens consecutivas
+(ônibus diferentes; acima de HEADWAY_MAX_MIN é interrupção de serviço, não headway). Por
+(linha, ponto, período) calcula-se a distribuição (média, mediana, p10, p90), o coeficiente
+de variação e o tempo de espera excedente:
+
+    espera_media = Σh² / (2·Σh)          (passageiro chegando ao acaso)
+    espera_ideal = média(h) / 2          (mesmos ônibus, perfeitamente espaçados)
+    espera_excedente = espera_media − espera_ideal
+
+Sem tabela horária (GTFS), o "ideal" é o headway regular com a mesma oferta observada. As
+linhas com `id_ponto` nulo agregam todas as paradas da linha/sentido.
+
+Tudo por ordenação + numpy/groupby sobre o dia inteiro, sem laço por par de ônibus. Os dias
+rodam em paralelo, um por processo.
+
+Saída (Gold, tmp + os.replace, manifesto como no Silver):
+    data/parquet/gold/headways/dt=YYYY-MM-DD/headways.parquet          (um headway por linha)
+    data/parquet/gold/regularidade/dt=YYYY-MM-DD/regularidade.parquet  (métricas agregadas)
+
+Uso:
+    python -m src.headways                                   # todas as partições de previsoes
+    python -m src.headways --inicio 2025-08-01 --fim 2025-08-31 --processos 8
+"""
+
+import argparse
+import functools
+import logging
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.catalogo_linhas import OFFSET_SENTIDO_2, carregar_catalogo_opcional
+from src.compactar_parquet import ler_particao, particao_vazia, processar_particoes, publicar_particao
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+PARQUET_DIR = os.path.join("data", "parquet")
+GOLD_DIR = os.path.join(PARQUET_DIR, "gold")
+
+LACUNA_VISITA_MIN = 30
+HEADWAY_MAX_MIN = 120
+MIN_HEADWAYS = 3
+
+# Hora de início de cada período (horário local)
+PERIODOS = {0: "madrugada", 5: "pico_manha", 9: "entrepico", 16: "pico_tarde", 20: "noite"}
+
+CHAVES_PONTO = ["tipo_ponto", "letreiro_linha", "id_linha", "sentido", "id_ponto"]
+
+TIPOS_PASSAGENS = {
+    "tipo_ponto": "object",
+    "letreiro_linha": "object",
+    "id_linha": "Int64",
+    "sentido": "int8",
+    "id_ponto": "Int64",
+    "id_onibus": "int64",
+    "instante": "datetime64[us]",
+}
+
+TIPOS_HEADWAYS = {
+    **TIPOS_PASSAGENS,
+    "id_onibus_anterior": "int64",
+    "periodo": "object",
+    "headway_s": "float64",
+}
+
+TIPOS_REGULARIDADE = {
+    "tipo_ponto": "object",
+    "letreiro_linha": "object",
+    "id_linha": "Int64",
+    "sentido": "int8",
+    "id_ponto": "Int64",
+    "periodo": "object",
+    "n_headways": "int32",
+    "headway_medio_s": "float64",
+    "headway_mediano_s": "float64",
+    "headway_p10_s": "float64",
+    "headway_p90_s": "float64",
+    "cv": "float64",
+    "espera_media_s": "float64",
+    "espera_ideal_s": "float64",
+    "espera_excedente_s": "float64",
+}
+
+
+def _por_valor_unico(valores, converter):
+    """Aplica `converter` só aos valores distintos (poucos HH:MM e instantes de coleta por dia) e espalha."""
+    codigos, unicos = pd.factorize(np.asarray(valores))
+    # Código -1 (nulo) não existe no índice → NaN/NaT
+    return converter(pd.Series(unicos)).reindex(codigos).reset_index(drop=True)
+
+
+def _minutos_do_dia(hhmm):
+    partes = hhmm.astype("string").str.extract(r"^(\d{1,2}):(\d{2})").astype("float64")
+    return partes[0] * 60 + partes[1]
+
+
+def horario_previsto(timestamp_coleta, horario_previsao):
+    """'HH:MM' da previsão → datetime no dia da coleta (ou no seguinte, se virou a meia-noite)."""
+    coleta = _por_valor_unico(timestamp_coleta, lambda s: pd.to_datetime(s, format="ISO8601"))
+    minutos = _por_valor_unico(horario_previsao, _minutos_do_dia)
+    previsto = coleta.dt.normalize() + pd.to_timedelta(minutos, unit="min")
+    # Previsão "23:58" coletada às 00:03 é de ontem; "00:05" coletada às 23:50 é de amanhã
+    previsto = previsto.mask(previsto < coleta - pd.Timedelta(hours=12), previsto + pd.Timedelta(days=1))
+    return previsto.mask(previsto > coleta + pd.Timedelta(hours=12), previsto - pd.Timedelta(days=1))
+
+
+def visitas_previsoes(previsoes, lacuna_visita_min=LACUNA_VISITA_MIN):
+    """Previsões (schema de `previsoes`) ordenadas por (id_linha, id_parada, id_onibus, coleta) e numeradas em visitas.
+
+    Retorna DataFrame com timestamp_coleta, id_linha, id_parada, id_onibus, previsto (datetime),
+    `visita` (0, 1, ... na ordem) e `fim_visita` (última coleta da visita).
+    """
+    previsoes = previsoes.dropna(subset=["id_linha", "id_onibus", "id_parada", "horario_previsao"])
+    coleta = _por_valor_unico(previsoes["timestamp_coleta"], lambda s: pd.to_datetime(s, format="ISO8601"))
+    coleta = coleta.to_numpy("datetime64[us]")
+    id_linha = previsoes["id_linha"].to_numpy("int64")
+    id_parada = previsoes["id_parada"].to_numpy("int64")
+    id_onibus = previsoes["id_onibus"].to_numpy("int64")
+    ordem = np.lexsort((coleta, id_onibus, id_parada, id_linha))
+    coleta, id_linha, id_parada, id_onibus = coleta[ordem], id_linha[ordem], id_parada[ordem], id_onibus[ordem]
+    previsto = horario_previsto(coleta, previsoes["horario_previsao"].to_numpy()[ordem]).to_numpy("datetime64[us]")
+
+    # A visita termina onde a chave muda ou a coleta seguinte demora demais
+    fim = np.ones(len(coleta), dtype=bool)
+    fim[:-1] = (
+        (id_linha[1:] != id_linha[:-1])
+        | (id_parada[1:] != id_parada[:-1])
+        | (id_onibus[1:] != id_onibus[:-1])
+        | (coleta[1:] - coleta[:-1] > np.timedelta64(lacuna_visita_min, "m"))
+    )
+    visita = np.zeros(len(coleta), dtype="int64")
+    visita[1:] = np.cumsum(fim[:-1])
+    return pd.DataFrame(
+        {
+            "timestamp_coleta": coleta,
+            "id_linha": id_linha,
+            "id_parada": id_parada,
+            "id_onibus": id_onibus,
+            "previsto": previsto,
+            "visita": visita,
+            "fim_visita": fim,
+        }
+    )
+
+
+def passagens_paradas(previsoes, catalogo=None, lacuna_visita_min=LACUNA_VISITA_MIN):
+    """Passagens estimadas por parada a partir das coletas de previsões (schema de `previsoes`)."""
+    visitas = visitas_previsoes(previsoes, lacuna_visita_min)
+    if visitas.empty:
+        return particao_vazia(TIPOS_PASSAGENS)
+
+    coleta = visitas["timestamp_coleta"].to_numpy()
+    # Ainda visível na última coleta da linha: o ônibus pode não ter passado
+    ultima_coleta = visitas.groupby("id_linha")["timestamp_coleta"].transform("max").to_numpy()
+    fim = visitas["fim_visita"].to_numpy() & (coleta < ultima_coleta) & visitas["previsto"].notna().to_numpy()
+    ultimas = visitas[fim]
+
+    passagens = pd.DataFrame(
+        {
+            "tipo_ponto": "parada",
+            "letreiro_linha": None,
+            "id_linha": ultimas["id_linha"],
+            "sentido": np.where(ultimas["id_linha"] >= OFFSET_SENTIDO_2, 2, 1),
+            "id_ponto": ultimas["id_parada"],
+            "id_onibus": ultimas["id_onibus"],
+            "instante": ultimas["previsto"],
+        }
+    ).reset_index(drop=True)
+    if catalogo is not None:
+        passagens["letreiro_linha"] = np.asarray(catalogo.letreiro_por_id(passagens["id_linha"]), dtype=object)
+    return passagens.astype(TIPOS_PASSAGENS)
+
+
+def passagens_terminais(viagens):
+    """Partidas de terminal (viagens que começam no terminal); `id_ponto` é o sentido da viagem."""
+    partidas = viagens[viagens["inicio_no_terminal"].astype(bool) & (viagens["sentido"] > 0)]
+    return pd.DataFrame(
+        {
+            "tipo_ponto": "terminal",
+            "letreiro_linha": partidas["letreiro_linha"].astype(object),
+            "id_linha": pd.NA,
+            "sentido": partidas["sentido"],
+            "id_ponto": partidas["sentido"],
+            "id_onibus": partidas["id_onibus"],
+            "instante": partidas["inicio"],
+        }
+    ).astype(TIPOS_PASSAGENS)
+
+
+def periodo_de(instantes):
+    """Nome do período (PERIODOS) de cada instante."""
+    horas = pd.DatetimeIndex(instantes).hour.to_numpy()
+    inicios = np.array(list(PERIODOS))
+    nomes = np.array(list(PERIODOS.values()), dtype=object)
+    return nomes[np.searchsorted(inicios, horas, side="right") - 1]
+
+
+def calcular_headways(passagens, headway_max_min=HEADWAY_MAX_MIN):
+    """Headway de cada passagem em relação à anterior do mesmo ponto (ordenação + diff)."""
+    if passagens.empty:
+        return particao_vazia(TIPOS_HEADWAYS)
+
+    passagens = passagens.sort_values([*CHAVES_PONTO, "instante"], na_position="first", kind="stable")
+    passagens = passagens.reset_index(drop=True)
+    grupo = passagens.groupby(CHAVES_PONTO, dropna=False, sort=False).ngroup().to_numpy()
+    instante = passagens["instante"].to_numpy("datetime64[us]")
+    onibus = passagens["id_onibus"].to_numpy()
+
+    valido = np.zeros(len(passagens), dtype=bool)
+    headway_s = np.full(len(passagens), np.nan)
+    headway_s[1:] = (instante[1:] - instante[:-1]) / np.timedelta64(1, "s")
+    anterior = np.zeros(len(passagens), dtype="int64")
+    anterior[1:] = onibus[:-1]
+    valido[1:] = (grupo[1:] == grupo[:-1]) & (onibus[1:] != onibus[:-1])
+    valido &= headway_s <= headway_max_min * 60
+
+    headways = passagens[valido].assign(id_onibus_anterior=anterior[valido], headway_s=headway_s[valido])
+    headways["periodo"] = periodo_de(headways["instante"])
+    return headways[list(TIPOS_HEADWAYS)].astype(TIPOS_HEADWAYS)
+
+
+def _agregar(headways, chaves, min_headways):
+    h = headways["headway_s"]
+    agrupado = h.groupby([headways[c] for c in chaves], dropna=False, sort=True)
+    metricas = pd.DataFrame(
+        {
+            "n_headways": agrupado.size(),
+            "headway_medio_s": agrupado.mean(),
+            "headway_mediano_s": agrupado.median(),
+            "headway_p10_s": agrupado.quantile(0.1),
+            "headway_p90_s": agrupado.quantile(0.9),
+            "desvio": agrupado.std(ddof=0),
+            "soma": agrupado.sum(),
+            "soma_quadrados": (h * h).groupby([headways[c] for c in chaves], dropna=False, sort=True).sum(),
+        }
+    ).reset_index()
+    metricas = metricas[metricas["n_headways"] >= min_headways]
+
+    metricas["cv"] = metricas["desvio"] / metricas["headway_medio_s"]
+    metricas["espera_media_s"] = metricas["soma_quadrados"] / (2 * metricas["soma"])
+    metricas["espera_ideal_s"] = metricas["headway_medio_s"] / 2
+    metricas["espera_excedente_s"] = metricas["espera_media_s"] - metricas["espera_ideal_s"]
+    return metricas
+
+
+def regularidade(headways, min_headways=MIN_HEADWAYS):
+    """Métricas por (ponto, período) e, com `id_ponto` nulo, por (linha, sentido, período) sobre as paradas."""
+    if headways.empty:
+        return particao_vazia(TIPOS_REGULARIDADE)
+
+    por_ponto = _agregar(headways, [*CHAVES_PONTO, "periodo"], min_headways)
+    paradas = headways[headways["tipo_ponto"] == "parada"]
+    por_linha = _agregar(paradas, ["tipo_ponto", "letreiro_linha", "id_linha", "sentido", "periodo"], min_headways)
+    por_linha["id_ponto"] = pd.NA
+
+    metricas = pd.concat([por_ponto, por_linha], ignore_index=True)
+    return metricas[list(TIPOS_REGULARIDADE)].astype(TIPOS_REGULARIDADE)
+
+
+def processar_dia(dia, parquet_dir=None, gold_dir=None, catalogo_path=None):
+    """Calcula e publica headways e regularidade de um dia; retorna o número de headways."""
+    parquet_dir = parquet_dir or PARQUET_DIR
+    gold_dir = gold_dir or GOLD_DIR
+    inicio = time.perf_counter()
+
+    partes = []
+    previsoes = ler_particao(
+        parquet_dir, "previsoes", dia, ["timestamp_coleta", "id_linha", "id_onibus", "id_parada", "horario_previsao"]
+    )
+    if previsoes is not None:
+        catalogo = carregar_catalogo_opcional("headways de paradas sairão sem letreiro_linha", catalogo_path)
+        partes.append(passagens_paradas(previsoes, catalogo))
+    viagens = ler_particao(
+        parquet_dir, "viagens", dia, ["letreiro_linha", "id_onibus", "sentido", "inicio", "inicio_no_terminal"]
+    )
+    if viagens is not None:
+        partes.append(passagens_terminais(viagens))
+    passagens = pd.concat(partes, ignore_index=True) if partes else particao_vazia(TIPOS_PASSAGENS)
+
+    headways = calcular_headways(passagens)
+    metricas = regularidade(headways)
+    publicar_particao(headways, os.path.join(gold_dir, "headways"), dia, "headways.parquet")
+    publicar_particao(metricas, os.path.join(gold_dir, "regularidade"), dia, "regularidade.parquet")
+    logging.info(
+        f"headways dt={dia}: {len(passagens)} passagens → {len(headways)} headways, "
+        f"{len(metricas)} grupos em {time.perf_counter() - inicio:.1f}s."
+    )
+    return len(headways)
+
+
+def processar_dias(dias, processos=None, parquet_dir=None, gold_dir=None, catalogo_path=None):
+    """Processa os dias com `processar_particoes` (um por tarefa; `processos=1` sem pool); retorna {dia: headways}."""
+    gold_dir = gold_dir or GOLD_DIR
+    fn = functools.partial(processar_dia, parquet_dir=parquet_dir, gold_dir=gold_dir, catalogo_path=catalogo_path)
+    destinos = [os.path.join(gold_dir, tabela) for tabela in ("headways", "regularidade")]
+    return processar_particoes(fn, dias, destinos, processos)
+
+
+def particoes(parquet_dir=None, inicio=None, fim=None):
+    """Dias ('YYYY-MM-DD') com partição Silver de previsões ou de viagens, opcionalmente em [inicio, fim]."""
+    dias = set()
+    for tabela in ("previsoes", "viagens"):
+        origem = os.path.join(parquet_dir or PARQUET_DIR, tabela)
+        if os.path.isdir(origem):
+            dias.update(d.removeprefix("dt=") for d in os.listdir(origem) if d.startswith("dt="))
+    return [d for d in sorted(dias) if (inicio is None or d >= inicio) and (fim is None or d <= fim)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headways e regularidade por linha, ponto e período (Gold)")
+    parser.add_argument("--inicio", help="Primeiro dia (YYYY-MM-DD).")
+    parser.add_argument("--fim", help="Último dia, inclusive (YYYY-MM-DD).")
+    parser.add_argument("--processos", type=int, default=os.cpu_count(), help="Processos paralelos (1 = sem pool).")
+    args = parser.parse_args()
+
+    dias = particoes(inicio=args.inicio, fim=args.fim)
+    if not dias:
+        logging.warning("Nenhuma partição de previsoes/viagens no período. Nada a calcular.")
+        return
+    logging.info(f"Calculando headways de {len(dias)} dia(s) com até {args.processos} processo(s)...")
+    resultado = processar_dias(dias, processos=args.processos)
+    logging.info(f"Concluído: {sum(resultado.values())} headways em {len(resultado)} dia(s).")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,7 @@ Cria as tabelas e índices UNIQUE necessários para o pipeline.
 Uso:
     python src/inicializar_banco.py                      # SQLite (padrão)
     DATABASE_URL=postgresql://... python src/inicializar_banco.py  # PostgreSQL
+    SPTRANS_SCHEMA_COMPACTO=1 python src/inicializar_banco.py      # SQLite, posições no schema compacto
 """
 
 import logging
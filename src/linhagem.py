@@ -0,0 +1,149 @@
+"""
+Registro de linhagem em lote e assíncrono (tabela `lineage_audit`).
+
+`registrar()` só enfileira o evento em memória (O(1), sem I/O); uma thread em
+segundo plano descarrega a fila em lotes — uma conexão e uma transação por lote,
+com `executemany` — a cada `INTERVALO_S` segundos ou quando a fila atinge
+`MAX_LOTE` eventos. No encerramento do processo (cada materialização Dagster roda
+em processo próprio) o que restar na fila é gravado via `atexit`. O banco de destino
+(DATABASE_URL/DB_PATH) é capturado ao enfileirar: a descarga grava cada evento no banco
+que estava em uso quando ele foi registrado, não no de quando a fila é esvaziada.
+
+Uso:
+    from src.linhagem import registrador, ultima_execucao_por_asset
+
+    registrador.registrar("posicoes_sptrans", "posicoes", "bronze", 15000, "ok")
+    registrador.descarregar()        # opcional: força a gravação imediata
+
+    with get_connection() as conn:
+        ultima_execucao_por_asset(conn)  # [{"asset_name": ..., "run_timestamp": ..., ...}]
+"""
+
+import atexit
+import logging
+import threading
+from datetime import datetime
+
+from src.database import SQL_INDICE_LINHAGEM, destino_atual, get_connection, is_postgres
+
+logger = logging.getLogger(__name__)
+
+MAX_LOTE = 500
+INTERVALO_S = 5.0
+MAX_PENDENTES = 50_000  # teto da fila se o banco ficar indisponível (descarta os mais antigos)
+
+COLUNAS = ["asset_name", "table_name", "layer", "run_timestamp", "row_count", "status"]
+
+
+class RegistradorLinhagem:
+    """Fila de eventos de linhagem com descarga em lote por uma thread de fundo."""
+
+    def __init__(self, max_lote=MAX_LOTE, intervalo_s=INTERVALO_S):
+        self.max_lote = max_lote
+        self.intervalo_s = intervalo_s
+        self._fila = []
+        self._lock = threading.Lock()
+        self._escrita = threading.Lock()  # serializa descargas (thread de fundo × chamada explícita)
+        self._acordar = threading.Event()
+        self._thread = None
+
+    def registrar(self, asset_name, table_name, layer, row_count, status="ok"):
+        """Enfileira um evento; nunca faz I/O nem levanta exceção no caminho do asset."""
+        evento = (asset_name, table_name, layer, datetime.now().isoformat(), int(row_count or 0), status)
+        with self._lock:
+            self._fila.append((destino_atual(), evento))
+            cheia = len(self._fila) >= self.max_lote
+        self._iniciar()
+        if cheia:
+            self._acordar.set()
+
+    def pendentes(self):
+        with self._lock:
+            return len(self._fila)
+
+    def limpar(self):
+        """Descarta os eventos pendentes sem gravar. Retorna quantos foram descartados."""
+        with self._lock:
+            descartados, self._fila = len(self._fila), []
+        return descartados
+
+    def descarregar(self):
+        """Grava os eventos pendentes, uma transação por banco de destino. Retorna quantos foram gravados."""
+        with self._escrita:
+            with self._lock:
+                fila, self._fila = self._fila, []
+            lotes = {}
+            for destino, evento in fila:
+                lotes.setdefault(destino, []).append(evento)
+            gravados = 0
+            for destino, lote in lotes.items():
+                try:
+                    with get_connection(destino) as conn:
+                        self._garantir_indice(conn)
+                        ph = ", ".join(["%s" if destino[0] is not None else "?"] * len(COLUNAS))
+                        conn.cursor().executemany(
+                            f"INSERT INTO lineage_audit ({', '.join(COLUNAS)}) VALUES ({ph})",
+                            lote,
+                        )
+                except Exception as e:
+                    with self._lock:
+                        self._fila = ([(destino, evento) for evento in lote] + self._fila)[-MAX_PENDENTES:]
+                    logger.warning("Falha ao gravar %s eventos de linhagem (banco indisponível?): %s", len(lote), e)
+                    continue
+                logger.debug("Linhagem: %s eventos gravados em lote.", len(lote))
+                gravados += len(lote)
+            return gravados
+
+    @staticmethod
+    def _garantir_indice(conn):
+        # A tabela vem do schema (init_db); o índice é criado aqui também para bancos
+        # anteriores a ele. Idempotente e barato: uma vez por lote, não por evento.
+        conn.cursor().execute(SQL_INDICE_LINHAGEM)
+
+    def _iniciar(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._laco, name="linhagem", daemon=True)
+            self._thread.start()
+
+    def _laco(self):
+        while True:
+            self._acordar.wait(self.intervalo_s)
+            self._acordar.clear()
+            self.descarregar()
+
+
+registrador = RegistradorLinhagem()
+atexit.register(registrador.descarregar)
+
+
+def ultima_execucao(conn, asset_name):
+    """Última execução registrada de um asset (ou None). Busca direta no índice (asset_name, run_timestamp)."""
+    ph = "%s" if is_postgres() else "?"
+    cursor = conn.cursor()
+    cursor.execute(
+        f"SELECT {', '.join(COLUNAS)} FROM lineage_audit WHERE asset_name = {ph} ORDER BY run_timestamp DESC LIMIT 1",
+        (asset_name,),
+    )
+    row = cursor.fetchone()
+    return dict(zip(COLUNAS, row)) if row else None
+
+
+def ultima_execucao_por_asset(conn):
+    """Última execução de cada asset, ordenada por asset_name."""
+    colunas = ", ".join(f"l.{c}" for c in COLUNAS)
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT {colunas}
+        FROM lineage_audit l
+        JOIN (
+            SELECT asset_name, max(run_timestamp) AS ultimo
+            FROM lineage_audit
+            GROUP BY asset_name
+        ) u ON l.asset_name = u.asset_name AND l.run_timestamp = u.ultimo
+        ORDER BY l.asset_name
+    """)
+    return [dict(zip(COLUNAS, row)) for row in cursor.fetchall()]
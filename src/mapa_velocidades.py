@@ -0,0 +1,219 @@
+"""
+Mapa de velocidades da cidade a partir das posições coletadas (Silver → Gold).
+
+Velocidade instantânea: entre duas posições consecutivas do mesmo ônibus na mesma linha,
+distância haversine / intervalo — vetorizado sobre o dia inteiro ordenado por (linha,
+ônibus, instante), sem groupby por ônibus. Passos com intervalo acima de LACUNA_MAX_MIN
+(o ônibus sumiu da coleta) ou velocidade acima de VELOCIDADE_MAXIMA_KMH (GPS saltando)
+são descartados.
+
+Cada passo cai na célula geohash do seu ponto médio e na janela de JANELA_MIN minutos do
+seu instante médio (horário local). Por (célula, janela): amostras, ônibus distintos e
+velocidade média, mediana e p10.
+
+Célula: geohash de PRECISAO_GEOHASH caracteres (7 ≈ 150 m × 150 m em São Paulo) guardado
+como inteiro — os 5 bits de cada caractere em sequência, longitude primeiro — em vez do
+texto base32: cabe num int64, ordena como o texto e comprime melhor. `geohash_texto` e
+`centro_celula` decodificam; o dashboard desenha o mapa de calor só com este agregado,
+sem ler as posições.
+
+Saída (Gold, tmp + os.replace, manifesto como no Silver), ordenada por (janela, celula):
+    data/parquet/gold/velocidades/dt=YYYY-MM-DD/velocidades.parquet
+
+Uso:
+    python -m src.mapa_velocidades                                   # todas as partições de posicoes
+    python -m src.mapa_velocidades --inicio 2025-08-01 --fim 2025-08-31 --processos 8
+"""
+
+import argparse
+import functools
+import logging
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.compactar_parquet import particao_vazia, processar_particoes, publicar_particao
+from src.geo import haversine_m
+from src.viagens import ler_posicoes_do_dia, particoes_posicoes, preparar_pontos
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+PARQUET_DIR = os.path.join("data", "parquet")
+GOLD_DIR = os.path.join(PARQUET_DIR, "gold")
+ARQUIVO_VELOCIDADES = "velocidades.parquet"
+
+PRECISAO_GEOHASH = 7
+JANELA_MIN = 15
+LACUNA_MAX_MIN = 10
+VELOCIDADE_MAXIMA_KMH = 90
+
+BASE32 = np.array(list("0123456789bcdefghjkmnpqrstuvwxyz"))
+
+TIPOS_VELOCIDADES = {
+    "janela": "datetime64[us]",
+    "celula": "int64",
+    "n_amostras": "int32",
+    "n_onibus": "int32",
+    "velocidade_media_kmh": "float32",
+    "velocidade_mediana_kmh": "float32",
+    "velocidade_p10_kmh": "float32",
+}
+
+
+def _bits(precisao):
+    """Bits de longitude e de latitude de um geohash de `precisao` caracteres (longitude leva o bit a mais)."""
+    total = 5 * precisao
+    return (total + 1) // 2, total // 2
+
+
+def geohash(latitude, longitude, precisao=PRECISAO_GEOHASH):
+    """Geohash de cada ponto como int64 (5·precisao bits, mesmo valor dos caracteres base32 em sequência)."""
+    bits_lon, bits_lat = _bits(precisao)
+    lat = np.asarray(latitude, dtype="float64")
+    lon = np.asarray(longitude, dtype="float64")
+    ix = np.clip(np.floor((lon + 180) / 360 * 2.0**bits_lon), 0, 2**bits_lon - 1).astype("int64")
+    iy = np.clip(np.floor((lat + 90) / 180 * 2.0**bits_lat), 0, 2**bits_lat - 1).astype("int64")
+    # Intercala do bit mais significativo: lon, lat, lon, ... (um passo por bit, não por ponto)
+    codigo = np.zeros(ix.shape, dtype="int64")
+    for k in range(5 * precisao):
+        fonte, bit = (ix, bits_lon - 1 - k // 2) if k % 2 == 0 else (iy, bits_lat - 1 - k // 2)
+        codigo = (codigo << 1) | ((fonte >> bit) & 1)
+    return codigo
+
+
+def _desintercalar(celula, precisao):
+    bits_lon, bits_lat = _bits(precisao)
+    codigo = np.asarray(celula, dtype="int64")
+    ix = np.zeros(codigo.shape, dtype="int64")
+    iy = np.zeros(codigo.shape, dtype="int64")
+    total = 5 * precisao
+    for k in range(total):
+        bit = (codigo >> (total - 1 - k)) & 1
+        if k % 2 == 0:
+            ix = (ix << 1) | bit
+        else:
+            iy = (iy << 1) | bit
+    return ix, iy, bits_lon, bits_lat
+
+
+def centro_celula(celula, precisao=PRECISAO_GEOHASH):
+    """Centro (latitude, longitude) de cada célula geohash inteira."""
+    ix, iy, bits_lon, bits_lat = _desintercalar(celula, precisao)
+    return (iy + 0.5) * 180 / 2.0**bits_lat - 90, (ix + 0.5) * 360 / 2.0**bits_lon - 180
+
+
+def geohash_texto(celula, precisao=PRECISAO_GEOHASH):
+    """Células inteiras → geohash em base32 (array de str), para exportar ou conferir."""
+    codigo = np.asarray(celula, dtype="int64")
+    caracteres = [BASE32[(codigo >> (5 * (precisao - 1 - i))) & 31] for i in range(precisao)]
+    return functools.reduce(np.char.add, caracteres)
+
+
+def velocidades_instantaneas(pontos, lacuna_max_min=LACUNA_MAX_MIN):
+    """Passos entre posições consecutivas do mesmo ônibus → DataFrame (id_onibus, instante, latitude,
+    longitude, velocidade_kmh), com instante e coordenadas no ponto médio do passo.
+
+    `pontos`: saída de `preparar_pontos` (ordenada por letreiro, ônibus e instante).
+    """
+    letreiro = pontos["letreiro_linha"].cat.codes.to_numpy()
+    onibus = pontos["id_onibus"].to_numpy()
+    instante = pontos["instante"].to_numpy()
+    lat = pontos["latitude"].to_numpy()
+    lon = pontos["longitude"].to_numpy()
+
+    dt = (instante[1:] - instante[:-1]) / np.timedelta64(1, "s")
+    velocidade = haversine_m(lat[:-1], lon[:-1], lat[1:], lon[1:]) / np.where(dt > 0, dt, np.nan) * 3.6
+    valido = (
+        (letreiro[1:] == letreiro[:-1])
+        & (onibus[1:] == onibus[:-1])
+        & (dt > 0)
+        & (dt <= lacuna_max_min * 60)
+        & (velocidade <= VELOCIDADE_MAXIMA_KMH)
+    )
+    anterior = np.flatnonzero(valido)
+    return pd.DataFrame(
+        {
+            "id_onibus": onibus[anterior],
+            "instante": instante[anterior] + (instante[anterior + 1] - instante[anterior]) / 2,
+            "latitude": (lat[anterior] + lat[anterior + 1]) / 2,
+            "longitude": (lon[anterior] + lon[anterior + 1]) / 2,
+            "velocidade_kmh": velocidade[valido],
+        }
+    )
+
+
+def agregar_celulas(passos, precisao=PRECISAO_GEOHASH, janela_min=JANELA_MIN):
+    """Passos (de `velocidades_instantaneas`) → métricas por (janela, célula), no schema TIPOS_VELOCIDADES."""
+    if passos.empty:
+        return particao_vazia(TIPOS_VELOCIDADES)
+
+    # Chave inteira única (janela << bits da célula | célula): agrupa e ordena por (janela, célula)
+    bits = 5 * precisao
+    janela = passos["instante"].to_numpy().astype("datetime64[m]").astype("int64") // janela_min
+    celula = geohash(passos["latitude"].to_numpy(), passos["longitude"].to_numpy(), precisao)
+    chave = (janela << bits) | celula
+    agrupado = pd.Series(passos["velocidade_kmh"].to_numpy(), index=chave).groupby(level=0, sort=True)
+
+    distintos = pd.DataFrame({"chave": chave, "id_onibus": passos["id_onibus"].to_numpy()}).drop_duplicates()
+    metricas = pd.DataFrame(
+        {
+            "n_amostras": agrupado.size(),
+            "n_onibus": distintos.groupby("chave", sort=True).size(),
+            "velocidade_media_kmh": agrupado.mean(),
+            "velocidade_mediana_kmh": agrupado.median(),
+            "velocidade_p10_kmh": agrupado.quantile(0.1),
+        }
+    )
+    chaves = metricas.index.to_numpy()
+    metricas["janela"] = ((chaves >> bits) * janela_min).astype("datetime64[m]")
+    metricas["celula"] = chaves & ((1 << bits) - 1)
+    return metricas[list(TIPOS_VELOCIDADES)].astype(TIPOS_VELOCIDADES).reset_index(drop=True)
+
+
+def mapa_velocidades(posicoes, precisao=PRECISAO_GEOHASH, janela_min=JANELA_MIN):
+    """Posições (schema de `posicoes`) → métricas de velocidade por (janela, célula)."""
+    return agregar_celulas(velocidades_instantaneas(preparar_pontos(posicoes)), precisao, janela_min)
+
+
+def processar_dia(dia, parquet_dir=None, gold_dir=None):
+    """Calcula e publica o mapa de velocidades de um dia; retorna o número de (janela, célula)."""
+    parquet_dir = parquet_dir or PARQUET_DIR
+    gold_dir = gold_dir or GOLD_DIR
+    inicio = time.perf_counter()
+    passos = velocidades_instantaneas(preparar_pontos(ler_posicoes_do_dia(dia, parquet_dir)))
+    metricas = agregar_celulas(passos)
+    publicar_particao(metricas, os.path.join(gold_dir, "velocidades"), dia, ARQUIVO_VELOCIDADES)
+    logging.info(
+        f"velocidades dt={dia}: {len(passos)} passos → {len(metricas)} (janela, célula) "
+        f"em {time.perf_counter() - inicio:.1f}s."
+    )
+    return len(metricas)
+
+
+def processar_dias(dias, processos=None, parquet_dir=None, gold_dir=None):
+    """Processa os dias com `processar_particoes` (um por tarefa; `processos=1` sem pool); retorna {dia: (janela, célula)}."""
+    gold_dir = gold_dir or GOLD_DIR
+    fn = functools.partial(processar_dia, parquet_dir=parquet_dir, gold_dir=gold_dir)
+    return processar_particoes(fn, dias, os.path.join(gold_dir, "velocidades"), processos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mapa de velocidades por célula geohash e janela de 15 min (Gold)")
+    parser.add_argument("--inicio", help="Primeiro dia (YYYY-MM-DD).")
+    parser.add_argument("--fim", help="Último dia, inclusive (YYYY-MM-DD).")
+    parser.add_argument("--processos", type=int, default=os.cpu_count(), help="Processos paralelos (1 = sem pool).")
+    args = parser.parse_args()
+
+    dias = particoes_posicoes(inicio=args.inicio, fim=args.fim)
+    if not dias:
+        logging.warning(f"Nenhuma partição de posições em {os.path.join(PARQUET_DIR, 'posicoes')} no período.")
+        return
+    logging.info(f"Calculando velocidades de {len(dias)} dia(s) com até {args.processos} processo(s)...")
+    resultado = processar_dias(dias, processos=args.processos)
+    logging.info(f"Concluído: {sum(resultado.values())} (janela, célula) em {len(resultado)} dia(s).")
+
+
+if __name__ == "__main__":
+    main()
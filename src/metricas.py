@@ -0,0 +1,286 @@
+"""
+Métricas operacionais no formato de exposição do Prometheus (texto 0.0.4).
+
+Registro em memória, por processo, com contadores, medidores (gauges) e
+histogramas rotulados — sem dependência nova. Duas formas de exposição:
+
+- HTTP `/metrics`: para os serviços de longa duração (`coleta_sptrans.main`,
+  `coleta_previsoes.main`), ligado por `SPTRANS_METRICAS_PORTA`; escuta só em
+  127.0.0.1, salvo `SPTRANS_METRICAS_ENDERECO` (ex.: 0.0.0.0 dentro de container);
+- textfile: para processos curtos (cada run do Dagster), gravado em
+  `SPTRANS_METRICAS_DIR/<nome>.prom` e lido pelo textfile collector do
+  node_exporter.
+
+Uso:
+    from src import metricas
+
+    with metricas.API_LATENCIA.medir(endpoint="/Posicao"):
+        resp = session.get(url)
+    metricas.LINHAS_INSERIDAS.inc(inseridos, tabela="posicoes")
+
+    metricas.iniciar_servidor()          # se SPTRANS_METRICAS_PORTA estiver definida
+    metricas.gravar_textfile("coleta")   # se SPTRANS_METRICAS_DIR estiver definida
+"""
+
+import logging
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+TIPO_CONTEUDO = "text/plain; version=0.0.4; charset=utf-8"
+# /metrics só na loopback por padrão; SPTRANS_METRICAS_ENDERECO abre para outras interfaces
+ENDERECO_PADRAO = "127.0.0.1"
+
+# Limites (segundos) pensados para chamadas HTTP e escritas em lote de 5 ms a 1 min
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# /Posicao devolve ~2-5 MB; /Previsao/Linha, poucos KB
+BUCKETS_BYTES = (1_000, 10_000, 100_000, 500_000, 1_000_000, 2_500_000, 5_000_000, 10_000_000)
+
+_REGISTRO = {}
+_lock_registro = threading.Lock()
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _formatar_numero(valor):
+    if math.isinf(valor):
+        return "+Inf" if valor > 0 else "-Inf"
+    return repr(float(valor)) if isinstance(valor, float) and not valor.is_integer() else str(int(valor))
+
+
+def _formatar_rotulos(pares):
+    pares = list(pares)
+    if not pares:
+        return ""
+    return "{" + ",".join(f'{nome}="{_escapar(valor)}"' for nome, valor in pares) + "}"
+
+
+class _Metrica:
+    tipo = "untyped"
+
+    def __init__(self, nome, ajuda, rotulos=()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def _chave(self, rotulos):
+        if set(rotulos) != set(self.rotulos):
+            raise ValueError(f"{self.nome}: rótulos esperados {self.rotulos}, recebidos {tuple(rotulos)}")
+        return tuple(str(rotulos[r]) for r in self.rotulos)
+
+    def valor(self, **rotulos):
+        """Valor atual da série (0 se ainda não observada)."""
+        with self._lock:
+            return self._valores.get(self._chave(rotulos), 0)
+
+    def limpar(self):
+        with self._lock:
+            self._valores.clear()
+
+    def _linhas(self):
+        with self._lock:
+            itens = sorted(self._valores.items())
+        for chave, valor in itens:
+            yield f"{self.nome}{_formatar_rotulos(zip(self.rotulos, chave))} {_formatar_numero(valor)}"
+
+    def expor(self):
+        return "\n".join([f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} {self.tipo}", *self._linhas()])
+
+
+class Contador(_Metrica):
+    """Valor monotônico (só cresce) por combinação de rótulos."""
+
+    tipo = "counter"
+
+    def inc(self, valor=1, **rotulos):
+        if valor < 0:
+            raise ValueError(f"{self.nome}: contador não pode decrescer ({valor}).")
+        chave = self._chave(rotulos)
+        with self._lock:
+            self._valores[chave] = self._valores.get(chave, 0) + valor
+
+
+class Medidor(_Metrica):
+    """Valor instantâneo (pode subir e descer)."""
+
+    tipo = "gauge"
+
+    def definir(self, valor, **rotulos):
+        chave = self._chave(rotulos)
+        with self._lock:
+            self._valores[chave] = valor
+
+
+class Histograma(_Metrica):
+    """Distribuição de observações em buckets cumulativos, com soma e contagem."""
+
+    tipo = "histogram"
+
+    def __init__(self, nome, ajuda, rotulos=(), buckets=BUCKETS_SEGUNDOS):
+        super().__init__(nome, ajuda, rotulos)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observar(self, valor, **rotulos):
+        chave = self._chave(rotulos)
+        with self._lock:
+            serie = self._valores.setdefault(chave, {"buckets": [0] * len(self.buckets), "soma": 0.0, "n": 0})
+            for i, limite in enumerate(self.buckets):
+                if valor <= limite:
+                    serie["buckets"][i] += 1
+            serie["soma"] += valor
+            serie["n"] += 1
+
+    @contextmanager
+    def medir(self, **rotulos):
+        """Observa a duração (relógio monotônico) do bloco, mesmo se ele levantar exceção."""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(time.perf_counter() - inicio, **rotulos)
+
+    def valor(self, **rotulos):
+        """(contagem, soma) da série."""
+        with self._lock:
+            serie = self._valores.get(self._chave(rotulos))
+            return (serie["n"], serie["soma"]) if serie else (0, 0.0)
+
+    def _linhas(self):
+        with self._lock:
+            itens = sorted(
+                (chave, dict(serie, buckets=list(serie["buckets"]))) for chave, serie in self._valores.items()
+            )
+        for chave, serie in itens:
+            pares = list(zip(self.rotulos, chave))
+            for limite, acumulado in zip(self.buckets, serie["buckets"]):
+                rotulos = _formatar_rotulos([*pares, ("le", _formatar_numero(limite))])
+                yield f"{self.nome}_bucket{rotulos} {acumulado}"
+            yield f"{self.nome}_sum{_formatar_rotulos(pares)} {_formatar_numero(serie['soma'])}"
+            yield f"{self.nome}_count{_formatar_rotulos(pares)} {serie['n']}"
+
+
+def _registrar(classe, nome, ajuda, rotulos=(), **kwargs):
+    with _lock_registro:
+        if nome not in _REGISTRO:
+            _REGISTRO[nome] = classe(nome, ajuda, rotulos, **kwargs)
+        metrica = _REGISTRO[nome]
+    if not isinstance(metrica, classe):
+        raise ValueError(f"Métrica '{nome}' já registrada como {metrica.tipo}.")
+    return metrica
+
+
+def contador(nome, ajuda, rotulos=()):
+    return _registrar(Contador, nome, ajuda, rotulos)
+
+
+def medidor(nome, ajuda, rotulos=()):
+    return _registrar(Medidor, nome, ajuda, rotulos)
+
+
+def histograma(nome, ajuda, rotulos=(), buckets=BUCKETS_SEGUNDOS):
+    return _registrar(Histograma, nome, ajuda, rotulos, buckets=buckets)
+
+
+def expor():
+    """Todas as métricas registradas, no formato de texto do Prometheus."""
+    with _lock_registro:
+        metricas = sorted(_REGISTRO.values(), key=lambda m: m.nome)
+    return "\n".join(m.expor() for m in metricas) + "\n"
+
+
+def limpar():
+    """Zera todas as séries (mantém as métricas registradas). Útil em testes."""
+    with _lock_registro:
+        metricas = list(_REGISTRO.values())
+    for metrica in metricas:
+        metrica.limpar()
+
+
+# --- Exposição ---
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        corpo = expor().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", TIPO_CONTEUDO)
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, format, *args):
+        logger.debug("metricas: " + format, *args)
+
+
+def iniciar_servidor(porta=None, endereco=None):
+    """Serve `/metrics` em uma thread daemon. Sem porta (nem SPTRANS_METRICAS_PORTA), não faz nada.
+
+    Sem endereço vale SPTRANS_METRICAS_ENDERECO ou ENDERECO_PADRAO (só loopback: expor a
+    outras interfaces é opt-in). Retorna o servidor (para `shutdown()`) ou None.
+    """
+    porta = porta if porta is not None else os.environ.get("SPTRANS_METRICAS_PORTA")
+    if porta is None or porta == "":
+        return None
+    endereco = endereco or os.environ.get("SPTRANS_METRICAS_ENDERECO") or ENDERECO_PADRAO
+    servidor = ThreadingHTTPServer((endereco, int(porta)), _Handler)
+    threading.Thread(target=servidor.serve_forever, name="metricas-http", daemon=True).start()
+    logger.info("Métricas expostas em http://%s:%s/metrics", endereco, servidor.server_address[1])
+    return servidor
+
+
+def gravar_textfile(nome, diretorio=None):
+    """Grava as métricas em `<diretorio>/<nome>.prom` (escrita atômica). Sem diretório, não faz nada."""
+    diretorio = diretorio or os.environ.get("SPTRANS_METRICAS_DIR")
+    if not diretorio:
+        return None
+    os.makedirs(diretorio, exist_ok=True)
+    caminho = os.path.join(diretorio, f"{nome}.prom")
+    # O collector ignora arquivos que não terminam em .prom: o temporário nunca é lido pela metade
+    tmp = f"{caminho}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(expor())
+    os.replace(tmp, caminho)
+    return caminho
+
+
+# --- Métricas do pipeline ---
+API_LATENCIA = histograma("sptrans_api_latencia_segundos", "Latência das chamadas à API Olho Vivo.", ["endpoint"])
+API_BYTES = histograma(
+    "sptrans_api_payload_bytes", "Tamanho do corpo das respostas da API Olho Vivo.", ["endpoint"], BUCKETS_BYTES
+)
+API_ERROS = contador("sptrans_api_erros_total", "Chamadas à API que falharam (rede, HTTP ou JSON).", ["endpoint"])
+VEICULOS_VISTOS = contador(
+    "sptrans_veiculos_vistos_total", "Veículos devolvidos pela API antes do filtro.", ["coletor"]
+)
+VEICULOS_MANTIDOS = contador(
+    "sptrans_veiculos_mantidos_total", "Veículos mantidos após o filtro de linhas alvo.", ["coletor"]
+)
+ARQUIVO_BYTES = contador(
+    "sptrans_arquivo_bruto_bytes_total", "Bytes (zstd) gravados no arquivo de respostas brutas.", ["endpoint"]
+)
+LINHAS_INSERIDAS = contador("sptrans_linhas_inseridas_total", "Linhas efetivamente inseridas no Bronze.", ["tabela"])
+DB_ESCRITA = histograma(
+    "sptrans_db_escrita_segundos", "Duração de inserir_lote (INSERT em lote + contador).", ["tabela"]
+)
+CICLO = histograma("sptrans_ciclo_segundos", "Duração de um ciclo completo de coleta.", ["coletor"])
+COMPACTACAO_SEGUNDOS = histograma(
+    "sptrans_compactacao_segundos", "Duração da exportação SQLite → Parquet.", ["tabela"]
+)
+COMPACTACAO_TAXA = medidor(
+    "sptrans_compactacao_linhas_por_segundo", "Vazão da última compactação (linhas exportadas / s).", ["tabela"]
+)
+EXPURGO_SEGUNDOS = histograma("sptrans_expurgo_segundos", "Duração do expurgo de um dia do Bronze.", ["tabela"])
+EXPURGO_LINHAS = contador("sptrans_expurgo_linhas_total", "Linhas removidas do Bronze pelo expurgo.", ["tabela"])
+CONSULTA_SEGUNDOS = histograma(
+    "sptrans_consulta_segundos", "Duração das consultas do serviço HTTP (acerto de cache = 0).", ["rota", "cache"]
+)
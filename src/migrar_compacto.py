@@ -0,0 +1,128 @@
+"""
+Script de migração one-shot: `posicoes` → schema compacto (SQLite).
+
+Copia a tabela `posicoes` para `posicoes_compactas` (WITHOUT ROWID, chave
+(ts_coleta, id_onibus), timestamps em segundos desde 1970, letreiro na dimensão
+`linhas`, lat/lon em inteiros de 1e-6 grau), troca a tabela pela view `posicoes`
+com as colunas de sempre e roda VACUUM para devolver o espaço ao disco.
+
+Tudo numa transação: uma falha no meio deixa o banco como estava. Pode ser
+executado múltiplas vezes sem efeito colateral (idempotente).
+
+Depois de migrar, recompacte os dias ainda no SQLite (`python src/compactar_parquet.py
+--date ...`): o Silver passa a ter as coordenadas arredondadas em 1e-6 grau, e o
+checksum Bronze × Silver só volta a bater com a partição regravada.
+
+Uso:
+    python -m src.migrar_compacto
+"""
+
+import logging
+import os
+import sqlite3
+
+from src.database import (
+    ESCALA_COORDENADA,
+    SQL_CREATE_LINHAS,
+    SQL_CREATE_POSICOES_COMPACTAS,
+    SQL_CREATE_VIEW_POSICOES,
+    ajustar_contagem,
+    is_postgres,
+)
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(levelname)s - %(message)s",
+)
+
+DB_PATH = os.path.join("data", "sptrans_data.db")
+
+SQL_COPIAR_LINHAS = """
+    INSERT OR IGNORE INTO linhas (letreiro_linha)
+    SELECT DISTINCT letreiro_linha FROM posicoes WHERE letreiro_linha IS NOT NULL ORDER BY letreiro_linha
+"""
+
+# Em ordem de chave: a B-tree de uma tabela WITHOUT ROWID cresce só pela direita
+SQL_COPIAR_POSICOES = f"""
+    INSERT OR IGNORE INTO posicoes_compactas (ts_coleta, id_onibus, id_letreiro, lat_e6, lon_e6, ts_posicao)
+    SELECT
+        CAST(strftime('%s', p.timestamp_coleta) AS INTEGER) AS ts_coleta,
+        p.id_onibus,
+        l.id_letreiro,
+        CAST(round(p.latitude * {ESCALA_COORDENADA}) AS INTEGER),
+        CAST(round(p.longitude * {ESCALA_COORDENADA}) AS INTEGER),
+        CAST(strftime('%s', p.timestamp_posicao) AS INTEGER)
+    FROM posicoes p
+    LEFT JOIN linhas l ON l.letreiro_linha = p.letreiro_linha
+    ORDER BY ts_coleta, p.id_onibus
+"""
+
+
+def ja_compacto(conn):
+    """True se `posicoes` já é a view do schema compacto."""
+    return conn.execute("SELECT type FROM sqlite_master WHERE name = 'posicoes'").fetchone() == ("view",)
+
+
+def migrar(conn):
+    """Migra `posicoes` para o schema compacto; retorna as linhas copiadas (0 se já migrado).
+
+    `conn` deve estar em modo autocommit (isolation_level=None): a migração controla a transação.
+    """
+    if ja_compacto(conn):
+        logging.info("'posicoes' já está no schema compacto. Nada a migrar.")
+        return 0
+
+    cursor = conn.cursor()
+    cursor.execute("BEGIN")
+    try:
+        cursor.execute(SQL_CREATE_LINHAS)
+        cursor.execute(SQL_CREATE_POSICOES_COMPACTAS)
+        cursor.execute("SELECT count(*) FROM posicoes")
+        originais = cursor.fetchone()[0]
+        logging.info(f"Copiando {originais} posições para 'posicoes_compactas'...")
+
+        cursor.execute(SQL_COPIAR_LINHAS)
+        cursor.execute(SQL_COPIAR_POSICOES)
+        copiadas = cursor.rowcount
+        descartadas = originais - copiadas
+        if descartadas:
+            # Duplicatas na chave (banco sem idx_posicoes_dedup) ou timestamp_coleta ilegível
+            logging.warning(f"  → {descartadas} registro(s) não copiado(s) (duplicados ou timestamp inválido).")
+
+        cursor.execute("DROP TABLE posicoes")
+        cursor.execute(SQL_CREATE_VIEW_POSICOES)
+        if descartadas:
+            ajustar_contagem(conn, "posicoes", -descartadas)
+        cursor.execute("COMMIT")
+    except Exception:
+        cursor.execute("ROLLBACK")
+        raise
+    logging.info(f"  → {copiadas} posições copiadas; 'posicoes' agora é uma view sobre 'posicoes_compactas'.")
+    return copiadas
+
+
+def main():
+    if is_postgres():
+        logging.warning("O schema compacto é só para SQLite (DATABASE_URL definida). Nada a migrar.")
+        return
+    if not os.path.exists(DB_PATH):
+        logging.warning(f"Banco {DB_PATH} não encontrado. Nada a migrar.")
+        return
+
+    tamanho_antes = os.path.getsize(DB_PATH)
+    conn = sqlite3.connect(DB_PATH, isolation_level=None)
+    try:
+        if migrar(conn):
+            logging.info("Executando VACUUM para devolver o espaço ao disco...")
+            conn.execute("VACUUM")
+    finally:
+        conn.close()
+
+    tamanho_depois = os.path.getsize(DB_PATH)
+    logging.info(
+        f"Migração para o schema compacto concluída: {tamanho_antes / 1e6:.1f} MB → {tamanho_depois / 1e6:.1f} MB."
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -14,6 +14,8 @@ import logging
 import os
 import sqlite3
 
+from src.database import ajustar_contagem
+
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s - %(levelname)s - %(message)s",
@@ -38,6 +40,7 @@ def remover_duplicatas(cursor, tabela, chaves, nome_idx):
     """)
     removidos = cursor.rowcount
     if removidos:
+        ajustar_contagem(cursor.connection, tabela, -removidos)
         logging.info(f"  → {removidos} registro(s) duplicado(s) removido(s).")
     else:
         logging.info("  → Nenhuma duplicata encontrada.")
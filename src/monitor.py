@@ -1,64 +1,203 @@
+"""
+Robô fiscal da pipeline: frescor e lotes vazios/parciais, com alertas por e-mail.
+
+Lê apenas a tabela de batimento `ultimo_lote` (uma linha por tabela, gravada pelos
+coletores na mesma transação do INSERT — ver `registrar_lote` em src/database.py) e a
+posição atual de cada ônibus (`posicoes_atuais`, via src/posicoes_atuais.py), então cada
+verificação custa O(1) ou O(frota) — nunca O(histórico) —, em SQLite ou PostgreSQL.
+
+Verificações por tabela (`posicoes`, `previsoes`):
+- frescor: último ciclo há mais de LIMITE_DADOS_ANTIGOS minutos;
+- lote vazio: último ciclo não inseriu nada;
+- lote parcial: inseridos < LIMITE_LOTE_PARCIAL × esperados (rejeições do contrato,
+  falha de escrita), ou esperados < LIMITE_LOTE_PARCIAL × média dos ciclos anteriores
+  (API devolveu só parte da frota).
+
+E sobre a frota do último ciclo de `posicoes`:
+- GPS atrasado: mais de LIMITE_FRACAO_GPS_ATRASADO dos ônibus com `timestamp_posicao` mais de
+  LIMITE_ATRASO_GPS minutos antes da coleta (a API está servindo posições congeladas).
+
+Cada problema tem uma chave estável e só gera e-mail quando aparece, a cada
+REENVIO_MINUTOS enquanto persistir, e uma vez quando se resolve (com a última mensagem
+vista). O estado dos alertas fica na tabela `alertas_ativos`, então a de-duplicação vale
+também entre execuções separadas (`--uma-vez` via cron) e sobrevive a reinícios do laço.
+
+Uso:
+    python -m src.monitor                  # laço contínuo (a cada INTERVALO_SEGUNDOS)
+    python -m src.monitor --uma-vez        # uma verificação (cron)
+"""
+
+import argparse
 import logging
 import os
 import smtplib
-import sqlite3
+import time
 from datetime import datetime
 from email.message import EmailMessage
 
+from src.database import get_connection, gravar_alertas_ativos, ler_alertas_ativos, ultimos_lotes
+from src.posicoes_atuais import frota_atual
+
 # --- Configuração ---
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
-DB_PATH = os.path.join('data', 'sptrans_data.db')
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+TABELAS = ["posicoes", "previsoes"]
+
+# Limites para os alertas
+LIMITE_DADOS_ANTIGOS = 60  # minutos sem ciclo registrado
+LIMITE_LOTE_PARCIAL = 0.5  # fração mínima de inseridos/esperados e de esperados/média
+INTERVALO_SEGUNDOS = 300
+REENVIO_MINUTOS = 60  # repete o alerta de um problema que persiste
+LIMITE_ATRASO_GPS = 10  # minutos entre o GPS do ônibus e a coleta
+LIMITE_FRACAO_GPS_ATRASADO = 0.5
 
-# Limites para os alertas (em minutos)
-LIMITE_DADOS_ANTIGOS = 60
 
 # --- Funções de Verificação (Health Checks) ---
 
-def verificar_dados_velhos(conn, problemas):
-    """Verifica se os dados nas tabelas não são mais antigos que o limite definido."""
+
+def verificar_dados_velhos(lotes, problemas, agora=None):
+    """Verifica se cada tabela teve um ciclo de coleta nos últimos LIMITE_DADOS_ANTIGOS minutos."""
     logging.info("Verificando se há dados antigos...")
-    cursor = conn.cursor()
-    tabelas = ['posicoes', 'previsoes']
-    for tabela in tabelas:
+    agora = agora or datetime.now()
+    for tabela in TABELAS:
+        lote = lotes.get(tabela)
+        if lote is None:
+            problemas[f"sem_lote:{tabela}"] = f"ALERTA: Nenhum ciclo de coleta registrado para a tabela '{tabela}'."
+            continue
+        ultimo = datetime.fromisoformat(str(lote["timestamp_coleta"]))
+        minutos = (agora - ultimo).total_seconds() / 60
+        if minutos > LIMITE_DADOS_ANTIGOS:
+            problemas[f"dados_velhos:{tabela}"] = (
+                f"ALERTA: A tabela '{tabela}' não recebe dados novos há {minutos:.0f} minutos "
+                f"(limite: {LIMITE_DADOS_ANTIGOS})."
+            )
+
+
+def verificar_lotes_vazios(lotes, problemas):
+    """Verifica se o último ciclo de cada tabela foi vazio ou parcial."""
+    logging.info("Verificando se houve lotes de coleta vazios ou parciais...")
+    for tabela in TABELAS:
+        lote = lotes.get(tabela)
+        if lote is None:
+            continue
+        esperados, inseridos, media = lote["esperados"], lote["inseridos"], lote["esperados_media"]
+        if inseridos == 0:
+            problemas[f"lote_vazio:{tabela}"] = (
+                f"ALERTA: O último lote de coleta para a tabela '{tabela}' ({lote['timestamp_coleta']}) "
+                f"foi vazio ({esperados} esperados)."
+            )
+        elif inseridos < LIMITE_LOTE_PARCIAL * esperados:
+            problemas[f"lote_parcial:{tabela}"] = (
+                f"ALERTA: O último lote da tabela '{tabela}' gravou {inseridos} de {esperados} registros esperados."
+            )
+        elif media and esperados < LIMITE_LOTE_PARCIAL * media:
+            problemas[f"lote_parcial:{tabela}"] = (
+                f"ALERTA: O último lote da tabela '{tabela}' trouxe {esperados} registros, "
+                f"abaixo da média recente ({media:.0f})."
+            )
+
+
+def verificar_gps_atrasado(atraso_gps_min, problemas):
+    """Verifica se a maior parte da frota do último ciclo chegou com GPS velho (posições congeladas)."""
+    logging.info("Verificando o atraso do GPS da frota atual...")
+    if atraso_gps_min.empty:
+        return
+    atrasados = int((atraso_gps_min > LIMITE_ATRASO_GPS).sum())
+    if atrasados > LIMITE_FRACAO_GPS_ATRASADO * len(atraso_gps_min):
+        problemas["gps_atrasado:posicoes"] = (
+            f"ALERTA: {atrasados} de {len(atraso_gps_min)} ônibus do último ciclo têm GPS com mais de "
+            f"{LIMITE_ATRASO_GPS} minutos de atraso (mediana: {atraso_gps_min.median():.0f} min)."
+        )
+
+
+def verificar(problemas=None):
+    """Executa todas as verificações. Retorna {chave: mensagem} dos problemas encontrados."""
+    problemas = {} if problemas is None else problemas
+    try:
+        with get_connection() as conn:
+            lotes = ultimos_lotes(conn)
+    except Exception as e:
+        problemas["banco"] = f"Falha crítica ao conectar ou ler o banco de dados: {e}"
+        return problemas
+    verificar_dados_velhos(lotes, problemas)
+    verificar_lotes_vazios(lotes, problemas)
+    try:
+        atraso = frota_atual().atraso_gps_min()
+    except Exception as e:
+        logging.warning(f"Frota atual indisponível para a verificação do GPS: {e}")
+    else:
+        verificar_gps_atrasado(atraso, problemas)
+    return problemas
+
+
+# --- De-duplicação de alertas ---
+
+
+class Alertas:
+    """Decide o que notificar a cada rodada, a partir das chaves dos problemas ativos.
+
+    `persistente=True` lê e grava o estado em `alertas_ativos` a cada rodada (ver `rodada`);
+    sem isso, o estado vive só neste objeto.
+    """
+
+    def __init__(self, reenvio_minutos=REENVIO_MINUTOS, persistente=False):
+        self.reenvio_segundos = reenvio_minutos * 60
+        self.persistente = persistente
+        self._ativos = {}  # chave -> (instante (época, s) da última notificação, última mensagem)
+
+    def carregar(self):
+        """Lê o estado salvo; se o banco falhar, segue com o estado em memória."""
+        if not self.persistente:
+            return
         try:
-            cursor.execute(f"SELECT MAX(timestamp_coleta) FROM {tabela}")
-            ultimo_timestamp_str = cursor.fetchone()[0]
-            if ultimo_timestamp_str:
-                ultimo_timestamp = datetime.fromisoformat(ultimo_timestamp_str)
-                diferenca = datetime.now() - ultimo_timestamp
-                if diferenca.total_seconds() > LIMITE_DADOS_ANTIGOS * 60:
-                    problemas.append(f"ALERTA: A tabela '{tabela}' não recebe dados novos há mais de {LIMITE_DADOS_ANTIGOS} minutos.")
-            else:
-                problemas.append(f"ALERTA: A tabela '{tabela}' está vazia.")
-        except sqlite3.Error as e:
-            problemas.append(f"ERRO: Não foi possível verificar a tabela '{tabela}': {e}")
-
-def verificar_lotes_vazios(conn, problemas):
-    """Verifica se o último lote de coleta inserido no banco está vazio."""
-    logging.info("Verificando se houve lotes de coleta vazios...")
-    cursor = conn.cursor()
-    tabelas = ['posicoes', 'previsoes']
-    for tabela in tabelas:
+            with get_connection() as conn:
+                self._ativos = ler_alertas_ativos(conn)
+        except Exception as e:
+            logging.warning(f"Estado dos alertas indisponível, usando o da memória: {e}")
+
+    def salvar(self):
+        if not self.persistente:
+            return
         try:
-            cursor.execute(f"SELECT COUNT(*) FROM {tabela} WHERE timestamp_coleta = (SELECT MAX(timestamp_coleta) FROM {tabela})")
-            contagem = cursor.fetchone()[0]
-            if contagem == 0:
-                problemas.append(f"ALERTA: O último lote de coleta para a tabela '{tabela}' foi vazio.")
-        except sqlite3.Error as e:
-            problemas.append(f"ERRO: Não foi possível verificar o último lote da tabela '{tabela}': {e}")
+            with get_connection() as conn:
+                gravar_alertas_ativos(conn, self._ativos)
+        except Exception as e:
+            logging.warning(f"Não foi possível gravar o estado dos alertas: {e}")
+
+    def filtrar(self, problemas, agora=None):
+        """Retorna (novos_ou_repetidos, resolvidos), ambos {chave: mensagem}.
+
+        O resolvido leva a última mensagem vista do problema (a chave, se o estado salvo não a tiver).
+        """
+        agora = time.time() if agora is None else agora
+        enviar = {}
+        for chave, mensagem in problemas.items():
+            ultimo, _ = self._ativos.get(chave, (None, None))
+            if ultimo is None or agora - ultimo >= self.reenvio_segundos:
+                enviar[chave] = mensagem
+                ultimo = agora
+            self._ativos[chave] = (ultimo, mensagem)
+        resolvidos = {
+            chave: mensagem or chave for chave, (_, mensagem) in self._ativos.items() if chave not in problemas
+        }
+        for chave in resolvidos:
+            del self._ativos[chave]
+        return enviar, resolvidos
+
 
 # --- Função de Alerta ---
 
-def enviar_alerta_email(problemas):
-    """Envia um e-mail de alerta com a lista de problemas encontrados."""
+
+def enviar_alerta_email(problemas, resolvidos=()):
+    """Envia um e-mail de alerta com a lista de problemas encontrados (e os que se resolveram)."""
     logging.info("Enviando e-mail de alerta...")
     try:
         # Lê as configurações de e-mail das variáveis de ambiente para segurança
-        EMAIL_HOST = os.environ.get('EMAIL_HOST')
-        EMAIL_PORT = int(os.environ.get('EMAIL_PORT', 587))
-        EMAIL_USER = os.environ.get('EMAIL_USER')
-        EMAIL_PASSWORD = os.environ.get('EMAIL_PASSWORD')
-        EMAIL_RECIPIENT = os.environ.get('EMAIL_RECIPIENT')
+        EMAIL_HOST = os.environ.get("EMAIL_HOST")
+        EMAIL_PORT = int(os.environ.get("EMAIL_PORT", 587))
+        EMAIL_USER = os.environ.get("EMAIL_USER")
+        EMAIL_PASSWORD = os.environ.get("EMAIL_PASSWORD")
+        EMAIL_RECIPIENT = os.environ.get("EMAIL_RECIPIENT")
 
         if not all([EMAIL_HOST, EMAIL_USER, EMAIL_PASSWORD, EMAIL_RECIPIENT]):
             logging.error("Variáveis de ambiente para envio de e-mail não configuradas. Não é possível enviar alerta.")
@@ -66,11 +205,19 @@ def enviar_alerta_email(problemas):
 
         # Cria a mensagem do e-mail
         msg = EmailMessage()
-        msg['Subject'] = "[ALERTA] Problema na Pipeline de Dados SPTrans"
-        msg['From'] = EMAIL_USER
-        msg['To'] = EMAIL_RECIPIENT
+        msg["Subject"] = (
+            "[ALERTA] Problema na Pipeline de Dados SPTrans" if problemas else "[OK] Pipeline de Dados SPTrans"
+        )
+        msg["From"] = EMAIL_USER
+        msg["To"] = EMAIL_RECIPIENT
 
-        corpo_email = "Os seguintes problemas foram detectados na pipeline de dados:\n\n" + "\n".join(f"- {p}" for p in problemas)
+        corpo_email = ""
+        if problemas:
+            corpo_email += "Os seguintes problemas foram detectados na pipeline de dados:\n\n"
+            corpo_email += "\n".join(f"- {p}" for p in problemas) + "\n"
+        if resolvidos:
+            corpo_email += "\nProblemas resolvidos desde o último alerta:\n\n"
+            corpo_email += "\n".join(f"- {r}" for r in resolvidos) + "\n"
         msg.set_content(corpo_email)
 
         # Conecta ao servidor SMTP e envia o e-mail
@@ -84,29 +231,41 @@ def enviar_alerta_email(problemas):
     except Exception as e:
         logging.error(f"Falha ao enviar e-mail de alerta: {e}")
 
+
 # --- Função Principal ---
-def main():
-    """Orquestra a execução das verificações e o envio de alertas."""
-    logging.info("--- Iniciando Robô Fiscal ---")
-    problemas_encontrados = []
-    conn = None
-    try:
-        conn = sqlite3.connect(DB_PATH)
-        verificar_dados_velhos(conn, problemas_encontrados)
-        verificar_lotes_vazios(conn, problemas_encontrados)
-    except sqlite3.Error as e:
-        problemas_encontrados.append(f"Falha crítica ao conectar ou ler o banco de dados: {e}")
-    finally:
-        if conn:
-            conn.close()
-
-    if problemas_encontrados:
-        logging.warning(f"Problemas encontrados na pipeline: {problemas_encontrados}")
-        enviar_alerta_email(problemas_encontrados)
+
+
+def rodada(alertas):
+    """Uma verificação completa; notifica só o que é novo, repetido após REENVIO_MINUTOS ou resolvido."""
+    problemas = verificar()
+    alertas.carregar()
+    enviar, resolvidos = alertas.filtrar(problemas)
+    alertas.salvar()
+    if problemas:
+        logging.warning(f"Problemas encontrados na pipeline: {list(problemas.values())}")
     else:
         logging.info("Pipeline de dados está saudável. Nenhum problema encontrado.")
+    if enviar or resolvidos:
+        enviar_alerta_email(list(enviar.values()), list(resolvidos.values()))
+    return problemas
 
+
+def main():
+    """Orquestra a execução das verificações e o envio de alertas."""
+    parser = argparse.ArgumentParser(description="Robô fiscal: frescor e lotes vazios/parciais da coleta")
+    parser.add_argument("--uma-vez", action="store_true", help="Executa uma única verificação e sai.")
+    parser.add_argument("--intervalo", type=int, default=INTERVALO_SEGUNDOS, help="Segundos entre verificações.")
+    args = parser.parse_args()
+
+    logging.info("--- Iniciando Robô Fiscal ---")
+    alertas = Alertas(persistente=True)
+    while True:
+        rodada(alertas)
+        if args.uma_vez:
+            break
+        time.sleep(args.intervalo)
     logging.info("--- Robô Fiscal Finalizado ---")
 
+
 if __name__ == "__main__":
     main()
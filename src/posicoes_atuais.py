@@ -0,0 +1,136 @@
+"""
+Onde está cada ônibus agora: cópia em memória da tabela `posicoes_atuais`.
+
+O coletor mantém `posicoes_atuais` — uma linha por `id_onibus`, com a posição da coleta mais
+recente — na mesma transação do INSERT em `posicoes` (ver `inserir_lote` em src/database.py).
+`FrotaAtual` guarda a tabela em memória e, a cada consulta, no máximo uma vez a cada
+INTERVALO_VERIFICACAO_S, confere a marca de alteração de `posicoes` (`versao_tabela`, O(1));
+só relê a tabela, O(frota), quando ela muda. Consultas da "frota atual" (mapa do dashboard,
+comparação com o Moovit, monitor) não varrem mais o histórico com ORDER BY/LIMIT ou
+drop_duplicates.
+
+Uso:
+    from src.posicoes_atuais import frota_atual, posicoes_atuais
+
+    df = posicoes_atuais()                         # uma linha por ônibus
+    df = posicoes_atuais(letreiros=["1036-10"])
+    atraso = frota_atual().atraso_gps_min()        # minutos entre o GPS e a coleta, último ciclo
+"""
+
+import logging
+import threading
+import time
+
+import pandas as pd
+
+from src import database
+from src.database import COLUNAS_POSICOES_ATUAIS, get_connection, ler_posicoes_atuais, versao_tabela
+from src.viagens import FUSO_HORARIO
+
+logger = logging.getLogger(__name__)
+
+INTERVALO_VERIFICACAO_S = 5
+
+
+def _vazio():
+    return pd.DataFrame(
+        {
+            "id_onibus": pd.Series(dtype="int64"),
+            "timestamp_coleta": pd.Series(dtype="datetime64[us]"),
+            "letreiro_linha": pd.Series(dtype="object"),
+            "latitude": pd.Series(dtype="float64"),
+            "longitude": pd.Series(dtype="float64"),
+            "timestamp_posicao": pd.Series(dtype="datetime64[us, UTC]"),
+        }
+    )
+
+
+def _como_dataframe(linhas):
+    """Linhas de `ler_posicoes_atuais` → DataFrame (coleta em horário local; GPS em UTC)."""
+    if not linhas:
+        return _vazio()
+    df = pd.DataFrame(linhas, columns=COLUNAS_POSICOES_ATUAIS)
+    df["id_onibus"] = df["id_onibus"].astype("int64")
+    df["timestamp_coleta"] = pd.to_datetime(df["timestamp_coleta"], format="ISO8601").astype("datetime64[us]")
+    df["latitude"] = df["latitude"].astype("float64")
+    df["longitude"] = df["longitude"].astype("float64")
+    df["timestamp_posicao"] = pd.to_datetime(
+        df["timestamp_posicao"], format="ISO8601", utc=True, errors="coerce"
+    ).astype("datetime64[us, UTC]")
+    return df
+
+
+class FrotaAtual:
+    """Cópia em memória de `posicoes_atuais`, relida só quando `posicoes` recebe um lote novo.
+
+    Segura para várias threads (um servidor HTTP, o Streamlit): a troca da cópia é atômica e
+    as consultas devolvem cópias.
+    """
+
+    def __init__(self, intervalo_verificacao_s=INTERVALO_VERIFICACAO_S):
+        self.intervalo_verificacao_s = intervalo_verificacao_s
+        self._lock = threading.Lock()
+        self._versao = None
+        self._verificado_em = None
+        self._df = _vazio()
+
+    def _atualizar(self):
+        # O banco faz parte da marca: trocar DATABASE_URL/DB_PATH força a releitura
+        banco = database.get_database_url() or database.DB_PATH
+        agora = time.monotonic()
+        recente = self._verificado_em is not None and agora - self._verificado_em < self.intervalo_verificacao_s
+        if recente and self._versao is not None and self._versao[0] == banco:
+            return
+        with get_connection() as conn:
+            versao = (banco, versao_tabela(conn, "posicoes"))
+            if versao[1] is None or versao != self._versao:
+                self._df = _como_dataframe(ler_posicoes_atuais(conn))
+                logger.debug(f"posicoes_atuais recarregada: {len(self._df)} ônibus (versão {versao[1]}).")
+        self._versao = versao
+        self._verificado_em = agora
+
+    def posicoes(self, letreiros=None):
+        """DataFrame com a última posição de cada ônibus (opcionalmente só das linhas `letreiros`)."""
+        with self._lock:
+            self._atualizar()
+            df = self._df
+        if letreiros is not None:
+            df = df[df["letreiro_linha"].isin(list(letreiros))]
+        return df.reset_index(drop=True).copy()
+
+    def atraso_gps_min(self):
+        """Minutos entre o GPS (`timestamp_posicao`) e a coleta, dos ônibus vistos no último ciclo.
+
+        Série indexada por id_onibus (NaN sem GPS); vazia se não houver frota.
+        """
+        df = self.posicoes()
+        if df.empty:
+            return pd.Series(dtype="float64", name="atraso_gps_min")
+        ultimo = df[df["timestamp_coleta"] == df["timestamp_coleta"].max()]
+        coleta = ultimo["timestamp_coleta"].dt.tz_localize(FUSO_HORARIO)
+        atraso = (coleta - ultimo["timestamp_posicao"]).dt.total_seconds() / 60
+        return pd.Series(atraso.to_numpy(), index=ultimo["id_onibus"].to_numpy(), name="atraso_gps_min")
+
+    def invalidar(self):
+        """Força a releitura na próxima consulta."""
+        with self._lock:
+            self._versao = None
+            self._verificado_em = None
+
+
+_FROTA = None
+_FROTA_LOCK = threading.Lock()
+
+
+def frota_atual():
+    """`FrotaAtual` compartilhada pelo processo (criada na primeira chamada)."""
+    global _FROTA
+    with _FROTA_LOCK:
+        if _FROTA is None:
+            _FROTA = FrotaAtual()
+        return _FROTA
+
+
+def posicoes_atuais(letreiros=None):
+    """Última posição de cada ônibus, da cópia em memória do processo (ver `FrotaAtual.posicoes`)."""
+    return frota_atual().posicoes(letreiros)
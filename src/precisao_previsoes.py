@@ -0,0 +1,352 @@
+"""
+Precisão das previsões de chegada: previsto (Olho Vivo) × chegada observada (GPS).
+
+Para cada visita (sequência de coletas em que um ônibus aparece nas previsões de uma
+parada — ver `headways.visitas_previsoes`), a chegada real é inferida do trajeto do
+próprio ônibus em `posicoes`: a parada é projetada em cada trecho entre duas posições
+consecutivas dentro da janela da visita (da primeira coleta até a última previsão +
+MARGEM_CHEGADA_MIN), e a chegada é o instante interpolado no ponto de maior aproximação
+da primeira passagem a até RAIO_CHEGADA_M da parada. As coordenadas das paradas vêm do
+catálogo de paradas (src/catalogo_paradas.py: GTFS/API), completado pela tabela `paradas`
+que o coletor de previsões preenche (ps[].py/px do payload).
+
+Cada previsão coletada antes da chegada vira uma avaliação:
+
+    erro_s       = chegada_real − previsto    (> 0: o ônibus chegou depois do previsto)
+    horizonte_s  = chegada_real − timestamp_coleta
+
+`horario_previsao` tem resolução de minuto (HH:MM), então o erro carrega até ±60 s de
+truncamento. O resumo agrega por linha (id_linha, que já codifica o sentido), faixa de
+horizonte (FAIXAS_HORIZONTE_MIN) e hora da coleta.
+
+Vetorizado: um único passe numpy sobre o dia (todas as linhas, ônibus e paradas) — as
+janelas viram intervalos de índices no trajeto ordenado (searchsorted), sem laço por
+visita. Os dias rodam em paralelo, um por processo.
+
+Saída (Gold, tmp + os.replace, manifesto como no Silver):
+    data/parquet/gold/previsoes_avaliadas/dt=YYYY-MM-DD/previsoes_avaliadas.parquet
+    data/parquet/gold/precisao_previsoes/dt=YYYY-MM-DD/precisao_previsoes.parquet
+
+Uso:
+    python -m src.precisao_previsoes                          # todas as partições de previsoes
+    python -m src.precisao_previsoes --inicio 2025-08-01 --fim 2025-08-31 --processos 8
+"""
+
+import argparse
+import functools
+import logging
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.catalogo_linhas import carregar_catalogo_opcional
+from src.compactar_parquet import ler_particao, particao_vazia, processar_particoes, publicar_particao
+from src.geo import RAIO_TERRA_M
+from src.headways import visitas_previsoes
+from src.viagens import preparar_pontos
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+PARQUET_DIR = os.path.join("data", "parquet")
+GOLD_DIR = os.path.join(PARQUET_DIR, "gold")
+
+RAIO_CHEGADA_M = 150
+MARGEM_CHEGADA_MIN = 30
+# Trechos entre posições mais distantes que isso no tempo não são interpolados
+LACUNA_TRAJETO_MIN = 10
+FAIXAS_HORIZONTE_MIN = [0, 2, 5, 10, 15, 20, 30, 45, 60]
+TOLERANCIA_ACERTO_S = 120
+
+TIPOS_AVALIADAS = {
+    "id_linha": "int64",
+    "letreiro_linha": "object",
+    "id_parada": "int64",
+    "id_onibus": "int64",
+    "timestamp_coleta": "datetime64[us]",
+    "previsto": "datetime64[us]",
+    "chegada_real": "datetime64[us]",
+    "distancia_parada_m": "float64",
+    "horizonte_s": "float64",
+    "erro_s": "float64",
+    "faixa_horizonte": "object",
+    "hora": "int8",
+}
+
+TIPOS_PRECISAO = {
+    "id_linha": "int64",
+    "letreiro_linha": "object",
+    "faixa_horizonte": "object",
+    "hora": "int8",
+    "n_previsoes": "int32",
+    "erro_medio_s": "float64",
+    "erro_mediano_s": "float64",
+    "erro_abs_medio_s": "float64",
+    "erro_p10_s": "float64",
+    "erro_p90_s": "float64",
+    "pct_acerto": "float64",
+}
+
+
+def rotulos_faixas(limites=FAIXAS_HORIZONTE_MIN):
+    """'0-2', '2-5', ..., '60+' (minutos)."""
+    return [f"{a}-{b}" for a, b in zip(limites, limites[1:])] + [f"{limites[-1]}+"]
+
+
+def faixa_horizonte(horizonte_s, limites=FAIXAS_HORIZONTE_MIN):
+    """Rótulo da faixa de horizonte (em minutos) de cada previsão; horizonte negativo → None."""
+    minutos = np.asarray(horizonte_s, dtype="float64") / 60
+    indice = np.searchsorted(np.asarray(limites, dtype="float64"), minutos, side="right") - 1
+    rotulos = np.array(rotulos_faixas(limites), dtype=object)
+    return np.where(indice >= 0, rotulos[np.clip(indice, 0, None)], None)
+
+
+def trajetos(posicoes):
+    """Posições deduplicadas ordenadas por (id_onibus, instante), independentemente da linha."""
+    pontos = preparar_pontos(posicoes)
+    ordem = np.lexsort((pontos["instante"].to_numpy(), pontos["id_onibus"].to_numpy()))
+    return pontos.iloc[ordem].reset_index(drop=True)
+
+
+def _janelas(visitas, margem_min):
+    """Uma linha por visita: ônibus, parada e janela [inicio, fim] onde procurar a chegada."""
+    agrupado = visitas.groupby("visita", sort=True)
+    janelas = agrupado.agg(
+        id_onibus=("id_onibus", "first"),
+        id_parada=("id_parada", "first"),
+        inicio=("timestamp_coleta", "min"),
+        ultima_coleta=("timestamp_coleta", "max"),
+        ultimo_previsto=("previsto", "max"),
+    )
+    fim = janelas[["ultima_coleta", "ultimo_previsto"]].max(axis=1) + pd.Timedelta(minutes=margem_min)
+    return janelas.assign(fim=fim)[["id_onibus", "id_parada", "inicio", "fim"]]
+
+
+def inferir_chegadas(
+    visitas,
+    pontos,
+    paradas,
+    raio_m=RAIO_CHEGADA_M,
+    margem_min=MARGEM_CHEGADA_MIN,
+    lacuna_trajeto_min=LACUNA_TRAJETO_MIN,
+):
+    """Chegada real de cada visita pela maior aproximação do trajeto do ônibus à parada.
+
+    Args:
+        visitas: Saída de `headways.visitas_previsoes`.
+        pontos: Saída de `trajetos` (ordenada por id_onibus, instante).
+        paradas: DataFrame id_parada, latitude, longitude.
+
+    Returns:
+        DataFrame indexado por `visita` com chegada_real e distancia_parada_m (só visitas com chegada).
+    """
+    vazio = pd.DataFrame(
+        {"chegada_real": pd.Series(dtype="datetime64[us]"), "distancia_parada_m": pd.Series(dtype="float64")}
+    )
+    janelas = _janelas(visitas, margem_min).join(paradas.set_index("id_parada"), on="id_parada", how="inner")
+    if janelas.empty or pontos.empty:
+        return vazio
+
+    # Trajeto ordenado: chave (ônibus, segundos) monotônica para localizar as janelas com searchsorted
+    instante = pontos["instante"].to_numpy("datetime64[s]").astype("int64")
+    base = min(instante.min(), janelas["inicio"].to_numpy("datetime64[s]").astype("int64").min())
+    onibus = pontos["id_onibus"].to_numpy("int64")
+    chave = (onibus << 32) | (instante - base)
+    lat, lon = pontos["latitude"].to_numpy(), pontos["longitude"].to_numpy()
+
+    j_onibus = janelas["id_onibus"].to_numpy("int64")
+    j_inicio = janelas["inicio"].to_numpy("datetime64[s]").astype("int64") - base
+    j_fim = janelas["fim"].to_numpy("datetime64[s]").astype("int64") - base
+    # Inclui o trecho que começa antes da janela e termina dentro dela
+    lo = np.maximum(np.searchsorted(chave, (j_onibus << 32) | j_inicio, side="left") - 1, 0)
+    hi = np.searchsorted(chave, (j_onibus << 32) | j_fim, side="right")
+    n = np.maximum(hi - lo, 0)
+
+    # Explode (janela, trecho): cada janela cobre os índices lo..hi-1 do trajeto
+    par_janela = np.repeat(np.arange(len(janelas)), n)
+    a = np.repeat(lo - np.cumsum(n) + n, n) + np.arange(n.sum())
+    a = np.minimum(a, len(chave) - 1)
+    b = np.minimum(a + 1, len(chave) - 1)
+    valido_a = onibus[a] == j_onibus[par_janela]
+    # Trecho só entre posições do mesmo ônibus e sem buraco; senão, o ponto isolado
+    segue = valido_a & (onibus[b] == onibus[a]) & (instante[b] - instante[a] <= lacuna_trajeto_min * 60)
+    b = np.where(segue, b, a)
+
+    lat_p = janelas["latitude"].to_numpy()[par_janela]
+    lon_p = janelas["longitude"].to_numpy()[par_janela]
+    ky = RAIO_TERRA_M * np.pi / 180
+    kx = ky * np.cos(np.radians(lat_p))
+    ax, ay = (lon[a] - lon_p) * kx, (lat[a] - lat_p) * ky
+    dx, dy = (lon[b] - lon[a]) * kx, (lat[b] - lat[a]) * ky
+    comprimento2 = dx * dx + dy * dy
+    with np.errstate(invalid="ignore", divide="ignore"):
+        f = np.where(comprimento2 > 0, np.clip(-(ax * dx + ay * dy) / comprimento2, 0, 1), 0.0)
+    distancia = np.hypot(ax + f * dx, ay + f * dy)
+    chegada = instante[a] + f * (instante[b] - instante[a])
+
+    # Primeira passagem pelo raio de cada janela (o ônibus pode voltar perto da parada mais tarde)
+    dentro = valido_a & (distancia <= raio_m)
+    anterior_dentro = np.zeros_like(dentro)
+    anterior_dentro[1:] = dentro[:-1] & (par_janela[1:] == par_janela[:-1])
+    passagem = np.cumsum(dentro & ~anterior_dentro)
+    candidatos = np.flatnonzero(dentro)
+    if not len(candidatos):
+        return vazio
+    primeira = pd.Series(passagem[candidatos]).groupby(par_janela[candidatos]).transform("min").to_numpy()
+    candidatos = candidatos[passagem[candidatos] == primeira]
+    ordem = np.lexsort((distancia[candidatos], par_janela[candidatos]))
+    candidatos = candidatos[ordem]
+    _, primeiros = np.unique(par_janela[candidatos], return_index=True)
+    escolhidos = candidatos[primeiros]
+
+    segundos = np.round(chegada[escolhidos]).astype("int64")
+    return pd.DataFrame(
+        {
+            "chegada_real": segundos.astype("datetime64[s]").astype("datetime64[us]"),
+            "distancia_parada_m": distancia[escolhidos],
+        },
+        index=pd.Index(janelas.index.to_numpy()[par_janela[escolhidos]], name="visita"),
+    )
+
+
+def avaliar(visitas, chegadas, catalogo=None):
+    """Uma linha por previsão coletada antes da chegada observada da sua visita."""
+    avaliadas = visitas.join(chegadas, on="visita", how="inner")
+    avaliadas = avaliadas[avaliadas["timestamp_coleta"] <= avaliadas["chegada_real"]]
+    avaliadas = avaliadas.dropna(subset=["previsto"])
+    if avaliadas.empty:
+        return particao_vazia(TIPOS_AVALIADAS)
+
+    avaliadas = avaliadas.assign(
+        horizonte_s=(avaliadas["chegada_real"] - avaliadas["timestamp_coleta"]).dt.total_seconds(),
+        erro_s=(avaliadas["chegada_real"] - avaliadas["previsto"]).dt.total_seconds(),
+        hora=avaliadas["timestamp_coleta"].dt.hour,
+        letreiro_linha=None,
+    )
+    avaliadas["faixa_horizonte"] = faixa_horizonte(avaliadas["horizonte_s"])
+    if catalogo is not None:
+        avaliadas["letreiro_linha"] = np.asarray(catalogo.letreiro_por_id(avaliadas["id_linha"]), dtype=object)
+    return avaliadas[list(TIPOS_AVALIADAS)].astype(TIPOS_AVALIADAS).reset_index(drop=True)
+
+
+def resumir(avaliadas, tolerancia_s=TOLERANCIA_ACERTO_S):
+    """Erro por (linha, faixa de horizonte, hora): média, mediana, |erro| médio, p10/p90 e % de acerto."""
+    if avaliadas.empty:
+        return particao_vazia(TIPOS_PRECISAO)
+
+    chaves = [avaliadas[c] for c in ("id_linha", "letreiro_linha", "faixa_horizonte", "hora")]
+    erro = avaliadas["erro_s"]
+    agrupado = erro.groupby(chaves, dropna=False, sort=True)
+    resumo = pd.DataFrame(
+        {
+            "n_previsoes": agrupado.size(),
+            "erro_medio_s": agrupado.mean(),
+            "erro_mediano_s": agrupado.median(),
+            "erro_abs_medio_s": erro.abs().groupby(chaves, dropna=False, sort=True).mean(),
+            "erro_p10_s": agrupado.quantile(0.1),
+            "erro_p90_s": agrupado.quantile(0.9),
+            "pct_acerto": (erro.abs() <= tolerancia_s).groupby(chaves, dropna=False, sort=True).mean() * 100,
+        }
+    ).reset_index()
+    return resumo[list(TIPOS_PRECISAO)].astype(TIPOS_PRECISAO)
+
+
+def carregar_paradas(catalogo_paradas_path=None):
+    """Paradas com coordenadas → DataFrame id_parada, latitude, longitude.
+
+    Usa o catálogo de paradas (src/catalogo_paradas.py) quando existe, completado pela
+    tabela `paradas` do banco com as paradas vistas depois de o catálogo ser gerado.
+    """
+    from src.catalogo_paradas import carregar_catalogo_paradas, combinar, paradas_da_coleta
+
+    try:
+        catalogo = carregar_catalogo_paradas(catalogo_paradas_path).df
+    except FileNotFoundError:
+        catalogo = None
+    paradas = combinar(catalogo, paradas_da_coleta())
+    return paradas[["id_parada", "latitude", "longitude"]]
+
+
+def processar_dia(dia, paradas, parquet_dir=None, gold_dir=None, catalogo_path=None):
+    """Avalia e publica as previsões de um dia; retorna o número de previsões avaliadas."""
+    parquet_dir = parquet_dir or PARQUET_DIR
+    gold_dir = gold_dir or GOLD_DIR
+    inicio = time.perf_counter()
+
+    previsoes = ler_particao(
+        parquet_dir, "previsoes", dia, ["timestamp_coleta", "id_linha", "id_onibus", "id_parada", "horario_previsao"]
+    )
+    posicoes = ler_particao(
+        parquet_dir,
+        "posicoes",
+        dia,
+        ["timestamp_coleta", "id_onibus", "letreiro_linha", "latitude", "longitude", "timestamp_posicao"],
+    )
+    if previsoes is None or posicoes is None:
+        avaliadas = particao_vazia(TIPOS_AVALIADAS)
+        n_visitas = n_chegadas = 0
+    else:
+        visitas = visitas_previsoes(previsoes)
+        chegadas = inferir_chegadas(visitas, trajetos(posicoes), paradas)
+        catalogo = carregar_catalogo_opcional("a precisão sairá sem letreiro_linha", catalogo_path)
+        avaliadas = avaliar(visitas, chegadas, catalogo)
+        n_visitas, n_chegadas = visitas["visita"].nunique(), len(chegadas)
+
+    publicar_particao(avaliadas, os.path.join(gold_dir, "previsoes_avaliadas"), dia, "previsoes_avaliadas.parquet")
+    publicar_particao(
+        resumir(avaliadas), os.path.join(gold_dir, "precisao_previsoes"), dia, "precisao_previsoes.parquet"
+    )
+    logging.info(
+        f"precisao dt={dia}: {n_chegadas}/{n_visitas} visitas com chegada observada → "
+        f"{len(avaliadas)} previsões avaliadas em {time.perf_counter() - inicio:.1f}s."
+    )
+    return len(avaliadas)
+
+
+def processar_dias(dias, paradas=None, processos=None, parquet_dir=None, gold_dir=None, catalogo_path=None):
+    """Processa os dias em paralelo (um por tarefa) e atualiza os manifestos; retorna {dia: avaliadas}.
+
+    `paradas` (padrão: tabela `paradas` do banco) é lida uma vez e enviada a cada tarefa;
+    `processos=1` roda sem pool (ver `processar_particoes`).
+    """
+    paradas = carregar_paradas() if paradas is None else paradas
+    gold_dir = gold_dir or GOLD_DIR
+    fn = functools.partial(
+        processar_dia, paradas=paradas, parquet_dir=parquet_dir, gold_dir=gold_dir, catalogo_path=catalogo_path
+    )
+    destinos = [os.path.join(gold_dir, tabela) for tabela in ("previsoes_avaliadas", "precisao_previsoes")]
+    return processar_particoes(fn, dias, destinos, processos)
+
+
+def particoes_previsoes(parquet_dir=None, inicio=None, fim=None):
+    """Dias ('YYYY-MM-DD') com partição Silver de previsões, opcionalmente em [inicio, fim]."""
+    origem = os.path.join(parquet_dir or PARQUET_DIR, "previsoes")
+    if not os.path.isdir(origem):
+        return []
+    dias = sorted(d.removeprefix("dt=") for d in os.listdir(origem) if d.startswith("dt="))
+    return [d for d in dias if (inicio is None or d >= inicio) and (fim is None or d <= fim)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precisão das previsões de chegada (previsto × observado)")
+    parser.add_argument("--inicio", help="Primeiro dia (YYYY-MM-DD).")
+    parser.add_argument("--fim", help="Último dia, inclusive (YYYY-MM-DD).")
+    parser.add_argument("--processos", type=int, default=os.cpu_count(), help="Processos paralelos (1 = sem pool).")
+    args = parser.parse_args()
+
+    dias = particoes_previsoes(inicio=args.inicio, fim=args.fim)
+    if not dias:
+        logging.warning("Nenhuma partição de previsoes no período. Nada a avaliar.")
+        return
+    paradas = carregar_paradas()
+    if paradas.empty:
+        logging.warning("Tabela 'paradas' vazia: rode o coletor de previsões para capturar as coordenadas.")
+        return
+    logging.info(f"Avaliando previsões de {len(dias)} dia(s) com {len(paradas)} paradas conhecidas...")
+    resultado = processar_dias(dias, paradas, processos=args.processos)
+    logging.info(f"Concluído: {sum(resultado.values())} previsões avaliadas em {len(resultado)} dia(s).")
+
+
+if __name__ == "__main__":
+    main()
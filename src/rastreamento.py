@@ -0,0 +1,163 @@
+"""
+Rastreamento por etapa (spans) e perfilamento opcional da pipeline.
+
+Um span mede uma etapa com relógio monotônico (`time.perf_counter`) e sabe quem é
+o span pai (via `contextvars`, seguro entre threads). Três saídas, todas opcionais:
+
+- log JSON: com `SPTRANS_TRACE=1`, cada span encerrado vira uma linha JSON no
+  logger `sptrans.trace` ({"span", "pai", "duracao_ms", "status", ...atributos});
+- Dagster: `coletar_etapas()` acumula {etapa: segundos} dos spans executados dentro
+  do bloco, para anexar como metadata do asset;
+- cProfile: com `SPTRANS_PROFILE=<dir>`, os spans marcados com `perfil=True` (raízes
+  de cada etapa pesada) gravam `<dir>/<span>-<timestamp>.prof` (abrir com
+  `python -m pstats` ou snakeviz). Para amostragem sem instrumentação, `py-spy record
+  -p <pid>` funciona sobre o processo como está — os spans não interferem.
+
+Uso:
+    from src.rastreamento import coletar_etapas, rastrear, span
+
+    @rastrear("api.posicao")
+    def coletar_posicoes(session): ...
+
+    with coletar_etapas() as etapas:
+        with span("coleta.filtro", linhas=len(dados)):
+            ...
+    etapas  # {"api.posicao": 1.84, "coleta.filtro": 0.12}
+"""
+
+import contextvars
+import cProfile
+import functools
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+logger = logging.getLogger("sptrans.trace")
+
+_span_atual = contextvars.ContextVar("span_atual", default=None)
+_etapas = contextvars.ContextVar("etapas", default=None)
+_perfil_ativo = contextvars.ContextVar("perfil_ativo", default=False)
+
+
+def trace_ativo():
+    return os.environ.get("SPTRANS_TRACE", "").lower() in ("1", "true", "sim")
+
+
+def diretorio_perfil():
+    return os.environ.get("SPTRANS_PROFILE") or None
+
+
+@contextmanager
+def span(nome, perfil=False, **atributos):
+    """Mede o bloco como a etapa `nome`. Exceções são registradas (status "erro") e repropagadas."""
+    pai = _span_atual.get()
+    token = _span_atual.set(nome)
+    perfilador = _iniciar_perfil(nome) if perfil else None
+    status = "ok"
+    inicio = time.perf_counter()
+    try:
+        yield atributos
+    except BaseException:
+        status = "erro"
+        raise
+    finally:
+        duracao = time.perf_counter() - inicio
+        _span_atual.reset(token)
+        if perfilador is not None:
+            _gravar_perfil(nome, *perfilador)
+        etapas = _etapas.get()
+        if etapas is not None:
+            etapas[nome] = etapas.get(nome, 0.0) + duracao
+        if trace_ativo():
+            _configurar_log_json()
+            registro = {"span": nome, "pai": pai, "duracao_ms": round(duracao * 1000, 3), "status": status}
+            registro.update(atributos)
+            logger.info(json.dumps(registro, default=str, ensure_ascii=False))
+
+
+def rastrear(nome=None, perfil=False):
+    """Decorator: executa a função dentro de um span (padrão: `<módulo>.<função>`)."""
+
+    def decorar(func):
+        nome_span = nome or f"{func.__module__.rsplit('.', 1)[-1]}.{func.__name__}"
+
+        @functools.wraps(func)
+        def envoltorio(*args, **kwargs):
+            with span(nome_span, perfil=perfil):
+                return func(*args, **kwargs)
+
+        return envoltorio
+
+    return decorar
+
+
+@contextmanager
+def coletar_etapas():
+    """Acumula {etapa: segundos} dos spans encerrados dentro do bloco (somando repetições)."""
+    etapas = {}
+    token = _etapas.set(etapas)
+    try:
+        yield etapas
+    finally:
+        _etapas.reset(token)
+
+
+def resumo_etapas(etapas, casas=4):
+    """{etapa: segundos} ordenado e arredondado (metadata do Dagster, comparação entre runs)."""
+    return {etapa: round(segundos, casas) for etapa, segundos in sorted(etapas.items())}
+
+
+class FormatadorJSON(logging.Formatter):
+    """Uma linha JSON por registro: {"ts", "nivel", ...campos do span}."""
+
+    def format(self, record):
+        try:
+            campos = json.loads(record.getMessage())
+        except ValueError:
+            campos = {"mensagem": record.getMessage()}
+        if not isinstance(campos, dict):
+            campos = {"mensagem": campos}
+        linha = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "nivel": record.levelname,
+        }
+        linha.update(campos)
+        return json.dumps(linha, default=str, ensure_ascii=False)
+
+
+def _configurar_log_json():
+    """Na primeira emissão, dá ao logger de trace um handler próprio em JSON (sem o prefixo de texto do root)."""
+    if any(isinstance(h.formatter, FormatadorJSON) for h in logger.handlers):
+        return
+    handler = logging.StreamHandler()
+    handler.setFormatter(FormatadorJSON())
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+def _iniciar_perfil(nome):
+    diretorio = diretorio_perfil()
+    # cProfile não aninha: só o span mais externo marcado com perfil=True perfila
+    if diretorio is None or _perfil_ativo.get():
+        return None
+    perfilador = cProfile.Profile()
+    try:
+        perfilador.enable()
+    except ValueError:  # outro perfilador já ativo no processo (Python 3.12+)
+        logger.warning("cProfile indisponível para '%s': outro perfilador já está ativo.", nome)
+        return None
+    token = _perfil_ativo.set(True)
+    return perfilador, token, diretorio
+
+
+def _gravar_perfil(nome, perfilador, token, diretorio):
+    perfilador.disable()
+    _perfil_ativo.reset(token)
+    os.makedirs(diretorio, exist_ok=True)
+    caminho = os.path.join(diretorio, f"{nome}-{datetime.now():%Y%m%dT%H%M%S%f}.prof")
+    perfilador.dump_stats(caminho)
+    logger.info("Perfil de '%s' gravado em %s", nome, caminho)
@@ -0,0 +1,169 @@
+"""
+Reconciliação Bronze ↔ Silver por dia (dt).
+
+Para cada dia da janela em comum compara a contagem do Bronze (SQLite/PostgreSQL)
+com a do Silver (Parquet) e reporta a divergência dia a dia:
+
+- Bronze: um `count(*)` por intervalo `[dia, dia+1)` de `timestamp_coleta`, resolvido
+  pelo índice de deduplicação (que começa por `timestamp_coleta`); os limites da
+  janela vêm de `min/max(timestamp_coleta)`, também pelo índice.
+- Silver: manifesto da tabela (`_manifest.json`, mantido pela compactação); dias que
+  o manifesto não cobre são contados pelos rodapés Parquet, sem ler os dados.
+
+A janela é a do Bronze: dias anteriores já foram expurgados e só existem no
+Silver, então não há o que reconciliar. O custo é O(dias), não O(linhas) do Parquet.
+
+Uso:
+    python -m src.reconciliacao                         # posicoes e previsoes
+    python -m src.reconciliacao --tabela posicoes --tolerancia 2
+"""
+
+import argparse
+import logging
+import os
+from datetime import datetime, timedelta
+
+import duckdb
+
+from src import compactar_parquet
+from src.database import fonte_coleta, get_connection, is_postgres
+from src.expurgar_sqlite import limites_do_dia
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(levelname)s - %(message)s",
+)
+
+TOLERANCIA_PCT = 5  # diferença percentual máxima aceitável por dia
+
+
+def dias_bronze(conn, tabela):
+    """Dias ('YYYY-MM-DD') entre o primeiro e o último `timestamp_coleta` do Bronze."""
+    fonte = fonte_coleta(conn, tabela)
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT min({fonte.coluna}), max({fonte.coluna}) FROM {fonte.tabela}")
+    inicio, fim = cursor.fetchone()
+    if inicio is None:
+        return []
+    inicio, fim = fonte.valor(inicio), fonte.valor(fim)
+    dia = datetime.strptime(str(inicio)[:10], "%Y-%m-%d")
+    ultimo = datetime.strptime(str(fim)[:10], "%Y-%m-%d")
+    dias = []
+    while dia <= ultimo:
+        dias.append(dia.strftime("%Y-%m-%d"))
+        dia += timedelta(days=1)
+    return dias
+
+
+def contagens_bronze(conn, tabela, dias):
+    """{dia: linhas} no Bronze, um count por intervalo de `timestamp_coleta` (busca no índice)."""
+    ph = "%s" if is_postgres() else "?"
+    fonte = fonte_coleta(conn, tabela)
+    cursor = conn.cursor()
+    contagens = {}
+    for dia in dias:
+        cursor.execute(
+            f"SELECT count(*) FROM {fonte.tabela} WHERE {fonte.coluna} >= {ph} AND {fonte.coluna} < {ph}",
+            tuple(fonte.parametro(limite) for limite in limites_do_dia(dia)),
+        )
+        contagens[dia] = cursor.fetchone()[0]
+    return contagens
+
+
+def contagens_silver(destino, dias=None):
+    """{dia: linhas} no Silver, pelo manifesto; o que faltar vem dos rodapés Parquet.
+
+    Retorna também a fonte de cada dia ("manifesto" ou "rodape").
+    """
+    particoes = compactar_parquet.ler_manifesto(destino)["particoes"] if os.path.isdir(destino) else {}
+    contagens = {dia: p["linhas"] for dia, p in particoes.items() if dias is None or dia in dias}
+    fontes = dict.fromkeys(contagens, "manifesto")
+
+    faltantes = [dia for dia in (dias or []) if dia not in contagens]
+    if faltantes and os.path.isdir(destino):
+        con = duckdb.connect()
+        try:
+            por_rodape = compactar_parquet.contar_por_rodape(con, destino, faltantes)
+        finally:
+            con.close()
+        for dia, (linhas, _arquivos) in por_rodape.items():
+            contagens[dia] = linhas
+            fontes[dia] = "rodape"
+    return contagens, fontes
+
+
+def comparar_dia(dia, bronze, silver, tolerancia_pct=TOLERANCIA_PCT):
+    """Linha do relatório para um dia: contagens, diferença e status."""
+    diferenca = silver - bronze
+    if bronze > 0:
+        diff_pct = abs(diferenca) / bronze * 100
+    else:
+        diff_pct = 100.0 if silver > 0 else 0.0
+
+    if bronze == 0 and silver == 0:
+        status = "vazio"
+    elif silver == 0:
+        status = "nao_compactado"
+    elif diff_pct > tolerancia_pct:
+        status = "divergente"
+    else:
+        status = "ok"
+    return {
+        "dt": dia,
+        "bronze": bronze,
+        "silver": silver,
+        "diferenca": diferenca,
+        "diff_pct": round(diff_pct, 1),
+        "status": status,
+    }
+
+
+def reconciliar(conn, tabela, dias=None, tolerancia_pct=TOLERANCIA_PCT):
+    """Relatório de divergência por dia entre Bronze e Silver.
+
+    Args:
+        conn: Conexão DB-API com o Bronze.
+        tabela: "posicoes" ou "previsoes".
+        dias: Dias a reconciliar; padrão = janela atual do Bronze.
+        tolerancia_pct: Diferença percentual acima da qual o dia é "divergente".
+
+    Retorna:
+        Lista de dicts (um por dia) com dt, bronze, silver, diferenca, diff_pct, status e fonte_silver.
+    """
+    dias = dias if dias is not None else dias_bronze(conn, tabela)
+    bronze = contagens_bronze(conn, tabela, dias)
+    silver, fontes = contagens_silver(os.path.join(compactar_parquet.PARQUET_DIR, tabela), dias)
+
+    relatorio = []
+    for dia in dias:
+        linha = comparar_dia(dia, bronze[dia], silver.get(dia, 0), tolerancia_pct)
+        linha["fonte_silver"] = fontes.get(dia, "-")
+        relatorio.append(linha)
+    return relatorio
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconcilia Bronze ↔ Silver por dia (janela do Bronze)")
+    parser.add_argument("--tabela", choices=["posicoes", "previsoes"], help="Padrão: ambas.")
+    parser.add_argument("--tolerancia", type=float, default=TOLERANCIA_PCT, help="Tolerância em %% por dia.")
+    args = parser.parse_args()
+
+    divergentes = 0
+    with get_connection() as conn:
+        for tabela in [args.tabela] if args.tabela else ["posicoes", "previsoes"]:
+            logging.info(f"Reconciliação '{tabela}':")
+            for linha in reconciliar(conn, tabela, tolerancia_pct=args.tolerancia):
+                nivel = logging.WARNING if linha["status"] == "divergente" else logging.INFO
+                logging.log(
+                    nivel,
+                    f"  dt={linha['dt']} bronze={linha['bronze']} silver={linha['silver']} "
+                    f"dif={linha['diferenca']:+d} ({linha['diff_pct']}%) → {linha['status']}",
+                )
+                divergentes += linha["status"] == "divergente"
+
+    if divergentes:
+        logging.warning(f"{divergentes} dia(s) com divergência acima da tolerância.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+"""
+Reprocessamento do arquivo bruto: reexecuta parse, filtro, contrato e INSERT dos
+coletores sobre as respostas arquivadas (src/arquivo_bruto.py), sem nova coleta.
+
+Paralelo por arquivo: cada processo do pool descomprime uma hora de snapshots e roda
+o mesmo código do coletor (`coleta_sptrans.preparar_registros`,
+`coleta_previsoes.registros_previsao`/`validar_registros`); o processo principal é o
+único escritor e grava um lote por snapshot com `inserir_lote`, na ordem em que os
+arquivos ficam prontos. Sem espera entre snapshots: meses de coleta em minutos.
+
+O `timestamp_coleta` vem do cabeçalho do snapshot — o mesmo gravado no Bronze na coleta
+original — então reprocessar sobre o mesmo banco é idempotente (os índices de dedup
+ignoram o que já existe) e só acrescenta o que o filtro antigo descartou. O batimento
+`ultimo_lote` não é tocado: reprocessamento não é coleta para o monitor.
+
+Uso:
+    python -m src.reprocessar_bruto --inicio 2025-08-01 --fim 2025-08-31    # posições, LINHAS_ALVO do config
+    python -m src.reprocessar_bruto --linhas 2411,34791                     # outras linhas alvo
+    python -m src.reprocessar_bruto --todas-as-linhas --banco data/replay.db
+    python -m src.reprocessar_bruto --endpoint previsao_linha --processos 8
+"""
+
+import argparse
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+from src import arquivo_bruto
+from src.database import get_connection, inserir_lote, registrar_paradas, schema_sql
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+ENDPOINT_POR_NOME = {nome: endpoint for endpoint, nome in arquivo_bruto.ENDPOINTS.items()}
+
+
+@dataclass
+class Lote:
+    """Registros de um snapshot prontos para `inserir_lote`."""
+
+    ts: datetime
+    tabela: str
+    colunas: list
+    registros: list
+    esperados: int
+    paradas: list = field(default_factory=list)  # coordenadas de paradas (só /Previsao/Linha)
+
+
+# --- Processadores (um por endpoint; funções de módulo para atravessar o pool de processos) ---
+
+
+def processar_posicao(snapshot, alvo):
+    """Parse + filtro + contrato de `coleta_sptrans` sobre um snapshot de /Posicao.
+
+    `alvo`: letreiros a manter; None mantém todas as linhas do snapshot.
+    """
+    from src import coleta_sptrans
+
+    dados = snapshot.json()
+    if not dados or not dados.get("l"):
+        return None
+    letreiros = alvo if alvo is not None else {linha.get("c") for linha in dados["l"]}
+    registros, esperados = coleta_sptrans.preparar_registros(dados, letreiros, snapshot.ts)
+    return Lote(snapshot.ts, "posicoes", coleta_sptrans.COLUNAS, registros, esperados)
+
+
+def processar_previsao(snapshot, alvo):
+    """Parse + contrato de `coleta_previsoes` sobre um snapshot de /Previsao/Linha.
+
+    `alvo`: ids de linha a manter; None mantém todas as linhas arquivadas.
+    """
+    from src import coleta_previsoes
+
+    linha_id = int(snapshot.params["codigoLinha"])
+    if alvo is not None and linha_id not in alvo:
+        return None
+    dados = snapshot.json()
+    if not dados or not dados.get("ps"):
+        return None
+    registros = coleta_previsoes.registros_previsao(dados, linha_id, snapshot.ts)
+    esperados = len(registros)
+    return Lote(
+        snapshot.ts,
+        "previsoes",
+        coleta_previsoes.COLUNAS,
+        coleta_previsoes.validar_registros(registros),
+        esperados,
+        coleta_previsoes.paradas_previsao(dados),
+    )
+
+
+PROCESSADORES = {"/Posicao": processar_posicao, "/Previsao/Linha": processar_previsao}
+
+
+def processar_arquivo(caminho, processador, alvo=None, inicio=None, fim=None):
+    """Lê um arquivo horário e aplica o processador a cada snapshot. Retorna (lotes, snapshots lidos)."""
+    lotes, lidos = [], 0
+    for snapshot in arquivo_bruto.ler_snapshots(caminho, inicio, fim):
+        lidos += 1
+        lote = processador(snapshot, alvo)
+        if lote is not None and lote.registros:
+            lotes.append(lote)
+    return lotes, lidos
+
+
+def gravar_lotes(lotes):
+    """Grava os lotes de um arquivo numa transação; retorna as linhas inseridas (duplicatas não contam)."""
+    inseridos = 0
+    with get_connection() as conn:
+        for lote in lotes:
+            registrar_paradas(conn, lote.paradas)
+            inseridos += inserir_lote(conn, lote.tabela, lote.colunas, lote.registros)
+    return inseridos
+
+
+def reprocessar(arquivos, processador, alvo=None, inicio=None, fim=None, processos=None, gravar=gravar_lotes):
+    """Reprocessa os arquivos em paralelo (um por tarefa) e grava os lotes no processo atual.
+
+    `processador(snapshot, alvo) -> Lote | None` e `gravar(lotes) -> int` podem ser trocados
+    para popular tabelas derivadas novas a partir do mesmo arquivo. `processos=1` roda sem pool.
+
+    Retorna {"arquivos", "snapshots", "registros", "inseridos", "segundos", "de", "ate"}.
+    """
+    resumo = {"arquivos": 0, "snapshots": 0, "registros": 0, "inseridos": 0, "de": None, "ate": None}
+    inicio_relogio = time.perf_counter()
+
+    def consolidar(lotes, lidos):
+        resumo["arquivos"] += 1
+        resumo["snapshots"] += lidos
+        resumo["registros"] += sum(len(lote.registros) for lote in lotes)
+        if lotes:
+            resumo["inseridos"] += gravar(lotes)
+            primeiro, ultimo = min(lote.ts for lote in lotes), max(lote.ts for lote in lotes)
+            resumo["de"] = min(resumo["de"] or primeiro, primeiro)
+            resumo["ate"] = max(resumo["ate"] or ultimo, ultimo)
+        logging.info(
+            f"{resumo['arquivos']}/{len(arquivos)} arquivos: {resumo['snapshots']} snapshots, "
+            f"{resumo['inseridos']} registros inseridos."
+        )
+
+    if processos == 1 or len(arquivos) <= 1:
+        for caminho in arquivos:
+            consolidar(*processar_arquivo(caminho, processador, alvo, inicio, fim))
+    else:
+        with ProcessPoolExecutor(max_workers=processos) as pool:
+            tarefas = [pool.submit(processar_arquivo, c, processador, alvo, inicio, fim) for c in arquivos]
+            for tarefa in as_completed(tarefas):
+                consolidar(*tarefa.result())
+
+    resumo["segundos"] = time.perf_counter() - inicio_relogio
+    return resumo
+
+
+def _alvo_padrao(endpoint, linhas, todas):
+    """Linhas alvo: --todas-as-linhas (None), --linhas ou LINHAS_ALVO do config.ini."""
+    if todas:
+        return None
+    if endpoint == "/Posicao":
+        from src import coleta_sptrans
+
+        ids = linhas if linhas is not None else coleta_sptrans.get_linhas_alvo_ids(coleta_sptrans.get_config())
+        return coleta_sptrans.get_letreiros_alvo(ids)
+    from src import coleta_previsoes
+
+    return set(linhas if linhas is not None else coleta_previsoes.get_linhas_alvo(coleta_previsoes.get_config()))
+
+
+def _preparar_banco(caminho):
+    """Aponta o SQLite para `caminho` e garante o schema (tabelas novas para backfill)."""
+    import src.database
+
+    src.database.DB_PATH = caminho
+    tabelas, indices = schema_sql()
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        for sql in [*tabelas, *indices]:
+            cursor.execute(sql)
+
+
+def _data(texto):
+    return datetime.strptime(texto, "%Y-%m-%d")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reprocessa o arquivo bruto da API sem nova coleta")
+    parser.add_argument("--endpoint", choices=sorted(ENDPOINT_POR_NOME), default="posicao")
+    parser.add_argument("--inicio", type=_data, help="Primeiro dia (YYYY-MM-DD).")
+    parser.add_argument("--fim", type=_data, help="Último dia, inclusive (YYYY-MM-DD).")
+    parser.add_argument(
+        "--linhas", type=lambda s: [int(x) for x in s.split(",")], help="Ids de linha (ex: 2411,34791)."
+    )
+    parser.add_argument("--todas-as-linhas", action="store_true", help="Não filtra: grava todas as linhas.")
+    parser.add_argument("--processos", type=int, default=os.cpu_count(), help="Processos paralelos (1 = sem pool).")
+    parser.add_argument("--banco", help="SQLite de destino (padrão: o banco do projeto / DATABASE_URL).")
+    parser.add_argument("--arquivo-dir", help="Raiz do arquivo bruto (padrão: SPTRANS_ARQUIVO_DIR ou data/bruto).")
+    args = parser.parse_args()
+
+    endpoint = ENDPOINT_POR_NOME[args.endpoint]
+    fim = args.fim + timedelta(days=1) - timedelta(microseconds=1) if args.fim else None
+    arquivos = arquivo_bruto.listar_arquivos(endpoint, args.inicio, fim, args.arquivo_dir)
+    if not arquivos:
+        logging.warning(f"Nenhum arquivo de {endpoint} no período.")
+        return
+
+    try:
+        alvo = _alvo_padrao(endpoint, args.linhas, args.todas_as_linhas)
+    except (FileNotFoundError, KeyError) as e:
+        logging.error(f"Erro ao carregar as linhas alvo: {e}")
+        return
+    if args.banco:
+        _preparar_banco(args.banco)
+
+    logging.info(f"Reprocessando {len(arquivos)} arquivo(s) de {endpoint} com {args.processos} processo(s)...")
+    resumo = reprocessar(arquivos, PROCESSADORES[endpoint], alvo, args.inicio, fim, args.processos)
+    velocidade = ""
+    if resumo["de"] and resumo["segundos"] > 0:
+        coberto = (resumo["ate"] - resumo["de"]).total_seconds()
+        velocidade = f" — {coberto / resumo['segundos']:,.0f}× o tempo real"
+    logging.info(
+        f"Reprocessamento concluído: {resumo['snapshots']} snapshots, {resumo['registros']} registros, "
+        f"{resumo['inseridos']} inseridos em {resumo['segundos']:.1f}s{velocidade}."
+    )
+
+
+if __name__ == "__main__":
+    main()
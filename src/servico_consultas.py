@@ -0,0 +1,473 @@
+"""
+Serviço HTTP de consultas (somente leitura) sobre o Parquet Silver de posições.
+
+Dashboard, notebooks e scripts abriam cada um sua conexão DuckDB e varriam
+`data/parquet/posicoes/**` a cada consulta. O serviço segura, pelo processo inteiro:
+
+- uma conexão DuckDB aquecida (`parquet_metadata_cache` ligado: rodapés lidos uma vez);
+  cada requisição usa um cursor próprio dela;
+- o manifesto de `posicoes` em memória, relido só quando o `_manifest.json` muda; as
+  consultas recebem a lista explícita de arquivos das partições do período, sem glob;
+- um cache LRU com TTL das respostas já codificadas, por (rota, parâmetros, formato,
+  versão do manifesto): uma compactação nova invalida tudo sem esperar o TTL.
+
+Rotas (GET). Resposta em JSON (lista de registros) ou, com `formato=arrow` ou
+`Accept: application/vnd.apache.arrow.stream`, em Arrow IPC (stream):
+
+    /posicoes/atuais[?linha=8000-10]                     última posição de cada ônibus
+    /posicoes?linha=8000-10&inicio=...&fim=...            posições da linha em [inicio, fim)
+    /onibus-parados[?dia=|inicio=&fim=][&linha=]          > PARADO_MIN_MINUTOS e < PARADO_MAX_M entre a 1ª e a última posição
+    /comboios[?dia=|inicio=&fim=][&linha=]                pares vizinhos (por latitude) da mesma linha a < COMBOIO_M
+    /saude                                                partições do manifesto e estatísticas do cache
+
+Sem `inicio`/`fim`, paradas e comboios olham os últimos JANELA_PADRAO_MIN minutos da
+partição mais recente (ou do `dia`). `/posicoes/atuais` vem da cópia em memória de
+`posicoes_atuais` (src/posicoes_atuais.py) quando há banco — só leitura, sem DDL, para não
+disputar o lock de escrita do SQLite com o coletor; sem banco, da última partição.
+
+Sem autenticação: por padrão escuta só em 127.0.0.1.
+
+Uso:
+    python -m src.servico_consultas --porta 8090 --cache-ttl 30
+
+    from src.servico_consultas import consultar
+    df = consultar("http://localhost:8090", "/posicoes", linha="8000-10", inicio="2025-08-15T06:00")
+"""
+
+import argparse
+import io
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import duckdb
+import pandas as pd
+import pyarrow as pa
+import requests
+
+from src import database, metricas
+from src.compactar_parquet import MANIFESTO, ler_manifesto
+from src.geo import RAIO_TERRA_M
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+PARQUET_DIR = os.path.join("data", "parquet")
+PORTA = 8090
+TIPO_ARROW = "application/vnd.apache.arrow.stream"
+TIPO_JSON = "application/json; charset=utf-8"
+
+CACHE_ITENS = 256
+CACHE_TTL_S = 30
+MAX_DIAS_CONSULTA = 31
+JANELA_PADRAO_MIN = 30
+PARADO_MIN_MINUTOS = 10  # mesmos limiares de analyze_stuck_buses no dashboard
+PARADO_MAX_M = 100
+COMBOIO_M = 200  # mesmo limiar de analyze_bunched_buses no dashboard
+
+COLUNAS_POSICOES = "timestamp_coleta, id_onibus, letreiro_linha, latitude, longitude, timestamp_posicao"
+
+
+class ErroConsulta(ValueError):
+    """Parâmetro inválido na requisição (vira HTTP 400)."""
+
+
+def _haversine_sql(lat1, lon1, lat2, lon2):
+    """Expressão SQL (DuckDB) da distância haversine em metros, como `geo.haversine_m`."""
+    a = (
+        f"pow(sin(radians({lat2} - {lat1}) / 2), 2) + "
+        f"cos(radians({lat1})) * cos(radians({lat2})) * pow(sin(radians({lon2} - {lon1}) / 2), 2)"
+    )
+    return f"(2 * {RAIO_TERRA_M} * asin(sqrt(least(greatest({a}, 0.0), 1.0))))"
+
+
+SQL_ATUAIS_PARQUET = """
+    SELECT id_onibus, max(timestamp_coleta) AS timestamp_coleta,
+           arg_max(letreiro_linha, timestamp_coleta) AS letreiro_linha,
+           arg_max(latitude, timestamp_coleta) AS latitude,
+           arg_max(longitude, timestamp_coleta) AS longitude,
+           arg_max(timestamp_posicao, timestamp_coleta) AS timestamp_posicao
+    FROM read_parquet(?)
+    GROUP BY id_onibus
+    HAVING ? IS NULL OR arg_max(letreiro_linha, timestamp_coleta) = ?
+    ORDER BY id_onibus
+"""
+
+SQL_POSICOES = f"""
+    SELECT {COLUNAS_POSICOES}
+    FROM read_parquet(?)
+    WHERE letreiro_linha = ? AND timestamp_coleta >= ? AND timestamp_coleta < ?
+    ORDER BY timestamp_coleta, id_onibus
+"""
+
+_DISTANCIA_PARADO = _haversine_sql(
+    "arg_min(latitude, timestamp_coleta)",
+    "arg_min(longitude, timestamp_coleta)",
+    "arg_max(latitude, timestamp_coleta)",
+    "arg_max(longitude, timestamp_coleta)",
+)
+
+SQL_PARADOS = f"""
+    SELECT * FROM (
+        SELECT id_onibus,
+               arg_max(letreiro_linha, timestamp_coleta) AS letreiro_linha,
+               min(timestamp_coleta) AS primeira_coleta,
+               max(timestamp_coleta) AS ultima_coleta,
+               date_diff('second', min(timestamp_coleta), max(timestamp_coleta)) / 60.0 AS tempo_decorrido_min,
+               {_DISTANCIA_PARADO} AS distancia_m,
+               arg_max(latitude, timestamp_coleta) AS latitude,
+               arg_max(longitude, timestamp_coleta) AS longitude
+        FROM read_parquet(?)
+        WHERE timestamp_coleta >= ? AND timestamp_coleta < ? AND (? IS NULL OR letreiro_linha = ?)
+        GROUP BY id_onibus
+    )
+    WHERE tempo_decorrido_min > ? AND distancia_m < ?
+    ORDER BY letreiro_linha, id_onibus
+"""
+
+SQL_COMBOIOS = f"""
+    SELECT * FROM (
+        SELECT timestamp_coleta, letreiro_linha,
+               lag(id_onibus) OVER w AS id_onibus_a, id_onibus AS id_onibus_b,
+               {_haversine_sql("lag(latitude) OVER w", "lag(longitude) OVER w", "latitude", "longitude")} AS distancia_m,
+               latitude, longitude
+        FROM read_parquet(?)
+        WHERE timestamp_coleta >= ? AND timestamp_coleta < ? AND (? IS NULL OR letreiro_linha = ?)
+        WINDOW w AS (PARTITION BY timestamp_coleta, letreiro_linha ORDER BY latitude, id_onibus)
+    )
+    WHERE id_onibus_a IS NOT NULL AND distancia_m < ?
+    ORDER BY timestamp_coleta, letreiro_linha, id_onibus_a
+"""
+
+
+class CacheLRU:
+    """Cache LRU com TTL, seguro para várias threads. `obter` devolve None se ausente ou expirado."""
+
+    def __init__(self, capacidade=CACHE_ITENS, ttl_s=CACHE_TTL_S, relogio=time.monotonic):
+        self.capacidade = capacidade
+        self.ttl_s = ttl_s
+        self._relogio = relogio
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.faltas = 0
+
+    def obter(self, chave):
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is not None and self._relogio() - item[0] < self.ttl_s:
+                self._itens.move_to_end(chave)
+                self.acertos += 1
+                return item[1]
+            if item is not None:
+                del self._itens[chave]
+            self.faltas += 1
+            return None
+
+    def guardar(self, chave, valor):
+        if self.capacidade <= 0:
+            return
+        with self._lock:
+            self._itens[chave] = (self._relogio(), valor)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.capacidade:
+                self._itens.popitem(last=False)
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+
+    def estatisticas(self):
+        with self._lock:
+            return {"itens": len(self._itens), "acertos": self.acertos, "faltas": self.faltas}
+
+
+class ManifestoPosicoes:
+    """Manifesto de `posicoes` em memória: partições e arquivos, relidos só quando o manifesto muda."""
+
+    def __init__(self, destino):
+        self.destino = destino
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._particoes = {}
+        self._arquivos = {}
+
+    def _atualizar(self):
+        try:
+            estado = os.stat(os.path.join(self.destino, MANIFESTO))
+            mtime = (estado.st_mtime_ns, estado.st_size)
+        except FileNotFoundError:
+            mtime = None
+        if mtime != self._mtime:
+            self._particoes = ler_manifesto(self.destino)["particoes"] if mtime else {}
+            self._arquivos = {}
+            self._mtime = mtime
+            logging.debug(f"Manifesto de posições recarregado: {len(self._particoes)} partição(ões).")
+
+    @property
+    def versao(self):
+        with self._lock:
+            self._atualizar()
+            return self._mtime
+
+    def dias(self, inicio=None, fim=None):
+        """Partições (YYYY-MM-DD) com linhas, entre os dias `inicio` e `fim` inclusive."""
+        with self._lock:
+            self._atualizar()
+            dias = sorted(dt for dt, info in self._particoes.items() if info.get("linhas", 0) > 0)
+        return [d for d in dias if (inicio is None or d >= inicio) and (fim is None or d <= fim)]
+
+    def arquivos(self, dias):
+        """Arquivos Parquet das partições `dias` (listados uma vez por versão do manifesto)."""
+        with self._lock:
+            self._atualizar()
+            for dia in dias:
+                if dia not in self._arquivos:
+                    particao = os.path.join(self.destino, f"dt={dia}")
+                    nomes = sorted(n for n in os.listdir(particao) if n.endswith(".parquet"))
+                    self._arquivos[dia] = [os.path.join(particao, n) for n in nomes]
+            return [caminho for dia in dias for caminho in self._arquivos[dia]]
+
+    def resumo(self):
+        with self._lock:
+            self._atualizar()
+            return {
+                "particoes": len(self._particoes),
+                "linhas": sum(info.get("linhas", 0) for info in self._particoes.values()),
+                "primeiro_dia": min(self._particoes, default=None),
+                "ultimo_dia": max(self._particoes, default=None),
+            }
+
+
+def _parametro(params, nome):
+    valor = params.get(nome, [None])[0]
+    return valor if valor not in (None, "") else None
+
+
+def _instante(params, nome):
+    valor = _parametro(params, nome)
+    if valor is None:
+        return None
+    try:
+        return datetime.fromisoformat(valor).replace(tzinfo=None)
+    except ValueError:
+        raise ErroConsulta(f"{nome} inválido: {valor!r} (use ISO 8601, ex: 2025-08-15T06:00).") from None
+
+
+def codificar(tabela, formato):
+    """Tabela Arrow → (Content-Type, bytes) em Arrow IPC (stream) ou JSON (registros, datas ISO)."""
+    if formato == "arrow":
+        destino = pa.BufferOutputStream()
+        with pa.ipc.new_stream(destino, tabela.schema) as escritor:
+            escritor.write_table(tabela)
+        return TIPO_ARROW, destino.getvalue().to_pybytes()
+    corpo = tabela.to_pandas().to_json(orient="records", date_format="iso", force_ascii=False)
+    return TIPO_JSON, corpo.encode("utf-8")
+
+
+class ServicoConsultas:
+    """Consultas sobre o Parquet de posições com uma conexão DuckDB e um manifesto por processo."""
+
+    ROTAS = {
+        "/posicoes/atuais": "posicoes_atuais",
+        "/posicoes": "posicoes",
+        "/onibus-parados": "onibus_parados",
+        "/comboios": "comboios",
+    }
+
+    def __init__(self, parquet_dir=None, cache=None):
+        self.parquet_dir = parquet_dir or PARQUET_DIR
+        self.manifesto = ManifestoPosicoes(os.path.join(self.parquet_dir, "posicoes"))
+        self.cache = cache if cache is not None else CacheLRU()
+        self._con = duckdb.connect()
+        self._con.execute("SET parquet_metadata_cache = true")
+
+    def fechar(self):
+        self._con.close()
+
+    def _executar(self, sql, parametros):
+        cursor = self._con.cursor()
+        try:
+            return cursor.execute(sql, parametros).to_arrow_table()
+        finally:
+            cursor.close()
+
+    def _dias_do_periodo(self, inicio, fim):
+        if fim <= inicio:
+            raise ErroConsulta("fim deve ser posterior a inicio.")
+        if (fim - inicio).days > MAX_DIAS_CONSULTA:
+            raise ErroConsulta(f"Período maior que {MAX_DIAS_CONSULTA} dias.")
+        ultimo = (fim - timedelta(microseconds=1)).date().isoformat()
+        return self.manifesto.dias(inicio.date().isoformat(), ultimo)
+
+    def _janela(self, params):
+        """(arquivos, inicio, fim) do período pedido; sem inicio/fim, os últimos JANELA_PADRAO_MIN do dia."""
+        inicio, fim = _instante(params, "inicio"), _instante(params, "fim")
+        if inicio is not None and fim is not None:
+            return self.manifesto.arquivos(self._dias_do_periodo(inicio, fim)), inicio, fim
+        if inicio is not None or fim is not None:
+            raise ErroConsulta("Informe inicio e fim juntos (ou nenhum dos dois).")
+        dia = _parametro(params, "dia")
+        dias = self.manifesto.dias(dia, dia) if dia else self.manifesto.dias()[-1:]
+        if not dias:
+            return [], None, None
+        arquivos = self.manifesto.arquivos(dias)
+        ultima = self._executar("SELECT max(timestamp_coleta) AS t FROM read_parquet(?)", [arquivos])
+        fim = ultima.column("t")[0].as_py() + timedelta(microseconds=1)
+        return arquivos, fim - timedelta(minutes=JANELA_PADRAO_MIN), fim
+
+    def posicoes_atuais(self, params):
+        linha = _parametro(params, "linha")
+        if database.is_postgres() or os.path.exists(database.DB_PATH):
+            from src.posicoes_atuais import posicoes_atuais
+
+            df = posicoes_atuais(letreiros=[linha] if linha else None)
+            return pa.Table.from_pandas(df, preserve_index=False)
+        arquivos = self.manifesto.arquivos(self.manifesto.dias()[-1:])
+        if not arquivos:
+            return pa.table({c.strip(): [] for c in COLUNAS_POSICOES.split(",")})
+        return self._executar(SQL_ATUAIS_PARQUET, [arquivos, linha, linha])
+
+    def posicoes(self, params):
+        linha = _parametro(params, "linha")
+        inicio, fim = _instante(params, "inicio"), _instante(params, "fim")
+        if linha is None or inicio is None:
+            raise ErroConsulta("Parâmetros obrigatórios: linha e inicio (fim opcional, padrão inicio + 1 dia).")
+        fim = fim or inicio + timedelta(days=1)
+        arquivos = self.manifesto.arquivos(self._dias_do_periodo(inicio, fim))
+        if not arquivos:
+            return pa.table({c.strip(): [] for c in COLUNAS_POSICOES.split(",")})
+        return self._executar(SQL_POSICOES, [arquivos, linha, inicio, fim])
+
+    def onibus_parados(self, params):
+        linha = _parametro(params, "linha")
+        arquivos, inicio, fim = self._janela(params)
+        if not arquivos:
+            return pa.table({})
+        return self._executar(SQL_PARADOS, [arquivos, inicio, fim, linha, linha, PARADO_MIN_MINUTOS, PARADO_MAX_M])
+
+    def comboios(self, params):
+        linha = _parametro(params, "linha")
+        arquivos, inicio, fim = self._janela(params)
+        if not arquivos:
+            return pa.table({})
+        return self._executar(SQL_COMBOIOS, [arquivos, inicio, fim, linha, linha, COMBOIO_M])
+
+    def saude(self):
+        return {"manifesto": self.manifesto.resumo(), "cache": self.cache.estatisticas()}
+
+    def responder(self, caminho, params, formato="json"):
+        """(status, Content-Type, corpo) da rota; respostas 200 passam pelo cache."""
+        metodo = self.ROTAS.get(caminho.rstrip("/") or "/")
+        if metodo is None:
+            return 404, TIPO_JSON, json.dumps({"erro": f"Rota desconhecida: {caminho}"}).encode("utf-8")
+        parametros = tuple(sorted((k, tuple(v)) for k, v in params.items() if k != "formato"))
+        chave = (metodo, parametros, formato, self.manifesto.versao)
+        resposta = self.cache.obter(chave)
+        if resposta is not None:
+            metricas.CONSULTA_SEGUNDOS.observar(0, rota=metodo, cache="acerto")
+            return (200, *resposta)
+        with metricas.CONSULTA_SEGUNDOS.medir(rota=metodo, cache="falta"):
+            try:
+                tabela = getattr(self, metodo)(params)
+            except ErroConsulta as e:
+                return 400, TIPO_JSON, json.dumps({"erro": str(e)}, ensure_ascii=False).encode("utf-8")
+            resposta = codificar(tabela, formato)
+        self.cache.guardar(chave, resposta)
+        logging.debug(f"consulta {metodo} {parametros}: {tabela.num_rows} linha(s).")
+        return (200, *resposta)
+
+
+# --- Servidor HTTP ---
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        servico = self.server.servico
+        if url.path == "/saude":
+            corpo = json.dumps(servico.saude()).encode("utf-8")
+            return self._responder(200, TIPO_JSON, corpo)
+        pede_arrow = _parametro(params, "formato") == "arrow" or TIPO_ARROW in self.headers.get("Accept", "")
+        try:
+            status, tipo, corpo = servico.responder(url.path, params, "arrow" if pede_arrow else "json")
+        except Exception as e:  # noqa: BLE001 - a requisição falha, o servidor continua
+            logging.exception(f"Erro na consulta {self.path}")
+            status, tipo, corpo = 500, TIPO_JSON, json.dumps({"erro": str(e)}).encode("utf-8")
+        self._responder(status, tipo, corpo)
+
+    def _responder(self, status, tipo, corpo):
+        self.send_response(status)
+        self.send_header("Content-Type", tipo)
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, format, *args):
+        logging.debug("consultas: " + format, *args)
+
+
+class ServidorConsultas(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, endereco, servico):
+        super().__init__(endereco, _Handler)
+        self.servico = servico
+
+    @property
+    def base_url(self):
+        host, porta = self.server_address[:2]
+        return f"http://{host}:{porta}"
+
+
+def iniciar(servico=None, porta=0, endereco="127.0.0.1"):
+    """Sobe o serviço em uma thread daemon. Retorna o servidor (`base_url`, `servico`, `shutdown()`)."""
+    servidor = ServidorConsultas((endereco, porta), servico or ServicoConsultas())
+    threading.Thread(target=servidor.serve_forever, name="servico-consultas", daemon=True).start()
+    return servidor
+
+
+def consultar(base_url, rota, formato="arrow", timeout=30, **params):
+    """Cliente: GET `rota` no serviço → DataFrame (Arrow IPC por padrão; `formato="json"` também funciona)."""
+    resposta = requests.get(f"{base_url}{rota}", params={**params, "formato": formato}, timeout=timeout)
+    resposta.raise_for_status()
+    if formato == "arrow":
+        return pa.ipc.open_stream(resposta.content).read_pandas()
+    return pd.read_json(io.BytesIO(resposta.content), orient="records")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serviço HTTP de consultas sobre o Parquet de posições")
+    parser.add_argument("--porta", type=int, default=PORTA)
+    parser.add_argument("--endereco", default="127.0.0.1", help="Sem autenticação: exponha com cuidado.")
+    parser.add_argument("--parquet-dir", default=PARQUET_DIR)
+    parser.add_argument("--cache-itens", type=int, default=CACHE_ITENS, help="Respostas no cache LRU (0 = sem cache).")
+    parser.add_argument("--cache-ttl", type=float, default=CACHE_TTL_S, help="Validade de uma resposta em cache (s).")
+    args = parser.parse_args()
+
+    servico = ServicoConsultas(args.parquet_dir, CacheLRU(args.cache_itens, args.cache_ttl))
+    servidor = ServidorConsultas((args.endereco, args.porta), servico)
+    resumo = servico.manifesto.resumo()
+    logging.info(
+        f"Serviço de consultas em http://localhost:{args.porta} — {resumo['particoes']} partição(ões) "
+        f"de posições ({resumo['linhas']} linhas), cache {args.cache_itens} itens / {args.cache_ttl:g}s."
+    )
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+        servico.fechar()
+
+
+if __name__ == "__main__":
+    main()
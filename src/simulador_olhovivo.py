@@ -0,0 +1,376 @@
+"""
+Simulador offline da API Olho Vivo (v2.1) para testes de carga e latência.
+
+Implementa os endpoints usados pelos coletores e pelo catálogo de paradas, com o mesmo
+formato de payload da API real:
+
+- `POST /Login/Autenticar?token=...` → `true` e cookie de sessão `apiCredentials`;
+- `GET  /Posicao` → `{"hr", "l": [{"c", "cl", "sl", "lt0", "lt1", "qv", "vs": [{"p", "a", "ta", "py", "px"}]}]}`;
+- `GET  /Previsao/Linha?codigoLinha=<cl>` → `{"hr", "ps": [{"cp", "np", "py", "px", "vs": [{"p", "t", "a", "ta", "py", "px"}]}]}`;
+- `GET  /Parada/BuscarParadasPorLinha?codigoLinha=<cl>` → `[{"cp", "np", "ed", "py", "px"}]`.
+
+A frota (padrão: 15 mil veículos, a escala real de SP) percorre rotas sintéticas em
+laço, cada veículo com fase e velocidade próprias; as posições são calculadas de forma
+vetorizada (NumPy) a cada requisição a partir do relógio, então duas chamadas seguidas
+mostram os ônibus andando. Com `--catalogo`, linhas e ids vêm do catálogo real
+(`data/todas_as_linhas.csv`) e o filtro `LINHAS_ALVO` dos coletores funciona sem mudanças.
+
+Injeção de falhas por requisição: latência base + jitter, taxa de erros HTTP 500 e
+taxa de respostas lentas.
+
+Uso:
+    python -m src.simulador_olhovivo --porta 8089 --catalogo data/todas_as_linhas.csv \\
+        --latencia-ms 150 --jitter-ms 100 --taxa-erro 0.01 --taxa-lenta 0.02
+
+    SPTRANS_BASE_URL=http://localhost:8089/v2.1 python src/coleta_sptrans.py
+"""
+
+import argparse
+import json
+import logging
+import random
+import threading
+import time
+from dataclasses import dataclass
+from datetime import UTC, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+from src.catalogo_linhas import OFFSET_SENTIDO_2
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(levelname)s - %(message)s",
+)
+
+PREFIXO_API = "/v2.1"
+N_VEICULOS = 15_000
+N_LINHAS = 1_300  # linhas-base; cada uma tem os dois sentidos
+PONTOS_POR_ROTA = 24  # vértices da rota sintética (também são as paradas)
+HORIZONTE_PREVISAO_S = 2 * 3600
+BASE_PARADA = 100_000
+COOKIE = "apiCredentials"
+
+# Retângulo aproximado da mancha urbana de São Paulo
+LAT_MIN, LAT_MAX = -23.75, -23.40
+LON_MIN, LON_MAX = -46.82, -46.40
+KM_POR_GRAU = 111.0
+
+
+@dataclass
+class Falhas:
+    """Injeção de falhas por requisição."""
+
+    latencia_ms: float = 0.0
+    jitter_ms: float = 0.0
+    taxa_erro: float = 0.0  # fração de respostas HTTP 500
+    taxa_lenta: float = 0.0  # fração de respostas com `lentidao_s` extra
+    lentidao_s: float = 5.0
+
+
+class Frota:
+    """Serviços (linha × sentido), rotas e veículos; posições calculadas a partir do relógio."""
+
+    def __init__(self, n_veiculos=N_VEICULOS, n_linhas=N_LINHAS, catalogo=None, seed=42, inicio=None):
+        rng = np.random.default_rng(seed)
+        self.inicio = time.time() if inicio is None else inicio
+        self._montar_servicos(n_linhas, catalogo)
+        n_servicos = len(self.cl)
+
+        # Rota de cada letreiro: passeio aleatório dentro de SP; o sentido 2 percorre a mesma rota ao contrário
+        n_rotas = int(self.rota.max()) + 1
+        centro = np.column_stack(
+            [
+                rng.uniform(LAT_MIN + 0.05, LAT_MAX - 0.05, n_rotas),
+                rng.uniform(LON_MIN + 0.05, LON_MAX - 0.05, n_rotas),
+            ]
+        )
+        passos = rng.normal(0, 0.004, (n_rotas, PONTOS_POR_ROTA, 2))
+        rotas = centro[:, None, :] + np.cumsum(passos, axis=1)
+        rotas[..., 0] = rotas[..., 0].clip(LAT_MIN, LAT_MAX)
+        rotas[..., 1] = rotas[..., 1].clip(LON_MIN, LON_MAX)
+        self.paradas_id = BASE_PARADA + np.arange(n_rotas * PONTOS_POR_ROTA).reshape(n_rotas, PONTOS_POR_ROTA)
+        volta = self.sentido == 2
+        self.pontos = rotas[self.rota]  # (n_servicos, K, 2) na ordem de percurso
+        self.pontos[volta] = self.pontos[volta, ::-1]
+        self.paradas = self.paradas_id[self.rota]
+        self.paradas[volta] = self.paradas[volta, ::-1]
+        comprimento_km = np.linalg.norm(np.diff(self.pontos, axis=1), axis=2).sum(axis=1) * KM_POR_GRAU
+
+        # Veículos: serviço, prefixo, acessibilidade, fase inicial e velocidade (fração da rota por segundo)
+        self.servico = np.sort(rng.integers(0, n_servicos, n_veiculos))
+        self.prefixo = rng.choice(np.arange(10_000, 99_999), n_veiculos, replace=False)
+        self.acessivel = rng.random(n_veiculos) < 0.9
+        self.fase = rng.random(n_veiculos)
+        velocidade_kmh = rng.uniform(12, 25, n_veiculos)
+        self.velocidade = velocidade_kmh / 3600 / np.maximum(comprimento_km[self.servico], 0.5)
+        self._fatias = np.searchsorted(self.servico, np.arange(n_servicos + 1))
+        self._por_cl = {int(cl): i for i, cl in enumerate(self.cl)}
+
+    def _montar_servicos(self, n_linhas, catalogo):
+        if catalogo is not None:
+            df = catalogo.df if hasattr(catalogo, "df") else catalogo
+            letreiros = df["letreiro"].astype(str)
+            self.cl = df["id_linha"].to_numpy(dtype=np.int64)
+            self.letreiro = letreiros.to_numpy()
+            self.sentido = df["sentido"].to_numpy(dtype=np.int64)
+            self.lt0 = df["sentido_ida"].astype(str).to_numpy()
+            self.lt1 = df["sentido_volta"].astype(str).to_numpy()
+            self.rota = letreiros.astype("category").cat.codes.to_numpy(dtype=np.int64)
+            return
+        base = np.arange(n_linhas)
+        self.cl = np.concatenate([base + 1, base + 1 + OFFSET_SENTIDO_2])
+        numericos = np.char.add((1000 + base).astype(str), "-10")
+        self.letreiro = np.concatenate([numericos, numericos])
+        self.sentido = np.repeat([1, 2], n_linhas)
+        self.lt0 = np.concatenate([np.char.add("TERMINAL A ", base.astype(str))] * 2)
+        self.lt1 = np.concatenate([np.char.add("TERMINAL B ", base.astype(str))] * 2)
+        self.rota = np.concatenate([base, base])
+
+    def __len__(self):
+        return len(self.servico)
+
+    def progresso(self, agora=None):
+        """Fração [0, 1) da rota percorrida por cada veículo no instante `agora`."""
+        agora = time.time() if agora is None else agora
+        return (self.fase + self.velocidade * (agora - self.inicio)) % 1.0
+
+    def posicoes(self, agora=None):
+        """(lat, lon) de cada veículo, interpolando entre os vértices da rota."""
+        s = self.progresso(agora) * (PONTOS_POR_ROTA - 1)
+        i = np.minimum(s.astype(np.int64), PONTOS_POR_ROTA - 2)
+        frac = (s - i)[:, None]
+        latlon = self.pontos[self.servico, i] * (1 - frac) + self.pontos[self.servico, i + 1] * frac
+        return latlon[:, 0], latlon[:, 1]
+
+    # --- Payloads ---
+
+    def payload_posicao(self, agora=None):
+        agora = time.time() if agora is None else agora
+        lat, lon = self.posicoes(agora)
+        ta = _iso_utc(agora)
+        linhas = []
+        for s in range(len(self.cl)):
+            inicio, fim = self._fatias[s], self._fatias[s + 1]
+            if inicio == fim:
+                continue
+            vs = [
+                {"p": int(p), "a": bool(a), "ta": ta, "py": round(float(y), 6), "px": round(float(x), 6)}
+                for p, a, y, x in zip(
+                    self.prefixo[inicio:fim], self.acessivel[inicio:fim], lat[inicio:fim], lon[inicio:fim]
+                )
+            ]
+            linhas.append(
+                {
+                    "c": str(self.letreiro[s]),
+                    "cl": int(self.cl[s]),
+                    "sl": int(self.sentido[s]),
+                    "lt0": str(self.lt0[s]),
+                    "lt1": str(self.lt1[s]),
+                    "qv": len(vs),
+                    "vs": vs,
+                }
+            )
+        return {"hr": _hora_local(agora), "l": linhas}
+
+    def payload_paradas_linha(self, codigo_linha):
+        s = self._por_cl.get(int(codigo_linha))
+        if s is None:
+            return []
+        return [
+            {
+                "cp": int(self.paradas[s, k]),
+                "np": f"PARADA {int(self.paradas[s, k])}",
+                "ed": "",
+                "py": round(float(self.pontos[s, k, 0]), 6),
+                "px": round(float(self.pontos[s, k, 1]), 6),
+            }
+            for k in range(PONTOS_POR_ROTA)
+        ]
+
+    def payload_previsao_linha(self, codigo_linha, agora=None):
+        agora = time.time() if agora is None else agora
+        s = self._por_cl.get(int(codigo_linha))
+        if s is None:
+            return {"hr": _hora_local(agora), "ps": []}
+        inicio, fim = self._fatias[s], self._fatias[s + 1]
+        lat, lon = self.posicoes(agora)
+        progresso = self.progresso(agora)[inicio:fim]
+        frac_paradas = np.linspace(0, 1, PONTOS_POR_ROTA)
+        # Segundos até cada parada (linhas: veículos, colunas: paradas); só paradas à frente no laço atual
+        eta = (frac_paradas[None, :] - progresso[:, None]) / self.velocidade[inicio:fim, None]
+        valida = (eta > 0) & (eta <= HORIZONTE_PREVISAO_S)
+        ta = _iso_utc(agora)
+
+        ps = []
+        for k in range(PONTOS_POR_ROTA):
+            veiculos = np.flatnonzero(valida[:, k])
+            vs = [
+                {
+                    "p": int(self.prefixo[inicio + v]),
+                    "t": _hora_local(agora + float(eta[v, k])),
+                    "a": bool(self.acessivel[inicio + v]),
+                    "ta": ta,
+                    "py": round(float(lat[inicio + v]), 6),
+                    "px": round(float(lon[inicio + v]), 6),
+                }
+                for v in veiculos[np.argsort(eta[veiculos, k])]
+            ]
+            cp = int(self.paradas[s, k])
+            ps.append(
+                {
+                    "cp": cp,
+                    "np": f"PARADA {cp}",
+                    "py": round(float(self.pontos[s, k, 0]), 6),
+                    "px": round(float(self.pontos[s, k, 1]), 6),
+                    "vs": vs,
+                }
+            )
+        return {"hr": _hora_local(agora), "ps": ps}
+
+
+def _iso_utc(ts):
+    return datetime.fromtimestamp(ts, tz=UTC).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _hora_local(ts):
+    # A API devolve "hr" e "t" em HH:MM no horário de Brasília (UTC-3, sem horário de verão)
+    return (datetime.fromtimestamp(ts, tz=UTC) - timedelta(hours=3)).strftime("%H:%M")
+
+
+# --- Servidor HTTP ---
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self._atender("POST")
+
+    def do_GET(self):
+        self._atender("GET")
+
+    def _atender(self, metodo):
+        srv = self.server
+        url = urlparse(self.path)
+        caminho = url.path[len(PREFIXO_API) :] if url.path.startswith(PREFIXO_API) else url.path
+        params = parse_qs(url.query)
+
+        srv.atrasar()
+        if srv.sortear_erro():
+            return self._responder(500, {"Message": "An error has occurred."})
+
+        if caminho == "/Login/Autenticar" and metodo == "POST":
+            ok = srv.token is None or params.get("token", [None])[0] == srv.token
+            cookie = f"{COOKIE}=simulador; Path=/; HttpOnly" if ok else None
+            return self._responder(200, ok, cookie=cookie)
+        if metodo == "GET" and caminho in ("/Posicao", "/Previsao/Linha", "/Parada/BuscarParadasPorLinha"):
+            if srv.exigir_autenticacao and f"{COOKIE}=" not in self.headers.get("Cookie", ""):
+                return self._responder(401, {"Message": "Authorization has been denied for this request."})
+            if caminho == "/Posicao":
+                return self._responder(200, srv.frota.payload_posicao())
+            try:
+                codigo = int(params["codigoLinha"][0])
+            except (KeyError, ValueError):
+                return self._responder(400, {"Message": "codigoLinha inválido."})
+            if caminho == "/Parada/BuscarParadasPorLinha":
+                return self._responder(200, srv.frota.payload_paradas_linha(codigo))
+            return self._responder(200, srv.frota.payload_previsao_linha(codigo))
+        return self._responder(404, {"Message": "No HTTP resource was found that matches the request URI."})
+
+    def _responder(self, status, corpo, cookie=None):
+        dados = json.dumps(corpo, separators=(",", ":")).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(dados)))
+        if cookie:
+            self.send_header("Set-Cookie", cookie)
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def log_message(self, format, *args):
+        logging.debug("simulador: " + format, *args)
+
+
+class ServidorSimulador(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, endereco, frota, falhas=None, token=None, exigir_autenticacao=True, seed=None):
+        super().__init__(endereco, _Handler)
+        self.frota = frota
+        self.falhas = falhas or Falhas()
+        self.token = token
+        self.exigir_autenticacao = exigir_autenticacao
+        self._rng = random.Random(seed)
+        self._lock_rng = threading.Lock()
+
+    @property
+    def base_url(self):
+        host, porta = self.server_address[:2]
+        return f"http://{host}:{porta}{PREFIXO_API}"
+
+    def _sortear(self):
+        with self._lock_rng:
+            return self._rng.random()
+
+    def atrasar(self):
+        f = self.falhas
+        atraso = f.latencia_ms / 1000
+        if f.jitter_ms:
+            atraso += self._sortear() * f.jitter_ms / 1000
+        if f.taxa_lenta and self._sortear() < f.taxa_lenta:
+            atraso += f.lentidao_s
+        if atraso > 0:
+            time.sleep(atraso)
+
+    def sortear_erro(self):
+        return bool(self.falhas.taxa_erro) and self._sortear() < self.falhas.taxa_erro
+
+
+def iniciar(frota, porta=0, endereco="127.0.0.1", falhas=None, **kwargs):
+    """Sobe o simulador em uma thread daemon. Retorna o servidor (`base_url`, `shutdown()`)."""
+    servidor = ServidorSimulador((endereco, porta), frota, falhas, **kwargs)
+    threading.Thread(target=servidor.serve_forever, name="simulador-olhovivo", daemon=True).start()
+    return servidor
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulador offline da API Olho Vivo (v2.1)")
+    parser.add_argument("--porta", type=int, default=8089)
+    parser.add_argument("--endereco", default="0.0.0.0")
+    parser.add_argument("--veiculos", type=int, default=N_VEICULOS, help="Tamanho da frota.")
+    parser.add_argument("--linhas", type=int, default=N_LINHAS, help="Linhas sintéticas (sem --catalogo).")
+    parser.add_argument("--catalogo", help="CSV de linhas (ex: data/todas_as_linhas.csv) para usar ids reais.")
+    parser.add_argument("--token", help="Token aceito em /Login/Autenticar (padrão: qualquer).")
+    parser.add_argument("--latencia-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--taxa-erro", type=float, default=0.0, help="Fração de respostas 500 (0-1).")
+    parser.add_argument("--taxa-lenta", type=float, default=0.0, help="Fração de respostas lentas (0-1).")
+    parser.add_argument("--lentidao-s", type=float, default=5.0, help="Atraso extra das respostas lentas.")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    catalogo = None
+    if args.catalogo:
+        from src.catalogo_linhas import carregar_catalogo
+
+        catalogo = carregar_catalogo(args.catalogo)
+    frota = Frota(args.veiculos, args.linhas, catalogo=catalogo, seed=args.seed)
+    falhas = Falhas(args.latencia_ms, args.jitter_ms, args.taxa_erro, args.taxa_lenta, args.lentidao_s)
+    servidor = ServidorSimulador((args.endereco, args.porta), frota, falhas, token=args.token, seed=args.seed)
+    logging.info(
+        f"Simulador Olho Vivo: {len(frota)} veículos em {len(frota.cl)} linhas/sentidos — "
+        f"SPTRANS_BASE_URL=http://localhost:{args.porta}{PREFIXO_API}"
+    )
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+"""
+Segmentação de viagens a partir do fluxo de posições (Silver → data/parquet/viagens).
+
+Para cada partição diária de `posicoes` (dt=YYYY-MM-DD), ordena as posições por
+(letreiro_linha, id_onibus, instante) e corta o fluxo de cada ônibus em viagens quando ele:
+
+- chega a um terminal da linha (até RAIO_TERMINAL_M): a viagem termina na chegada e a
+  seguinte começa na partida (último ponto no terminal), sem o tempo parado entre elas;
+- inverte o sentido fora dos terminais (o progresso entre os terminais muda de sinal,
+  desconsiderando oscilações menores que RUIDO_SENTIDO_M);
+- fica mais de LACUNA_MAX_MIN minutos sem posição.
+
+`instante` é o horário do GPS (`timestamp_posicao`, UTC, levado ao horário local) e, na
+falta dele, o `timestamp_coleta`; posições repetidas (veículo sem atualização entre
+coletas) entram uma vez só.
+
+Terminais: os dois extremos de cada linha, inferidos das posições do próprio dia
+(`inferir_terminais`), ou um CSV `letreiro_linha,lat_a,lon_a,lat_b,lon_b` (--terminais).
+`sentido` 1 vai de A para B, 2 de B para A (0: linha sem terminais).
+
+Vetorizado: numpy sobre o dia inteiro, sem laço por ônibus. Os dias são independentes e
+rodam em paralelo, um por processo; uma viagem que atravessa a meia-noite sai como duas.
+
+Saída: data/parquet/viagens/dt=YYYY-MM-DD/viagens.parquet (tmp + os.replace; reprocessar
+um dia o sobrescreve) e o manifesto da tabela, como no Silver.
+
+Uso:
+    python -m src.viagens                                    # todas as partições de posicoes
+    python -m src.viagens --inicio 2025-08-01 --fim 2025-08-31 --processos 8
+    python -m src.viagens --terminais data/terminais.csv
+"""
+
+import argparse
+import functools
+import logging
+import os
+import time
+
+import duckdb
+import numpy as np
+import pandas as pd
+
+from src.compactar_parquet import processar_particoes, publicar_particao
+from src.geo import haversine_m
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+PARQUET_DIR = os.path.join("data", "parquet")
+FUSO_HORARIO = "America/Sao_Paulo"
+ARQUIVO_VIAGENS = "viagens.parquet"
+
+RAIO_TERMINAL_M = 300
+LACUNA_MAX_MIN = 20
+RUIDO_SENTIDO_M = 150
+# Ao inferir terminais, ignora o 1% de pontos mais afastados de cada linha (GPS espúrio)
+QUANTIL_TERMINAL = 0.99
+MIN_PONTOS = 2
+MIN_DISTANCIA_M = 200
+
+COLUNAS_TERMINAIS = ["lat_a", "lon_a", "lat_b", "lon_b"]
+
+TIPOS_VIAGENS = {
+    "letreiro_linha": "object",
+    "id_onibus": "int64",
+    "sentido": "int8",
+    "inicio": "datetime64[us]",
+    "fim": "datetime64[us]",
+    "duracao_s": "float64",
+    "distancia_m": "float64",
+    "velocidade_media_kmh": "float64",
+    "n_pontos": "int32",
+    "lat_inicio": "float64",
+    "lon_inicio": "float64",
+    "lat_fim": "float64",
+    "lon_fim": "float64",
+    "inicio_no_terminal": "bool",
+    "fim_no_terminal": "bool",
+    "completa": "bool",
+    "motivo_fim": "object",
+}
+
+
+def preparar_pontos(posicoes):
+    """Posições (schema de `posicoes`) → pontos ordenados por (letreiro_linha, id_onibus, instante), sem repetição."""
+    instante = pd.to_datetime(posicoes["timestamp_coleta"], errors="coerce")
+    if "timestamp_posicao" in posicoes:
+        gps = pd.to_datetime(posicoes["timestamp_posicao"], errors="coerce", utc=True)
+        instante = gps.dt.tz_convert(FUSO_HORARIO).dt.tz_localize(None).fillna(instante)
+    pontos = pd.DataFrame(
+        {
+            "letreiro_linha": posicoes["letreiro_linha"],
+            "id_onibus": posicoes["id_onibus"],
+            "instante": instante.astype("datetime64[us]"),
+            "latitude": posicoes["latitude"].astype("float64"),
+            "longitude": posicoes["longitude"].astype("float64"),
+        }
+    ).dropna()
+    pontos = pontos.drop_duplicates(["letreiro_linha", "id_onibus", "instante"])
+    pontos["letreiro_linha"] = pontos["letreiro_linha"].astype(str).astype("category")
+    pontos["id_onibus"] = pontos["id_onibus"].astype("int64")
+    ordem = np.lexsort(
+        (pontos["instante"].to_numpy(), pontos["id_onibus"].to_numpy(), pontos["letreiro_linha"].cat.codes.to_numpy())
+    )
+    return pontos.iloc[ordem].reset_index(drop=True)
+
+
+def _mais_distante(pontos, distancia):
+    """Por linha, o ponto mais distante (dentro do QUANTIL_TERMINAL) → DataFrame (latitude, longitude) por letreiro."""
+    letreiro = pontos["letreiro_linha"]
+    distancia = pd.Series(distancia, index=pontos.index)
+    limite = distancia.groupby(letreiro, observed=True).transform("quantile", QUANTIL_TERMINAL, interpolation="higher")
+    indices = distancia.where(distancia <= limite).groupby(letreiro, observed=True).idxmax()
+    return pontos.loc[indices.to_numpy(), ["letreiro_linha", "latitude", "longitude"]].set_index("letreiro_linha")
+
+
+def _por_ponto(tabela, letreiro):
+    """Valores de uma tabela indexada por letreiro, alinhados a cada ponto (NaN para letreiro ausente)."""
+    alinhada = tabela.reindex(letreiro.cat.categories)
+    codigos = letreiro.cat.codes.to_numpy()
+    return {coluna: alinhada[coluna].to_numpy("float64")[codigos] for coluna in alinhada.columns}
+
+
+def inferir_terminais(pontos):
+    """Terminais A e B de cada linha: o ponto mais afastado do centro e o mais afastado de A.
+
+    Retorna DataFrame indexado por letreiro_linha com lat_a, lon_a, lat_b, lon_b.
+    """
+    letreiro = pontos["letreiro_linha"]
+    lat, lon = pontos["latitude"], pontos["longitude"]
+    centro_lat = lat.groupby(letreiro, observed=True).transform("mean")
+    centro_lon = lon.groupby(letreiro, observed=True).transform("mean")
+    terminal_a = _mais_distante(pontos, haversine_m(lat, lon, centro_lat, centro_lon))
+
+    a = _por_ponto(terminal_a, letreiro)
+    terminal_b = _mais_distante(pontos, haversine_m(lat, lon, a["latitude"], a["longitude"]))
+    terminais = terminal_a.join(terminal_b, lsuffix="_a", rsuffix="_b")
+    terminais.columns = COLUNAS_TERMINAIS
+    return terminais
+
+
+def carregar_terminais(caminho):
+    """CSV letreiro_linha,lat_a,lon_a,lat_b,lon_b → DataFrame indexado por letreiro_linha."""
+    return pd.read_csv(caminho, dtype={"letreiro_linha": str}).set_index("letreiro_linha")[COLUNAS_TERMINAIS]
+
+
+def segmentar(
+    pontos,
+    terminais=None,
+    raio_terminal_m=RAIO_TERMINAL_M,
+    lacuna_max_min=LACUNA_MAX_MIN,
+    ruido_sentido_m=RUIDO_SENTIDO_M,
+):
+    """Corta os pontos (de `preparar_pontos`) em viagens; retorna um DataFrame no schema de `viagens`."""
+    if pontos.empty:
+        return _tipar(pd.DataFrame(columns=list(TIPOS_VIAGENS)))
+    terminais = inferir_terminais(pontos) if terminais is None else terminais
+
+    n = len(pontos)
+    codigos = pontos["letreiro_linha"].cat.codes.to_numpy()
+    onibus = pontos["id_onibus"].to_numpy()
+    instante = pontos["instante"].to_numpy()
+    segundos = (instante - instante[0]) / np.timedelta64(1, "s")
+    lat, lon = pontos["latitude"].to_numpy(), pontos["longitude"].to_numpy()
+
+    # Sequências contínuas: mesmo ônibus e linha, sem lacuna
+    novo = np.ones(n, dtype=bool)
+    novo[1:] = (codigos[1:] != codigos[:-1]) | (onibus[1:] != onibus[:-1])
+    lacuna = ~novo & (np.diff(segundos, prepend=segundos[0]) > lacuna_max_min * 60)
+    inicio_seq = novo | lacuna
+
+    # Terminais: chegada (1º ponto no raio) fecha a viagem, partida (último) abre a próxima
+    t = _por_ponto(terminais, pontos["letreiro_linha"])
+    dist_a = haversine_m(lat, lon, t["lat_a"], t["lon_a"])
+    dist_b = haversine_m(lat, lon, t["lat_b"], t["lon_b"])
+    no_terminal = (dist_a <= raio_terminal_m) | (dist_b <= raio_terminal_m)
+    anterior_no_terminal = np.r_[False, no_terminal[:-1]] & ~inicio_seq
+    proximo_no_terminal = np.r_[no_terminal[1:] & ~inicio_seq[1:], False]
+    chegada = no_terminal & ~anterior_no_terminal
+    partida = no_terminal & ~proximo_no_terminal
+    parado = no_terminal & anterior_no_terminal & proximo_no_terminal
+
+    # Sentido: sinal do avanço entre os terminais, propagado sobre passos menores que o ruído;
+    # recomeça em cada sequência e em cada terminal (lá o corte já é pela chegada/partida)
+    progresso = dist_a - dist_b
+    reinicio = inicio_seq | no_terminal
+    passo = np.diff(progresso, prepend=np.nan)
+    passo[reinicio] = np.nan
+    sinal = np.where(np.abs(passo) >= ruido_sentido_m, np.sign(passo), np.nan)
+    sinal = pd.Series(sinal).groupby(np.cumsum(reinicio)).ffill().to_numpy()
+    sinal_anterior = np.r_[np.nan, sinal[:-1]]
+    sinal_anterior[reinicio] = np.nan
+    inverte = (sinal != sinal_anterior) & ~np.isnan(sinal) & ~np.isnan(sinal_anterior)
+    # Ponto de retorno: o anterior à inversão (fecha uma viagem e abre a seguinte)
+    retorno = np.r_[inverte[1:], False] & ~no_terminal & ~np.r_[no_terminal[1:], False]
+
+    # Pontos de fronteira entram nas duas viagens (duplicados); os parados no terminal, em nenhuma
+    compartilhado = (chegada & partida) | retorno
+    corta = inicio_seq | (partida & ~chegada)
+    mantidos = np.flatnonzero(~parado)
+    idx = np.repeat(mantidos, 1 + compartilhado[mantidos])
+    segunda_copia = np.r_[False, idx[1:] == idx[:-1]]
+    corte = corta[idx] | segunda_copia
+
+    inicios = np.flatnonzero(corte)
+    fins = np.r_[inicios[1:], len(idx)] - 1
+    passo_m = np.r_[0.0, haversine_m(lat[idx[:-1]], lon[idx[:-1]], lat[idx[1:]], lon[idx[1:]])]
+    passo_m[corte] = 0.0
+    p0, p1 = idx[inicios], idx[fins]
+    seguinte = np.minimum(p1 + 1, n - 1)
+    avanco = progresso[p1] - progresso[p0]
+    duracao_s = segundos[p1] - segundos[p0]
+    distancia_m = np.add.reduceat(passo_m, inicios)
+
+    viagens = pd.DataFrame(
+        {
+            "letreiro_linha": pontos["letreiro_linha"].to_numpy()[p0],
+            "id_onibus": onibus[p0],
+            "sentido": np.where(np.isnan(avanco), 0, np.where(avanco >= 0, 1, 2)),
+            "inicio": instante[p0],
+            "fim": instante[p1],
+            "duracao_s": duracao_s,
+            "distancia_m": distancia_m,
+            "velocidade_media_kmh": np.divide(
+                distancia_m * 3.6, duracao_s, out=np.full(len(p0), np.nan), where=duracao_s > 0
+            ),
+            "n_pontos": fins - inicios + 1,
+            "lat_inicio": lat[p0],
+            "lon_inicio": lon[p0],
+            "lat_fim": lat[p1],
+            "lon_fim": lon[p1],
+            "inicio_no_terminal": no_terminal[p0],
+            "fim_no_terminal": no_terminal[p1],
+            "completa": no_terminal[p0] & no_terminal[p1],
+            "motivo_fim": np.select(
+                [no_terminal[p1], retorno[p1], (p1 + 1 < n) & lacuna[seguinte]],
+                ["terminal", "sentido", "lacuna"],
+                "fim_dos_dados",
+            ),
+        }
+    )
+    viagens = viagens[(viagens["n_pontos"] >= MIN_PONTOS) & (viagens["distancia_m"] >= MIN_DISTANCIA_M)]
+    return _tipar(viagens.reset_index(drop=True))
+
+
+def _tipar(viagens):
+    """Fixa os tipos para que todas as partições tenham o mesmo schema Parquet."""
+    return viagens.astype(TIPOS_VIAGENS)
+
+
+def ler_posicoes_do_dia(dia, parquet_dir=None):
+    """Posições da partição Silver dt=`dia` (só as colunas usadas na segmentação)."""
+    origem = os.path.join(parquet_dir or PARQUET_DIR, "posicoes", f"dt={dia}")
+    con = duckdb.connect()
+    try:
+        return con.execute(
+            "SELECT timestamp_coleta, id_onibus, letreiro_linha, latitude, longitude, timestamp_posicao "
+            f"FROM read_parquet('{origem}/*.parquet')"
+        ).fetchdf()
+    finally:
+        con.close()
+
+
+def processar_dia(dia, terminais=None, parquet_dir=None):
+    """Segmenta e publica as viagens de um dia; retorna o número de viagens."""
+    parquet_dir = parquet_dir or PARQUET_DIR
+    inicio = time.perf_counter()
+    pontos = preparar_pontos(ler_posicoes_do_dia(dia, parquet_dir))
+    viagens = segmentar(pontos, terminais)
+    publicar_particao(viagens, os.path.join(parquet_dir, "viagens"), dia, ARQUIVO_VIAGENS)
+    logging.info(
+        f"viagens dt={dia}: {len(pontos)} pontos → {len(viagens)} viagens "
+        f"({int(viagens['completa'].sum())} completas) em {time.perf_counter() - inicio:.1f}s."
+    )
+    return len(viagens)
+
+
+def processar_dias(dias, terminais=None, processos=None, parquet_dir=None):
+    """Processa os dias com `processar_particoes` (um por tarefa; `processos=1` sem pool); retorna {dia: viagens}."""
+    parquet_dir = parquet_dir or PARQUET_DIR
+    fn = functools.partial(processar_dia, terminais=terminais, parquet_dir=parquet_dir)
+    return processar_particoes(fn, dias, os.path.join(parquet_dir, "viagens"), processos)
+
+
+def particoes_posicoes(parquet_dir=None, inicio=None, fim=None):
+    """Dias ('YYYY-MM-DD') com partição Silver de posições, opcionalmente em [inicio, fim]."""
+    origem = os.path.join(parquet_dir or PARQUET_DIR, "posicoes")
+    if not os.path.isdir(origem):
+        return []
+    dias = sorted(d.removeprefix("dt=") for d in os.listdir(origem) if d.startswith("dt="))
+    return [d for d in dias if (inicio is None or d >= inicio) and (fim is None or d <= fim)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Segmenta as posições (Silver) em viagens por dia")
+    parser.add_argument("--inicio", help="Primeiro dia (YYYY-MM-DD).")
+    parser.add_argument("--fim", help="Último dia, inclusive (YYYY-MM-DD).")
+    parser.add_argument("--processos", type=int, default=os.cpu_count(), help="Processos paralelos (1 = sem pool).")
+    parser.add_argument("--terminais", help="CSV letreiro_linha,lat_a,lon_a,lat_b,lon_b (padrão: inferidos).")
+    args = parser.parse_args()
+
+    dias = particoes_posicoes(inicio=args.inicio, fim=args.fim)
+    if not dias:
+        logging.warning(f"Nenhuma partição de posições em {os.path.join(PARQUET_DIR, 'posicoes')} no período.")
+        return
+    terminais = carregar_terminais(args.terminais) if args.terminais else None
+
+    inicio = time.perf_counter()
+    logging.info(f"Segmentando viagens de {len(dias)} dia(s) com {args.processos} processo(s)...")
+    resultado = processar_dias(dias, terminais, args.processos)
+    logging.info(
+        f"Segmentação concluída: {sum(resultado.values())} viagens em {len(dias)} dia(s), "
+        f"{time.perf_counter() - inicio:.1f}s."
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,21 @@ import pandas as pd
 import pytest
 
 
+@pytest.fixture(autouse=True)
+def arquivo_bruto_temporario(tmp_path, monkeypatch):
+    """Coletores arquivam cada resposta: nos testes, o arquivo bruto fica no tmp_path, não em ./data/bruto."""
+    monkeypatch.setenv("SPTRANS_ARQUIVO_DIR", str(tmp_path / "bruto"))
+
+
+@pytest.fixture(autouse=True)
+def fila_linhagem_vazia():
+    """Eventos de linhagem enfileirados num teste não sobram para a descarga do atexit (no banco padrão)."""
+    from src.linhagem import registrador
+
+    yield
+    registrador.limpar()
+
+
 @pytest.fixture
 def sample_posicoes_df():
     """DataFrame de exemplo com dados de posição."""
@@ -1,6 +1,9 @@
 """Testes para analise_onibus.py — merge e processamento de dados."""
 
 import pandas as pd
+import pytest
+
+import src.catalogo_linhas
 
 
 def test_merge_posicoes_previsoes(sample_posicoes_df, sample_previsoes_df):
@@ -61,3 +64,336 @@ def test_rename_colunas(sample_posicoes_df, sample_previsoes_df):
     ]
     for col in colunas_esperadas:
         assert col in df_final.columns, f"Coluna {col} deveria existir"
+
+
+def _catalogo_8000():
+    from src.catalogo_linhas import CatalogoLinhas, _normalizar
+
+    return CatalogoLinhas(
+        _normalizar(
+            pd.DataFrame(
+                {
+                    "id_linha": [1273, 2160],
+                    "letreiro_numerico": ["8000", "9000"],
+                    "tipo_letreiro": [10, 10],
+                    "sentido_ida": ["A", "C"],
+                    "sentido_volta": ["B", "D"],
+                }
+            )
+        )
+    )
+
+
+def test_juntar_asof_usa_previsao_mais_recente_ate_a_posicao():
+    """Cada posição recebe a previsão mais recente do mesmo ônibus/linha, nunca uma futura."""
+    from src.analise_onibus import juntar_asof
+
+    posicoes = pd.DataFrame(
+        {
+            "timestamp_coleta": ["2025-08-15 10:00:00", "2025-08-15 10:20:00", "2025-08-15 12:00:00"],
+            "id_onibus": [1001, 1001, 1001],
+            "letreiro_linha": ["8000-10", "8000-10", "8000-10"],
+            "latitude": [-23.55, -23.56, -23.57],
+            "longitude": [-46.63, -46.64, -46.65],
+        }
+    )
+    previsoes = pd.DataFrame(
+        {
+            "timestamp_coleta": [
+                "2025-08-15 09:55:00",
+                "2025-08-15 09:55:00",
+                "2025-08-15 10:15:00",
+                "2025-08-15 10:25:00",
+                "2025-08-15 10:15:00",
+            ],
+            "id_linha": [1273, 1273, 1273, 1273, 2160],
+            "id_onibus": [1001, 1001, 1001, 1001, 1001],
+            "id_parada": [1, 2, 3, 4, 9],
+            "horario_previsao": ["10:05", "10:02", "10:30", "10:40", "10:16"],
+        }
+    )
+
+    df = juntar_asof(posicoes, previsoes, _catalogo_8000()).sort_values("timestamp_coleta")
+
+    assert len(df) == 3
+    # 10:00 → coleta 09:55, próxima parada = menor horário previsto (parada 2)
+    assert df.iloc[0]["id_parada"] == 2
+    # 10:20 → coleta 10:15 da linha 8000-10 (a previsão da 9000-10 é ignorada)
+    assert df.iloc[1]["id_parada"] == 3
+    # 12:00 → última previsão tem mais de 30 min: sem pareamento
+    assert pd.isna(df.iloc[2]["id_parada"])
+
+
+def test_juntar_asof_sem_catalogo_e_sem_previsoes(sample_posicoes_df, sample_previsoes_df):
+    """Sem catálogo pareia só por id_onibus; sem previsões mantém todas as posições."""
+    from src.analise_onibus import juntar_asof
+
+    df = juntar_asof(sample_posicoes_df, sample_previsoes_df)
+    assert len(df) == len(sample_posicoes_df)
+    assert set(df["id_parada"]) == {5001, 5002}
+
+    df_vazio = juntar_asof(sample_posicoes_df, pd.DataFrame())
+    assert len(df_vazio) == len(sample_posicoes_df)
+    assert df_vazio["id_parada"].isna().all()
+
+
+def _popular_banco(db_path, inicio, n_coletas, onibus=(1001, 1002)):
+    import sqlite3
+    from datetime import timedelta
+
+    from src.database import schema_sql
+
+    conn = sqlite3.connect(db_path)
+    tables, indexes = _schema_sqlite(schema_sql)
+    for sql in tables + indexes:
+        conn.execute(sql)
+    for k in range(n_coletas):
+        ts = inicio + timedelta(minutes=5 * k)
+        conn.executemany(
+            "INSERT INTO posicoes (timestamp_coleta, id_onibus, letreiro_linha, latitude, longitude) "
+            "VALUES (?, ?, '8000-10', -23.55, -46.63)",
+            [(ts, b) for b in onibus],
+        )
+    conn.commit()
+    conn.close()
+
+
+def _schema_sqlite(schema_sql):
+    import os
+
+    original = os.environ.pop("DATABASE_URL", None)
+    try:
+        return schema_sql()
+    finally:
+        if original is not None:
+            os.environ["DATABASE_URL"] = original
+
+
+def test_analise_incremental_por_watermark(tmp_path, monkeypatch):
+    """Segunda execução só processa posições novas e acrescenta (sem DELETE-all)."""
+    import sqlite3
+    import sys
+    from datetime import datetime
+
+    import src.analise_onibus as ao
+
+    db_path = str(tmp_path / "test.db")
+    monkeypatch.setattr(ao, "DB_PATH", db_path)
+    monkeypatch.setattr(ao, "PARQUET_DIR", str(tmp_path / "parquet"))
+    monkeypatch.setattr(src.catalogo_linhas, "CATALOGO_LINHAS_PATH", str(tmp_path / "sem_catalogo.csv"))
+    monkeypatch.setattr(sys, "argv", ["analise_onibus.py", "--mode", "sqlite"])
+
+    _popular_banco(db_path, datetime(2025, 8, 15, 10, 0), 3)
+    ao.main()
+    _popular_banco(db_path, datetime(2025, 8, 15, 10, 15), 1)
+    ao.main()
+    ao.main()  # nada novo
+
+    conn = sqlite3.connect(db_path)
+    total = conn.execute("SELECT count(*) FROM resultados_analise").fetchone()[0]
+    watermark = conn.execute("SELECT ultimo_timestamp_coleta FROM analise_watermark").fetchone()[0]
+    conn.close()
+    assert total == 8
+    assert watermark == "2025-08-15 10:15:00"
+
+    particao = tmp_path / "parquet" / "resultados_analise" / "dt=2025-08-15"
+    arquivos = sorted(p.name for p in particao.iterdir())
+    assert arquivos == ["part-20250815101000.parquet", "part-inicial.parquet"]
+    assert sum(len(pd.read_parquet(particao / a)) for a in arquivos) == 8
+
+
+def test_reprocessar_so_troca_os_resultados_ao_terminar(tmp_path, monkeypatch):
+    """--reprocessar monta SQLite e Parquet ao lado; uma falha no meio mantém os publicados e é retomada depois."""
+    import sqlite3
+    import sys
+    from datetime import datetime
+
+    import src.analise_onibus as ao
+
+    db_path = str(tmp_path / "test.db")
+    monkeypatch.setattr(ao, "DB_PATH", db_path)
+    monkeypatch.setattr(ao, "PARQUET_DIR", str(tmp_path / "parquet"))
+    monkeypatch.setattr(src.catalogo_linhas, "CATALOGO_LINHAS_PATH", str(tmp_path / "sem_catalogo.csv"))
+    monkeypatch.setattr(ao, "BYTES_POR_POSICAO", 1024 * 1024 // 3)  # uma coleta por lote
+    monkeypatch.setattr(sys, "argv", ["analise_onibus.py", "--mode", "sqlite", "--memoria-mb", "1"])
+    _popular_banco(db_path, datetime(2025, 8, 15, 10, 0), 3)
+    ao.main()
+    particao = tmp_path / "parquet" / "resultados_analise" / "dt=2025-08-15"
+    publicados = sorted(p.name for p in particao.iterdir())
+
+    publicar = ao._publicar_lote
+    chamadas = []
+
+    def falha_no_segundo_lote(*args, **kwargs):
+        chamadas.append(1)
+        if len(chamadas) == 2:
+            raise RuntimeError("falha no meio da reconstrução")
+        return publicar(*args, **kwargs)
+
+    monkeypatch.setattr(ao, "_publicar_lote", falha_no_segundo_lote)
+    monkeypatch.setattr(sys, "argv", [*sys.argv, "--reprocessar"])
+    with pytest.raises(RuntimeError):
+        ao.main()
+
+    def contar(tabela):
+        conn = sqlite3.connect(db_path)
+        try:
+            return conn.execute(f"SELECT count(*) FROM {tabela}").fetchone()[0]
+        finally:
+            conn.close()
+
+    # Leitores continuam vendo o resultado anterior, inteiro, nos dois destinos
+    assert contar("resultados_analise") == 6
+    assert contar(ao.TABELA_RECONSTRUCAO) == 2
+    assert sorted(p.name for p in particao.iterdir()) == publicados
+    assert sum(len(pd.read_parquet(particao / a)) for a in publicados) == 6
+    versoes = ao._versoes_parquet()
+    assert len(versoes) == 2 and ao._versao_publicada() == versoes[0]
+
+    # A execução seguinte retoma a reconstrução da marca d'água e só então troca
+    monkeypatch.setattr(ao, "_publicar_lote", publicar)
+    monkeypatch.setattr(sys, "argv", sys.argv[:-1])
+    ao.main()
+    assert ao._versoes_parquet() == [versoes[1]] and ao._versao_publicada() == versoes[1]
+    assert sum(len(pd.read_parquet(particao / a)) for a in particao.iterdir()) == 6
+    assert contar("resultados_analise") == 6
+    with pytest.raises(sqlite3.OperationalError, match="no such table"):
+        contar(ao.TABELA_RECONSTRUCAO)
+
+
+def _preparar_analise(tmp_path, monkeypatch, n_coletas=3):
+    """Banco com `n_coletas` coletas de 2 ônibus, uma coleta por lote, e a primeira análise já publicada."""
+    import sys
+    from datetime import datetime
+
+    import src.analise_onibus as ao
+
+    db_path = str(tmp_path / "test.db")
+    monkeypatch.setattr(ao, "DB_PATH", db_path)
+    monkeypatch.setattr(ao, "PARQUET_DIR", str(tmp_path / "parquet"))
+    monkeypatch.setattr(src.catalogo_linhas, "CATALOGO_LINHAS_PATH", str(tmp_path / "sem_catalogo.csv"))
+    monkeypatch.setattr(ao, "BYTES_POR_POSICAO", 1024 * 1024 // 3)
+    monkeypatch.setattr(sys, "argv", ["analise_onibus.py", "--mode", "sqlite", "--memoria-mb", "1"])
+    _popular_banco(db_path, datetime(2025, 8, 15, 10, 0), n_coletas)
+    return ao
+
+
+def _linhas_publicadas(tmp_path):
+    """O que um leitor do Parquet (como o dashboard) vê ao abrir resultados_analise/ agora."""
+    import duckdb
+
+    padrao = str(tmp_path / "parquet" / "resultados_analise" / "**" / "*.parquet")
+    con = duckdb.connect()
+    try:
+        return con.execute(f"SELECT count(*) FROM read_parquet('{padrao}')").fetchone()[0]
+    finally:
+        con.close()
+
+
+def test_troca_do_parquet_nunca_deixa_o_leitor_sem_resultados(tmp_path, monkeypatch):
+    """A cada passo de --reprocessar que mexe em arquivos, resultados_analise/ abre com o resultado inteiro."""
+    import os
+    import shutil
+    import sys
+
+    ao = _preparar_analise(tmp_path, monkeypatch)
+    ao.main()
+    assert os.path.islink(tmp_path / "parquet" / "resultados_analise")
+    vistos = []
+
+    def observado(funcao):
+        def chamar(*args, **kwargs):
+            vistos.append(_linhas_publicadas(tmp_path))
+            resultado = funcao(*args, **kwargs)
+            vistos.append(_linhas_publicadas(tmp_path))
+            return resultado
+
+        return chamar
+
+    for modulo, nome in ((os, "replace"), (os, "remove"), (os, "symlink"), (shutil, "rmtree")):
+        monkeypatch.setattr(modulo, nome, observado(getattr(modulo, nome)))
+    monkeypatch.setattr(sys, "argv", [*sys.argv, "--reprocessar"])
+    ao.main()
+
+    assert vistos and set(vistos) == {6}
+    assert len(ao._versoes_parquet()) == 1
+
+
+def test_troca_do_parquet_interrompida_e_completada_na_execucao_seguinte(tmp_path, monkeypatch):
+    """Queda depois do commit da troca no SQLite: a próxima execução aponta o link para a versão nova."""
+    import sys
+
+    ao = _preparar_analise(tmp_path, monkeypatch)
+    ao.main()
+    publicar = ao._publicar_versao_parquet
+    chamadas = []
+
+    def cai_ao_concluir():
+        chamadas.append(1)
+        if len(chamadas) == 2:  # a primeira é a verificação no início da execução
+            raise RuntimeError("queda antes da troca do Parquet")
+        publicar()
+
+    monkeypatch.setattr(ao, "_publicar_versao_parquet", cai_ao_concluir)
+    monkeypatch.setattr(sys, "argv", [*sys.argv, "--reprocessar"])
+    with pytest.raises(RuntimeError):
+        ao.main()
+    antiga, nova = ao._versoes_parquet()
+    assert ao._versao_publicada() == antiga
+
+    monkeypatch.setattr(ao, "_publicar_versao_parquet", publicar)
+    monkeypatch.setattr(sys, "argv", sys.argv[:-1])
+    ao.main()
+    assert ao._versoes_parquet() == [nova] and ao._versao_publicada() == nova
+    assert _linhas_publicadas(tmp_path) == 6
+
+
+def test_resultados_em_diretorio_comum_viram_versao(tmp_path, monkeypatch):
+    """Layout anterior às versões: resultados_analise/ comum é substituído pelo link na primeira reconstrução."""
+    import os
+
+    ao = _preparar_analise(tmp_path, monkeypatch)
+    legado = tmp_path / "parquet" / "resultados_analise" / "dt=2025-08-14"
+    legado.mkdir(parents=True)
+    pd.DataFrame({"id_onibus": [1]}).to_parquet(legado / "part-antigo.parquet")
+
+    ao.main()
+
+    assert os.path.islink(tmp_path / "parquet" / "resultados_analise")
+    assert ao._versoes_parquet() == [ao._versao_publicada()]
+    assert _linhas_publicadas(tmp_path) == 6
+
+
+def test_analise_sqlite_em_lotes(tmp_path, monkeypatch):
+    """Orçamento pequeno divide a análise em lotes sem partir coletas e sem perder posições."""
+    import sqlite3
+    import sys
+    from datetime import datetime
+
+    import src.analise_onibus as ao
+
+    db_path = str(tmp_path / "test.db")
+    monkeypatch.setattr(ao, "DB_PATH", db_path)
+    monkeypatch.setattr(ao, "PARQUET_DIR", str(tmp_path / "parquet"))
+    monkeypatch.setattr(src.catalogo_linhas, "CATALOGO_LINHAS_PATH", str(tmp_path / "sem_catalogo.csv"))
+    # 1 MB de orçamento = 3 posições por lote
+    monkeypatch.setattr(ao, "BYTES_POR_POSICAO", 1024 * 1024 // 3)
+    monkeypatch.setattr(sys, "argv", ["analise_onibus.py", "--mode", "sqlite", "--memoria-mb", "1"])
+
+    _popular_banco(db_path, datetime(2025, 8, 15, 10, 0), 5)
+
+    conn = sqlite3.connect(db_path)
+    lotes = ao._planejar_lotes_sqlite(conn, None, 3)
+    conn.close()
+    # 5 coletas × 2 ônibus: cada lote leva uma coleta inteira (2 posições)
+    assert [n for _, _, n in lotes] == [2, 2, 2, 2, 2]
+    assert lotes[1][0] == lotes[0][1]
+
+    ao.main()
+
+    conn = sqlite3.connect(db_path)
+    total = conn.execute("SELECT count(*) FROM resultados_analise").fetchone()[0]
+    watermark = conn.execute("SELECT ultimo_timestamp_coleta FROM analise_watermark").fetchone()[0]
+    conn.close()
+    assert total == 10
+    assert watermark == "2025-08-15 10:20:00"
@@ -0,0 +1,65 @@
+"""Testes do arquivo de respostas brutas (zstd por hora)."""
+
+import json
+from datetime import datetime
+
+import pytest
+
+from src import arquivo_bruto
+
+
+@pytest.fixture
+def diretorio(tmp_path, monkeypatch):
+    monkeypatch.setenv("SPTRANS_ARQUIVO_DIR", str(tmp_path))
+    return tmp_path
+
+
+def test_arquivar_e_ler(diretorio):
+    """Respostas da mesma hora vão para o mesmo arquivo, como frames independentes e na ordem."""
+    corpos = [json.dumps({"hr": f"10:{m:02d}", "l": []}).encode() for m in (0, 30)]
+    caminhos = {
+        arquivo_bruto.arquivar("/Posicao", corpo, datetime(2025, 8, 15, 10, m)) for corpo, m in zip(corpos, (0, 30))
+    }
+    assert caminhos == {str(diretorio / "posicao" / "dt=2025-08-15" / "posicao-20250815T10.zst")}
+
+    snapshots = list(arquivo_bruto.ler_snapshots(caminhos.pop()))
+    assert [s.corpo for s in snapshots] == corpos
+    assert [s.ts for s in snapshots] == [datetime(2025, 8, 15, 10, 0), datetime(2025, 8, 15, 10, 30)]
+    assert snapshots[1].json()["hr"] == "10:30"
+
+
+def test_params_e_listagem_por_periodo(diretorio):
+    for hora in (9, 10, 11):
+        arquivo_bruto.arquivar("/Previsao/Linha", b'{"ps": []}', datetime(2025, 8, 15, hora, 5), {"codigoLinha": 2411})
+
+    arquivos = arquivo_bruto.listar_arquivos(
+        "/Previsao/Linha", inicio=datetime(2025, 8, 15, 10, 30), fim=datetime(2025, 8, 15, 11, 0)
+    )
+    assert [arquivo_bruto.hora_do_arquivo(a).hour for a in arquivos] == [10, 11]
+    (snapshot,) = arquivo_bruto.ler_snapshots(arquivos[0])
+    assert snapshot.params == {"codigoLinha": 2411}
+    assert arquivo_bruto.listar_arquivos("/Posicao") == []
+
+
+def test_frame_truncado_so_perde_a_si_mesmo(diretorio):
+    """Queda no meio de uma escrita: os frames anteriores continuam legíveis."""
+    ts = datetime(2025, 8, 15, 10, 0)
+    caminho = arquivo_bruto.arquivar("/Posicao", b'{"l": [1]}', ts)
+    arquivo_bruto.arquivar("/Posicao", b'{"l": [2]}' * 100, ts)
+    with open(caminho, "r+b") as f:
+        f.truncate(f.seek(0, 2) - 5)
+
+    assert [s.json()["l"] for s in arquivo_bruto.ler_snapshots(caminho)] == [[1]]
+
+
+def test_desligado_por_variavel_vazia(monkeypatch):
+    monkeypatch.setenv("SPTRANS_ARQUIVO_DIR", "")
+    assert arquivo_bruto.arquivar("/Posicao", b"{}", datetime(2025, 8, 15, 10)) is None
+
+
+def test_falha_de_disco_nao_derruba_a_coleta(diretorio, monkeypatch):
+    def falhar(*args, **kwargs):
+        raise OSError("disco cheio")
+
+    monkeypatch.setattr(arquivo_bruto, "arquivar", falhar)
+    assert arquivo_bruto.arquivar_sem_falhar("/Posicao", b"{}", datetime(2025, 8, 15, 10)) is None
@@ -117,3 +117,88 @@ def test_asset_groups():
         "AssetKey(['expurgar_posicoes'])",
         "AssetKey(['expurgar_previsoes'])",
     }
+
+
+def test_assets_processamento_particionados():
+    """Compactação, expurgo e checks compartilham a partição diária."""
+    from assets import defs
+    from assets.processamento import particoes_diarias
+
+    g = defs.resolve_asset_graph()
+    for nome in ("compactar_posicoes", "compactar_previsoes", "expurgar_posicoes", "expurgar_previsoes"):
+        assert g.get(AssetKey([nome])).partitions_def == particoes_diarias
+    for checks in defs.asset_checks:
+        for spec in checks.check_specs:
+            assert spec.partitions_def == particoes_diarias
+
+
+def test_schedules_miram_particao_correta():
+    """Compactação mira D-1; expurgo mira o dia que saiu da janela quente."""
+    from datetime import datetime
+
+    from dagster import build_schedule_context
+
+    from assets import compactacao_schedule, expurgo_schedule
+    from assets.processamento import JANELA_DIAS
+
+    ctx = build_schedule_context(scheduled_execution_time=datetime(2025, 9, 20, 2, 0))
+    assert compactacao_schedule(ctx).partition_key == "2025-09-19"
+    assert expurgo_schedule(ctx).partition_key == f"2025-09-{20 - JANELA_DIAS - 1:02d}"
+
+
+def test_materializar_particao_compacta_e_expurga(tmp_path, monkeypatch):
+    """Materializa um dia antigo: exporta só aquele dt, o check passa e o expurgo remove só aquele dia."""
+    import sqlite3
+
+    import pytest
+
+    pytest.importorskip("duckdb")
+    from dagster import materialize
+
+    import src.compactar_parquet
+    import src.database
+    import src.expurgar_sqlite
+    from assets.checks import check_posicoes_bronze_silver
+    from assets.processamento import compactar_posicoes, expurgar_posicoes
+
+    db_path = str(tmp_path / "sptrans.db")
+    monkeypatch.setattr(src.database, "DB_PATH", db_path)
+    monkeypatch.setattr(src.expurgar_sqlite, "DB_PATH", db_path)
+    monkeypatch.setattr(src.compactar_parquet, "DB_PATH", db_path)
+    monkeypatch.setattr(src.compactar_parquet, "PARQUET_DIR", str(tmp_path / "parquet"))
+    monkeypatch.delenv("DATABASE_URL", raising=False)
+
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        "CREATE TABLE posicoes (id INTEGER PRIMARY KEY, timestamp_coleta DATETIME, id_onibus INTEGER, "
+        "letreiro_linha TEXT, latitude REAL, longitude REAL, timestamp_posicao DATETIME)"
+    )
+    conn.executemany(
+        "INSERT INTO posicoes (timestamp_coleta, id_onibus, letreiro_linha, latitude, longitude) VALUES (?,?,?,?,?)",
+        [
+            ("2025-08-13 10:00:00", 1, "8000-10", -23.5, -46.6),
+            ("2025-08-13 23:59:00", 2, "8000-10", -23.5, -46.6),
+            ("2025-08-14 00:00:00", 3, "8000-10", -23.5, -46.6),
+        ],
+    )
+    conn.commit()
+    conn.close()
+
+    result = materialize(
+        [compactar_posicoes, check_posicoes_bronze_silver, expurgar_posicoes],
+        partition_key="2025-08-13",
+        selection=["compactar_posicoes", "expurgar_posicoes"],
+    )
+    assert result.success
+    assert result.output_for_node("compactar_posicoes") == 2
+    assert result.output_for_node("expurgar_posicoes") == 2
+    assert [e.passed for e in result.get_asset_check_evaluations()] == [True]
+    materializacoes = {
+        m.asset_key.path[-1]: m.metadata for m in result.asset_materializations_for_node("compactar_posicoes")
+    }
+    assert "compactacao.exportar_tabela" in materializacoes["compactar_posicoes"]["stage_timings"].data
+
+    conn = sqlite3.connect(db_path)
+    restantes = conn.execute("SELECT timestamp_coleta FROM posicoes").fetchall()
+    conn.close()
+    assert restantes == [("2025-08-14 00:00:00",)]
@@ -0,0 +1,112 @@
+"""Testes do harness de benchmarks: gerador reproduzível, comparação com baseline e execução."""
+
+import argparse
+import dataclasses
+import json
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from benchmarks import executar as bench
+from benchmarks.gerador import CENARIOS, criar_banco, gerar_posicoes, gerar_previsoes, instantes
+
+CASOS_RAPIDOS = [
+    "coleta.parse_filtro",
+    "insercao.sqlite.executemany",
+    "insercao.sqlite.multiplo",
+    "insercao.sqlite.compacto",
+    "expurgo.expurgar",
+]
+
+
+def test_gerador_reproduzivel():
+    """Mesma semente → mesmos dados; semente diferente → dados diferentes."""
+    cenario = CENARIOS["minimo"]
+    pd.testing.assert_frame_equal(gerar_posicoes(cenario), gerar_posicoes(cenario))
+    pd.testing.assert_frame_equal(gerar_previsoes(cenario), gerar_previsoes(cenario))
+
+    outra = gerar_posicoes(dataclasses.replace(cenario, seed=7))
+    assert not outra["latitude"].equals(gerar_posicoes(cenario)["latitude"])
+
+
+def test_gerador_dimensoes(temp_db_path):
+    """N dias × M ônibus × ciclos por dia, sem duplicatas na chave de dedup do Bronze."""
+    cenario = dataclasses.replace(CENARIOS["minimo"], dias=2)
+    posicoes = gerar_posicoes(cenario)
+    ciclos = len(instantes(cenario, cenario.intervalo_posicoes_min))
+
+    assert ciclos == 2 * 37  # 05:00 a 23:00 a cada 30 min
+    assert len(posicoes) == ciclos * cenario.onibus
+    assert not posicoes.duplicated(["timestamp_coleta", "id_onibus"]).any()
+
+    criar_banco(temp_db_path, posicoes)
+    with sqlite3.connect(temp_db_path) as conn:
+        assert conn.execute("SELECT count(*) FROM posicoes").fetchone()[0] == len(posicoes)
+
+
+def _resultado(**medianas):
+    return {"casos": {nome: {"status": "ok", "mediana_s": s} for nome, s in medianas.items()}}
+
+
+def test_comparar_detecta_regressao():
+    base = _resultado(lento=1.0, estavel=1.0, curto=0.001)
+    atual = _resultado(lento=1.5, estavel=1.1, curto=0.003, novo=2.0)
+
+    comparacao = bench.comparar(atual, base, limite=0.25)
+
+    assert comparacao["lento"]["regressao"]
+    assert not comparacao["estavel"]["regressao"]
+    # 3× mais lento, mas abaixo do piso de ruído
+    assert not comparacao["curto"]["regressao"]
+    assert "novo" not in comparacao
+
+
+def test_comparar_ignora_pulados():
+    base = _resultado(caso=1.0)
+    atual = {"casos": {"caso": {"status": "pulado", "motivo": "sem --postgres"}}}
+    assert bench.comparar(atual, base) == {}
+
+
+def test_executar_casos(tmp_path):
+    resultado = bench.executar(
+        CENARIOS["minimo"], CASOS_RAPIDOS + ["insercao.postgres.executemany"], repeticoes=2, diretorio=str(tmp_path)
+    )
+    casos = resultado["casos"]
+
+    for nome in CASOS_RAPIDOS:
+        assert casos[nome]["status"] == "ok", casos[nome]
+        assert len(casos[nome]["tempos_s"]) == 2
+        assert casos[nome]["linhas"] > 0
+    assert casos["insercao.postgres.executemany"]["status"] == "pulado"
+    assert resultado["cenario"]["nome"] == "minimo"
+
+
+def test_main_baseline_e_regressao(tmp_path, monkeypatch):
+    """Sem baseline o gate só falha com --exigir-baseline; uma baseline irrealmente rápida faz o processo falhar."""
+    monkeypatch.setattr(bench, "BASELINE_DIR", str(tmp_path / "baseline"))
+    monkeypatch.setattr(bench, "RESULTADOS_DIR", str(tmp_path / "resultados"))
+    monkeypatch.setattr(bench, "PISO_SEGUNDOS", 0.0)
+    args = ["--cenario", "minimo", "--casos", "coleta", "--repeticoes", "1"]
+
+    # Sem baseline: só avisa, salvo com --exigir-baseline (o gate do make bench)
+    assert bench.main(args) == 0
+    assert bench.main([*args, "--exigir-baseline"]) == 1
+
+    assert bench.main([*args, "--gravar-baseline"]) == 0
+    caminho = tmp_path / "baseline" / "minimo.json"
+    baseline = json.loads(caminho.read_text())
+    assert baseline["casos"]["coleta.parse_filtro"]["status"] == "ok"
+
+    baseline["casos"]["coleta.parse_filtro"]["mediana_s"] = 1e-6
+    caminho.write_text(json.dumps(baseline))
+    assert bench.main([*args, "--limite", "0.1"]) == 1
+
+
+@pytest.mark.parametrize("argumentos", [["--dias", "2"], ["--onibus", "10", "--seed", "3"]])
+def test_cenario_derivado_tem_nome_proprio(argumentos):
+    args = argparse.Namespace(cenario="minimo", dias=None, onibus=None, linhas=None, seed=None)
+    for chave, valor in zip(argumentos[::2], argumentos[1::2]):
+        setattr(args, chave.lstrip("-"), int(valor))
+    cenario = bench._cenario_dos_argumentos(args)
+    assert cenario.nome.startswith("minimo-") and cenario.nome != "minimo"
@@ -0,0 +1,106 @@
+"""Testes do catálogo de linhas indexado (src/catalogo_linhas.py)."""
+
+import os
+
+import pandas as pd
+import pytest
+
+import src.catalogo_linhas as cl
+
+
+@pytest.fixture
+def catalogo_csv(tmp_path):
+    """CSV de catálogo mínimo: 8000-10 nos dois sentidos + 9000-21."""
+    path = tmp_path / "todas_as_linhas.csv"
+    pd.DataFrame(
+        {
+            "id_linha": [1273, 34041, 2160],
+            "letreiro_numerico": ["8000", "8000", "9000"],
+            "tipo_letreiro": [10, 10, 21],
+            "sentido_ida": ["Terminal Lapa", "Terminal Lapa", "Centro"],
+            "sentido_volta": ["Ibirapuera", "Ibirapuera", "Bairro"],
+        }
+    ).to_csv(path, index=False)
+    cl._CACHE.clear()
+    yield str(path)
+    cl._CACHE.clear()
+
+
+def test_carregar_catalogo_tipado(catalogo_csv):
+    """Catálogo normaliza tipos, deriva sentido e monta o letreiro."""
+    catalogo = cl.carregar_catalogo(catalogo_csv)
+
+    assert len(catalogo) == 3
+    df = catalogo.df.set_index("id_linha")
+    assert df.loc[1273, "letreiro"] == "8000-10"
+    assert df.loc[1273, "sentido"] == 1
+    assert df.loc[34041, "sentido"] == 2
+    assert df.loc[2160, "nome_linha"] == "Centro / Bairro"
+    assert str(catalogo.df["id_linha"].dtype) == "int32"
+
+
+def test_carregar_catalogo_grava_e_reusa_cache(catalogo_csv, monkeypatch):
+    """Primeira carga grava o Parquet; a seguinte (processo novo) lê dele."""
+    cl.carregar_catalogo(catalogo_csv)
+    cache_path = os.path.splitext(catalogo_csv)[0] + ".parquet"
+    assert os.path.exists(cache_path)
+
+    cl._CACHE.clear()
+    monkeypatch.setattr(cl.pd, "read_csv", lambda *a, **k: pytest.fail("CSV não deveria ser relido com cache válido"))
+    catalogo = cl.carregar_catalogo(catalogo_csv)
+    assert catalogo.letreiros_de([2160]) == {"9000-21"}
+
+
+def test_carregar_catalogo_inexistente(tmp_path):
+    """CSV ausente levanta FileNotFoundError."""
+    with pytest.raises(FileNotFoundError):
+        cl.carregar_catalogo(str(tmp_path / "nao_existe.csv"))
+
+
+def test_carregar_catalogo_opcional_usa_o_caminho_padrao(catalogo_csv, tmp_path, monkeypatch):
+    """Sem caminho vale CATALOGO_LINHAS_PATH; CSV ausente vira None (com aviso)."""
+    monkeypatch.setattr(cl, "CATALOGO_LINHAS_PATH", catalogo_csv)
+    assert cl.carregar_catalogo_opcional("sem letreiros").letreiros_de([2160]) == {"9000-21"}
+
+    monkeypatch.setattr(cl, "CATALOGO_LINHAS_PATH", str(tmp_path / "nao_existe.csv"))
+    assert cl.carregar_catalogo_opcional("sem letreiros") is None
+
+
+def test_buscas_vetorizadas(catalogo_csv):
+    """letreiros_de, ids_de, letreiro_por_id e nome_por_letreiro."""
+    catalogo = cl.carregar_catalogo(catalogo_csv)
+
+    assert catalogo.letreiros_de([1273, 34041, 99999]) == {"8000-10"}
+    assert sorted(catalogo.ids_de({"8000-10"})) == [1273, 34041]
+
+    letreiros = catalogo.letreiro_por_id(pd.Series([2160, 99999, 1273]))
+    assert letreiros[0] == "9000-21"
+    assert pd.isna(letreiros[1])
+    assert letreiros[2] == "8000-10"
+
+    nomes = catalogo.nome_por_letreiro(["8000-10", "8000", "1234-10"])
+    assert nomes[0] == "Terminal Lapa / Ibirapuera"
+    assert nomes[1] == "Terminal Lapa / Ibirapuera"  # sem tipo → '-10'
+    assert pd.isna(nomes[2])
+
+
+def test_get_letreiros_alvo_usa_catalogo(catalogo_csv, monkeypatch):
+    """Coletor de posições monta o filtro a partir do catálogo."""
+    import src.coleta_sptrans
+
+    monkeypatch.setattr(cl, "CATALOGO_LINHAS_PATH", catalogo_csv)
+    assert src.coleta_sptrans.get_letreiros_alvo([1273, 2160]) == {"8000-10", "9000-21"}
+
+
+def test_enrich_with_catalogo(catalogo_csv):
+    """Dashboard enriquece contagens usando o índice do catálogo."""
+    from src.dashboard_sptrans import enrich_with_line_names
+
+    catalogo = cl.carregar_catalogo(catalogo_csv)
+    contagem = pd.DataFrame({"contagem": [5, 2]}, index=pd.Index(["8000-10", "7777-10"], name="letreiro_linha"))
+
+    result = enrich_with_line_names(contagem, catalogo)
+
+    assert result.index.name == "nome_linha"
+    assert list(result.index) == ["Terminal Lapa / Ibirapuera", "7777-10"]
+    assert list(result["contagem"]) == [5, 2]
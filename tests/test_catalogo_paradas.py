@@ -0,0 +1,121 @@
+"""Testes do catálogo de paradas e do índice espacial em grade (src/catalogo_paradas.py)."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import src.database
+from src import catalogo_paradas as cp
+from src.database import get_connection, registrar_paradas
+
+
+def _forca_bruta(indice, lat_paradas, lon_paradas, lat, lon):
+    x, y = indice._projetar(lat_paradas, lon_paradas)
+    qx, qy = indice._projetar(lat, lon)
+    return np.hypot(qx[:, None] - x[None, :], qy[:, None] - y[None, :])
+
+
+@pytest.fixture
+def nuvem():
+    rng = np.random.default_rng(0)
+    paradas = (-23.55 + rng.normal(0, 0.05, 3000), -46.63 + rng.normal(0, 0.05, 3000))
+    # Pontos mais espalhados que as paradas (bordas esparsas) e um muito longe de tudo
+    pontos = (-23.55 + rng.normal(0, 0.08, 1500), -46.63 + rng.normal(0, 0.08, 1500))
+    pontos[0][0], pontos[1][0] = -3.0, -60.0
+    return paradas, pontos
+
+
+@pytest.mark.parametrize("k", [1, 4])
+def test_vizinhos_exatos(nuvem, k):
+    (lat_p, lon_p), (lat, lon) = nuvem
+    indice = cp.IndiceParadas(lat_p, lon_p)
+
+    distancias, indices = indice.vizinhos(lat, lon, k)
+
+    matriz = _forca_bruta(indice, lat_p, lon_p, lat, lon)
+    esperado = np.argsort(matriz, axis=1)[:, :k]
+    assert (indices == esperado).all()
+    assert distancias == pytest.approx(np.take_along_axis(matriz, esperado, axis=1))
+
+
+def test_consulta_por_raio(nuvem):
+    (lat_p, lon_p), (lat, lon) = nuvem
+    indice = cp.IndiceParadas(lat_p, lon_p, tamanho_celula_m=100)
+
+    i_ponto, i_parada, distancias = indice.no_raio(lat, lon, raio_m=400)
+
+    matriz = _forca_bruta(indice, lat_p, lon_p, lat, lon)
+    assert len(i_ponto) == (matriz <= 400).sum()
+    assert distancias == pytest.approx(matriz[i_ponto, i_parada])
+    # Ordenado por ponto e, dentro dele, por distância
+    assert (np.diff(i_ponto) >= 0).all()
+    assert (np.diff(distancias)[np.diff(i_ponto) == 0] >= 0).all()
+
+
+def test_menos_paradas_que_k():
+    indice = cp.IndiceParadas([-23.55, -23.56], [-46.63, -46.63])
+    distancias, indices = indice.vizinhos([-23.55], [-46.63], k=3)
+    assert list(indices[0]) == [0, 1, -1]
+    assert distancias[0, 2] == np.inf
+
+
+def test_gtfs_api_e_coleta_combinados(tmp_path, temp_db_path, monkeypatch):
+    monkeypatch.delenv("DATABASE_URL", raising=False)
+    monkeypatch.setattr(src.database, "DB_PATH", temp_db_path)
+    stops = tmp_path / "stops.txt"
+    stops.write_text(
+        "stop_id,stop_name,stop_lat,stop_lon,location_type\n"
+        "18848,Clínicas,-23.554022,-46.671108,0\n"
+        "18849,Estação Consolação,-23.557,-46.66,1\n"
+        "abc,Sem id numérico,-23.55,-46.66,0\n",
+        encoding="utf-8-sig",
+    )
+    with get_connection() as conn:
+        registrar_paradas(conn, [(18848, "CLINICAS (coleta)", -23.5, -46.6), (700016, None, -23.56, -46.64)])
+    api = cp._normalizar(
+        pd.DataFrame(
+            {"id_parada": [700016, 5], "nome": ["API", "zero"], "latitude": [-23.561, 0], "longitude": [-46.641, 0]}
+        ),
+        "api",
+    )
+
+    paradas = cp.construir_catalogo(
+        gtfs_path=str(stops), incluir_coleta=True, caminho=str(tmp_path / "paradas.parquet")
+    )
+    assert list(paradas["id_parada"]) == [18848, 700016]
+    assert list(paradas["fonte"]) == ["gtfs", "coleta"]
+
+    # API antes da coleta; coordenadas (0, 0) descartadas
+    combinado = cp.combinar(cp.ler_stops_gtfs(str(stops)), api, cp.paradas_da_coleta())
+    assert combinado.set_index("id_parada").loc[700016, "nome"] == "API"
+    assert 5 not in set(combinado["id_parada"])
+
+
+def test_catalogo_em_cache_e_encaixe(tmp_path):
+    caminho = str(tmp_path / "paradas.parquet")
+    cp.gravar_catalogo(
+        cp.combinar(
+            cp._normalizar(
+                pd.DataFrame(
+                    {"id_parada": [10, 20], "nome": ["A", "B"], "latitude": [-23.55, -23.56], "longitude": -46.63}
+                ),
+                "gtfs",
+            )
+        ),
+        caminho,
+    )
+
+    catalogo = cp.carregar_catalogo_paradas(caminho)
+    assert cp.carregar_catalogo_paradas(caminho) is catalogo
+
+    # ~11 m da parada 10; ~550 m de ambas; ~11 m da parada 20
+    encaixe = catalogo.encaixar([-23.5501, -23.555, -23.5599], [-46.63, -46.63, -46.63], raio_m=50)
+    assert encaixe["id_parada"].tolist() == [10, pd.NA, 20]
+    assert encaixe["distancia_m"].iloc[0] == pytest.approx(11.1, abs=0.1)
+    assert np.isnan(encaixe["distancia_m"].iloc[1])
+
+    perto = catalogo.no_raio([-23.555], [-46.63], raio_m=600)
+    assert sorted(perto["id_parada"]) == [10, 20]
+
+    with pytest.raises(FileNotFoundError):
+        cp.carregar_catalogo_paradas(str(tmp_path / "nao_existe.parquet"))
@@ -3,6 +3,10 @@
 import os
 import tempfile
 
+from dagster import build_op_context
+
+DIA = "2025-08-13"
+
 
 class TestChecksBronzeSilver:
     def test_posicoes_check_passes(self, monkeypatch):
@@ -15,7 +19,7 @@ class TestChecksBronzeSilver:
             monkeypatch.setattr(src.compactar_parquet, "DB_PATH", os.path.join(tmp, "nonexistent.db"))
             monkeypatch.setattr(src.compactar_parquet, "PARQUET_DIR", os.path.join(tmp, "parquet"))
 
-            result = check_posicoes_bronze_silver()
+            result = check_posicoes_bronze_silver(build_op_context(partition_key=DIA))
             assert result.passed is True
 
     def test_previsoes_check_passes(self, monkeypatch):
@@ -27,7 +31,7 @@ class TestChecksBronzeSilver:
             monkeypatch.setattr(src.compactar_parquet, "DB_PATH", os.path.join(tmp, "nonexistent.db"))
             monkeypatch.setattr(src.compactar_parquet, "PARQUET_DIR", os.path.join(tmp, "parquet"))
 
-            result = check_previsoes_bronze_silver()
+            result = check_previsoes_bronze_silver(build_op_context(partition_key=DIA))
             assert result.passed is True
 
     def test_posicoes_check_with_data(self, monkeypatch):
@@ -54,6 +58,8 @@ class TestChecksBronzeSilver:
             )
             conn.execute("INSERT INTO posicoes VALUES (1, '2025-08-13 10:00', 123, -23.5, -46.6)")
             conn.execute("INSERT INTO posicoes VALUES (2, '2025-08-13 10:05', 456, -23.6, -46.7)")
+            # Outro dia no Bronze (sem Silver) não afeta o check da partição 2025-08-13
+            conn.execute("INSERT INTO posicoes VALUES (3, '2025-08-14 00:00', 789, -23.6, -46.7)")
             conn.commit()
             conn.close()
 
@@ -62,13 +68,17 @@ class TestChecksBronzeSilver:
             con = duckdb.connect()
             con.execute(
                 f"COPY (SELECT *, CAST(timestamp_coleta AS DATE) AS dt "
-                f"FROM sqlite_scan('{db_path}', 'posicoes')) "
+                f"FROM sqlite_scan('{db_path}', 'posicoes') WHERE timestamp_coleta < '2025-08-14') "
                 f"TO '{pq_table}' (FORMAT PARQUET, PARTITION_BY (dt))"
             )
             con.close()
 
-            result = check_posicoes_bronze_silver()
+            result = check_posicoes_bronze_silver(build_op_context(partition_key=DIA))
             assert result.passed is True
+            assert result.metadata["bronze_count"].value == 2
+
+            result = check_posicoes_bronze_silver(build_op_context(partition_key="2025-08-14"))
+            assert result.passed is False
 
     def test_asset_checks_registered(self):
         """Verifica que os asset_checks estão registrados nas Definitions."""
@@ -83,3 +93,49 @@ class TestChecksBronzeSilver:
                 check_names.add(spec.name)
         assert "check_posicoes_bronze_silver" in check_names
         assert "check_previsoes_bronze_silver" in check_names
+
+
+class TestChecksumParticao:
+    def _exportar(self, monkeypatch, tmp_path, temp_db_connection, temp_db_path):
+        import duckdb
+
+        import src.compactar_parquet as cp
+
+        monkeypatch.setattr(cp, "DB_PATH", temp_db_path)
+        monkeypatch.setattr(cp, "PARQUET_DIR", str(tmp_path / "parquet"))
+        temp_db_connection.executemany(
+            "INSERT INTO posicoes (timestamp_coleta, id_onibus, letreiro_linha, latitude, longitude) "
+            "VALUES (?, ?, '8000-10', ?, -46.6)",
+            [("2025-08-13 10:00:00", 1, -23.5), ("2025-08-13 10:05:00", 2, -23.6)],
+        )
+        temp_db_connection.commit()
+        con = duckdb.connect()
+        try:
+            cp.exportar_tabela(con, "posicoes", filtro_data=DIA)
+        finally:
+            con.close()
+        return cp
+
+    def test_checksum_confere_apos_compactacao(self, monkeypatch, tmp_path, temp_db_connection, temp_db_path):
+        """Manifesto recebe o checksum e o check confere com o Bronze."""
+        from assets.checks import check_posicoes_checksum
+
+        cp = self._exportar(monkeypatch, tmp_path, temp_db_connection, temp_db_path)
+        manifesto = cp.ler_manifesto(os.path.join(cp.PARQUET_DIR, "posicoes"))
+        assert len(manifesto["particoes"][DIA]["checksum"]) == 16
+
+        result = check_posicoes_checksum(build_op_context(partition_key=DIA))
+        assert result.passed is True
+
+    def test_checksum_detecta_linha_alterada(self, monkeypatch, tmp_path, temp_db_connection, temp_db_path):
+        """Contagem igual, conteúdo diferente: reconciliação passa, checksum falha."""
+        from assets.checks import check_posicoes_bronze_silver, check_posicoes_checksum
+
+        self._exportar(monkeypatch, tmp_path, temp_db_connection, temp_db_path)
+        temp_db_connection.execute("UPDATE posicoes SET latitude = -23.7 WHERE id_onibus = 2")
+        temp_db_connection.commit()
+
+        assert check_posicoes_bronze_silver(build_op_context(partition_key=DIA)).passed is True
+        result = check_posicoes_checksum(build_op_context(partition_key=DIA))
+        assert result.passed is False
+        assert "diverge do Bronze" in result.description
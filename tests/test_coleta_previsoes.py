@@ -1,12 +1,16 @@
 """Testes para coleta_previsoes.py — autenticação, coleta e DB."""
 
 import json
+import sqlite3
 from unittest.mock import MagicMock, patch
 
+import pytest
+
 from src.coleta_previsoes import (
     autenticar,
     coletar_previsao_linha,
     job,
+    paradas_previsao,
 )
 
 
@@ -73,8 +77,23 @@ def test_coletar_previsao_json_invalido():
     assert result is None
 
 
+@pytest.fixture
+def banco_temporario(temp_db_path, monkeypatch):
+    """DB_PATH num SQLite temporário com o schema: o batimento de ciclos vazios não toca ./data."""
+    import src.database
+    from src.database import schema_sql
+
+    monkeypatch.delenv("DATABASE_URL", raising=False)
+    monkeypatch.setattr(src.database, "DB_PATH", temp_db_path)
+    tabelas, indices = schema_sql()
+    with sqlite3.connect(temp_db_path) as conn:
+        for sql in [*tabelas, *indices]:
+            conn.execute(sql)
+    return temp_db_path
+
+
 @patch("src.coleta_previsoes.coletar_previsao_linha")
-def test_job_sem_linhas(mock_coletar):
+def test_job_sem_linhas(mock_coletar, banco_temporario):
     """Job com lista de linhas vazia não faz coleta."""
     mock_session = MagicMock()
     result = job(mock_session, [])
@@ -83,16 +102,22 @@ def test_job_sem_linhas(mock_coletar):
 
 
 @patch("src.coleta_previsoes.coletar_previsao_linha")
-def test_job_linhas_sem_dados(mock_coletar):
+def test_job_linhas_sem_dados(mock_coletar, banco_temporario):
     """Job com linha que não retorna dados não quebra."""
+    from src.database import get_connection, ultimos_lotes
+
     mock_coletar.return_value = None
     mock_session = MagicMock()
     result = job(mock_session, [2411])
     assert result is None
 
+    # O ciclo vazio ainda registra o batimento, no banco temporário
+    with get_connection() as conn:
+        assert ultimos_lotes(conn)["previsoes"]["inseridos"] == 0
+
 
 @patch("src.coleta_previsoes.coletar_previsao_linha")
-def test_job_com_dados_processa_registros(mock_coletar):
+def test_job_com_dados_processa_registros(mock_coletar, banco_temporario):
     """Job processa dados de previsão corretamente."""
     mock_coletar.return_value = {
         "ps": [
@@ -111,6 +136,7 @@ def test_job_com_dados_processa_registros(mock_coletar):
 
     mock_conn = MagicMock()
     mock_cursor = MagicMock()
+    mock_cursor.rowcount = 2
     mock_conn.cursor.return_value = mock_cursor
 
     @contextmanager
@@ -118,7 +144,9 @@ def test_job_com_dados_processa_registros(mock_coletar):
         yield mock_conn
 
     with patch("src.coleta_previsoes.get_connection", mock_get_connection):
-        job(mock_session, [2411])
+        inseridos = job(mock_session, [2411])
+
+    assert inseridos == 2
 
     # Verifica que executemany foi chamado com 2 registros
     # (commit é feito automaticamente pelo context manager de get_connection)
@@ -127,3 +155,25 @@ def test_job_com_dados_processa_registros(mock_coletar):
     assert len(registros) == 2
     assert registros[0][1] == 2411  # id_linha
     assert registros[1][1] == 2411
+
+
+def test_job_grava_coordenadas_das_paradas(temp_db_connection, temp_db_path, monkeypatch):
+    """Paradas do payload (cp/np/py/px) são gravadas na mesma transação das previsões."""
+    import src.database
+    from src.database import get_connection, ler_paradas
+
+    monkeypatch.delenv("DATABASE_URL", raising=False)
+    monkeypatch.setattr(src.database, "DB_PATH", temp_db_path)
+    payload = {
+        "ps": [
+            {"cp": 5001, "np": "PARADA A", "py": -23.55, "px": -46.63, "vs": [{"p": 1001, "t": "10:15"}]},
+            {"cp": 5002, "vs": [{"p": 1001, "t": "10:20"}]},  # sem coordenadas: ignorada
+        ]
+    }
+    assert paradas_previsao(payload) == [(5001, "PARADA A", -23.55, -46.63)]
+
+    with patch("src.coleta_previsoes.coletar_previsao_linha", return_value=payload):
+        assert job(MagicMock(), [2411]) == 2
+
+    with get_connection() as conn:
+        assert [p[0] for p in ler_paradas(conn)] == [5001]
@@ -193,17 +193,22 @@ def test_job_com_dados_salva_no_db(mock_coletar, mock_autenticar, mock_get_token
             with patch("src.coleta_sptrans.datetime") as mock_dt:
                 mock_dt.now.return_value = real_now
 
-                job({"8000-10"})
+                inseridos = job({"8000-10"})
+                # Mesmo snapshot de novo: tudo duplicado, nada inserido
+                reinseridos = job({"8000-10"})
 
         # Verifica que apenas 8000-10 foi inserido (não 9000-10)
         conn2 = sqlite3.connect(db_path)
         cursor2 = conn2.cursor()
         cursor2.execute("SELECT id_onibus, letreiro_linha FROM posicoes")
         rows = cursor2.fetchall()
+        total = cursor2.execute("SELECT total FROM contagem_tabelas WHERE tabela = 'posicoes'").fetchone()[0]
         conn2.close()
 
         assert len(rows) == 2, "Deveria inserir 2 registros (apenas 8000-10)"
         assert all(r[1] == "8000-10" for r in rows), "Apenas letreiro 8000-10"
+        assert (inseridos, reinseridos) == (2, 0)
+        assert total == 2, "Contador mantido na mesma transação do INSERT"
 
     finally:
         if os.path.exists(db_path):
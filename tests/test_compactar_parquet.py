@@ -1,10 +1,13 @@
 """Testes para compactar_parquet.py — exportação SQLite → Parquet."""
 
+import functools
 import os
 import shutil
+import sqlite3
 import tempfile
 
 import duckdb
+import pandas as pd
 import pytest
 
 import src.compactar_parquet as cp
@@ -45,8 +48,7 @@ def test_exportar_parquet_com_dados(temp_db_connection, temp_parquet_dir, temp_d
     con2 = duckdb.connect()
     try:
         result = con2.execute(
-            f"SELECT id_onibus, letreiro_linha "
-            f"FROM read_parquet('{temp_parquet_dir}/posicoes/**/*.parquet')"
+            f"SELECT id_onibus, letreiro_linha FROM read_parquet('{temp_parquet_dir}/posicoes/**/*.parquet')"
         ).fetchall()
         assert len(result) == 1
         assert result[0][0] == 1001
@@ -104,3 +106,87 @@ def test_exportar_parquet_idempotente(temp_db_connection, temp_parquet_dir, temp
         con3.close()
 
     assert total == 1, "Idempotência: mesma contagem após 2 exportações"
+
+
+def _inserir_posicoes(conn, dia, n):
+    conn.executemany(
+        "INSERT INTO posicoes (timestamp_coleta, id_onibus, letreiro_linha, latitude, longitude) "
+        "VALUES (?, ?, '8000-10', ?, -46.63)",
+        [(f"{dia} 10:00:00", i, -23.5 - i / 1e6) for i in range(n)],
+    )
+    conn.commit()
+
+
+def test_checksum_sqlite_le_so_o_dia_pelo_indice(temp_db_connection, temp_parquet_dir, temp_db_path, monkeypatch):
+    """O custo do checksum acompanha o dia, não o Bronze; e bate com o do Parquet exportado."""
+    monkeypatch.setattr(cp, "DB_PATH", temp_db_path)
+    monkeypatch.setattr(cp, "PARQUET_DIR", temp_parquet_dir)
+    passos = []
+    conectar = sqlite3.connect
+
+    def conectar_contando(*args, **kwargs):
+        conn = conectar(*args, **kwargs)
+        conn.set_progress_handler(lambda: passos.append(1), 100)  # instruções da VM do SQLite
+        return conn
+
+    def checksum(con):
+        passos.clear()
+        monkeypatch.setattr(cp.sqlite3, "connect", conectar_contando)
+        try:
+            return cp.checksum_sqlite(con, "posicoes", "2025-08-15", cp.COLUNAS_CHECKSUM["posicoes"])
+        finally:
+            monkeypatch.setattr(cp.sqlite3, "connect", conectar)
+
+    _inserir_posicoes(temp_db_connection, "2025-08-15", 200)
+    _inserir_posicoes(temp_db_connection, "2025-08-14", 200)
+    con = duckdb.connect()
+    try:
+        antes = checksum(con)
+        passos_antes = len(passos)
+        _inserir_posicoes(temp_db_connection, "2025-08-16", 20_000)
+        assert checksum(con) == antes
+        assert 0 < len(passos) <= passos_antes * 1.1  # 50x mais Bronze fora do dia: mesmo custo
+
+        assert cp.exportar_tabela(con, "posicoes", filtro_data="2025-08-15") == 200
+        colunas = cp.COLUNAS_CHECKSUM["posicoes"]
+        assert antes == cp.checksum_parquet(con, f"{temp_parquet_dir}/posicoes", "2025-08-15", colunas)
+    finally:
+        con.close()
+
+
+def _publicar_dia(dia, destinos):
+    """Tarefa de `processar_particoes` nos testes: publica tantas linhas quanto o dia do mês em cada destino."""
+    n = int(dia[-2:])
+    for destino in destinos:
+        cp.publicar_particao(pd.DataFrame({"valor": range(n)}), destino, dia, "tabela.parquet")
+    return n
+
+
+@pytest.mark.parametrize("processos", [1, 2])
+def test_processar_particoes_publica_e_atualiza_os_manifestos(tmp_path, processos):
+    """Mesmo resultado com e sem pool: {dia: retorno} ordenado e um manifesto por tabela publicada."""
+    destinos = [str(tmp_path / "gold" / "a"), str(tmp_path / "gold" / "b")]
+    dias = ["2025-08-03", "2025-08-01", "2025-08-02"]
+
+    resultado = cp.processar_particoes(functools.partial(_publicar_dia, destinos=destinos), dias, destinos, processos)
+
+    assert resultado == {"2025-08-01": 1, "2025-08-02": 2, "2025-08-03": 3}
+    for destino in destinos:
+        manifesto = cp.ler_manifesto(destino)
+        assert {dt: p["linhas"] for dt, p in manifesto["particoes"].items()} == resultado
+        assert manifesto["total_linhas"] == 6
+        assert sorted(os.listdir(os.path.join(destino, "dt=2025-08-01"))) == ["tabela.parquet"]  # sem .tmp
+
+
+def test_processar_particoes_sem_dias(tmp_path):
+    assert cp.processar_particoes(_publicar_dia, [], str(tmp_path / "gold"), processos=2) == {}
+    assert not (tmp_path / "gold").exists()
+
+
+def test_ler_particao(tmp_path):
+    cp.publicar_particao(
+        pd.DataFrame({"a": [1, 2], "b": ["x", "y"]}), str(tmp_path / "tabela"), "2025-08-01", "t.parquet"
+    )
+
+    assert cp.ler_particao(str(tmp_path), "tabela", "2025-08-01", ["b"])["b"].tolist() == ["x", "y"]
+    assert cp.ler_particao(str(tmp_path), "tabela", "2025-08-02", ["b"]) is None
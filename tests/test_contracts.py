@@ -148,3 +148,71 @@ class TestValidarLote:
         erros = validar_lote(PosicaoBronze, registros)
         assert len(erros) == 1
         assert erros[0]["indice"] == 1
+
+
+class TestValidarColunas:
+    COLUNAS = ["timestamp_coleta", "id_onibus", "letreiro_linha", "latitude", "longitude", "timestamp_posicao"]
+
+    def test_tuplas_mascara_e_motivos(self):
+        from src.contracts import PosicaoBronze, validar_colunas
+
+        registros = [
+            (datetime(2025, 8, 13, 10, 0), 123, "8000-10", -23.55, -46.63, "2025-08-13T13:00:00Z"),
+            (datetime(2025, 8, 13, 10, 0), 0, "8000-10", 95.0, -46.63, "lixo"),
+            (None, 456, "X" * 21, None, -46.63, None),
+        ]
+        resultado = validar_colunas(PosicaoBronze, registros, colunas=self.COLUNAS)
+
+        assert resultado.rejeitados.tolist() == [False, True, True]
+        assert resultado.motivos[0] == ""
+        assert set(resultado.motivos[1].split(";")) == {"id_onibus:gt", "latitude:le", "timestamp_posicao:tipo"}
+        assert set(resultado.motivos[2].split(";")) == {
+            "timestamp_coleta:nulo",
+            "letreiro_linha:max_length",
+            "latitude:nulo",
+        }
+        assert resultado.filtrar(registros) == registros[:1]
+
+    def test_coluna_obrigatoria_ausente(self):
+        import pandas as pd
+
+        from src.contracts import PosicaoBronze, validar_colunas
+
+        df = pd.DataFrame({"timestamp_coleta": [datetime(2025, 8, 13)], "id_onibus": [1], "latitude": [-23.5]})
+        resultado = validar_colunas(PosicaoBronze, df)
+
+        assert resultado.n_rejeitados == 1
+        assert resultado.resumo() == {"longitude:ausente": 1}
+
+    def test_arrow_silver_pattern(self):
+        pa = pytest.importorskip("pyarrow")
+        from src.contracts import PrevisaoSilver, validar_colunas
+
+        tabela = pa.table(
+            {
+                "timestamp_coleta": [datetime(2025, 8, 13, 10, 0)] * 2,
+                "id_linha": [2411, 2411],
+                "id_onibus": [1001, 1002],
+                "id_parada": [None, 7],
+                "horario_previsao": ["10:05", "10:07"],
+                "dt": ["2025-08-13", "13-08-2025"],
+            }
+        )
+        resultado = validar_colunas(PrevisaoSilver, tabela)
+
+        assert resultado.rejeitados.tolist() == [False, True]
+        assert resultado.motivos[1] == "dt:pattern"
+        assert resultado.filtrar(tabela).num_rows == 1
+
+    def test_equivalente_a_validar_lote(self):
+        from src.contracts import PosicaoBronze, validar_colunas, validar_lote
+
+        registros = [
+            {"timestamp_coleta": datetime(2025, 8, 13), "id_onibus": i, "latitude": -23.5 + i, "longitude": -46.6}
+            for i in range(-2, 120, 7)
+        ]
+        colunas = {k: [r[k] for r in registros] for k in registros[0]}
+        resultado = validar_colunas(PosicaoBronze, colunas)
+        esperado = [e["indice"] for e in validar_lote(PosicaoBronze, registros)]
+
+        assert resultado.rejeitados.nonzero()[0].tolist() == esperado
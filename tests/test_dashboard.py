@@ -7,6 +7,9 @@ from src.dashboard_sptrans import (
     analyze_bunched_buses,
     analyze_stuck_buses,
     enrich_with_line_names,
+    load_current_positions,
+    load_speed_heatmap,
+    speed_heatmap_days,
 )
 
 
@@ -60,6 +63,89 @@ def test_analyze_stuck_buses_com_movimento():
     assert result.empty, "Ônibus com deslocamento > 0.1km não deve ser detectado como parado"
 
 
+def test_analyze_stuck_buses_usa_avanco_na_rota(monkeypatch):
+    """Ônibus que deu a volta num laço termina perto de onde começou: com as rotas, não está parado."""
+    import src.dashboard_sptrans as dashboard
+    from src.encaixe_rotas import RedeRotas
+
+    laco = [(-23.55, -46.70), (-23.54, -46.70), (-23.54, -46.69), (-23.55, -46.69), (-23.55, -46.70)]
+    rede = RedeRotas(
+        pd.DataFrame(
+            {
+                "letreiro_linha": "9000-10",
+                "sentido": 1,
+                "shape_id": "laco",
+                "latitude": [p[0] for p in laco],
+                "longitude": [p[1] for p in laco],
+            }
+        )
+    )
+    df = pd.DataFrame(
+        {
+            "id_onibus": [1001] * 4,
+            "letreiro_linha": ["9000-10"] * 4,
+            "timestamp_analise": pd.to_datetime(
+                ["2025-08-15 10:00", "2025-08-15 10:05", "2025-08-15 10:10", "2025-08-15 10:15"]
+            ),
+            "posicao_atual_lat": [-23.5495, -23.54, -23.545, -23.5499],
+            "posicao_atual_lon": [-46.70, -46.695, -46.69, -46.6995],
+        }
+    )
+
+    monkeypatch.setattr(dashboard, "load_route_network", lambda: None)
+    assert 1001 in analyze_stuck_buses(df).index
+    monkeypatch.setattr(dashboard, "load_route_network", lambda: rede)
+    assert analyze_stuck_buses.__wrapped__(df).empty
+
+
+def test_load_current_positions_da_frota_em_memoria(monkeypatch):
+    """O mapa usa posicoes_atuais (uma linha por ônibus); sem ela, None e o dashboard cai nos resultados."""
+    import src.dashboard_sptrans as dashboard
+
+    frota = pd.DataFrame(
+        {"id_onibus": [1, 2], "letreiro_linha": ["8000-10", "9000-10"], "latitude": [-23.5, -23.6], "longitude": -46.6}
+    )
+    monkeypatch.setattr(
+        dashboard,
+        "posicoes_atuais",
+        lambda letreiros=None: frota[frota["letreiro_linha"].isin(letreiros or ["8000-10", "9000-10"])],
+    )
+    assert load_current_positions()[["lat", "lon"]].shape == (2, 2)
+    assert load_current_positions("9000-10")["id_onibus"].tolist() == [2]
+    assert load_current_positions("875A-10") is None
+
+    def falha(letreiros=None):
+        raise RuntimeError("sem banco")
+
+    monkeypatch.setattr(dashboard, "posicoes_atuais", falha)
+    assert load_current_positions() is None
+
+
+def test_load_speed_heatmap_le_so_o_agregado(tmp_path):
+    """O mapa de velocidades vem do Gold: centro e cor de cada célula, do vermelho (parado) ao verde."""
+    from src.mapa_velocidades import agregar_celulas
+
+    passos = pd.DataFrame(
+        {
+            "id_onibus": [1, 2],
+            "instante": pd.to_datetime(["2025-08-15 10:01", "2025-08-15 10:02"]),
+            "latitude": [-23.55, -23.60],
+            "longitude": [-46.63, -46.70],
+            "velocidade_kmh": [0.0, 45.0],
+        }
+    )
+    particao = tmp_path / "dt=2025-08-15"
+    particao.mkdir()
+    agregar_celulas(passos).to_parquet(particao / "velocidades.parquet", index=False)
+
+    assert speed_heatmap_days(str(tmp_path)) == ["2025-08-15"]
+    assert speed_heatmap_days(str(tmp_path / "nao_existe")) == []
+    df = load_speed_heatmap.__wrapped__("2025-08-15", str(tmp_path)).sort_values("velocidade_mediana_kmh")
+    assert df["lat"].to_numpy() == pytest.approx([-23.55, -23.60], abs=1e-3)
+    assert df["lon"].to_numpy() == pytest.approx([-46.63, -46.70], abs=1e-3)
+    assert df["cor"].tolist() == [[255, 0, 0, 160], [0, 200, 0, 160]]
+
+
 def test_analyze_bunched_buses_sem_comboio(sample_df):
     """DataFrame com 3 ônibus distantes não detecta comboio."""
     result = analyze_bunched_buses(sample_df)
@@ -0,0 +1,170 @@
+"""Testes do encaixe das posições nas rotas do GTFS (src/encaixe_rotas.py)."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src import encaixe_rotas as er
+
+M_POR_GRAU = 111_195.08
+LINHA = "8000-10"
+LACO = "9000-10"
+INICIO = pd.Timestamp("2025-08-15 06:00:00")
+
+
+def _rotas():
+    """Linha 8000-10: ida para o norte em lon -46.60 (-23.60 → -23.50) e volta pela mesma rua.
+    Linha 9000-10: laço quadrado de ~1,1 km de lado, um único shape."""
+    lat = np.linspace(-23.60, -23.50, 101)
+    laco = [(-23.55, -46.70), (-23.54, -46.70), (-23.54, -46.69), (-23.55, -46.69), (-23.55, -46.70)]
+    return pd.DataFrame(
+        {
+            "letreiro_linha": [LINHA] * 202 + [LACO] * 5,
+            "sentido": [1] * 101 + [2] * 101 + [1] * 5,
+            "shape_id": ["ida"] * 101 + ["volta"] * 101 + ["laco"] * 5,
+            "latitude": np.r_[lat, lat[::-1], [p[0] for p in laco]],
+            "longitude": np.r_[np.full(202, -46.60), [p[1] for p in laco]],
+        }
+    )
+
+
+def _escrever_gtfs(diretorio):
+    rotas = _rotas()
+    rotas["shape_pt_sequence"] = rotas.groupby("shape_id").cumcount() + 1
+    rotas.rename(columns={"latitude": "shape_pt_lat", "longitude": "shape_pt_lon"}).drop(
+        columns=["letreiro_linha", "sentido"]
+    ).to_csv(diretorio / "shapes.txt", index=False)
+    pd.DataFrame(
+        {
+            "route_id": [LINHA, LINHA, LINHA, LACO],
+            "service_id": "USD",
+            "trip_id": ["a", "b", "c", "d"],
+            "direction_id": [0, 0, 1, 0],
+            "shape_id": ["ida", "ida", "volta", "laco"],
+        }
+    ).to_csv(diretorio / "trips.txt", index=False)
+
+
+def _posicoes(onibus, latitudes, longitude=-46.60, letreiro=LINHA, minutos=1):
+    return pd.DataFrame(
+        {
+            "timestamp_coleta": INICIO + pd.to_timedelta(np.arange(len(latitudes)) * minutos, unit="min"),
+            "id_onibus": onibus,
+            "letreiro_linha": letreiro,
+            "latitude": latitudes,
+            "longitude": longitude,
+            "timestamp_posicao": None,
+        }
+    )
+
+
+def test_gtfs_vira_rede_em_cache(tmp_path):
+    _escrever_gtfs(tmp_path)
+
+    rede = er.carregar_rede_rotas(str(tmp_path))
+
+    assert er.carregar_rede_rotas(str(tmp_path)) is rede
+    assert (tmp_path / er.ARQUIVO_ROTAS).exists()
+    formas = rede.formas.set_index("shape_id")
+    assert list(formas.loc[["ida", "volta", "laco"], "sentido"]) == [1, 2, 1]
+    assert formas.loc["ida", "comprimento_m"] == pytest.approx(0.10 * M_POR_GRAU, rel=1e-3)
+    with pytest.raises(FileNotFoundError):
+        er.carregar_rede_rotas(str(tmp_path / "nao_existe"))
+
+
+def test_referencia_linear_e_desvio():
+    rede = er.RedeRotas(_rotas())
+    # 20 m a leste da rua, no meio da ida; longe demais; linha desconhecida
+    leste = 20 / (M_POR_GRAU * np.cos(np.radians(-23.55)))
+    forma, distancia, desvio = rede.projetar(
+        [LINHA, LINHA, "1234-10"], [-23.55, -23.55, -23.55], [-46.60 + leste, -46.59, -46.60]
+    )
+
+    # No meio da rua de ida e volta: 0,05° desde o início de qualquer um dos dois shapes
+    assert rede.formas["shape_id"][forma[0]] in {"ida", "volta"}
+    assert desvio[0] == pytest.approx(20, abs=0.1)
+    assert distancia[0] == pytest.approx(0.05 * M_POR_GRAU, rel=1e-3)
+    assert list(forma[1:]) == [-1, -1]
+    assert np.isnan(distancia[1:]).all()
+
+
+def test_candidatos_iguais_a_forca_bruta():
+    rede = er.RedeRotas(_rotas(), raio_m=80, tamanho_celula_m=50)
+    rng = np.random.default_rng(1)
+    lat = -23.60 + rng.random(2000) * 0.11
+    lon = -46.60 + rng.normal(0, 0.0006, 2000)
+
+    forma, _, desvio = rede.projetar(np.full(2000, LINHA), lat, lon)
+
+    # Força bruta: distância ao segmento mais próximo de qualquer forma da linha
+    x, y = rede._projetar(lat, lon)
+    segmentos = np.flatnonzero(rede.formas["letreiro_linha"].to_numpy()[rede._forma] == LINHA)
+    dx, dy = rede._dx[segmentos], rede._dy[segmentos]
+    t = ((x[:, None] - rede._x0[segmentos]) * dx + (y[:, None] - rede._y0[segmentos]) * dy) / (dx * dx + dy * dy)
+    t = np.clip(t, 0, 1)
+    minimo = np.hypot(x[:, None] - rede._x0[segmentos] - t * dx, y[:, None] - rede._y0[segmentos] - t * dy).min(axis=1)
+    dentro = minimo <= 80
+    assert ((forma >= 0) == dentro).all()
+    # Empates dentro de 1 mm podem cair em segmentos vizinhos
+    assert desvio[dentro] == pytest.approx(minimo[dentro], abs=1e-3)
+
+
+def test_sentido_pelo_avanco_do_onibus():
+    """Ida e volta pela mesma rua: o shape é o que o ônibus percorre para a frente, inclusive parado."""
+    rede = er.RedeRotas(_rotas())
+    para_o_sul = np.r_[[-23.52] * 3, np.linspace(-23.52, -23.58, 10)]
+    para_o_norte = np.linspace(-23.58, -23.52, 10)
+    posicoes = pd.concat([_posicoes(1, para_o_sul), _posicoes(2, para_o_norte)], ignore_index=True)
+
+    encaixadas = er.encaixar_posicoes(posicoes, rede)
+
+    por_onibus = encaixadas.groupby("id_onibus")
+    assert set(por_onibus.get_group(1)["shape_id"]) == {"volta"}
+    assert set(por_onibus.get_group(2)["shape_id"]) == {"ida"}
+    assert set(encaixadas.loc[encaixadas["id_onibus"] == 1, "sentido"]) == {2}
+    # 0,06° em 9 min, um passo por minuto: ~44 km/h; parado: 0
+    velocidade = por_onibus.get_group(1)["velocidade_rota_kmh"]
+    assert velocidade.iloc[1:3].tolist() == [0, 0]
+    assert velocidade.iloc[4:].to_numpy() == pytest.approx(0.06 / 9 * M_POR_GRAU * 60 / 1000, rel=1e-3)
+
+
+def test_avanco_no_laco_ao_longo_da_rota():
+    """No laço, o ônibus volta para perto de onde começou: em linha reta não andou, na rota andou ~3,3 km."""
+    rede = er.RedeRotas(_rotas())
+    pontos = pd.DataFrame(
+        {
+            "letreiro_linha": LACO,
+            "id_onibus": 7,
+            "instante": INICIO + pd.to_timedelta([0, 3, 6, 9], unit="min"),
+            "latitude": [-23.5495, -23.54, -23.545, -23.5499],
+            "longitude": [-46.70, -46.695, -46.69, -46.69],
+        }
+    )
+
+    avanco = er.avanco_na_rota(pontos.iloc[::-1], rede)
+
+    assert avanco.loc[7] == pytest.approx(
+        (0.01 + 0.01 * np.cos(np.radians(-23.545)) + 0.0099 - 0.0005) * M_POR_GRAU, rel=1e-2
+    )
+
+
+def test_processa_dias_e_publica(tmp_path):
+    gtfs, silver = tmp_path / "gtfs", tmp_path / "parquet"
+    gtfs.mkdir()
+    _escrever_gtfs(gtfs)
+    for dia in ("2025-08-15", "2025-08-16"):
+        particao = silver / "posicoes" / f"dt={dia}"
+        particao.mkdir(parents=True)
+        posicoes = _posicoes(1, np.linspace(-23.58, -23.52, 10))
+        posicoes["timestamp_coleta"] = pd.Timestamp(dia) + (posicoes["timestamp_coleta"] - INICIO.normalize())
+        pd.concat([posicoes, _posicoes(2, [-23.55], longitude=-46.50)]).to_parquet(
+            particao / "part-0.parquet", index=False
+        )
+
+    dias = er.particoes_posicoes(str(silver))
+    resultado = er.processar_dias(dias, str(gtfs), processos=1, parquet_dir=str(silver))
+
+    assert resultado == {"2025-08-15": 10, "2025-08-16": 10}
+    encaixadas = pd.read_parquet(silver / "posicoes_rota" / "dt=2025-08-16" / er.ARQUIVO_POSICOES_ROTA)
+    assert list(encaixadas.columns) == list(er.TIPOS_POSICOES_ROTA)
+    assert encaixadas["shape_id"].isna().sum() == 1
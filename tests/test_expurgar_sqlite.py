@@ -96,3 +96,34 @@ def test_expurgar_duas_tabelas():
         conn.close()
     finally:
         os.unlink(path)
+
+
+def test_contador_acompanha_insercao_e_expurgo(monkeypatch):
+    """inserir_lote soma ao contador e o expurgo subtrai, sem count(*) no caminho quente."""
+    from src.database import inserir_lote
+    from src.expurgar_sqlite import expurgar_dia
+
+    monkeypatch.delenv("DATABASE_URL", raising=False)
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    try:
+        conn = sqlite3.connect(path)
+        conn.execute("CREATE TABLE posicoes (id INTEGER PRIMARY KEY, timestamp_coleta DATETIME, id_onibus INTEGER)")
+        conn.execute("CREATE UNIQUE INDEX idx_dedup ON posicoes(timestamp_coleta, id_onibus)")
+        conn.execute("INSERT INTO posicoes (timestamp_coleta, id_onibus) VALUES ('2024-01-01 08:00:00', 9)")
+
+        lote = [("2024-01-01 10:00:00", 1), ("2024-01-01 10:00:00", 2), ("2024-01-02 10:00:00", 1)]
+        assert inserir_lote(conn, "posicoes", ["timestamp_coleta", "id_onibus"], lote) == 3
+        assert inserir_lote(conn, "posicoes", ["timestamp_coleta", "id_onibus"], lote[:1]) == 0
+        conn.commit()
+
+        def contador():
+            return conn.execute("SELECT total FROM contagem_tabelas WHERE tabela = 'posicoes'").fetchone()[0]
+
+        assert contador() == 4  # semeado com count(*) na primeira vez (inclui a linha pré-existente)
+
+        assert expurgar_dia(conn, "posicoes", "2024-01-01") == 3
+        assert contador() == 1
+        conn.close()
+    finally:
+        os.unlink(path)
@@ -0,0 +1,111 @@
+"""Testes do cálculo de headways e regularidade (src/headways.py)."""
+
+import pandas as pd
+import pytest
+
+from src import headways
+
+LINHA = 2160
+PARADA = 700016
+# Ônibus 1..4 passam na parada às 06:00, 06:10, 06:20 e 06:50 → headways 600, 600, 1800 s
+PASSAGENS = {1: "06:00", 2: "06:10", 3: "06:20", 4: "06:50"}
+
+
+def _previsoes(dia="2025-08-15"):
+    """Coletas a cada 5 min; cada ônibus aparece nos 20 min antes de passar, com o horário previsto."""
+    registros = []
+    for onibus, hhmm in PASSAGENS.items():
+        passagem = pd.Timestamp(f"{dia} {hhmm}")
+        for minutos in (20, 15, 10, 5):
+            registros.append((passagem - pd.Timedelta(minutes=minutos), LINHA, onibus, PARADA, hhmm))
+    # Ônibus 5 ainda se aproxima na última coleta da linha: sem passagem
+    registros.append((pd.Timestamp(f"{dia} 07:00"), LINHA, 5, PARADA, "07:04"))
+    return pd.DataFrame(
+        registros, columns=["timestamp_coleta", "id_linha", "id_onibus", "id_parada", "horario_previsao"]
+    )
+
+
+def test_horario_previsto_vira_a_meia_noite():
+    coletas = pd.Series(pd.to_datetime(["2025-08-15 23:50", "2025-08-16 00:03", "2025-08-15 10:00"]))
+    previsto = headways.horario_previsto(coletas, ["00:05", "23:58", "10:07"])
+    assert list(previsto) == list(pd.to_datetime(["2025-08-16 00:05", "2025-08-15 23:58", "2025-08-15 10:07"]))
+
+
+def test_passagens_pela_ultima_previsao_de_cada_visita():
+    passagens = headways.passagens_paradas(_previsoes())
+
+    assert list(passagens["id_onibus"]) == [1, 2, 3, 4]
+    assert list(passagens["instante"].dt.strftime("%H:%M")) == list(PASSAGENS.values())
+    assert set(passagens["sentido"]) == {1}
+    assert set(passagens["id_ponto"]) == {PARADA}
+
+
+def test_headways_cv_e_espera_excedente():
+    hw = headways.calcular_headways(headways.passagens_paradas(_previsoes()))
+    assert list(hw["headway_s"]) == [600, 600, 1800]
+    assert list(hw["id_onibus_anterior"]) == [1, 2, 3]
+    assert set(hw["periodo"]) == {"pico_manha"}
+
+    metricas = headways.regularidade(hw)
+    # Uma linha para a parada e uma para a linha inteira (id_ponto nulo)
+    assert len(metricas) == 2
+    parada = metricas[metricas["id_ponto"].notna()].iloc[0]
+    assert parada["n_headways"] == 3
+    assert parada["headway_medio_s"] == 1000
+    assert parada["cv"] == pytest.approx((2 * 400**2 + 800**2) ** 0.5 / 3**0.5 / 1000)
+    # Σh² / 2Σh = (2·600² + 1800²) / 6000 = 660 s; ideal = 1000 / 2
+    assert parada["espera_media_s"] == pytest.approx(660)
+    assert parada["espera_excedente_s"] == pytest.approx(160)
+
+
+def test_mesmo_onibus_e_interrupcao_nao_contam():
+    passagens = pd.DataFrame(
+        {
+            "tipo_ponto": "terminal",
+            "letreiro_linha": "8000-10",
+            "id_linha": pd.NA,
+            "sentido": 1,
+            "id_ponto": 1,
+            "id_onibus": [1, 1, 2, 3],
+            "instante": pd.to_datetime(
+                ["2025-08-15 06:00", "2025-08-15 06:05", "2025-08-15 06:15", "2025-08-15 10:00"]
+            ),
+        }
+    ).astype(headways.TIPOS_PASSAGENS)
+
+    hw = headways.calcular_headways(passagens)
+
+    assert list(hw["headway_s"]) == [600]
+    assert headways.regularidade(hw).empty
+
+
+def test_partidas_de_terminal_vem_das_viagens():
+    viagens = pd.DataFrame(
+        {
+            "letreiro_linha": ["8000-10"] * 3,
+            "id_onibus": [1, 2, 3],
+            "sentido": [1, 1, 2],
+            "inicio": pd.to_datetime(["2025-08-15 06:00", "2025-08-15 06:12", "2025-08-15 06:20"]),
+            "inicio_no_terminal": [True, True, False],
+        }
+    )
+    passagens = headways.passagens_terminais(viagens)
+    assert list(passagens["id_onibus"]) == [1, 2]
+    assert list(headways.calcular_headways(passagens)["headway_s"]) == [720]
+
+
+def test_processa_dias_e_publica_gold(tmp_path):
+    silver, gold = tmp_path / "parquet", tmp_path / "gold"
+    for dia in ("2025-08-15", "2025-08-16"):
+        particao = silver / "previsoes" / f"dt={dia}"
+        particao.mkdir(parents=True)
+        _previsoes(dia).to_parquet(particao / "part-0.parquet", index=False)
+
+    dias = headways.particoes(str(silver))
+    resultado = headways.processar_dias(
+        dias, processos=1, parquet_dir=str(silver), gold_dir=str(gold), catalogo_path=str(tmp_path / "x.csv")
+    )
+
+    assert resultado == {"2025-08-15": 3, "2025-08-16": 3}
+    metricas = pd.read_parquet(gold / "regularidade" / "dt=2025-08-16" / "regularidade.parquet")
+    assert metricas["espera_excedente_s"].tolist() == pytest.approx([160, 160])
@@ -3,6 +3,8 @@
 import os
 import tempfile
 
+import pytest
+
 
 class TestRegistrarLinhagem:
     def test_registrar_e_consultar(self):
@@ -36,10 +38,14 @@ class TestRegistrarLinhagem:
             src.database.SQLITE_PATH = db_path
 
             try:
+                from src.linhagem import registrador
+
                 registrar_linhagem("test_asset", "posicoes", "bronze", 100, "ok")
+                assert registrador.descarregar() >= 1
                 conn2 = sqlite3.connect(db_path)
                 row = conn2.execute(
-                    "SELECT asset_name, table_name, layer, row_count, status FROM lineage_audit"
+                    "SELECT asset_name, table_name, layer, row_count, status FROM lineage_audit "
+                    "WHERE asset_name = 'test_asset'"
                 ).fetchone()
                 conn2.close()
                 assert row is not None
@@ -54,14 +60,134 @@ class TestRegistrarLinhagem:
                 if original_database_url is not None:
                     os.environ["DATABASE_URL"] = original_database_url
 
-    def test_registrar_sem_banco(self):
+    def test_registrar_sem_banco(self, tmp_path, monkeypatch):
         """Não deve levantar exceção se o banco não existir."""
+        import src.database
         from src.database import registrar_linhagem
 
+        monkeypatch.delenv("DATABASE_URL", raising=False)
+        monkeypatch.setattr(src.database, "DB_PATH", str(tmp_path / "nao_existe.db"))
+
         # Deve apenas logar warning, não levantar
         registrar_linhagem("test", "tabela", "bronze", 0, "ok")
 
-
+    def test_descarga_falha_reenfileira(self, tmp_path, monkeypatch):
+        """Banco sem schema: o lote volta para a fila em vez de ser perdido."""
+        import src.database
+        from src.linhagem import RegistradorLinhagem
+
+        monkeypatch.delenv("DATABASE_URL", raising=False)
+        monkeypatch.setattr(src.database, "DB_PATH", str(tmp_path / "vazio.db"))
+        registrador = RegistradorLinhagem(intervalo_s=3600)
+        registrador.registrar("a", "posicoes", "bronze", 1)
+
+        assert registrador.descarregar() == 0
+        assert registrador.pendentes() == 1
+
+
+@pytest.fixture
+def conn_linhagem(temp_db_path, monkeypatch):
+    """SQLite temporário com o schema de src.database (inclui lineage_audit)."""
+    import sqlite3
+
+    from src.database import schema_sql
+
+    monkeypatch.delenv("DATABASE_URL", raising=False)
+    conn = sqlite3.connect(temp_db_path)
+    tables, indexes = schema_sql()
+    for sql in tables + indexes:
+        conn.execute(sql)
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+class TestRegistradorLinhagem:
+    def _registrador(self, temp_db_path, monkeypatch, **kwargs):
+        import src.database
+        from src.linhagem import RegistradorLinhagem
+
+        monkeypatch.delenv("DATABASE_URL", raising=False)
+        monkeypatch.setattr(src.database, "DB_PATH", temp_db_path)
+        return RegistradorLinhagem(**kwargs)
+
+    def test_lote_em_uma_descarga(self, temp_db_path, conn_linhagem, monkeypatch):
+        """Eventos ficam em memória até a descarga, que grava todos de uma vez."""
+        registrador = self._registrador(temp_db_path, monkeypatch, intervalo_s=3600)
+        for i in range(10):
+            registrador.registrar(f"asset_{i % 2}", "posicoes", "bronze", i)
+
+        assert conn_linhagem.execute("SELECT count(*) FROM lineage_audit").fetchone()[0] == 0
+        assert registrador.pendentes() == 10
+        assert registrador.descarregar() == 10
+        assert registrador.pendentes() == 0
+        assert conn_linhagem.execute("SELECT count(*) FROM lineage_audit").fetchone()[0] == 10
+
+    def test_lote_cheio_acorda_thread(self, temp_db_path, conn_linhagem, monkeypatch):
+        """Atingir max_lote dispara a descarga em segundo plano, sem esperar o intervalo."""
+        import time
+
+        registrador = self._registrador(temp_db_path, monkeypatch, max_lote=3, intervalo_s=3600)
+        for i in range(3):
+            registrador.registrar("asset", "posicoes", "bronze", i)
+
+        limite = time.monotonic() + 5
+        while registrador.pendentes() and time.monotonic() < limite:
+            time.sleep(0.01)
+        time.sleep(0.05)
+        assert conn_linhagem.execute("SELECT count(*) FROM lineage_audit").fetchone()[0] == 3
+
+    def test_descarga_vai_para_o_banco_do_registro(self, temp_db_path, conn_linhagem, tmp_path, monkeypatch):
+        """Trocar DB_PATH depois de enfileirar não desvia os eventos para o banco novo."""
+        import src.database
+
+        registrador = self._registrador(temp_db_path, monkeypatch, intervalo_s=3600)
+        registrador.registrar("asset", "posicoes", "bronze", 1)
+        monkeypatch.setattr(src.database, "DB_PATH", str(tmp_path / "outro.db"))
+
+        assert registrador.descarregar() == 1
+        assert conn_linhagem.execute("SELECT count(*) FROM lineage_audit").fetchone()[0] == 1
+        assert not (tmp_path / "outro.db").exists()
+
+    def test_ultima_execucao_por_asset(self, conn_linhagem):
+        """Consulta devolve só a execução mais recente de cada asset."""
+        from src.linhagem import ultima_execucao, ultima_execucao_por_asset
+
+        conn_linhagem.executemany(
+            "INSERT INTO lineage_audit (asset_name, table_name, layer, run_timestamp, row_count, status) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                ("compactar_posicoes", "posicoes", "silver", "2025-08-01T02:00:00", 10, "ok"),
+                ("compactar_posicoes", "posicoes", "silver", "2025-08-02T02:00:00", 20, "ok"),
+                ("posicoes_sptrans", "posicoes", "bronze", "2025-08-02T10:00:00", 5, "falha"),
+            ],
+        )
+        conn_linhagem.commit()
+
+        ultimas = ultima_execucao_por_asset(conn_linhagem)
+        assert [(u["asset_name"], u["row_count"]) for u in ultimas] == [
+            ("compactar_posicoes", 20),
+            ("posicoes_sptrans", 5),
+        ]
+        assert ultima_execucao(conn_linhagem, "compactar_posicoes")["run_timestamp"] == "2025-08-02T02:00:00"
+        assert ultima_execucao(conn_linhagem, "inexistente") is None
+
+    def test_indice_no_schema(self, conn_linhagem):
+        """Índice (asset_name, run_timestamp) faz parte do schema."""
+        nomes = {r[0] for r in conn_linhagem.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        assert "idx_lineage_asset_ts" in nomes
+
+
+@pytest.fixture
+def banco_vazio(tmp_path, monkeypatch):
+    """DB_PATH temporário: os assets contam linhas e enfileiram linhagem fora de ./data."""
+    import src.database
+
+    monkeypatch.delenv("DATABASE_URL", raising=False)
+    monkeypatch.setattr(src.database, "DB_PATH", str(tmp_path / "sptrans_data.db"))
+
+
+@pytest.mark.usefixtures("banco_vazio")
 class TestAssetsMetadata:
     def test_assets_posicoes_metadata(self):
         """Asset posicoes_sptrans retorna Output com metadata."""
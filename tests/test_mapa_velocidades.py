@@ -0,0 +1,97 @@
+"""Testes do mapa de velocidades por célula geohash e janela (src/mapa_velocidades.py)."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src import mapa_velocidades as mv
+
+M_POR_GRAU = 111_195.08
+INICIO = pd.Timestamp("2025-08-15 06:00:00")
+
+
+def _posicoes(onibus, latitudes, minutos, letreiro="8000-10", longitude=-46.63, inicio=INICIO):
+    return pd.DataFrame(
+        {
+            "timestamp_coleta": inicio + pd.to_timedelta(minutos, unit="min"),
+            "id_onibus": onibus,
+            "letreiro_linha": letreiro,
+            "latitude": latitudes,
+            "longitude": longitude,
+            "timestamp_posicao": None,
+        }
+    )
+
+
+def test_geohash_inteiro_e_texto():
+    celulas = mv.geohash([57.64911, -23.55], [10.40744, -46.63], precisao=11)
+
+    assert list(mv.geohash_texto(celulas, precisao=11)) == ["u4pruydqqvj", "6gyf4bv561z"]
+    # Prefixo: a célula de precisão 7 é a de precisão 11 sem os 20 bits finais
+    assert (mv.geohash([57.64911, -23.55], [10.40744, -46.63]) == celulas >> 20).all()
+    lat, lon = mv.centro_celula(celulas, precisao=11)
+    assert lat == pytest.approx([57.64911, -23.55], abs=1e-5)
+    assert lon == pytest.approx([10.40744, -46.63], abs=1e-5)
+
+
+def test_velocidade_entre_posicoes_consecutivas():
+    posicoes = pd.concat(
+        [
+            # 0,01° por minuto (~67 km/h), depois 20 min sem coleta
+            _posicoes(1, [-23.60, -23.59, -23.58, -23.50], [0, 1, 2, 22]),
+            # Parado, depois GPS saltando ~11 km em 1 min
+            _posicoes(2, [-23.55, -23.55, -23.45], [0, 2, 3]),
+            # Mesmo ônibus reaparece em outra linha: não é um passo
+            _posicoes(1, [-23.40], [3], letreiro="9000-10"),
+        ],
+        ignore_index=True,
+    )
+
+    passos = mv.velocidades_instantaneas(mv.preparar_pontos(posicoes))
+
+    assert passos["id_onibus"].tolist() == [1, 1, 2]
+    assert passos["velocidade_kmh"].to_numpy() == pytest.approx([0.01 * M_POR_GRAU * 60 / 1000] * 2 + [0], rel=1e-3)
+    # Ponto e instante médios do passo
+    assert passos["latitude"].iloc[0] == pytest.approx(-23.595)
+    assert passos["instante"].iloc[0] == INICIO + pd.Timedelta(seconds=30)
+
+
+def test_agrega_por_janela_e_celula():
+    passos = pd.DataFrame(
+        {
+            "id_onibus": [1, 1, 2, 3],
+            "instante": INICIO + pd.to_timedelta([1, 14, 5, 16], unit="min"),
+            "latitude": [-23.5500, -23.5501, -23.5502, -23.5500],
+            "longitude": -46.6300,
+            "velocidade_kmh": [10.0, 20.0, 60.0, 5.0],
+        }
+    )
+
+    metricas = mv.agregar_celulas(passos)
+
+    assert list(metricas.columns) == list(mv.TIPOS_VELOCIDADES)
+    assert metricas["janela"].tolist() == [INICIO, INICIO + pd.Timedelta(minutes=15)]
+    assert metricas["celula"].nunique() == 1
+    assert metricas[["n_amostras", "n_onibus"]].values.tolist() == [[3, 2], [1, 1]]
+    assert metricas["velocidade_media_kmh"].tolist() == pytest.approx([30, 5])
+    assert metricas["velocidade_mediana_kmh"].tolist() == pytest.approx([20, 5])
+    assert mv.agregar_celulas(passos.iloc[:0]).dtypes.to_dict() == metricas.dtypes.to_dict()
+
+
+def test_processa_dias_e_publica(tmp_path):
+    silver, gold = tmp_path / "parquet", tmp_path / "gold"
+    for dia in ("2025-08-15", "2025-08-16"):
+        particao = silver / "posicoes" / f"dt={dia}"
+        particao.mkdir(parents=True)
+        _posicoes(
+            1, np.linspace(-23.60, -23.50, 31), np.arange(31), inicio=pd.Timestamp(dia) + pd.Timedelta("6h")
+        ).to_parquet(particao / "part-0.parquet", index=False)
+
+    dias = mv.particoes_posicoes(str(silver))
+    resultado = mv.processar_dias(dias, processos=1, parquet_dir=str(silver), gold_dir=str(gold))
+
+    metricas = pd.read_parquet(gold / "velocidades" / "dt=2025-08-16" / mv.ARQUIVO_VELOCIDADES)
+    assert resultado == {"2025-08-15": len(metricas), "2025-08-16": len(metricas)}
+    assert metricas["n_amostras"].sum() == 30
+    assert metricas["janela"].nunique() == 2
+    assert metricas[["janela", "celula"]].apply(tuple, axis=1).is_monotonic_increasing
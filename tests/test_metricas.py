@@ -0,0 +1,128 @@
+"""Testes do registro de métricas (formato Prometheus) e da instrumentação dos coletores."""
+
+import urllib.request
+from unittest.mock import MagicMock
+
+import pytest
+
+from src import metricas
+
+
+@pytest.fixture(autouse=True)
+def metricas_zeradas():
+    metricas.limpar()
+    yield
+    metricas.limpar()
+
+
+def test_contador_e_medidor_no_formato_prometheus():
+    """Séries rotuladas aparecem com HELP/TYPE e valores acumulados."""
+    metricas.LINHAS_INSERIDAS.inc(3, tabela="posicoes")
+    metricas.LINHAS_INSERIDAS.inc(2, tabela="posicoes")
+    metricas.COMPACTACAO_TAXA.definir(1500.5, tabela="previsoes")
+
+    texto = metricas.expor()
+    assert "# TYPE sptrans_linhas_inseridas_total counter" in texto
+    assert 'sptrans_linhas_inseridas_total{tabela="posicoes"} 5' in texto
+    assert 'sptrans_compactacao_linhas_por_segundo{tabela="previsoes"} 1500.5' in texto
+
+
+def test_histograma_buckets_cumulativos():
+    """Buckets são cumulativos, com +Inf, _sum e _count."""
+    h = metricas.histograma("teste_duracao_segundos", "Teste.", ["etapa"], buckets=(0.1, 1))
+    h.observar(0.05, etapa="a")
+    h.observar(0.5, etapa="a")
+    h.observar(5, etapa="a")
+
+    texto = h.expor()
+    assert 'teste_duracao_segundos_bucket{etapa="a",le="0.1"} 1' in texto
+    assert 'teste_duracao_segundos_bucket{etapa="a",le="1"} 2' in texto
+    assert 'teste_duracao_segundos_bucket{etapa="a",le="+Inf"} 3' in texto
+    assert 'teste_duracao_segundos_count{etapa="a"} 3' in texto
+    assert h.valor(etapa="a") == (3, 5.55)
+
+
+def test_rotulos_invalidos_e_contador_negativo():
+    with pytest.raises(ValueError):
+        metricas.LINHAS_INSERIDAS.inc(1, coletor="x")
+    with pytest.raises(ValueError):
+        metricas.LINHAS_INSERIDAS.inc(-1, tabela="posicoes")
+
+
+def test_servidor_http_e_textfile(tmp_path):
+    """/metrics responde com o texto do registro; o textfile é gravado em <dir>/<nome>.prom."""
+    metricas.API_ERROS.inc(endpoint="/Posicao")
+    servidor = metricas.iniciar_servidor(porta=0, endereco="127.0.0.1")
+    try:
+        url = f"http://127.0.0.1:{servidor.server_address[1]}/metrics"
+        with urllib.request.urlopen(url, timeout=5) as resp:
+            corpo = resp.read().decode()
+            assert resp.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+    finally:
+        servidor.shutdown()
+    assert 'sptrans_api_erros_total{endpoint="/Posicao"} 1' in corpo
+
+    caminho = metricas.gravar_textfile("coleta", diretorio=str(tmp_path))
+    assert caminho == str(tmp_path / "coleta.prom")
+    assert (tmp_path / "coleta.prom").read_text() == metricas.expor()
+    assert metricas.iniciar_servidor(porta="") is None
+
+
+def test_servidor_escuta_na_loopback_salvo_configuracao(monkeypatch):
+    """Sem endereço, /metrics fica em 127.0.0.1; SPTRANS_METRICAS_ENDERECO abre para outras interfaces."""
+    monkeypatch.delenv("SPTRANS_METRICAS_ENDERECO", raising=False)
+    monkeypatch.setenv("SPTRANS_METRICAS_PORTA", "0")
+    enderecos = []
+    for endereco in (None, "0.0.0.0"):
+        if endereco:
+            monkeypatch.setenv("SPTRANS_METRICAS_ENDERECO", endereco)
+        servidor = metricas.iniciar_servidor()
+        enderecos.append(servidor.server_address[0])
+        servidor.shutdown()
+        servidor.server_close()
+
+    assert enderecos == ["127.0.0.1", "0.0.0.0"]
+
+
+def test_job_posicoes_registra_vistos_mantidos_e_inseridos(temp_db_connection, temp_db_path, tmp_path, monkeypatch):
+    """Um ciclo de posições alimenta latência, bytes, vistos × mantidos, inseridos e escrita no banco."""
+    import src.coleta_sptrans as coleta
+    import src.database
+
+    dados = {
+        "l": [
+            {"c": "8000-10", "vs": [{"p": 1, "py": -23.5, "px": -46.6, "ta": "2025-08-15T10:00:00Z"}]},
+            {"c": "9999-10", "vs": [{"p": 2, "py": -23.5, "px": -46.6, "ta": "2025-08-15T10:00:00Z"}] * 3},
+        ]
+    }
+    resp = MagicMock(content=b"x" * 1234)
+    resp.json.return_value = dados
+    session = MagicMock()
+    session.get.return_value = resp
+
+    monkeypatch.delenv("DATABASE_URL", raising=False)
+    monkeypatch.setattr(src.database, "DB_PATH", temp_db_path)
+    monkeypatch.setenv("SPTRANS_ARQUIVO_DIR", str(tmp_path / "bruto"))
+    monkeypatch.setattr(coleta, "get_config", lambda: {"SPTRANS": {"TOKEN": "t"}})
+    monkeypatch.setattr(coleta, "autenticar", lambda token, s: True)
+    monkeypatch.setattr(coleta.requests, "Session", lambda: session)
+    monkeypatch.setattr(coleta, "datetime", _DatetimeFixo)
+
+    assert coleta.job({"8000-10"}) == 1
+    assert metricas.VEICULOS_VISTOS.valor(coletor="posicoes") == 4
+    assert metricas.VEICULOS_MANTIDOS.valor(coletor="posicoes") == 1
+    assert metricas.LINHAS_INSERIDAS.valor(tabela="posicoes") == 1
+    assert metricas.API_BYTES.valor(endpoint="/Posicao") == (1, 1234)
+    assert metricas.API_LATENCIA.valor(endpoint="/Posicao")[0] == 1
+    assert metricas.DB_ESCRITA.valor(tabela="posicoes")[0] == 1
+    assert metricas.CICLO.valor(coletor="posicoes")[0] == 1
+
+
+class _DatetimeFixo:
+    """datetime.now() dentro do horário de coleta."""
+
+    @staticmethod
+    def now():
+        from datetime import datetime
+
+        return datetime(2025, 8, 15, 10, 0, 0)
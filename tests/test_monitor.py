@@ -0,0 +1,148 @@
+"""Testes do robô fiscal — batimento `ultimo_lote`, lotes vazios/parciais e de-duplicação de alertas."""
+
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytest
+
+import src.database
+from src import monitor
+from src.database import get_connection, registrar_lote, ultimos_lotes
+
+
+@pytest.fixture
+def banco(temp_db_path, monkeypatch):
+    monkeypatch.delenv("DATABASE_URL", raising=False)
+    monkeypatch.setattr(src.database, "DB_PATH", temp_db_path)
+    return temp_db_path
+
+
+def _registrar(tabela, timestamp, esperados, inseridos):
+    with get_connection() as conn:
+        registrar_lote(conn, tabela, timestamp, esperados, inseridos)
+
+
+def _sem_lote(tabela):
+    return f"ALERTA: Nenhum ciclo de coleta registrado para a tabela '{tabela}'."
+
+
+def test_registrar_lote_upsert_e_media(banco):
+    """Uma linha por tabela; ciclos vazios não puxam a média de esperados."""
+    agora = datetime(2025, 8, 15, 10, 0)
+    _registrar("posicoes", agora, 100, 100)
+    _registrar("posicoes", agora + timedelta(minutes=5), 200, 200)
+    _registrar("posicoes", agora + timedelta(minutes=10), 0, 0)
+
+    with get_connection() as conn:
+        lotes = ultimos_lotes(conn)
+    assert list(lotes) == ["posicoes"]
+    assert lotes["posicoes"]["timestamp_coleta"] == (agora + timedelta(minutes=10)).isoformat()
+    assert lotes["posicoes"]["inseridos"] == 0
+    assert lotes["posicoes"]["esperados_media"] == pytest.approx(110)
+
+
+def test_verificacoes(banco):
+    """Frescor, lote vazio, parcial (inseridos × esperados) e parcial (esperados × média)."""
+    agora = datetime.now()
+    _registrar("posicoes", agora - timedelta(minutes=90), 100, 0)
+    _registrar("previsoes", agora, 100, 100)
+    _registrar("previsoes", agora, 30, 30)  # média ~93: ciclo bem abaixo do habitual
+
+    problemas = monitor.verificar()
+    assert set(problemas) == {"dados_velhos:posicoes", "lote_vazio:posicoes", "lote_parcial:previsoes"}
+
+    _registrar("posicoes", agora, 100, 40)
+    assert "lote_parcial:posicoes" in monitor.verificar()
+
+
+def test_sem_batimento(banco):
+    assert set(monitor.verificar()) == {"sem_lote:posicoes", "sem_lote:previsoes"}
+
+
+def test_alertas_deduplicados():
+    """Problema persistente só é reenviado após o intervalo; resolução é reportada uma vez."""
+    alertas = monitor.Alertas(reenvio_minutos=60)
+    problema = {"lote_vazio:posicoes": "vazio"}
+
+    assert alertas.filtrar(problema, agora=0) == (problema, {})
+    assert alertas.filtrar(problema, agora=600) == ({}, {})
+    assert alertas.filtrar(problema, agora=3600) == (problema, {})
+    # A mensagem mudou sem reenvio: o resolvido leva a última vista
+    assert alertas.filtrar({"lote_vazio:posicoes": "ainda vazio"}, agora=3650) == ({}, {})
+    assert alertas.filtrar({}, agora=3700) == ({}, {"lote_vazio:posicoes": "ainda vazio"})
+    assert alertas.filtrar({}, agora=3800) == ({}, {})
+
+
+def test_rodada_envia_apenas_mudancas(banco, monkeypatch):
+    enviados = []
+    monkeypatch.setattr(monitor, "enviar_alerta_email", lambda p, r=(): enviados.append((p, list(r))))
+    alertas = monitor.Alertas()
+
+    monitor.rodada(alertas)
+    monitor.rodada(alertas)
+    assert len(enviados) == 1
+
+    _registrar("posicoes", datetime.now(), 10, 10)
+    _registrar("previsoes", datetime.now(), 10, 10)
+    monitor.rodada(alertas)
+    assert enviados[-1] == ([], [_sem_lote("posicoes"), _sem_lote("previsoes")])
+
+
+def test_uma_vez_deduplica_entre_execucoes(banco, monkeypatch):
+    """Cada execução do cron é um processo novo: o estado dos alertas vem de `alertas_ativos`."""
+    enviados = []
+    monkeypatch.setattr(monitor, "enviar_alerta_email", lambda p, r=(): enviados.append((p, list(r))))
+
+    monitor.rodada(monitor.Alertas(persistente=True))
+    monitor.rodada(monitor.Alertas(persistente=True))
+    assert len(enviados) == 1
+
+    _registrar("posicoes", datetime.now(), 10, 10)
+    monitor.rodada(monitor.Alertas(persistente=True))
+    assert enviados[-1] == ([], [_sem_lote("posicoes")])
+    with get_connection() as conn:
+        assert list(src.database.ler_alertas_ativos(conn)) == ["sem_lote:previsoes"]
+
+
+def test_alertas_ativos_de_versao_anterior_sem_mensagem(banco):
+    """Tabela antiga (sem `mensagem`) ganha a coluna; o resolvido dela sai com a chave."""
+    with get_connection() as conn:
+        conn.execute("CREATE TABLE alertas_ativos (chave TEXT PRIMARY KEY, notificado_em DOUBLE PRECISION NOT NULL)")
+        conn.execute("INSERT INTO alertas_ativos VALUES ('lote_vazio:posicoes', 0)")
+
+    alertas = monitor.Alertas(persistente=True)
+    alertas.carregar()
+    assert alertas.filtrar({"sem_lote:previsoes": "sem ciclo"}, agora=60) == (
+        {"sem_lote:previsoes": "sem ciclo"},
+        {"lote_vazio:posicoes": "lote_vazio:posicoes"},
+    )
+    alertas.salvar()
+    with get_connection() as conn:
+        assert src.database.ler_alertas_ativos(conn) == {"sem_lote:previsoes": (60, "sem ciclo")}
+
+
+def test_gps_atrasado_na_frota_atual(banco):
+    """Maioria da frota do último ciclo com GPS velho: a API está servindo posições congeladas."""
+    from src.database import inserir_lote, schema_sql
+
+    ciclo = datetime.now().replace(microsecond=0)
+    colunas = ["timestamp_coleta", "id_onibus", "letreiro_linha", "latitude", "longitude", "timestamp_posicao"]
+    # Horário local de São Paulo (UTC-3) → UTC do GPS: 1 ônibus em dia, 2 com 40 min de atraso
+    utc = ciclo + timedelta(hours=3)
+    gps = [utc, utc - timedelta(minutes=40), utc - timedelta(minutes=40)]
+    tabelas, indices = schema_sql()
+    with get_connection() as conn:
+        for sql in [*tabelas, *indices]:
+            conn.execute(sql)
+        registros = [(ciclo, i, "8000-10", -23.55, -46.63, g.isoformat() + "Z") for i, g in enumerate(gps)]
+        inserir_lote(conn, "posicoes", colunas, registros)
+    _registrar("posicoes", ciclo, 3, 3)
+    _registrar("previsoes", ciclo, 3, 3)
+
+    problemas = monitor.verificar()
+    assert set(problemas) == {"gps_atrasado:posicoes"}
+    assert "2 de 3 ônibus" in problemas["gps_atrasado:posicoes"]
+
+    problemas = {}
+    monitor.verificar_gps_atrasado(pd.Series([1.0, 40.0, 2.0]), problemas)
+    assert problemas == {}
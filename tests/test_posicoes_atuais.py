@@ -0,0 +1,97 @@
+"""Testes da tabela `posicoes_atuais` e da cópia em memória (src/posicoes_atuais.py)."""
+
+import sqlite3
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+import src.database
+from src import posicoes_atuais as pa
+from src.database import _schema_sqlite, get_connection, inserir_lote, ler_posicoes_atuais
+
+COLUNAS = ["timestamp_coleta", "id_onibus", "letreiro_linha", "latitude", "longitude", "timestamp_posicao"]
+CICLO_1 = datetime(2025, 8, 15, 10, 0)
+CICLO_2 = datetime(2025, 8, 15, 10, 5)
+
+
+def _registros(ciclo, onibus, letreiro="8000-10", latitude=-23.55, ta="2025-08-15T12:59:30Z"):
+    return [(ciclo, o, letreiro, latitude, -46.63, ta) for o in onibus]
+
+
+@pytest.fixture(params=[False, True], ids=["normal", "compacto"])
+def banco(request, temp_db_path, monkeypatch):
+    monkeypatch.delenv("DATABASE_URL", raising=False)
+    monkeypatch.setattr(src.database, "DB_PATH", temp_db_path)
+    tabelas, indices = _schema_sqlite(compacto=request.param)
+    with sqlite3.connect(temp_db_path) as conn:
+        for sql in [*tabelas, *indices]:
+            conn.execute(sql)
+    return temp_db_path
+
+
+def _atuais():
+    with get_connection() as conn:
+        return {linha[0]: linha[1:] for linha in ler_posicoes_atuais(conn)}
+
+
+def test_upsert_na_mesma_transacao(banco):
+    with get_connection() as conn:
+        inserir_lote(conn, "posicoes", COLUNAS, _registros(CICLO_1, [1, 2]))
+        inserir_lote(conn, "posicoes", COLUNAS, _registros(CICLO_2, [1], letreiro="917H-10", latitude=-23.56))
+
+    atuais = _atuais()
+    assert set(atuais) == {1, 2}
+    assert atuais[1][1:3] == ("917H-10", -23.56)
+    assert atuais[2][1:3] == ("8000-10", -23.55)
+
+    # Replay de um ciclo antigo com ônibus novo: o 1 não volta no tempo, o 3 entra
+    with get_connection() as conn:
+        inserir_lote(conn, "posicoes", COLUNAS, _registros(datetime(2025, 8, 15, 9, 0), [1, 3]))
+    atuais = _atuais()
+    assert atuais[1][1] == "917H-10"
+    assert 3 in atuais
+
+    # Falha na transação desfaz o append e o upsert juntos
+    with pytest.raises(RuntimeError), get_connection() as conn:
+        inserir_lote(conn, "posicoes", COLUNAS, _registros(datetime(2025, 8, 15, 11, 0), [1, 4]))
+        raise RuntimeError("falha depois do INSERT")
+    atuais = _atuais()
+    assert 4 not in atuais
+    assert atuais[1][1] == "917H-10"
+
+
+def test_copia_em_memoria_relida_so_com_lote_novo(banco, monkeypatch):
+    leituras = []
+    ler = pa.ler_posicoes_atuais
+    monkeypatch.setattr(pa, "ler_posicoes_atuais", lambda conn: leituras.append(1) or ler(conn))
+    frota = pa.FrotaAtual(intervalo_verificacao_s=0)
+    with get_connection() as conn:
+        inserir_lote(conn, "posicoes", COLUNAS, _registros(CICLO_1, [1, 2]))
+
+    assert sorted(frota.posicoes()["id_onibus"]) == [1, 2]
+    assert len(frota.posicoes()) == 2
+    assert len(leituras) == 1
+
+    with get_connection() as conn:
+        inserir_lote(conn, "posicoes", COLUNAS, _registros(CICLO_2, [3], letreiro="917H-10"))
+        inserir_lote(conn, "posicoes", COLUNAS, _registros(CICLO_2, [3], letreiro="917H-10"))  # duplicado
+    df = frota.posicoes(letreiros=["917H-10"])
+    assert df["id_onibus"].tolist() == [3]
+    assert df["timestamp_coleta"].iloc[0] == pd.Timestamp(CICLO_2)
+    assert len(leituras) == 2
+
+
+def test_atraso_do_gps_no_ultimo_ciclo(banco):
+    with get_connection() as conn:
+        inserir_lote(conn, "posicoes", COLUNAS, _registros(CICLO_1, [1], ta="2025-08-15T11:00:00Z"))
+        # 10:05 em São Paulo = 13:05 UTC
+        inserir_lote(conn, "posicoes", COLUNAS, _registros(CICLO_2, [2], ta="2025-08-15T13:04:00Z"))
+        inserir_lote(conn, "posicoes", COLUNAS, _registros(CICLO_2, [3], ta="2025-08-15T12:35:00Z"))
+        inserir_lote(conn, "posicoes", COLUNAS, _registros(CICLO_2, [4], ta=None))
+
+    atraso = pa.FrotaAtual(intervalo_verificacao_s=0).atraso_gps_min()
+
+    assert atraso.loc[[2, 3]].tolist() == pytest.approx([1, 30])
+    assert pd.isna(atraso.loc[4])
+    assert 1 not in atraso.index
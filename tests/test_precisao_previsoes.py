@@ -0,0 +1,133 @@
+"""Testes da precisão das previsões de chegada (src/precisao_previsoes.py)."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import src.database
+from src import precisao_previsoes as pp
+from src.database import get_connection, ler_paradas, registrar_paradas
+
+LINHA = 2160
+PARADA = 700016
+LONGE = 700099  # fora do trajeto
+INICIO = pd.Timestamp("2025-08-15 06:00:00")
+# Ônibus 1 desce de -23.50 a -23.60 (lon -46.60) em 60 min, uma posição a cada 5 min
+PARADAS = pd.DataFrame({"id_parada": [PARADA, LONGE], "latitude": [-23.5537, -23.55], "longitude": [-46.60, -46.70]})
+# Parada a 0,444 do trecho 06:30 → 06:35: chegada às 06:32:13
+CHEGADA = pd.Timestamp("2025-08-15 06:32:13")
+
+
+def _posicoes(dia=INICIO):
+    frac = np.linspace(0, 1, 13)
+    return pd.DataFrame(
+        {
+            "timestamp_coleta": dia + pd.to_timedelta(frac * 60, unit="min"),
+            "id_onibus": 1,
+            "letreiro_linha": "8000-10",
+            "latitude": -23.50 - 0.10 * frac,
+            "longitude": -46.60,
+            "timestamp_posicao": None,
+        }
+    )
+
+
+def _previsoes(dia=INICIO):
+    registros = [
+        (dia + pd.Timedelta(minutes=10), LINHA, 1, PARADA, "06:30"),
+        (dia + pd.Timedelta(minutes=20), LINHA, 1, PARADA, "06:33"),
+        (dia + pd.Timedelta(minutes=30), LINHA, 1, PARADA, "06:32"),
+        # Coletada depois da chegada observada: não é avaliada
+        (dia + pd.Timedelta(minutes=35), LINHA, 1, PARADA, "06:36"),
+        (dia + pd.Timedelta(minutes=10), LINHA, 1, LONGE, "06:40"),
+    ]
+    return pd.DataFrame(
+        registros, columns=["timestamp_coleta", "id_linha", "id_onibus", "id_parada", "horario_previsao"]
+    )
+
+
+def _chegadas():
+    from src.headways import visitas_previsoes
+
+    visitas = visitas_previsoes(_previsoes())
+    return visitas, pp.inferir_chegadas(visitas, pp.trajetos(_posicoes()), PARADAS)
+
+
+def test_chegada_pela_maior_aproximacao_interpolada():
+    visitas, chegadas = _chegadas()
+
+    # Só a parada no trajeto tem chegada; a outra fica a ~10 km
+    assert len(chegadas) == 1
+    chegada = chegadas.iloc[0]
+    assert abs(chegada["chegada_real"] - CHEGADA) <= pd.Timedelta(seconds=1)
+    assert chegada["distancia_parada_m"] < 1
+
+
+def test_primeira_passagem_vence_retorno_posterior():
+    """O ônibus volta mais perto da parada depois: vale a primeira passagem pelo raio."""
+    ida = _posicoes()
+    volta = _posicoes(INICIO + pd.Timedelta(minutes=65)).iloc[::-1]
+    volta["timestamp_coleta"] = INICIO + pd.to_timedelta(np.linspace(65, 125, 13), unit="min")
+    visitas = pd.DataFrame(
+        {
+            "timestamp_coleta": [INICIO + pd.Timedelta(minutes=10)],
+            "id_linha": LINHA,
+            "id_parada": PARADA,
+            "id_onibus": 1,
+            "previsto": [INICIO + pd.Timedelta(minutes=30)],
+            "visita": 0,
+            "fim_visita": True,
+        }
+    )
+    chegadas = pp.inferir_chegadas(visitas, pp.trajetos(pd.concat([ida, volta])), PARADAS, margem_min=120)
+    assert abs(chegadas.iloc[0]["chegada_real"] - CHEGADA) <= pd.Timedelta(seconds=1)
+
+
+def test_avaliacao_erro_por_horizonte():
+    visitas, chegadas = _chegadas()
+    avaliadas = pp.avaliar(visitas, chegadas)
+
+    assert list(avaliadas["timestamp_coleta"].dt.strftime("%H:%M")) == ["06:10", "06:20", "06:30"]
+    # erro = chegada − previsto: +133 s, −47 s, +13 s
+    assert avaliadas["erro_s"].tolist() == pytest.approx([133, -47, 13], abs=1)
+    assert list(avaliadas["faixa_horizonte"]) == ["20-30", "10-15", "2-5"]
+
+    resumo = pp.resumir(avaliadas)
+    assert list(resumo["faixa_horizonte"]) == ["10-15", "2-5", "20-30"]
+    assert resumo.set_index("faixa_horizonte").loc["20-30", "pct_acerto"] == 0
+    assert resumo.set_index("faixa_horizonte").loc["2-5", "pct_acerto"] == 100
+
+
+def test_faixas_de_horizonte():
+    assert list(pp.faixa_horizonte([-30, 0, 119, 120, 3600, 7200])) == [None, "0-2", "0-2", "2-5", "60+", "60+"]
+
+
+def test_paradas_no_banco(temp_db_path, monkeypatch):
+    monkeypatch.delenv("DATABASE_URL", raising=False)
+    monkeypatch.setattr(src.database, "DB_PATH", temp_db_path)
+    with get_connection() as conn:
+        registrar_paradas(conn, [(PARADA, "PARADA A", -23.5, -46.6), (LONGE, None, -23.55, -46.70)])
+        registrar_paradas(conn, [(PARADA, "PARADA A", -23.5537, -46.6)])
+        assert ler_paradas(conn)[0] == (PARADA, "PARADA A", -23.5537, -46.6)
+
+    paradas = pp.carregar_paradas()
+    assert list(paradas.columns) == ["id_parada", "latitude", "longitude"]
+    assert len(paradas) == 2
+
+
+def test_processa_dias_e_publica_gold(tmp_path):
+    silver, gold = tmp_path / "parquet", tmp_path / "gold"
+    for dia in (INICIO, INICIO + pd.Timedelta(days=1)):
+        for tabela, df in (("posicoes", _posicoes(dia)), ("previsoes", _previsoes(dia))):
+            particao = silver / tabela / f"dt={dia:%Y-%m-%d}"
+            particao.mkdir(parents=True)
+            df.to_parquet(particao / "part-0.parquet", index=False)
+
+    dias = pp.particoes_previsoes(str(silver))
+    resultado = pp.processar_dias(
+        dias, PARADAS, processos=1, parquet_dir=str(silver), gold_dir=str(gold), catalogo_path="x.csv"
+    )
+
+    assert resultado == {"2025-08-15": 3, "2025-08-16": 3}
+    avaliadas = pd.read_parquet(gold / "previsoes_avaliadas" / "dt=2025-08-16" / "previsoes_avaliadas.parquet")
+    assert avaliadas["chegada_real"].iloc[0].strftime("%Y-%m-%d %H:%M") == "2025-08-16 06:32"
@@ -0,0 +1,81 @@
+"""Testes dos spans de rastreamento: etapas, log JSON e cProfile opcional."""
+
+import json
+import logging
+import pstats
+
+import pytest
+
+from src import rastreamento
+from src.rastreamento import coletar_etapas, rastrear, resumo_etapas, span
+
+
+@pytest.fixture(autouse=True)
+def sem_handler_json():
+    """Cada teste começa sem o handler JSON instalado por testes anteriores."""
+    yield
+    for handler in list(rastreamento.logger.handlers):
+        rastreamento.logger.removeHandler(handler)
+    rastreamento.logger.propagate = True
+
+
+def test_coletar_etapas_soma_repeticoes_e_aninhamento():
+    """Spans repetidos somam; spans aninhados aparecem por nome próprio."""
+
+    @rastrear("etapa.decorada")
+    def trabalho():
+        with span("etapa.interna"):
+            return 42
+
+    with coletar_etapas() as etapas:
+        assert trabalho() == 42
+        assert trabalho() == 42
+    assert set(etapas) == {"etapa.decorada", "etapa.interna"}
+    assert etapas["etapa.decorada"] >= etapas["etapa.interna"] >= 0
+    assert list(resumo_etapas({"b": 1.234567, "a": 2.0})) == ["a", "b"]
+
+    # Fora do bloco nada é acumulado
+    with span("etapa.solta"):
+        pass
+    assert "etapa.solta" not in etapas
+
+
+def test_log_json_com_pai_e_status(monkeypatch, capsys):
+    """Com SPTRANS_TRACE=1 cada span vira uma linha JSON com pai, duração e status."""
+    monkeypatch.setenv("SPTRANS_TRACE", "1")
+
+    with pytest.raises(RuntimeError):
+        with span("externo", tabela="posicoes"):
+            with span("interno"):
+                raise RuntimeError("falhou")
+
+    linhas = [json.loads(linha) for linha in capsys.readouterr().err.strip().splitlines()]
+    assert [(r["span"], r["pai"], r["status"]) for r in linhas] == [
+        ("interno", "externo", "erro"),
+        ("externo", None, "erro"),
+    ]
+    assert linhas[1]["tabela"] == "posicoes"
+    assert linhas[0]["duracao_ms"] >= 0 and "ts" in linhas[0]
+
+
+def test_sem_trace_nao_loga(monkeypatch, caplog):
+    monkeypatch.delenv("SPTRANS_TRACE", raising=False)
+    with caplog.at_level(logging.DEBUG, logger="sptrans.trace"):
+        with span("silencioso"):
+            pass
+    assert caplog.records == []
+
+
+def test_perfil_grava_prof_so_no_span_externo(tmp_path, monkeypatch):
+    """Com SPTRANS_PROFILE, o span marcado com perfil=True grava um .prof (sem aninhar perfiladores)."""
+    monkeypatch.setenv("SPTRANS_PROFILE", str(tmp_path))
+
+    @rastrear("raiz", perfil=True)
+    def raiz():
+        with span("filho", perfil=True):
+            return sum(range(1000))
+
+    raiz()
+    arquivos = list(tmp_path.glob("*.prof"))
+    assert [a.name.split("-")[0] for a in arquivos] == ["raiz"]
+    assert pstats.Stats(str(arquivos[0])).total_calls > 0
@@ -0,0 +1,87 @@
+"""Testes da reconciliação Bronze ↔ Silver por dia (src/reconciliacao.py)."""
+
+import json
+import os
+
+import duckdb
+import pytest
+
+import src.compactar_parquet as cp
+from src import reconciliacao
+
+
+@pytest.fixture
+def bronze_silver(temp_db_connection, temp_db_path, tmp_path, monkeypatch):
+    """Bronze com 3 dias (15, 16, 17); Silver exportado para 15 e 16 via compactação."""
+    monkeypatch.delenv("DATABASE_URL", raising=False)
+    monkeypatch.setattr(cp, "DB_PATH", temp_db_path)
+    monkeypatch.setattr(cp, "PARQUET_DIR", str(tmp_path / "parquet"))
+
+    linhas = [
+        ("2025-08-15 10:00:00", 1001),
+        ("2025-08-15 23:59:59", 1002),
+        ("2025-08-16 00:00:00", 1001),
+        ("2025-08-17 08:00:00", 1001),
+    ]
+    temp_db_connection.executemany(
+        "INSERT INTO posicoes (timestamp_coleta, id_onibus, letreiro_linha, latitude, longitude) "
+        "VALUES (?, ?, '8000-10', -23.55, -46.63)",
+        linhas,
+    )
+    temp_db_connection.commit()
+
+    con = duckdb.connect()
+    try:
+        cp.exportar_tabela(con, "posicoes", filtro_data="2025-08-15")
+        cp.exportar_tabela(con, "posicoes", filtro_data="2025-08-16")
+    finally:
+        con.close()
+    return temp_db_connection
+
+
+def test_compactacao_mantem_manifesto(bronze_silver):
+    """Cada exportação atualiza o manifesto com as contagens dos rodapés."""
+    destino = os.path.join(cp.PARQUET_DIR, "posicoes")
+    manifesto = cp.ler_manifesto(destino)
+
+    assert {dt: p["linhas"] for dt, p in manifesto["particoes"].items()} == {"2025-08-15": 2, "2025-08-16": 1}
+    assert manifesto["total_linhas"] == 3
+
+
+def test_relatorio_por_dia(bronze_silver):
+    """Janela do Bronze, contagem por dia e status de cada dia."""
+    relatorio = reconciliacao.reconciliar(bronze_silver, "posicoes")
+
+    assert [(r["dt"], r["bronze"], r["silver"], r["status"]) for r in relatorio] == [
+        ("2025-08-15", 2, 2, "ok"),
+        ("2025-08-16", 1, 1, "ok"),
+        ("2025-08-17", 1, 0, "nao_compactado"),
+    ]
+    assert {r["fonte_silver"] for r in relatorio[:2]} == {"manifesto"}
+
+
+def test_divergencia_e_fallback_por_rodape(bronze_silver):
+    """Sem manifesto, conta pelos rodapés; Bronze com linhas novas aparece como divergente."""
+    os.remove(os.path.join(cp.PARQUET_DIR, "posicoes", cp.MANIFESTO))
+    bronze_silver.execute(
+        "INSERT INTO posicoes (timestamp_coleta, id_onibus, latitude, longitude) "
+        "VALUES ('2025-08-16 12:00:00', 1002, -23.5, -46.6)"
+    )
+    bronze_silver.commit()
+
+    relatorio = {r["dt"]: r for r in reconciliacao.reconciliar(bronze_silver, "posicoes", dias=["2025-08-16"])}
+
+    assert relatorio["2025-08-16"]["fonte_silver"] == "rodape"
+    assert relatorio["2025-08-16"]["diferenca"] == -1
+    assert relatorio["2025-08-16"]["status"] == "divergente"
+
+
+def test_dias_expurgados_fora_da_janela(bronze_silver):
+    """Dias que só existem no Silver (já expurgados do Bronze) não entram na janela."""
+    bronze_silver.execute("DELETE FROM posicoes WHERE timestamp_coleta < '2025-08-16'")
+    bronze_silver.commit()
+
+    dias = [r["dt"] for r in reconciliacao.reconciliar(bronze_silver, "posicoes")]
+    assert dias == ["2025-08-16", "2025-08-17"]
+    with open(os.path.join(cp.PARQUET_DIR, "posicoes", cp.MANIFESTO)) as f:
+        assert "2025-08-15" in json.load(f)["particoes"]
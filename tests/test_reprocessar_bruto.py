@@ -0,0 +1,97 @@
+"""Testes do reprocessamento do arquivo bruto (replay do coletor sem nova coleta)."""
+
+import json
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from src import arquivo_bruto, reprocessar_bruto
+from src.simulador_olhovivo import Frota
+
+INICIO = datetime(2025, 8, 15, 10, 0)
+
+
+@pytest.fixture
+def banco(temp_db_connection, temp_db_path, monkeypatch):
+    import src.database
+
+    monkeypatch.delenv("DATABASE_URL", raising=False)
+    monkeypatch.setattr(src.database, "DB_PATH", temp_db_path)
+    return temp_db_connection
+
+
+@pytest.fixture
+def frota():
+    return Frota(n_veiculos=300, n_linhas=20, seed=1, inicio=0.0)
+
+
+@pytest.fixture
+def arquivo(tmp_path, monkeypatch, frota):
+    """Quatro snapshots de /Posicao a cada 30 min (duas horas → dois arquivos)."""
+    monkeypatch.setenv("SPTRANS_ARQUIVO_DIR", str(tmp_path))
+    for i in range(4):
+        ts = INICIO + timedelta(minutes=30 * i)
+        corpo = json.dumps(frota.payload_posicao(agora=1800.0 * i)).encode()
+        arquivo_bruto.arquivar("/Posicao", corpo, ts)
+    return arquivo_bruto.listar_arquivos("/Posicao")
+
+
+def _veiculos_da_linha(frota, letreiro):
+    return int(np.isin(frota.servico, np.flatnonzero(frota.letreiro == letreiro)).sum())
+
+
+@pytest.mark.parametrize("processos", [1, 2])
+def test_reprocessa_posicoes_com_outro_filtro(banco, arquivo, frota, processos):
+    """Um filtro diferente do usado na coleta recupera as linhas descartadas, com o timestamp original."""
+    letreiro = str(frota.letreiro[3])
+    resumo = reprocessar_bruto.reprocessar(
+        arquivo, reprocessar_bruto.processar_posicao, alvo={letreiro}, processos=processos
+    )
+
+    esperados = 4 * _veiculos_da_linha(frota, letreiro)
+    assert (resumo["arquivos"], resumo["snapshots"], resumo["inseridos"]) == (2, 4, esperados)
+    assert (resumo["de"], resumo["ate"]) == (INICIO, INICIO + timedelta(minutes=90))
+    linhas = banco.execute("SELECT DISTINCT letreiro_linha FROM posicoes").fetchall()
+    assert linhas == [(letreiro,)]
+    coletas = banco.execute("SELECT DISTINCT timestamp_coleta FROM posicoes ORDER BY 1").fetchall()
+    assert [datetime.fromisoformat(ts) for (ts,) in coletas] == [INICIO + timedelta(minutes=30 * i) for i in range(4)]
+
+
+def test_reprocessar_de_novo_e_idempotente(banco, arquivo, frota):
+    primeira = reprocessar_bruto.reprocessar(arquivo, reprocessar_bruto.processar_posicao, alvo=None, processos=1)
+    segunda = reprocessar_bruto.reprocessar(arquivo, reprocessar_bruto.processar_posicao, alvo=None, processos=1)
+
+    assert primeira["inseridos"] == 4 * len(frota)
+    assert segunda["inseridos"] == 0
+
+
+def test_reprocessa_previsoes(banco, tmp_path, monkeypatch, frota):
+    monkeypatch.setenv("SPTRANS_ARQUIVO_DIR", str(tmp_path))
+    linhas = [int(frota.cl[0]), int(frota.cl[1])]
+    for linha in linhas:
+        corpo = json.dumps(frota.payload_previsao_linha(linha, agora=0.0)).encode()
+        arquivo_bruto.arquivar("/Previsao/Linha", corpo, INICIO, {"codigoLinha": linha})
+    arquivos = arquivo_bruto.listar_arquivos("/Previsao/Linha")
+
+    resumo = reprocessar_bruto.reprocessar(
+        arquivos, reprocessar_bruto.processar_previsao, alvo={linhas[0]}, processos=1
+    )
+
+    assert resumo["snapshots"] == 2
+    assert resumo["inseridos"] > 0
+    assert banco.execute("SELECT DISTINCT id_linha FROM previsoes").fetchall() == [(linhas[0],)]
+
+
+def test_gravacao_substituivel(arquivo, frota):
+    """Tabelas derivadas novas: troca-se `gravar` (e/ou o processador) sem tocar no Bronze."""
+    recebidos = []
+    resumo = reprocessar_bruto.reprocessar(
+        arquivo,
+        reprocessar_bruto.processar_posicao,
+        alvo=None,
+        processos=1,
+        gravar=lambda lotes: recebidos.extend(lotes) or 0,
+    )
+    assert resumo["inseridos"] == 0
+    assert sum(len(lote.registros) for lote in recebidos) == 4 * len(frota)
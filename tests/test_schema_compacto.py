@@ -0,0 +1,136 @@
+"""Testes do schema compacto de `posicoes` (SQLite) e da migração src/migrar_compacto.py."""
+
+import sqlite3
+from datetime import datetime
+
+import duckdb
+import pytest
+
+import src.database
+from src import analise_onibus, compactar_parquet, expurgar_sqlite, migrar_compacto
+from src.database import _schema_sqlite, contagem_tabela, get_connection, inserir_lote
+
+COLUNAS = ["timestamp_coleta", "id_onibus", "letreiro_linha", "latitude", "longitude", "timestamp_posicao"]
+
+REGISTROS = [
+    (datetime(2025, 8, 15, 10, 0, 0, 123456), 1001, "8000-10", -23.550512, -46.633301, "2025-08-15T12:59:30Z"),
+    (datetime(2025, 8, 15, 10, 0, 0, 123456), 1002, "8000-10", -23.551, -46.6328, "2025-08-15T12:58:00Z"),
+    (datetime(2025, 8, 15, 10, 30), 1001, "917H-10", -23.5601, -46.6401, None),
+    (datetime(2025, 8, 16, 10, 0), 1001, "8000-10", -23.57, -46.65, "2025-08-16T12:59:59Z"),
+]
+
+
+def _criar(caminho, compacto):
+    tabelas, indices = _schema_sqlite(compacto=compacto)
+    with sqlite3.connect(caminho) as conn:
+        for sql in [*tabelas, *indices]:
+            conn.execute(sql)
+
+
+@pytest.fixture
+def banco(temp_db_path, monkeypatch):
+    monkeypatch.delenv("DATABASE_URL", raising=False)
+    monkeypatch.setattr(src.database, "DB_PATH", temp_db_path)
+    return temp_db_path
+
+
+@pytest.fixture
+def compacto(banco):
+    _criar(banco, compacto=True)
+    with get_connection() as conn:
+        inserir_lote(conn, "posicoes", COLUNAS, REGISTROS)
+    return banco
+
+
+def test_view_mantem_colunas_e_valores(compacto):
+    with sqlite3.connect(compacto) as conn:
+        cursor = conn.execute("SELECT * FROM posicoes ORDER BY timestamp_coleta, id_onibus")
+        colunas = [d[0] for d in cursor.description]
+        linhas = cursor.fetchall()
+        assert conn.execute("SELECT letreiro_linha FROM linhas ORDER BY 1").fetchall() == [("8000-10",), ("917H-10",)]
+
+    assert colunas == ["id", *COLUNAS]
+    assert linhas[0] == (None, "2025-08-15 10:00:00", 1001, "8000-10", -23.550512, -46.633301, "2025-08-15T12:59:30Z")
+    assert linhas[2][1:3] == ("2025-08-15 10:30:00", 1001)
+    assert linhas[2][-1] is None
+    assert contagem_tabela("posicoes") == 4
+
+
+def test_insercao_idempotente_pela_chave(compacto):
+    """Replay/reexecução: a chave (ts_coleta, id_onibus) ignora o lote repetido."""
+    with get_connection() as conn:
+        assert inserir_lote(conn, "posicoes", COLUNAS, REGISTROS) == 0
+        novo = (datetime(2025, 8, 16, 10, 0), 1002, "875A-10", -23.5, -46.6, None)
+        assert inserir_lote(conn, "posicoes", COLUNAS, [novo]) == 1
+    assert contagem_tabela("posicoes") == 5
+
+
+def test_expurgo_e_reconciliacao_usam_a_tabela_fisica(compacto):
+    with get_connection() as conn:
+        assert expurgar_sqlite.expurgar_dia(conn, "posicoes", "2025-08-15", dry_run=True) == 3
+        assert expurgar_sqlite.expurgar_dia(conn, "posicoes", "2025-08-15") == 3
+        assert expurgar_sqlite.expurgar(conn, "posicoes", datetime(2025, 8, 17)) == 1
+        assert conn.execute("SELECT count(*) FROM posicoes_compactas").fetchone()[0] == 0
+    assert contagem_tabela("posicoes") == 0
+
+
+def test_analise_em_lotes(compacto, monkeypatch):
+    monkeypatch.setattr(analise_onibus, "DB_PATH", compacto)
+    with sqlite3.connect(compacto) as conn:
+        lotes = analise_onibus._planejar_lotes_sqlite(conn, None, max_linhas=2)
+        assert lotes == [(None, "2025-08-15 10:00:00", 2), ("2025-08-15 10:00:00", "2025-08-16 10:00:00", 2)]
+        assert analise_onibus._planejar_lotes_sqlite(conn, "2025-08-15 10:30:00", max_linhas=10) == [
+            ("2025-08-15 10:30:00", "2025-08-16 10:00:00", 1)
+        ]
+
+    # Orçamento de 2 posições por lote (BYTES_POR_POSICAO = 1 KiB)
+    posicoes = [p for p, _previsoes in analise_onibus._iterar_lotes_sqlite(memoria_mb=2 / 1024)]
+    assert [len(p) for p in posicoes] == [2, 2]
+    assert list(posicoes[0].columns) == ["id", *COLUNAS]
+
+
+def test_export_parquet_decodifica_com_os_tipos_de_sempre(compacto, tmp_path, monkeypatch):
+    monkeypatch.setattr(compactar_parquet, "DB_PATH", compacto)
+    monkeypatch.setattr(compactar_parquet, "PARQUET_DIR", str(tmp_path))
+    con = duckdb.connect()
+
+    assert compactar_parquet.exportar_tabela(con, "posicoes") == 4
+
+    destino = tmp_path / "posicoes"
+    descricao = con.execute(f"DESCRIBE SELECT * FROM read_parquet('{destino}/*/*.parquet')").fetchall()
+    tipos = {nome: tipo for nome, tipo, *_ in descricao}
+    assert tipos["timestamp_coleta"] == "TIMESTAMP" and tipos["latitude"] == "DOUBLE"
+    colunas = compactar_parquet.COLUNAS_CHECKSUM["posicoes"]
+    for dia in ("2025-08-15", "2025-08-16"):
+        assert compactar_parquet.checksum_sqlite(con, "posicoes", dia, colunas) == compactar_parquet.checksum_parquet(
+            con, str(destino), dia, colunas
+        )
+
+
+def test_migracao_preserva_dados_e_e_idempotente(banco):
+    _criar(banco, compacto=False)
+    with get_connection() as conn:
+        inserir_lote(conn, "posicoes", COLUNAS, REGISTROS)
+        antes = conn.execute(
+            "SELECT timestamp_coleta, id_onibus, letreiro_linha, latitude, longitude, timestamp_posicao "
+            "FROM posicoes ORDER BY 1, 2"
+        ).fetchall()
+
+    conn = sqlite3.connect(banco, isolation_level=None)
+    try:
+        assert migrar_compacto.migrar(conn) == 4
+        assert migrar_compacto.migrar(conn) == 0
+        depois = conn.execute(
+            "SELECT timestamp_coleta, id_onibus, letreiro_linha, latitude, longitude, timestamp_posicao "
+            "FROM posicoes ORDER BY 1, 2"
+        ).fetchall()
+        tipo = conn.execute("SELECT type FROM sqlite_master WHERE name = 'posicoes'").fetchone()
+    finally:
+        conn.close()
+
+    assert tipo == ("view",)
+    # timestamp_coleta perde a fração de segundo; coordenadas ficam em 1e-6 grau
+    assert [(ts[:19], *resto) for ts, *resto in antes] == depois
+    assert contagem_tabela("posicoes") == 4
+    with get_connection() as conn:
+        assert inserir_lote(conn, "posicoes", COLUNAS, REGISTROS) == 0
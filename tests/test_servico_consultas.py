@@ -0,0 +1,176 @@
+"""Testes do serviço HTTP de consultas sobre o Parquet de posições (src/servico_consultas.py)."""
+
+import sqlite3
+
+import duckdb
+import numpy as np
+import pandas as pd
+import pytest
+import requests
+
+import src.database
+from src import servico_consultas as sc
+from src.compactar_parquet import atualizar_manifesto
+
+M_POR_GRAU = 111_195.08
+INICIO = pd.Timestamp("2025-08-16 06:00:00")
+
+
+def _posicoes(onibus, latitudes, minutos, letreiro="8000-10", inicio=INICIO):
+    return pd.DataFrame(
+        {
+            "timestamp_coleta": inicio + pd.to_timedelta(minutos, unit="min"),
+            "id_onibus": onibus,
+            "letreiro_linha": letreiro,
+            "latitude": latitudes,
+            "longitude": -46.63,
+            "timestamp_posicao": None,
+        }
+    )
+
+
+def _publicar(silver, dia, df, nome="part-0.parquet"):
+    particao = silver / "posicoes" / f"dt={dia}"
+    particao.mkdir(parents=True, exist_ok=True)
+    df.to_parquet(particao / nome, index=False)
+    con = duckdb.connect()
+    try:
+        atualizar_manifesto(con, str(silver / "posicoes"), [dia])
+    finally:
+        con.close()
+
+
+@pytest.fixture
+def silver(tmp_path, monkeypatch):
+    monkeypatch.delenv("DATABASE_URL", raising=False)
+    monkeypatch.setattr(src.database, "DB_PATH", str(tmp_path / "sem_banco.db"))
+    silver = tmp_path / "parquet"
+    _publicar(silver, "2025-08-15", _posicoes(9, [-23.50, -23.51], [0, 1], inicio=pd.Timestamp("2025-08-15 06:00")))
+    minutos = np.arange(0, 16)
+    _publicar(
+        silver,
+        "2025-08-16",
+        pd.concat(
+            [
+                # 1 anda para o norte; 2 fica parado 15 min; 3 anda colado no 1 (~110 m atrás)
+                _posicoes(1, np.linspace(-23.60, -23.45, 16), minutos),
+                _posicoes(2, [-23.70] * 16, minutos),
+                _posicoes(3, np.linspace(-23.60, -23.45, 16) - 0.001, minutos),
+                _posicoes(4, np.linspace(-23.30, -23.20, 16), minutos, letreiro="917H-10"),
+            ],
+            ignore_index=True,
+        ),
+    )
+    return silver
+
+
+@pytest.fixture
+def servidor(silver):
+    servidor = sc.iniciar(sc.ServicoConsultas(str(silver)))
+    yield servidor
+    servidor.shutdown()
+    servidor.server_close()
+    servidor.servico.fechar()
+
+
+def test_cache_lru_com_ttl():
+    agora = [0.0]
+    cache = sc.CacheLRU(capacidade=2, ttl_s=10, relogio=lambda: agora[0])
+    cache.guardar("a", 1)
+    cache.guardar("b", 2)
+    assert cache.obter("a") == 1
+    cache.guardar("c", 3)  # "b" é o menos usado: sai
+
+    assert cache.obter("b") is None
+    agora[0] = 10
+    assert cache.obter("a") is None
+    assert cache.estatisticas() == {"itens": 1, "acertos": 1, "faltas": 2}
+
+
+def test_posicoes_da_linha_em_json_e_arrow(servidor):
+    params = {"linha": "8000-10", "inicio": "2025-08-16T06:05", "fim": "2025-08-16T06:10"}
+
+    df_json = sc.consultar(servidor.base_url, "/posicoes", formato="json", **params)
+    df_arrow = sc.consultar(servidor.base_url, "/posicoes", **params)
+
+    assert len(df_arrow) == 3 * 5
+    assert df_arrow["timestamp_coleta"].min() == pd.Timestamp("2025-08-16 06:05")
+    assert set(df_arrow["id_onibus"]) == {1, 2, 3}
+    assert df_json["id_onibus"].tolist() == df_arrow["id_onibus"].tolist()
+    assert pd.to_datetime(df_json["timestamp_coleta"]).tolist() == df_arrow["timestamp_coleta"].tolist()
+
+    resposta = requests.get(f"{servidor.base_url}/posicoes", params=params, headers={"Accept": sc.TIPO_ARROW})
+    assert resposta.headers["Content-Type"] == sc.TIPO_ARROW
+
+
+def test_erros_de_parametro_e_rota(servidor):
+    assert requests.get(f"{servidor.base_url}/posicoes", params={"linha": "8000-10"}).status_code == 400
+    resposta = requests.get(f"{servidor.base_url}/posicoes", params={"linha": "8000-10", "inicio": "ontem"})
+    assert resposta.status_code == 400
+    assert "inicio" in resposta.json()["erro"]
+    assert requests.get(f"{servidor.base_url}/nao-existe").status_code == 404
+
+
+def test_onibus_parados_e_comboios_na_ultima_janela(servidor):
+    parados = sc.consultar(servidor.base_url, "/onibus-parados")
+    comboios = sc.consultar(servidor.base_url, "/comboios", linha="8000-10")
+
+    assert parados["id_onibus"].tolist() == [2]
+    assert parados["tempo_decorrido_min"].iloc[0] == pytest.approx(15)
+    assert parados["distancia_m"].iloc[0] == pytest.approx(0)
+    assert len(comboios) == 16
+    assert set(zip(comboios["id_onibus_a"], comboios["id_onibus_b"])) == {(3, 1)}
+    assert comboios["distancia_m"].to_numpy() == pytest.approx(0.001 * M_POR_GRAU, rel=1e-3)
+    # Dia sem ninguém parado por mais de 10 min
+    assert sc.consultar(servidor.base_url, "/onibus-parados", dia="2025-08-15").empty
+
+
+def test_atuais_sem_banco_vem_da_ultima_particao(servidor):
+    atuais = sc.consultar(servidor.base_url, "/posicoes/atuais")
+    so_917 = sc.consultar(servidor.base_url, "/posicoes/atuais", linha="917H-10")
+
+    assert atuais["id_onibus"].tolist() == [1, 2, 3, 4]
+    assert (atuais["timestamp_coleta"] == INICIO + pd.Timedelta(minutes=15)).all()
+    assert atuais["latitude"].iloc[0] == pytest.approx(-23.45)
+    assert so_917["id_onibus"].tolist() == [4]
+
+
+def test_cache_invalidado_por_manifesto_novo(servidor, silver, monkeypatch):
+    chamadas = []
+    executar = servidor.servico._executar
+    monkeypatch.setattr(servidor.servico, "_executar", lambda *a: chamadas.append(1) or executar(*a))
+    params = {"linha": "8000-10", "inicio": "2025-08-16T06:00", "fim": "2025-08-17T00:00"}
+
+    assert len(sc.consultar(servidor.base_url, "/posicoes", **params)) == 48
+    assert len(sc.consultar(servidor.base_url, "/posicoes", **params)) == 48
+    assert len(chamadas) == 1
+    assert servidor.servico.cache.estatisticas()["acertos"] == 1
+
+    # Compactação nova na partição: o manifesto muda e a resposta em cache deixa de valer
+    _publicar(silver, "2025-08-16", _posicoes(5, [-23.0], [30]), nome="part-1.parquet")
+    assert len(sc.consultar(servidor.base_url, "/posicoes", **params)) == 49
+    assert len(chamadas) == 2
+
+    saude = requests.get(f"{servidor.base_url}/saude").json()
+    assert saude["manifesto"]["particoes"] == 2
+    assert saude["manifesto"]["ultimo_dia"] == "2025-08-16"
+
+
+def test_atuais_com_banco_so_le(silver, tmp_path, monkeypatch):
+    """Banco sem `posicoes_atuais`/`contagem_tabelas`: frota vazia, e o serviço não cria nada no banco."""
+    from src.posicoes_atuais import frota_atual
+
+    banco = tmp_path / "coletor.db"
+    with sqlite3.connect(banco) as conn:
+        conn.execute("CREATE TABLE posicoes (id INTEGER PRIMARY KEY, timestamp_coleta DATETIME)")
+    monkeypatch.setattr(src.database, "DB_PATH", str(banco))
+    frota_atual().invalidar()
+    servico = sc.ServicoConsultas(str(silver))
+    try:
+        status, _, corpo = servico.responder("/posicoes/atuais", {})
+    finally:
+        servico.fechar()
+
+    assert (status, corpo) == (200, b"[]")
+    with sqlite3.connect(banco) as conn:
+        assert [r[0] for r in conn.execute("SELECT name FROM sqlite_master")] == ["posicoes"]
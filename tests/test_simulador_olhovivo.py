@@ -0,0 +1,111 @@
+"""Testes do simulador offline da API Olho Vivo e dos coletores rodando contra ele."""
+
+import re
+
+import numpy as np
+import pytest
+import requests
+
+from src import simulador_olhovivo as sim
+
+
+@pytest.fixture
+def servidor():
+    frota = sim.Frota(n_veiculos=300, n_linhas=20, seed=7)
+    servidor = sim.iniciar(frota, token="segredo", seed=7)
+    yield servidor
+    servidor.shutdown()
+    servidor.server_close()
+
+
+def test_frota_vetorizada_se_move():
+    """Posições ficam dentro de SP e mudam com o relógio; todo veículo aparece uma vez em /Posicao."""
+    frota = sim.Frota(n_veiculos=1000, n_linhas=50, seed=1, inicio=0)
+    lat0, lon0 = frota.posicoes(agora=0)
+    lat1, lon1 = frota.posicoes(agora=120)
+    assert (lat0 >= sim.LAT_MIN).all() and (lat0 <= sim.LAT_MAX).all()
+    assert (lon0 >= sim.LON_MIN).all() and (lon0 <= sim.LON_MAX).all()
+    assert ((lat0 != lat1) | (lon0 != lon1)).mean() > 0.99
+
+    payload = frota.payload_posicao(agora=0)
+    prefixos = [v["p"] for linha in payload["l"] for v in linha["vs"]]
+    assert sorted(prefixos) == sorted(frota.prefixo.tolist())
+    assert all(linha["qv"] == len(linha["vs"]) for linha in payload["l"])
+    assert {linha["sl"] for linha in payload["l"]} == {1, 2}
+
+
+def test_previsao_ordenada_por_chegada():
+    frota = sim.Frota(n_veiculos=500, n_linhas=5, seed=3, inicio=0)
+    payload = frota.payload_previsao_linha(int(frota.cl[0]), agora=0)
+    assert len(payload["ps"]) == sim.PONTOS_POR_ROTA
+    assert any(p["vs"] for p in payload["ps"])
+    for parada in payload["ps"]:
+        assert set(parada) == {"cp", "np", "py", "px", "vs"}
+        assert all(re.fullmatch(r"\d{2}:\d{2}", v["t"]) for v in parada["vs"])
+    assert frota.payload_previsao_linha(999_999)["ps"] == []
+
+
+def test_endpoints_http_com_autenticacao(servidor):
+    session = requests.Session()
+    assert session.get(f"{servidor.base_url}/Posicao", timeout=5).status_code == 401
+    assert session.post(f"{servidor.base_url}/Login/Autenticar?token=errado", timeout=5).json() is False
+    assert session.post(f"{servidor.base_url}/Login/Autenticar?token=segredo", timeout=5).json() is True
+
+    posicao = session.get(f"{servidor.base_url}/Posicao", timeout=5).json()
+    assert sum(linha["qv"] for linha in posicao["l"]) == 300
+    cl = posicao["l"][0]["cl"]
+    previsao = session.get(f"{servidor.base_url}/Previsao/Linha?codigoLinha={cl}", timeout=5).json()
+    assert len(previsao["ps"]) == sim.PONTOS_POR_ROTA
+    paradas = session.get(f"{servidor.base_url}/Parada/BuscarParadasPorLinha?codigoLinha={cl}", timeout=5).json()
+    assert [p["cp"] for p in paradas] == [p["cp"] for p in previsao["ps"]]
+
+
+def test_catalogo_de_paradas_pela_api(servidor, monkeypatch):
+    from src import catalogo_paradas, coleta_previsoes
+
+    monkeypatch.setattr(coleta_previsoes, "BASE_URL", servidor.base_url)
+    session = requests.Session()
+    assert coleta_previsoes.autenticar("segredo", session)
+    codigos = [int(cl) for cl in servidor.frota.cl[:3]]
+
+    paradas = catalogo_paradas.buscar_paradas_api(session, codigos)
+    assert len(paradas) > 0
+    assert set(paradas["fonte"]) == {"api"}
+    assert paradas["latitude"].between(sim.LAT_MIN, sim.LAT_MAX).all()
+
+
+def test_injecao_de_erros(servidor):
+    servidor.falhas = sim.Falhas(taxa_erro=1.0)
+    resp = requests.post(f"{servidor.base_url}/Login/Autenticar?token=segredo", timeout=5)
+    assert resp.status_code == 500
+
+
+def test_coletor_de_posicoes_contra_o_simulador(servidor, temp_db_connection, temp_db_path, monkeypatch, tmp_path):
+    """coleta_sptrans.job roda ponta a ponta contra o simulador e grava só as linhas alvo."""
+    import src.coleta_sptrans as coleta
+    import src.database
+
+    monkeypatch.delenv("DATABASE_URL", raising=False)
+    monkeypatch.setenv("SPTRANS_ARQUIVO_DIR", str(tmp_path / "bruto"))
+    monkeypatch.setattr(src.database, "DB_PATH", temp_db_path)
+    monkeypatch.setattr(coleta, "BASE_URL", servidor.base_url)
+    monkeypatch.setattr(coleta, "get_config", lambda: {"SPTRANS": {"TOKEN": "segredo"}})
+    monkeypatch.setattr(coleta, "datetime", _DatetimeFixo)
+
+    frota = servidor.frota
+    letreiro = str(frota.letreiro[0])
+    esperados = int(np.isin(frota.servico, np.flatnonzero(frota.letreiro == letreiro)).sum())
+
+    assert coleta.job({letreiro}) == esperados
+    gravados = temp_db_connection.execute("SELECT DISTINCT letreiro_linha FROM posicoes").fetchall()
+    assert gravados == [(letreiro,)]
+    # A resposta completa (todas as linhas) fica no arquivo bruto, com o timestamp do Bronze
+    assert (tmp_path / "bruto" / "posicao" / "dt=2025-08-15" / "posicao-20250815T10.zst").exists()
+
+
+class _DatetimeFixo:
+    @staticmethod
+    def now():
+        from datetime import datetime
+
+        return datetime(2025, 8, 15, 10, 0, 0)
@@ -0,0 +1,120 @@
+"""Testes da segmentação de viagens (src/viagens.py)."""
+
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src import viagens
+
+TERMINAL_A = (-23.50, -46.60)
+TERMINAL_B = (-23.60, -46.60)  # ~11 km ao sul de A
+INICIO = pd.Timestamp("2025-08-15 06:00:00")
+
+
+def _trecho(onibus, de, ate, inicio, passos, letreiro="8000-10", intervalo_min=5):
+    """Posições de um ônibus indo de `de` a `ate` em `passos` intervalos (inclui as duas pontas)."""
+    frac = np.linspace(0, 1, passos + 1)
+    return pd.DataFrame(
+        {
+            "timestamp_coleta": inicio + pd.to_timedelta(frac * passos * intervalo_min, unit="min"),
+            "id_onibus": onibus,
+            "letreiro_linha": letreiro,
+            "latitude": de[0] + (ate[0] - de[0]) * frac,
+            "longitude": de[1] + (ate[1] - de[1]) * frac,
+            "timestamp_posicao": None,
+        }
+    )
+
+
+def _ida_e_volta():
+    """A→B (60 min), 10 min parado em B, B→A (60 min), 2 h sem sinal e meia ida."""
+    meio = ((TERMINAL_A[0] + TERMINAL_B[0]) / 2, TERMINAL_A[1])
+    return pd.concat(
+        [
+            _trecho(1, TERMINAL_A, TERMINAL_B, INICIO, 12),
+            _trecho(1, TERMINAL_B, TERMINAL_B, INICIO + pd.Timedelta(minutes=65), 1),
+            _trecho(1, TERMINAL_B, TERMINAL_A, INICIO + pd.Timedelta(minutes=75), 12),
+            _trecho(1, TERMINAL_A, meio, INICIO + pd.Timedelta(hours=4), 6),
+        ],
+        ignore_index=True,
+    )
+
+
+def _segmentar(posicoes, **kwargs):
+    return viagens.segmentar(viagens.preparar_pontos(posicoes), **kwargs)
+
+
+def test_corta_nos_terminais_e_na_lacuna():
+    resultado = _segmentar(_ida_e_volta())
+
+    # Terminais inferidos: qual extremo é "A" depende dos dados, mas o sentido alterna
+    ida, volta, de_novo = resultado["sentido"]
+    assert {ida, volta} == {1, 2} and de_novo == ida
+    assert list(resultado["motivo_fim"]) == ["terminal", "terminal", "fim_dos_dados"]
+    assert list(resultado["completa"]) == [True, True, False]
+    # A chegada em B fecha a 1ª viagem; a 2ª sai de B na partida, sem os 10 min parado
+    assert resultado.loc[0, "fim"] == INICIO + pd.Timedelta(minutes=60)
+    assert resultado.loc[1, "inicio"] == INICIO + pd.Timedelta(minutes=75)
+    assert resultado.loc[0, "duracao_s"] == 3600
+    assert resultado.loc[0, "distancia_m"] == pytest.approx(11_119, rel=0.01)
+    assert resultado.loc[0, "velocidade_media_kmh"] == pytest.approx(11.1, rel=0.01)
+
+
+def test_inversao_de_sentido_fora_do_terminal():
+    """Ônibus que retorna no meio da linha: o ponto de retorno fecha uma viagem e abre a outra."""
+    meio = (-23.55, -46.60)
+    outro = pd.concat(
+        [
+            _trecho(2, TERMINAL_A, meio, INICIO, 6),
+            _trecho(2, meio, TERMINAL_A, INICIO + pd.Timedelta(minutes=35), 5),
+        ],
+        ignore_index=True,
+    )
+    terminais = pd.DataFrame(
+        [[*TERMINAL_A, *TERMINAL_B]], columns=viagens.COLUNAS_TERMINAIS, index=pd.Index(["8000-10"])
+    )
+
+    resultado = _segmentar(outro, terminais=terminais)
+
+    assert list(resultado["motivo_fim"]) == ["sentido", "terminal"]
+    assert list(resultado["sentido"]) == [1, 2]
+    assert resultado.loc[0, "fim"] == resultado.loc[1, "inicio"]
+    assert resultado.loc[0, "lat_fim"] == pytest.approx(meio[0])
+
+
+def test_onibus_e_linhas_independentes_e_horario_do_gps():
+    """Cada (ônibus, linha) é segmentado à parte; `timestamp_posicao` (UTC) vira horário local."""
+    uma = _trecho(1, TERMINAL_A, TERMINAL_B, INICIO, 12)
+    outra = _trecho(1, TERMINAL_A, TERMINAL_B, INICIO, 12, letreiro="917H-10")
+    outra["timestamp_posicao"] = (outra["timestamp_coleta"] + pd.Timedelta(hours=3) - pd.Timedelta(minutes=1)).map(
+        lambda ts: ts.strftime("%Y-%m-%dT%H:%M:%SZ")
+    )
+
+    resultado = _segmentar(pd.concat([uma, outra, uma], ignore_index=True))
+
+    assert sorted(resultado["letreiro_linha"]) == ["8000-10", "917H-10"]
+    gps = resultado.set_index("letreiro_linha").loc["917H-10", "inicio"]
+    assert gps == INICIO - pd.Timedelta(minutes=1)
+
+
+def test_vazio():
+    vazio = _segmentar(_ida_e_volta().iloc[:0])
+    assert vazio.empty and list(vazio.columns) == list(viagens.TIPOS_VIAGENS)
+
+
+def test_processa_dias_e_publica(tmp_path):
+    for dia in ("2025-08-15", "2025-08-16"):
+        particao = tmp_path / "posicoes" / f"dt={dia}"
+        particao.mkdir(parents=True)
+        deslocado = _ida_e_volta()
+        deslocado["timestamp_coleta"] += pd.Timestamp(dia) - INICIO.normalize()
+        deslocado["timestamp_posicao"] = pd.NaT
+        deslocado.to_parquet(particao / "part-0.parquet", index=False)
+
+    dias = viagens.particoes_posicoes(str(tmp_path))
+    resultado = viagens.processar_dias(dias, processos=1, parquet_dir=str(tmp_path))
+
+    assert resultado == {"2025-08-15": 3, "2025-08-16": 3}
+    lido = pd.read_parquet(tmp_path / "viagens" / "dt=2025-08-16" / viagens.ARQUIVO_VIAGENS)
+    assert lido["inicio"].min() == pd.Timestamp("2025-08-16 06:00:00")